@@ -1,14 +1,22 @@
 from django.contrib import admin
-from .models import ChartConfig
+from django.db.models import Prefetch
+from django.template.response import TemplateResponse
+
+from .models import ChartConfig, ChartExecution, ExportJob
+from .profiling import profile_chart
 
 
 @admin.register(ChartConfig)
 class ChartConfigAdmin(admin.ModelAdmin):
-    list_display = ['title', 'section', 'chart_type', 'size', 'display_order', 'is_active', 'updated_at']
+    list_display = [
+        'title', 'section', 'chart_type', 'size', 'display_order', 'is_active',
+        'last_duration', 'p50_duration', 'p95_duration', 'query_counts', 'updated_at',
+    ]
     list_filter = ['section', 'chart_type', 'size', 'is_active', 'created_at']
     search_fields = ['title', 'description']
     ordering = ['section', 'display_order', 'title']
     list_editable = ['display_order', 'is_active']
+    actions = ['profile_now']
 
     fieldsets = (
         ('Configuration de base', {
@@ -18,8 +26,20 @@ class ChartConfigAdmin(admin.ModelAdmin):
             'fields': ('display_order', 'size', 'is_active')
         }),
         ('Requête de données', {
-            'fields': ('query_code',),
+            'fields': ('query_spec', 'query_code', 'depends_on'),
             'description': '''
+            <strong>Spécification (recommandée, une seule requête en base) :</strong><br>
+            <pre>
+{
+    "model": "Interaction",
+    "dimension": {"field": "created_at", "bucket": "month", "months": 6},
+    "measure": {"op": "count"},
+    "label": "Interactions",
+    "colors": ["#3b82f6"]
+}
+            </pre>
+            Voir analysis/chart_spec.py pour le format complet (cases, series, measures, cumulative…).<br><br>
+
             <strong>Exemples de code :</strong><br><br>
 
             <strong>1. Évolution mensuelle des bénéficiaires :</strong><br>
@@ -60,9 +80,16 @@ result = {
             </pre><br>
 
             <strong>Variables disponibles :</strong> Count, Sum, Avg, Q, timezone, datetime, timedelta,
-            Beneficiary, Interaction, FinancialSnapshot, Child, Appointment, Volunteer, StockItem, StockMovement
+            Beneficiary, Interaction, FinancialSnapshot, Child, Appointment, Volunteer, StockItem, StockMovement,
+            FinancialFrame (photos financières en tableaux NumPy, voir analysis/frames.py), np
             '''
         }),
+        ("Limites d'exécution", {
+            'fields': ('timeout_seconds', 'memory_limit_mb', 'row_limit'),
+            'classes': ('collapse',),
+            'description': 'Vide : valeurs par défaut. Le code de requête est exécuté dans un '
+                           'sous-processus aux ressources bornées, interrompu au-delà de ces limites.'
+        }),
         ('Labels des axes', {
             'fields': ('x_axis_label', 'y_axis_label')
         }),
@@ -75,4 +102,63 @@ result = {
     readonly_fields = ['created_at', 'updated_at']
 
     def get_queryset(self, request):
-        return super().get_queryset(request)
+        # Mesures d'exécution en une requête pour toute la liste (tampon borné par graphique)
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('executions', queryset=ChartExecution.objects.order_by('-executed_at', '-id'))
+        )
+
+    @staticmethod
+    def _format_ms(value):
+        return '-' if value is None else f'{value:.0f} ms'
+
+    def last_duration(self, obj):
+        stats = obj.execution_stats
+        return self._format_ms(stats and stats['last_ms'])
+    last_duration.short_description = 'Dernière'
+
+    def p50_duration(self, obj):
+        stats = obj.execution_stats
+        return self._format_ms(stats and stats['p50_ms'])
+    p50_duration.short_description = 'Médiane'
+
+    def p95_duration(self, obj):
+        stats = obj.execution_stats
+        return self._format_ms(stats and stats['p95_ms'])
+    p95_duration.short_description = 'P95'
+
+    def query_counts(self, obj):
+        stats = obj.execution_stats
+        if not stats:
+            return '-'
+        return f"{stats['last_queries']} / {stats['p50_queries']} / {stats['p95_queries']}"
+    query_counts.short_description = 'Requêtes (dern. / méd. / P95)'
+
+    def profile_now(self, request, queryset):
+        """Évalue les graphiques sélectionnés sans cache et affiche les requêtes SQL exécutées"""
+        profiles = [
+            (chart, profile_chart(chart, capture_sql=True))
+            for chart in queryset.order_by('section', 'display_order', 'title')
+        ]
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Profilage des graphiques',
+            'opts': self.model._meta,
+            'profiles': profiles,
+        }
+        return TemplateResponse(request, 'admin/analysis/chartconfig/profile.html', context)
+    profile_now.short_description = 'Profiler maintenant (requêtes SQL)'
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'user', 'export_format', 'status', 'progress', 'finished_at', 'expires_at']
+    list_filter = ['status', 'export_format', 'created_at']
+    search_fields = ['user__username', 'user__first_name', 'user__last_name']
+    ordering = ['-created_at']
+    readonly_fields = [
+        'id', 'user', 'export_format', 'status', 'progress', 'message', 'error', 'file',
+        'created_at', 'started_at', 'finished_at', 'expires_at',
+    ]
+
+    def has_add_permission(self, request):
+        return False
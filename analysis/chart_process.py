@@ -0,0 +1,14 @@
+"""
+Préchargement du serveur de processus des graphiques (forkserver).
+
+Le serveur est un processus neuf, à un seul thread, sans connexion à la
+base : Django y est initialisé une fois, puis chaque sous-processus de
+graphique (voir governor) en est une copie prête à exécuter le code de
+requête. Rien n'est hérité des threads du processus web (verrous de libpq,
+du logging ou des imports).
+"""
+import django
+
+django.setup()
+
+from . import frames, governor  # noqa: E402,F401  (numpy et modèles chargés une fois)
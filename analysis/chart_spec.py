@@ -0,0 +1,382 @@
+"""
+Spécification déclarative des graphiques d'analyse.
+
+Alternative au code de requête exécuté par exec() : un dict JSON décrit le
+graphique et est compilé en une seule requête values().annotate(), évaluée
+entièrement en base.
+
+    {
+        "model": "FinancialSnapshot",
+        "filter": {"beneficiary__housing_status": "CADA"},
+        "dimension": {"field": "date", "bucket": "month", "months": 6},
+        "series": {
+            "cases": [
+                {"label": "0 enfants", "filter": {"beneficiary__dependents_count": 0}},
+                {"label": "1-2 enfants", "filter": {"beneficiary__dependents_count__lte": 2}}
+            ],
+            "default": "3+ enfants",
+            "colors": ["#8b5cf6", "#10b981", "#f59e0b"]
+        },
+        "measure": {"op": "avg", "fields": ["salaire", "af"], "subtract": ["loyer_residuel"]}
+    }
+
+- model : nom d'un modèle de CHART_CONTEXT_MODELS ; filter : lookups Django
+- dimension (axe X), au choix :
+  - field : valeurs du champ (libellés des choices s'il en a), triées dans
+    l'ordre des choices ou par valeur, par mesure décroissante (order
+    "-measure") ou par libellé (order "label"), avec limit, label_format ("{} enfant(s)"), empty_label
+  - field + bucket "month" (TruncMonth, `months` derniers mois, cumulative
+    pour un total à date) ou "weekday" (lundi à dimanche)
+  - cases : liste de {label, filter} (Case/When, premier cas vrai), default
+  - absente : une barre par mesure (aggregate)
+- series (un jeu de données par valeur) : field ou cases comme la dimension ;
+  une ligne sans cas correspondant ni default est ignorée
+- measure / measures : op "count", "sum" ou "avg" sur la somme des champs
+  `fields` moins `subtract` (valeurs nulles comptées 0), éventuellement
+  divisée par la somme du champ `divide_by` (moyenne pondérée depuis les
+  agrégats mensuels), label, style
+- label, style (options Chart.js de chaque jeu de données), colors
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Avg, Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractIsoWeekDay, NullIf, TruncMonth
+from django.utils import timezone
+from django.utils.formats import date_format
+
+
+WEEKDAY_LABELS = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+MEASURE_FUNCTIONS = {
+    'sum': Sum,
+    'avg': Avg,
+}
+
+
+class ChartSpecError(ValueError):
+    """Spécification de graphique invalide"""
+
+
+def get_spec_model(spec):
+    from .models import CHART_CONTEXT_MODELS
+
+    if not isinstance(spec, dict):
+        raise ChartSpecError('La spécification doit être un objet JSON.')
+    name = spec.get('model')
+    if name not in CHART_CONTEXT_MODELS:
+        raise ChartSpecError(
+            f'Modèle inconnu : {name!r} (disponibles : {", ".join(CHART_CONTEXT_MODELS)}).'
+        )
+    return apps.get_model(CHART_CONTEXT_MODELS[name])
+
+
+def _resolve_path(model, path):
+    """
+    Champ désigné par un chemin de lookup (relations traversées) et modèles
+    traversés. Les transformations et lookups finaux (__hour, __gte…) sont
+    ignorés ; le champ retourné est None si le chemin ne désigne aucun champ.
+    """
+    field, traversed = None, [model]
+    for part in path.split('__'):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            break
+        if field.is_relation and field.related_model:
+            model = field.related_model
+            traversed.append(model)
+    return field, traversed
+
+
+def _spec_lookups(spec):
+    """Tous les chemins de lookup utilisés par la spécification"""
+    paths = list(spec.get('filter', {}))
+    for axis in (spec.get('dimension'), spec.get('series')):
+        if axis:
+            if axis.get('field'):
+                paths.append(axis['field'])
+            for case in axis.get('cases', []):
+                paths.extend(case.get('filter', {}))
+    for measure in _measures(spec):
+        paths.extend(measure.get('fields') or [measure.get('field') or 'pk'])
+        paths.extend(measure.get('subtract', []))
+        if measure.get('divide_by'):
+            paths.append(measure['divide_by'])
+    return paths
+
+
+def get_spec_dependencies(spec):
+    """
+    Noms (clés de CHART_CONTEXT_MODELS) des modèles lus par la spécification,
+    y compris le modèle source d'un champ recopié (CHART_DERIVED_FIELDS)
+    """
+    from .models import CHART_CONTEXT_MODELS, CHART_DERIVED_FIELDS
+
+    model = get_spec_model(spec)
+    labels = {label: name for name, label in CHART_CONTEXT_MODELS.items()}
+    names = set()
+    for path in _spec_lookups(spec) or ['pk']:
+        field, traversed_models = _resolve_path(model, path)
+        for traversed in traversed_models:
+            if traversed._meta.label in labels:
+                names.add(labels[traversed._meta.label])
+        if field is not None and field.model._meta.label in labels:
+            source = CHART_DERIVED_FIELDS.get(labels[field.model._meta.label], {}).get(field.name)
+            if source:
+                names.add(source)
+    return sorted(names)
+
+
+def _measures(spec):
+    measures = spec.get('measures') or [spec.get('measure') or {'op': 'count'}]
+    if not isinstance(measures, list) or not all(isinstance(measure, dict) for measure in measures):
+        raise ChartSpecError('"measures" doit être une liste d\'objets.')
+    return measures
+
+
+def _measure_expression(measure):
+    op = measure.get('op', 'count')
+    if op == 'count':
+        return Count('pk')
+    if op not in MEASURE_FUNCTIONS:
+        raise ChartSpecError(f'Opération inconnue : {op!r} (count, sum ou avg).')
+    fields = measure.get('fields') or ([measure['field']] if measure.get('field') else [])
+    if not fields:
+        raise ChartSpecError(f'La mesure {op!r} doit indiquer "fields".')
+
+    def term(name):
+        return Coalesce(F(name), Value(0), output_field=FloatField())
+
+    expression = term(fields[0])
+    for name in fields[1:]:
+        expression = expression + term(name)
+    for name in measure.get('subtract', []):
+        expression = expression - term(name)
+    aggregate = MEASURE_FUNCTIONS[op](expression, output_field=FloatField())
+    if measure.get('divide_by'):
+        # Moyenne pondérée sur des agrégats pré-calculés (sommes / effectifs)
+        return aggregate / NullIf(Sum(term(measure['divide_by'])), 0, output_field=FloatField())
+    return aggregate
+
+
+def _cases_expression(axis):
+    whens = []
+    for case in axis['cases']:
+        if 'label' not in case:
+            raise ChartSpecError('Chaque cas doit avoir un "label".')
+        whens.append(When(Q(**case.get('filter', {})), then=Value(case['label'])))
+    return Case(*whens, default=Value(axis.get('default')), output_field=models.CharField())
+
+
+def _month_start(day, months_back=0):
+    month_index = day.year * 12 + day.month - 1 - months_back
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class CompiledSpec:
+    """Requête compilée d'une spécification et mise en forme de son résultat"""
+
+    def __init__(self, spec, today=None):
+        self.spec = spec
+        self.model = get_spec_model(spec)
+        self.today = today or timezone.localdate()
+        self.dimension = spec.get('dimension') or None
+        self.series = spec.get('series') or None
+        self.measures = _measures(spec)
+        self.queryset = self._build_queryset()
+
+    # Compilation
+
+    def _axis_expression(self, axis, name):
+        if axis.get('cases'):
+            return _cases_expression(axis)
+        if not axis.get('field'):
+            raise ChartSpecError(f'La {name} doit indiquer "field" ou "cases".')
+        bucket = axis.get('bucket')
+        if bucket == 'month':
+            return TruncMonth(axis['field'])
+        if bucket == 'weekday':
+            return ExtractIsoWeekDay(axis['field'])
+        if bucket:
+            raise ChartSpecError(f'Regroupement inconnu : {bucket!r} (month ou weekday).')
+        return F(axis['field'])
+
+    def _months(self):
+        months = int(self.dimension.get('months', 12))
+        return [_month_start(self.today, back) for back in range(months - 1, -1, -1)]
+
+    def _build_queryset(self):
+        queryset = self.model.objects.filter(**self.spec.get('filter', {}))
+        annotations = {
+            f'value_{index}': _measure_expression(measure)
+            for index, measure in enumerate(self.measures)
+        }
+
+        if self.dimension is None and self.series is None:
+            self.aggregates = annotations
+            return queryset
+
+        groups = {}
+        if self.dimension is not None:
+            groups['dimension'] = self._axis_expression(self.dimension, 'dimension')
+            if self.dimension.get('bucket') == 'month' and not self.dimension.get('cumulative'):
+                # Fenêtre des derniers mois (un total cumulé a besoin de l'historique)
+                field, _ = _resolve_path(self.model, self.dimension['field'])
+                start = self._months()[0]
+                if isinstance(field, models.DateTimeField):
+                    start = timezone.make_aware(datetime.combine(start, time.min))
+                queryset = queryset.filter(**{f"{self.dimension['field']}__gte": start})
+        if self.series is not None:
+            groups['series'] = self._axis_expression(self.series, 'série')
+
+        queryset = queryset.values(**groups).annotate(**annotations)
+        if self.dimension is not None and self.dimension.get('order') == '-measure':
+            queryset = queryset.order_by('-value_0', *groups)
+        else:
+            queryset = queryset.order_by(*groups)
+        if self.dimension is not None and self.dimension.get('limit') and self.series is None:
+            queryset = queryset[:int(self.dimension['limit'])]
+        return queryset
+
+    # Mise en forme
+
+    def _field_label(self, axis, value):
+        if value is None or value == '':
+            return axis.get('empty_label', 'Non renseigné')
+        field, _ = _resolve_path(self.model, axis['field'])
+        choices = dict(field.flatchoices) if field is not None and field.choices else {}
+        label = str(choices.get(value, value))
+        return axis['label_format'].format(label) if axis.get('label_format') else label
+
+    def _axis_keys(self, axis, rows, key):
+        """Valeurs de l'axe dans l'ordre d'affichage, avec leurs libellés"""
+        if axis.get('cases'):
+            labels = [case['label'] for case in axis['cases']]
+            if axis.get('default') is not None:
+                labels.append(axis['default'])
+            labels = list(dict.fromkeys(labels))
+            return labels, labels
+        if axis.get('bucket') == 'month':
+            months = self._months()
+            return months, [date_format(month, 'N Y') for month in months]
+        if axis.get('bucket') == 'weekday':
+            return list(range(1, 8)), WEEKDAY_LABELS
+        keys = list(dict.fromkeys(row[key] for row in rows))
+        field, _ = _resolve_path(self.model, axis['field'])
+        if axis.get('order') == 'label':
+            keys.sort(key=lambda value: self._field_label(axis, value))
+        elif axis.get('order') is None and field is not None and field.choices:
+            # Ordre des choices du champ (stable d'un mois à l'autre pour les séries)
+            positions = {value: index for index, value in enumerate(dict(field.flatchoices))}
+            keys.sort(key=lambda value: positions.get(value, len(positions)))
+        if axis.get('limit'):
+            keys = keys[:int(axis['limit'])]
+        return keys, [self._field_label(axis, value) for value in keys]
+
+    def _normalize_month(self, value):
+        if isinstance(value, datetime):
+            value = timezone.localtime(value) if timezone.is_aware(value) else value
+            return value.date()
+        return value
+
+    def _dataset(self, label, data, index, colors):
+        dataset = {'label': label, 'data': data}
+        dataset.update(self.spec.get('style', {}))
+        if colors:
+            dataset['backgroundColor'] = dataset['borderColor'] = colors[index % len(colors)]
+        return dataset
+
+    def evaluate(self):
+        """Exécute la requête et retourne {'labels', 'datasets'} pour Chart.js"""
+        if self.dimension is None and self.series is None:
+            row = self.queryset.aggregate(**self.aggregates)
+            dataset = {
+                'label': self.spec.get('label', ''),
+                'data': [_number(row[f'value_{index}']) for index in range(len(self.measures))],
+            }
+            dataset.update(self.spec.get('style', {}))
+            colors = self.spec.get('colors')
+            if colors:
+                dataset['backgroundColor'] = colors if len(colors) > 1 else colors[0]
+            return {
+                'labels': [measure.get('label', measure.get('op', 'count')) for measure in self.measures],
+                'datasets': [dataset],
+            }
+
+        rows = list(self.queryset)
+        if self.dimension is not None and self.dimension.get('bucket') == 'month':
+            for row in rows:
+                row['dimension'] = self._normalize_month(row['dimension'])
+
+        if self.dimension is not None:
+            dimension_keys, labels = self._axis_keys(self.dimension, rows, 'dimension')
+        else:
+            dimension_keys, labels = [None], [self.spec.get('label', '')]
+        if self.series is not None:
+            rows = [row for row in rows if row['series'] is not None]
+            series_keys, series_labels = self._axis_keys(self.series, rows, 'series')
+        else:
+            series_keys, series_labels = [None], [None]
+
+        # Valeurs indexées par (série, dimension, mesure)
+        values = {}
+        baseline = {}
+        cumulative = self.dimension is not None and self.dimension.get('cumulative')
+        first_key = dimension_keys[0] if dimension_keys else None
+        for row in rows:
+            series_key = row.get('series')
+            for index in range(len(self.measures)):
+                value = _number(row[f'value_{index}'])
+                if cumulative and row['dimension'] is not None and row['dimension'] < first_key:
+                    baseline[series_key, index] = baseline.get((series_key, index), 0) + value
+                else:
+                    values[series_key, row.get('dimension'), index] = value
+
+        colors = (self.series or {}).get('colors') or self.spec.get('colors')
+        datasets = []
+        for index, measure in enumerate(self.measures):
+            for series_key, series_label in zip(series_keys, series_labels):
+                data = []
+                running = baseline.get((series_key, index), 0)
+                for dimension_key in dimension_keys:
+                    value = values.get((series_key, dimension_key, index), 0)
+                    if cumulative:
+                        running += value
+                        value = running
+                    data.append(value)
+                label = measure.get('label') or self.spec.get('label', '')
+                if series_label is not None:
+                    label = f'{label} – {series_label}' if len(self.measures) > 1 else series_label
+                dataset = self._dataset(label, data, len(datasets), colors)
+                dataset.update(measure.get('style', {}))
+                datasets.append(dataset)
+
+        return {'labels': labels, 'datasets': datasets}
+
+
+def _number(value):
+    if value is None:
+        return 0
+    if isinstance(value, (Decimal, float)):
+        value = round(float(value), 2)
+        return int(value) if value.is_integer() else value
+    return value
+
+
+def compile_chart_spec(spec, today=None):
+    """Compile la spécification (sans l'exécuter) ; ChartSpecError ou FieldError si invalide"""
+    if not isinstance(spec, dict):
+        raise ChartSpecError('La spécification doit être un objet JSON.')
+    try:
+        return CompiledSpec(spec, today=today)
+    except (KeyError, TypeError, AttributeError) as error:
+        raise ChartSpecError(f'Spécification invalide : {error}') from error
+
+
+def evaluate_chart_spec(spec, today=None):
+    """Données Chart.js d'une spécification : une seule requête en base"""
+    return compile_chart_spec(spec, today=today).evaluate()
@@ -0,0 +1,123 @@
+"""
+Évaluation parallèle et bornée dans le temps des graphiques d'analyse.
+
+Les graphiques sont évalués dans un pool de threads borné
+(CHART_EXECUTOR_MAX_WORKERS) : chaque thread utilise sa propre connexion à la
+base (les connexions Django sont propres à chaque thread) et la ferme en fin
+de tâche. La latence de la page devient celle du graphique le plus lent, et
+non plus la somme de tous.
+
+Chaque graphique dispose de son délai (ChartConfig.timeout_seconds, à défaut
+CHART_TIMEOUT_SECONDS) à partir de son démarrage :
+- côté base, statement_timeout annule les requêtes trop longues et libère le
+  thread
+- côté page, un graphique en retard est rendu « délai dépassé » sans attendre
+  sa fin ; s'il se termine plus tard, son résultat alimente le cache pour la
+  visite suivante
+
+Un graphique qui ne démarre jamais (pool occupé par des graphiques bloqués)
+est arrêté par le délai global : le plus long des délais par vague de
+CHART_EXECUTOR_MAX_WORKERS graphiques.
+"""
+import logging
+import math
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connection
+
+from .governor import get_chart_limits
+
+logger = logging.getLogger(__name__)
+
+
+# Résultat d'un graphique : données, durée en secondes, délai dépassé
+ChartResult = namedtuple('ChartResult', ['data', 'duration', 'timed_out'])
+
+
+def _timed_out_data(timeout):
+    return {'error': f'Délai dépassé ({timeout:g} s)', 'labels': [], 'datasets': []}
+
+
+def _evaluate(chart, timeout, started):
+    """Tâche d'un thread du pool : un graphique, sur la connexion du thread"""
+    started[chart.pk] = time.monotonic()
+    try:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('statement_timeout', %s, false)", [str(int(timeout * 1000))])
+        data = chart.get_chart_data()
+        return data, time.monotonic() - started[chart.pk]
+    finally:
+        connection.close()
+
+
+def evaluate_charts(charts, max_workers=None, timeout=None):
+    """
+    Évalue les graphiques en parallèle, chacun sous son propre délai
+    (`timeout`, s'il est fourni, s'impose à tous).
+    Retourne {chart.pk: ChartResult} ; l'ordre des graphiques est conservé.
+    """
+    charts = list(charts)
+    max_workers = max_workers or getattr(settings, 'CHART_EXECUTOR_MAX_WORKERS', 4)
+    if not charts:
+        return {}
+    timeouts = {chart.pk: timeout or get_chart_limits(chart).timeout for chart in charts}
+
+    started = {}
+    results = {}
+    submitted_at = time.monotonic()
+    overall_deadline = submitted_at + max(timeouts.values()) * math.ceil(len(charts) / max_workers)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chart')
+    futures = {executor.submit(_evaluate, chart, timeouts[chart.pk], started): chart for chart in charts}
+    pending = set(futures)
+    try:
+        while pending:
+            deadlines = [
+                started[futures[future].pk] + timeouts[futures[future].pk]
+                for future in pending if futures[future].pk in started
+            ]
+            next_deadline = min(deadlines + [overall_deadline])
+            done, pending = wait(
+                pending,
+                timeout=max(0, min(next_deadline - time.monotonic(), 0.1)),
+                return_when=FIRST_COMPLETED
+            )
+
+            for future in done:
+                chart = futures[future]
+                timeout = timeouts[chart.pk]
+                try:
+                    data, duration = future.result()
+                except Exception as error:  # Erreur hors du code du graphique (connexion…)
+                    data, duration = {'error': str(error), 'labels': [], 'datasets': []}, 0
+                # Requête annulée par statement_timeout
+                timed_out = duration >= timeout
+                results[chart.pk] = ChartResult(_timed_out_data(timeout) if timed_out else data, duration, timed_out)
+
+            now = time.monotonic()
+            for future in list(pending):
+                chart = futures[future]
+                timeout = timeouts[chart.pk]
+                chart_started = started.get(chart.pk)
+                if (chart_started is not None and now - chart_started >= timeout) or now >= overall_deadline:
+                    pending.discard(future)
+                    future.cancel()
+                    duration = now - chart_started if chart_started is not None else 0
+                    results[chart.pk] = ChartResult(_timed_out_data(timeout), duration, True)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for chart in charts:
+        result = results[chart.pk]
+        if result.timed_out:
+            logger.warning('Graphique %s "%s" : délai dépassé après %.0f ms', chart.pk, chart.title,
+                           result.duration * 1000)
+        else:
+            logger.info('Graphique %s "%s" : %.0f ms', chart.pk, chart.title, result.duration * 1000)
+    logger.info('%s graphiques évalués en %.0f ms', len(charts), (time.monotonic() - submitted_at) * 1000)
+
+    return {chart.pk: results[chart.pk] for chart in charts}
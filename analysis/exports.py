@@ -0,0 +1,264 @@
+"""
+Exports PDF et PowerPoint des analyses, construits en arrière-plan.
+
+La vue crée un ExportJob et rend aussitôt la main (le navigateur suit la
+progression par polling HTMX) ; la commande run_export_worker prend les jobs
+en attente un par un (SELECT ... FOR UPDATE SKIP LOCKED, plusieurs workers
+possibles) :
+- évaluation des graphiques par lots, progression enregistrée après chaque lot
+- rendu des images (cache d'images partagé)
+- document écrit dans un fichier temporaire puis copié par blocs dans
+  MEDIA_ROOT/exports/<id du job>/ : jamais entièrement en mémoire
+- le fichier est servi par une vue authentifiée et supprimé, avec son job,
+  EXPORT_JOB_RETENTION_DAYS jours après sa création
+"""
+import io
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Image, PageBreak, Paragraph, SimpleDocTemplate, Spacer
+from pptx import Presentation
+from pptx.util import Inches, Pt
+
+from .executor import evaluate_charts
+from .images import get_chart_images
+from .models import ChartConfig, ExportJob
+
+logger = logging.getLogger(__name__)
+
+
+def get_export_charts():
+    """Graphiques exportés, dans l'ordre du document"""
+    return list(ChartConfig.objects.filter(is_active=True).order_by('section', 'display_order'))
+
+
+def get_export_images(charts, results):
+    """PNG des graphiques exportés {chart.id: BytesIO}, via le cache d'images partagé"""
+    charts = [chart for chart in charts if 'error' not in results[chart.id].data]
+    images = get_chart_images([
+        {
+            'chart_data': results[chart.id].data,
+            'chart_type': chart.chart_type,
+            'title': chart.title,
+            'size': chart.size,
+        }
+        for chart in charts
+    ])
+    return {chart.id: io.BytesIO(image) for chart, image in zip(charts, images) if image}
+
+
+def build_pdf(output, charts, results, images, generated_on=None):
+    """Écrit le PDF des analyses dans `output` (chemin ou fichier binaire)"""
+    generated_on = generated_on or timezone.localdate()
+    doc = SimpleDocTemplate(output, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    story = []
+    styles = getSampleStyleSheet()
+
+    # Style personnalisé pour le titre
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor='#1f2937',
+        spaceAfter=30,
+        alignment=TA_CENTER
+    )
+
+    # Page de titre
+    story.append(Paragraph("Analyses & Indicateurs", title_style))
+    story.append(Paragraph(f"rosa - {generated_on.strftime('%d/%m/%Y')}", styles['Normal']))
+    story.append(Spacer(1, 0.5*inch))
+
+    current_section = None
+    for chart in charts:
+        # Nouvelle section
+        if chart.section != current_section:
+            if current_section is not None:
+                story.append(PageBreak())
+            story.append(Paragraph(chart.get_section_display(), styles['Heading1']))
+            story.append(Spacer(1, 0.2*inch))
+            current_section = chart.section
+
+        # Titre du graphique
+        story.append(Paragraph(chart.title, styles['Heading2']))
+        if chart.description:
+            story.append(Paragraph(chart.description, styles['Normal']))
+        story.append(Spacer(1, 0.1*inch))
+
+        # Image du graphique
+        data = results[chart.id].data
+        if 'error' not in data:
+            img_buffer = images.get(chart.id)
+            if img_buffer:
+                story.append(Image(img_buffer, width=6*inch, height=3.6*inch))
+        else:
+            story.append(Paragraph(f"Erreur: {data['error']}", styles['Normal']))
+
+        story.append(Spacer(1, 0.3*inch))
+
+    doc.build(story)
+
+
+def build_pptx(output, charts, results, images, generated_on=None):
+    """Écrit la présentation PowerPoint des analyses dans `output` (chemin ou fichier binaire)"""
+    generated_on = generated_on or timezone.localdate()
+    prs = Presentation()
+    prs.slide_width = Inches(10)
+    prs.slide_height = Inches(7.5)
+
+    # Slide de titre
+    slide = prs.slides.add_slide(prs.slide_layouts[0])
+    slide.shapes.title.text = "Analyses & Indicateurs"
+    slide.placeholders[1].text = f"rosa - {generated_on.strftime('%d/%m/%Y')}"
+
+    current_section = None
+    for chart in charts:
+        # Slide de section
+        if chart.section != current_section:
+            section_slide = prs.slides.add_slide(prs.slide_layouts[5])  # Blank layout
+            txBox = section_slide.shapes.add_textbox(Inches(1), Inches(3), Inches(8), Inches(1))
+            tf = txBox.text_frame
+            tf.text = chart.get_section_display()
+            p = tf.paragraphs[0]
+            p.font.size = Pt(44)
+            p.font.bold = True
+            current_section = chart.section
+
+        # Slide avec graphique
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+
+        # Titre
+        txBox = slide.shapes.add_textbox(Inches(0.5), Inches(0.3), Inches(9), Inches(0.6))
+        tf = txBox.text_frame
+        tf.text = chart.title
+        p = tf.paragraphs[0]
+        p.font.size = Pt(28)
+        p.font.bold = True
+
+        # Description
+        if chart.description:
+            txBox = slide.shapes.add_textbox(Inches(0.5), Inches(0.9), Inches(9), Inches(0.4))
+            tf = txBox.text_frame
+            tf.text = chart.description
+            p = tf.paragraphs[0]
+            p.font.size = Pt(14)
+
+        # Graphique
+        data = results[chart.id].data
+        if 'error' not in data:
+            img_buffer = images.get(chart.id)
+            if img_buffer:
+                slide.shapes.add_picture(img_buffer, Inches(1), Inches(1.5), width=Inches(8), height=Inches(5))
+        else:
+            # Afficher l'erreur
+            txBox = slide.shapes.add_textbox(Inches(2), Inches(3), Inches(6), Inches(1))
+            tf = txBox.text_frame
+            tf.text = f"Erreur: {data['error']}"
+            p = tf.paragraphs[0]
+            p.font.size = Pt(16)
+
+    prs.save(output)
+
+
+BUILDERS = {
+    'pdf': build_pdf,
+    'pptx': build_pptx,
+}
+
+
+def run_export_job(job):
+    """
+    Construit le fichier du job (déjà réservé par ExportJob.claim_next) et
+    l'enregistre dans MEDIA_ROOT. Le job termine DONE ou FAILED, jamais RUNNING.
+    """
+    try:
+        charts = get_export_charts()
+        batch_size = getattr(settings, 'CHART_EXECUTOR_MAX_WORKERS', 4)
+        results = {}
+        # Évaluation des graphiques : 0 à 60 %
+        for start in range(0, len(charts), batch_size):
+            results.update(evaluate_charts(charts[start:start + batch_size]))
+            job.set_progress(
+                int(60 * len(results) / len(charts)),
+                f'Graphiques évalués : {len(results)}/{len(charts)}'
+            )
+
+        job.set_progress(60, 'Rendu des images')
+        images = get_export_images(charts, results)
+
+        job.set_progress(85, 'Construction du document')
+        descriptor, temporary_path = tempfile.mkstemp(suffix=f'.{job.export_format}')
+        try:
+            with os.fdopen(descriptor, 'w+b') as output:
+                BUILDERS[job.export_format](output, charts, results, images, timezone.localdate(job.created_at))
+                output.seek(0)
+                job.file.save(job.download_name, File(output), save=False)
+        finally:
+            os.remove(temporary_path)
+
+        now = timezone.now()
+        job.status = 'DONE'
+        job.progress = 100
+        job.message = 'Export prêt'
+        job.finished_at = now
+        job.expires_at = now + timedelta(days=getattr(settings, 'EXPORT_JOB_RETENTION_DAYS', 7))
+        job.save(update_fields=['status', 'progress', 'message', 'file', 'finished_at', 'expires_at'])
+
+    except Exception as error:
+        logger.exception('Export %s en échec', job.pk)
+        now = timezone.now()
+        job.status = 'FAILED'
+        job.message = "L'export a échoué"
+        job.error = str(error)
+        job.finished_at = now
+        job.expires_at = now + timedelta(days=getattr(settings, 'EXPORT_JOB_RETENTION_DAYS', 7))
+        job.save(update_fields=['status', 'message', 'error', 'finished_at', 'expires_at'])
+
+    return job
+
+
+def run_pending_export_jobs(limit=None):
+    """Traite les jobs en attente (au plus `limit`) ; retourne la liste des jobs traités"""
+    processed = []
+    while limit is None or len(processed) < limit:
+        job = ExportJob.claim_next()
+        if job is None:
+            break
+        processed.append(run_export_job(job))
+    return processed
+
+
+def purge_export_jobs(now=None):
+    """
+    Supprime les jobs expirés et leurs fichiers, et passe en échec les jobs
+    RUNNING abandonnés (worker arrêté en cours d'export) depuis plus de
+    EXPORT_JOB_STALE_SECONDS. Retourne (supprimés, abandonnés).
+    """
+    now = now or timezone.now()
+    expired = ExportJob.objects.filter(expires_at__lte=now)
+    deleted = 0
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        deleted += 1
+
+    stale_after = timedelta(seconds=getattr(settings, 'EXPORT_JOB_STALE_SECONDS', 1800))
+    stale = ExportJob.objects.filter(status='RUNNING', started_at__lte=now - stale_after).update(
+        status='FAILED',
+        message="L'export a échoué",
+        error='Export interrompu (worker arrêté)',
+        finished_at=now,
+        expires_at=now + timedelta(days=getattr(settings, 'EXPORT_JOB_RETENTION_DAYS', 7)),
+    )
+    return deleted, stale
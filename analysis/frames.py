@@ -0,0 +1,182 @@
+"""
+Photos financières en tableaux NumPy pour le code des graphiques.
+
+Au lieu de parcourir les photos une à une en Python, FinancialFrame.load()
+lit en une seule requête (values_list) les totaux calculés par la base
+(FinancialSnapshot.total_revenus, total_charges) et en déduit solde et reste
+à vivre par opérations vectorielles. stats() donne ensuite moyennes, médianes,
+centiles par groupe (enfants à charge, foyer, logement, mois), directement
+utilisables comme labels / données d'un graphique.
+
+Exemple (code de requête) :
+    frame = FinancialFrame.load(latest=True)
+    stats = frame.stats('rav', by='housing_status', stats=('mean', 'median'))
+    result = {'labels': stats['labels'], 'datasets': [{'label': 'Médiane', 'data': stats['median']}]}
+"""
+from datetime import date
+
+import numpy as np
+from django.db import connections
+from django.db.models import Case, FloatField, Value, When
+from django.db.models.functions import Cast, ExtractMonth, ExtractYear
+from django.utils.formats import date_format
+
+from beneficiaries.models import Beneficiary, FinancialSnapshot
+
+
+METRICS = ('revenus', 'charges', 'solde', 'rav')
+
+HOUSEHOLD_LABELS = ['0 enfants', '1-2 enfants', '3+ enfants']
+
+
+class FinancialFrame:
+    """
+    Photos financières en colonnes NumPy (une ligne par photo, triées par
+    bénéficiaire puis par date)
+    """
+
+    def __init__(self, beneficiary_ids, months, dependents, housing, revenus, charges):
+        self.beneficiary_ids = beneficiary_ids
+        # Mois en index entier (année * 12 + mois - 1) : regroupement vectoriel
+        self.months = months
+        self.dependents = dependents
+        # Logement en index de Beneficiary.HOUSING_STATUS_CHOICES (dernier : non renseigné)
+        self.housing = housing
+        self.revenus = revenus
+        self.charges = charges
+
+    @classmethod
+    def load(cls, queryset=None, latest=False):
+        """
+        Lit les photos de `queryset` (toutes par défaut) en une requête.
+        latest : ne garder que la photo la plus récente de chaque bénéficiaire
+        (sans queryset : lue directement par Beneficiary.latest_snapshot).
+
+        Toutes les colonnes sont numériques côté base (montants en float, mois
+        et logement en index) : pas de conversion Decimal / datetime par ligne.
+        """
+        if queryset is None:
+            queryset = FinancialSnapshot.objects.all()
+            if latest:
+                queryset = queryset.filter(
+                    pk__in=Beneficiary.objects.filter(latest_snapshot__isnull=False).values('latest_snapshot')
+                )
+        housing = Case(
+            *[When(beneficiary__housing_status=value, then=Value(index))
+              for index, (value, _) in enumerate(Beneficiary.HOUSING_STATUS_CHOICES)],
+            default=Value(len(Beneficiary.HOUSING_STATUS_CHOICES)),
+        )
+        rows = queryset.order_by('beneficiary_id', 'date', 'pk').values_list(
+            'beneficiary_id',
+            ExtractYear('date') * 12 + ExtractMonth('date') - 1,
+            'beneficiary__dependents_count',
+            housing,
+            Cast('total_revenus', FloatField()),
+            Cast('total_charges', FloatField()),
+        )
+        # Curseur direct : les convertisseurs de l'ORM (un appel par cellule)
+        # coûteraient plus que la lecture elle-même
+        sql, params = rows.query.sql_with_params()
+        with connections[rows.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            table = np.array(cursor.fetchall(), dtype=float).reshape(-1, 6)
+
+        frame = cls(
+            beneficiary_ids=table[:, 0].astype(np.int64),
+            months=table[:, 1].astype(np.int64),
+            dependents=np.nan_to_num(table[:, 2]).astype(np.int64),
+            housing=table[:, 3].astype(np.int64),
+            revenus=table[:, 4],
+            charges=table[:, 5],
+        )
+        return frame.latest() if latest else frame
+
+    def __len__(self):
+        return len(self.beneficiary_ids)
+
+    @property
+    def solde(self):
+        """Solde net (revenus - charges) de chaque photo"""
+        return self.revenus - self.charges
+
+    @property
+    def rav(self):
+        """Reste à vivre journalier (solde net / 30), comme FinancialSnapshot.reste_a_vivre_journalier"""
+        return self.solde / 30
+
+    def take(self, indices):
+        """Sous-ensemble des lignes `indices` (masque booléen ou index croissants)"""
+        return FinancialFrame(
+            self.beneficiary_ids[indices], self.months[indices], self.dependents[indices],
+            self.housing[indices], self.revenus[indices], self.charges[indices],
+        )
+
+    def latest(self):
+        """Photo la plus récente de chaque bénéficiaire (dernière ligne de chacun)"""
+        ids = self.beneficiary_ids
+        return self.take(np.append(ids[1:] != ids[:-1], True) if len(ids) else np.zeros(0, dtype=bool))
+
+    def _group_keys(self, by):
+        """Clé entière de groupe de chaque ligne et fonction clé -> label"""
+        if by is None:
+            return np.zeros(len(self), dtype=np.int64), lambda key: 'Ensemble'
+        if by == 'dependents':
+            return self.dependents, str
+        if by == 'household':
+            keys = np.select([self.dependents == 0, self.dependents <= 2], [0, 1], 2)
+            return keys, HOUSEHOLD_LABELS.__getitem__
+        if by == 'housing_status':
+            labels = [label for _, label in Beneficiary.HOUSING_STATUS_CHOICES] + ['Non renseigné']
+            return self.housing, labels.__getitem__
+        if by == 'month':
+            return self.months, lambda key: date_format(date(key // 12, key % 12 + 1, 1), 'N Y')
+        raise ValueError(f"Regroupement inconnu : {by} (dependents, household, housing_status, month)")
+
+    def stats(self, metric, by=None, stats=('mean', 'median')):
+        """
+        Statistiques de `metric` (revenus, charges, solde, rav) par groupe `by`
+        (None, dependents, household, housing_status, month), dans l'ordre
+        des groupes. stats : mean, sum, median, min, max ou centile pNN (p90).
+        Retourne {'labels': [...], 'count': [...], <stat>: [...]}.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Mesure inconnue : {metric} ({', '.join(METRICS)})")
+        values = getattr(self, metric)
+        keys, label = self._group_keys(by)
+        groups, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(groups))
+
+        result = {'labels': [label(int(key)) for key in groups], 'count': counts.tolist()}
+        if not len(groups):
+            result.update({stat: [] for stat in stats})
+            return result
+
+        # Valeurs triées par groupe puis par valeur : centiles sans boucle sur les groupes
+        sorted_values = values[np.lexsort((values, inverse))]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        for stat in stats:
+            if stat == 'mean':
+                computed = np.bincount(inverse, weights=values, minlength=len(groups)) / counts
+            elif stat == 'sum':
+                computed = np.bincount(inverse, weights=values, minlength=len(groups))
+            else:
+                computed = _grouped_percentile(sorted_values, starts, counts, _percentile_rank(stat))
+            result[stat] = np.round(computed, 2).tolist()
+        return result
+
+
+def _percentile_rank(stat):
+    ranks = {'median': 50, 'min': 0, 'max': 100}
+    if stat in ranks:
+        return ranks[stat]
+    if stat.startswith('p') and stat[1:].isdigit() and 0 <= int(stat[1:]) <= 100:
+        return int(stat[1:])
+    raise ValueError(f"Statistique inconnue : {stat} (mean, sum, median, min, max, pNN)")
+
+
+def _grouped_percentile(sorted_values, starts, counts, rank):
+    """Centile (interpolation linéaire, comme np.percentile) de chaque groupe trié"""
+    position = starts + (counts - 1) * rank / 100
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
@@ -0,0 +1,221 @@
+"""
+Gouverneur de ressources des graphiques d'analyse.
+
+Un code de requête défaillant (boucle infinie, itération sur toute une table)
+ne doit ni bloquer un worker gunicorn ni garder une connexion à la base. Les
+limites de ChartConfig (ou, à défaut, CHART_TIMEOUT_SECONDS,
+CHART_MEMORY_LIMIT_MB et CHART_ROW_LIMIT) sont appliquées :
+- côté base : statement_timeout posé pour la seule transaction du graphique
+  (SET LOCAL), et arrêt dès que les requêtes ont lu plus de row_limit lignes
+  (curseurs côté client, même pour iterator(), pour que le nombre de lignes
+  soit connu dès l'exécution)
+- côté Python, pour le code de requête : exécution dans un sous-processus
+  éphémère avec sa propre connexion, temps CPU (RLIMIT_CPU) et mémoire
+  supplémentaire (RLIMIT_AS) bornés ; il est tué s'il dépasse le délai
+
+Les sous-processus sont créés par un serveur forkserver (Django préchargé
+par analysis.chart_process) et non par fork du processus web, dont les
+autres threads peuvent tenir un verrou au moment du fork. L'enfant reçoit
+le graphique sérialisé (pickle), tel que l'appelant le voit.
+
+Le code est exécuté dans le processus courant (limites SQL seulement) si
+CHART_GOVERNOR_SUBPROCESS est désactivé ou si l'appelant est dans une
+transaction : un sous-processus ne verrait pas ses données non validées.
+"""
+import math
+import multiprocessing
+import os
+import resource
+import signal
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .profiling import QueryRecorder
+
+
+# Limites d'exécution d'un graphique : délai (s), temps CPU (s), mémoire (Mo), lignes lues
+ChartLimits = namedtuple('ChartLimits', ['timeout', 'cpu_seconds', 'memory_mb', 'row_limit'])
+
+# Délai laissé au sous-processus pour démarrer et renvoyer son résultat (en secondes)
+SUBPROCESS_GRACE_SECONDS = 1
+
+
+class ChartLimitExceeded(Exception):
+    """Limite d'exécution dépassée par un graphique"""
+
+
+def get_chart_limits(chart):
+    """Limites du graphique, complétées par les valeurs par défaut des settings"""
+    timeout = chart.timeout_seconds or getattr(settings, 'CHART_TIMEOUT_SECONDS', 10)
+    return ChartLimits(
+        timeout=timeout,
+        cpu_seconds=math.ceil(timeout),
+        memory_mb=chart.memory_limit_mb or getattr(settings, 'CHART_MEMORY_LIMIT_MB', 256),
+        row_limit=chart.row_limit or getattr(settings, 'CHART_ROW_LIMIT', 100000),
+    )
+
+
+class RowLimiter:
+    """
+    Wrapper d'exécution SQL : cumule les lignes retournées par les requêtes
+    et interrompt le graphique au-delà de la limite, avant que Python ne les
+    parcoure.
+    """
+
+    def __init__(self, row_limit):
+        self.row_limit = row_limit
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        rowcount = getattr(context['cursor'], 'rowcount', -1)
+        if not many and rowcount > 0:
+            self.rows += rowcount
+            if self.rows > self.row_limit:
+                raise ChartLimitExceeded(f'Limite de {self.row_limit} lignes lues dépassée')
+        return result
+
+
+@contextmanager
+def governed_queries(limits):
+    """
+    Transaction du graphique : statement_timeout local (sans relâcher un
+    délai plus strict déjà posé, par l'exécuteur par exemple) et limite de
+    lignes.
+    """
+    # Un curseur serveur (iterator() dans une transaction) ne donne pas de
+    # rowcount et ses lignes passent par fetchmany(), hors du wrapper :
+    # curseurs client le temps du graphique. Copie du dictionnaire, partagé
+    # entre les connexions des threads.
+    settings_dict = connection.settings_dict
+    connection.settings_dict = {**settings_dict, 'DISABLE_SERVER_SIDE_CURSORS': True}
+    try:
+        with _governed_transaction(limits):
+            yield
+    finally:
+        connection.settings_dict = settings_dict
+
+
+@contextmanager
+def _governed_transaction(limits):
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            milliseconds = int(limits.timeout * 1000)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config('statement_timeout', CASE"
+                    " WHEN current_setting('statement_timeout')::interval = interval '0'"
+                    " OR current_setting('statement_timeout')::interval > %s * interval '1 ms' THEN %s"
+                    " ELSE current_setting('statement_timeout') END, true)",
+                    [milliseconds, str(milliseconds)]
+                )
+        with connection.execute_wrapper(RowLimiter(limits.row_limit)):
+            yield
+
+
+def run_governed(chart, limits):
+    """
+    Exécute le code de requête du graphique (ChartConfig.execute_query_code)
+    sous les limites. Retourne les données, ou un dict d'erreur.
+    """
+    use_subprocess = getattr(settings, 'CHART_GOVERNOR_SUBPROCESS', True)
+    if not use_subprocess or connection.in_atomic_block:
+        with governed_queries(limits):
+            return chart.execute_query_code()
+    return _run_in_subprocess(chart, limits)
+
+
+def _error(message):
+    return {'error': message, 'labels': [], 'datasets': []}
+
+
+def _get_context():
+    """Contexte forkserver ; le préchargement ne compte qu'avant le démarrage du serveur"""
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['analysis.chart_process'])
+    return context
+
+
+def _run_in_subprocess(chart, limits):
+    capture_sql = any(
+        isinstance(wrapper, QueryRecorder) and wrapper.capture_sql for wrapper in connection.execute_wrappers
+    )
+    context = _get_context()
+    reader, writer = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_child, args=(chart, limits, writer, capture_sql, connection.settings_dict), daemon=True
+    )
+    process.start()
+    writer.close()
+
+    payload = None
+    try:
+        if reader.poll(limits.timeout + SUBPROCESS_GRACE_SECONDS):
+            try:
+                payload = reader.recv()
+            except EOFError:
+                pass
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        reader.close()
+
+    if payload is None:
+        if process.exitcode == -signal.SIGXCPU:
+            return _error(f'Limite de temps CPU dépassée ({limits.cpu_seconds} s)')
+        if process.exitcode == -signal.SIGKILL:
+            return _error(f'Délai dépassé ({limits.timeout:g} s)')
+        return _error(f"Exécution interrompue (code {process.exitcode})")
+
+    QueryRecorder.add_to_active(payload['query_count'], payload['sql_duration'], payload['queries'])
+    return payload['data']
+
+
+def _current_memory_bytes():
+    """Mémoire virtuelle du processus (RLIMIT_AS porte sur cette valeur)"""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _limit_resources(limits):
+    resource.setrlimit(resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds + 1))
+    try:
+        memory = _current_memory_bytes() + limits.memory_mb * 1024 * 1024
+    except OSError:
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+def _child(chart, limits, writer, capture_sql, settings_dict):
+    """Sous-processus : nouvelle connexion, ressources bornées, résultat renvoyé par le pipe"""
+    # Base du parent (base de test comprise), sur une connexion propre à l'enfant
+    connection.settings_dict = settings_dict
+
+    recorder = QueryRecorder(capture_sql)
+    try:
+        # Connexion ouverte hors mesure : ses requêtes d'initialisation (types
+        # de django.contrib.postgres) ne sont pas celles du graphique
+        connection.ensure_connection()
+        _limit_resources(limits)
+        with connection.execute_wrapper(recorder):
+            with governed_queries(limits):
+                data = chart.execute_query_code()
+        payload = {'data': data}
+    except MemoryError:
+        payload = {'data': _error(f'Limite mémoire dépassée ({limits.memory_mb} Mo)')}
+    except Exception as error:
+        payload = {'data': _error(str(error))}
+
+    payload.update(query_count=recorder.count, sql_duration=recorder.duration, queries=recorder.queries)
+    try:
+        writer.send(payload)
+    except Exception as error:
+        # Résultat non transmissible (objet non sérialisable, mémoire…)
+        writer.send({**payload, 'data': _error(f'Résultat non transmissible : {error}'), 'queries': []})
+    finally:
+        writer.close()
+        connection.close()
@@ -0,0 +1,265 @@
+"""
+Rendu PNG des graphiques pour les exports PDF et PowerPoint.
+
+- clé : empreinte SHA-256 des données, du type, du titre et de la taille du
+  graphique (et de RENDER_VERSION, à incrémenter quand le rendu change) ; le
+  même graphique n'est dessiné qu'une fois pour les deux formats
+- cache disque partagé entre les workers (CHART_IMAGE_CACHE_DIR), écritures
+  atomiques, éviction LRU (date d'accès portée par le mtime) au-delà de
+  CHART_IMAGE_CACHE_MAX_BYTES
+- les images manquantes sont dessinées par matplotlib dans un pool de
+  processus (CHART_RENDER_MAX_WORKERS) : plusieurs cœurs, et le worker web
+  n'exécute pas matplotlib lui-même
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+RENDER_VERSION = 1
+
+# Taille de la figure (pouces) selon ChartConfig.size
+FIGURE_SIZES = {
+    'full': (10, 6),
+    'half': (8, 6),
+}
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def chart_image_key(chart_data, chart_type, title, size='full'):
+    """Empreinte d'une image : identique pour des données identiques"""
+    payload = json.dumps(
+        [RENDER_VERSION, chart_data, chart_type, title, size],
+        sort_keys=True, default=_json_default
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _plain(value):
+    """Données sérialisables pour le processus de rendu (Decimal -> float)"""
+    return json.loads(json.dumps(value, default=_json_default))
+
+
+def _cache_dir():
+    path = getattr(settings, 'CHART_IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'rosa_chart_images'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _cache_path(key):
+    return os.path.join(_cache_dir(), f'{key}.png')
+
+
+def read_cached_image(key):
+    """PNG en cache ou None ; une lecture rafraîchit la date d'accès (LRU)"""
+    path = _cache_path(key)
+    try:
+        with open(path, 'rb') as image_file:
+            content = image_file.read()
+        os.utime(path)
+    except OSError:
+        return None
+    return content
+
+
+def write_cached_image(key, content):
+    """Écriture atomique (fichier temporaire puis renommage)"""
+    directory = _cache_dir()
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as image_file:
+            image_file.write(content)
+        os.replace(temporary_path, _cache_path(key))
+    except OSError:
+        logger.exception("Écriture impossible dans le cache d'images")
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+def evict_cached_images(max_bytes=None):
+    """Supprime les images les moins récemment utilisées au-delà de max_bytes"""
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'CHART_IMAGE_CACHE_MAX_BYTES', 100 * 1024 * 1024)
+    entries = []
+    with os.scandir(_cache_dir()) as scan:
+        for entry in scan:
+            if entry.name.endswith('.png'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def render_chart_png(chart_data, chart_type, title, size='full'):
+    """
+    Dessine le graphique (format Chart.js) et retourne le PNG, ou None.
+    Exécutée dans un processus du pool : n'utilise ni Django ni la base.
+
+    Heatmap : une ligne par jeu de données (label), une colonne par label.
+    """
+    import matplotlib
+    matplotlib.use('Agg')  # Backend sans interface graphique
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=FIGURE_SIZES.get(size, FIGURE_SIZES['full']))
+
+    try:
+        datasets = chart_data.get('datasets', [])
+        labels = chart_data.get('labels', [])
+
+        if chart_type in ['pie', 'doughnut']:
+            # Graphique circulaire
+            if datasets and datasets[0].get('data'):
+                data = datasets[0]['data']
+                colors = datasets[0].get('backgroundColor')
+                if isinstance(colors, str):
+                    colors = [colors]
+                ax.pie(data, labels=labels, autopct='%1.1f%%', colors=colors or None, startangle=90,
+                       wedgeprops={'width': 0.4} if chart_type == 'doughnut' else None)
+                ax.axis('equal')
+
+        elif chart_type == 'bar':
+            # Graphique à barres
+            x = range(len(labels))
+            width = 0.8 / len(datasets) if len(datasets) > 1 else 0.6
+
+            for i, dataset in enumerate(datasets):
+                offset = (i - len(datasets) / 2) * width + width / 2
+                ax.bar([p + offset for p in x], dataset['data'], width,
+                       label=dataset.get('label', f'Série {i+1}'),
+                       color=dataset.get('backgroundColor', None))
+
+            ax.set_xticks(x)
+            ax.set_xticklabels(labels, rotation=45, ha='right')
+            ax.legend()
+            ax.grid(axis='y', alpha=0.3)
+
+        elif chart_type == 'line':
+            # Graphique en courbes
+            for dataset in datasets:
+                ax.plot(labels, dataset['data'],
+                        label=dataset.get('label', ''),
+                        marker='o',
+                        color=dataset.get('borderColor', None))
+
+            ax.legend()
+            ax.grid(True, alpha=0.3)
+            plt.xticks(rotation=45, ha='right')
+
+        elif chart_type == 'stacked_bar':
+            # Graphique à barres empilées
+            bottom = [0] * len(labels)
+            for dataset in datasets:
+                ax.bar(labels, dataset['data'], label=dataset.get('label', ''),
+                       bottom=bottom, color=dataset.get('backgroundColor', None))
+                bottom = [b + d for b, d in zip(bottom, dataset['data'])]
+
+            ax.legend()
+            ax.grid(axis='y', alpha=0.3)
+            plt.xticks(rotation=45, ha='right')
+
+        elif chart_type == 'heatmap':
+            # Carte de chaleur : matrice jeux de données × labels, valeurs annotées
+            matrix = [[value or 0 for value in dataset.get('data', [])] for dataset in datasets]
+            if matrix and labels:
+                image = ax.imshow(matrix, cmap='Blues', aspect='auto')
+                ax.set_xticks(range(len(labels)))
+                ax.set_xticklabels(labels, rotation=45, ha='right')
+                ax.set_yticks(range(len(datasets)))
+                ax.set_yticklabels([dataset.get('label', '') for dataset in datasets])
+                peak = max((max(row) for row in matrix if row), default=0)
+                for row_index, row in enumerate(matrix):
+                    for column_index, value in enumerate(row):
+                        ax.text(column_index, row_index, f'{value:g}', ha='center', va='center',
+                                color='white' if peak and value > peak / 2 else '#1f2937')
+                fig.colorbar(image, ax=ax)
+
+        ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
+        plt.tight_layout()
+
+        buffer = io.BytesIO()
+        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+        return buffer.getvalue()
+
+    except Exception as e:
+        logger.warning("Rendu impossible du graphique « %s » : %s", title, e)
+        return None
+
+    finally:
+        plt.close(fig)
+
+
+def get_chart_images(items, max_workers=None):
+    """
+    PNG des graphiques `items` : liste de dicts (chart_data, chart_type,
+    title, size). Retourne une liste alignée de bytes (None si le rendu a
+    échoué). Les images absentes du cache sont dessinées en parallèle.
+    """
+    items = [dict(item, chart_data=_plain(item['chart_data'])) for item in items]
+    keys = [chart_image_key(**item) for item in items]
+    images = {key: read_cached_image(key) for key in set(keys)}
+
+    missing = {key: item for key, item in zip(keys, items) if images[key] is None}
+    if missing:
+        max_workers = max_workers or getattr(settings, 'CHART_RENDER_MAX_WORKERS', 2)
+        rendered = _render_many(list(missing.items()), max_workers)
+        for key, content in rendered.items():
+            images[key] = content
+            if content is not None:
+                write_cached_image(key, content)
+        evict_cached_images()
+
+    return [images[key] for key in keys]
+
+
+def _render_many(jobs, max_workers):
+    """Rendu {clé: PNG} : pool de processus s'il y a plusieurs images et plusieurs cœurs"""
+    max_workers = min(max_workers, len(jobs), os.cpu_count() or 1)
+    if max_workers <= 1:
+        return {key: render_chart_png(**item) for key, item in jobs}
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {key: executor.submit(render_chart_png, **item) for key, item in jobs}
+            return {key: future.result() for key, future in futures.items()}
+    except (BrokenProcessPool, OSError) as error:
+        # Pool indisponible (ressources du système) : rendu dans le processus courant
+        logger.warning('Pool de rendu indisponible (%s), rendu séquentiel', error)
+        return {key: render_chart_png(**item) for key, item in jobs}
+
+
+def get_chart_image(chart_data, chart_type, title, size='full'):
+    """PNG d'un seul graphique (cache partagé)"""
+    return get_chart_images([{
+        'chart_data': chart_data, 'chart_type': chart_type, 'title': title, 'size': size,
+    }])[0]
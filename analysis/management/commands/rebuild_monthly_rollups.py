@@ -0,0 +1,42 @@
+"""
+Commande Django pour reconstruire les agrégats mensuels d'analyse.
+
+Recalcule BeneficiaryMonthlyRollup, InteractionMonthlyRollup et
+FinancialMonthlyRollup sur tout l'historique. Les modifications courantes sont
+déjà répercutées par signaux : la commande sert à l'initialisation (lancée au
+démarrage du conteneur app, voir docker-compose.yaml), après un import en
+masse ou une modification hors ORM (update(), SQL).
+
+Usage: python manage.py rebuild_monthly_rollups [--only beneficiaries|interactions|financial]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from analysis.rollups import ROLLUPS, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les agrégats mensuels des bénéficiaires, interactions et photos financières'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            choices=sorted(ROLLUPS),
+            action='append',
+            help='Agrégat à reconstruire (répétable, défaut: tous)'
+        )
+
+    def handle(self, *args, **options):
+        kinds = options['only'] or list(ROLLUPS)
+
+        started = time.perf_counter()
+        for kind in kinds:
+            count = refresh_rollups(kind)
+            self.stdout.write(f'📊 {kind}: {count} lignes')
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Agrégats mensuels reconstruits en {elapsed:.2f}s')
+        )
@@ -0,0 +1,83 @@
+"""
+Commande Django traitant la file des exports PDF / PowerPoint des analyses.
+
+Prend les ExportJob en attente un par un (plusieurs workers peuvent tourner
+en parallèle), construit les fichiers dans MEDIA_ROOT et, à chaque tour,
+supprime les exports expirés et passe en échec les exports abandonnés.
+
+Seul processus permanent hors de gunicorn, il porte aussi l'entretien
+quotidien : au changement de jour, la table des occurrences de créneaux est
+reconstruite sur le nouvel horizon (calendar_app.occurrences.advance_horizon)
+et les traces de suppression de l'API de synchronisation sont purgées
+(calendar_app.sync.purge_tombstones).
+
+Usage: python manage.py run_export_worker [--once] [--interval SECONDES]
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from analysis.exports import purge_export_jobs, run_pending_export_jobs
+from calendar_app.occurrences import advance_horizon
+from calendar_app.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Construit en arrière-plan les exports PDF / PowerPoint des analyses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Traite les exports en attente puis s\'arrête (cron)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'EXPORT_WORKER_POLL_SECONDS', 5),
+            help='Intervalle de scrutation de la file en secondes (défaut: EXPORT_WORKER_POLL_SECONDS)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['once']:
+            self.stdout.write(f"🚀 Worker d'export démarré (scrutation toutes les {options['interval']:g}s)")
+
+        maintained_on = None
+        while True:
+            if maintained_on != timezone.localdate():
+                maintained_on = timezone.localdate()
+                self.daily_maintenance()
+
+            deleted, stale = purge_export_jobs()
+            if deleted:
+                self.stdout.write(f'🗑️  {deleted} export(s) expiré(s) supprimé(s)')
+            if stale:
+                self.stdout.write(self.style.WARNING(f'⚠️  {stale} export(s) abandonné(s) passé(s) en échec'))
+
+            for job in run_pending_export_jobs():
+                duration = (job.finished_at - job.started_at).total_seconds()
+                if job.status == 'DONE':
+                    self.stdout.write(self.style.SUCCESS(
+                        f'✅ Export {job.get_export_format_display()} {job.pk} prêt en {duration:.1f}s'
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(f'❌ Export {job.pk} en échec : {job.error}'))
+
+            if options['once']:
+                break
+            # Connexion fermée si elle est devenue inutilisable (redémarrage de la base…)
+            close_old_connections()
+            time.sleep(options['interval'])
+
+    def daily_maintenance(self):
+        """Entretien lancé au démarrage puis à chaque changement de jour"""
+        occurrences = advance_horizon()
+        if occurrences is not None:
+            self.stdout.write(f'📅 Horizon des créneaux avancé : {occurrences} occurrences générées')
+        tombstones = purge_tombstones()
+        if tombstones:
+            self.stdout.write(f'🗑️  {tombstones} trace(s) de suppression purgée(s)')
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chartconfig',
+            name='depends_on',
+            field=models.CharField(blank=True, help_text='Modèles dont les modifications invalident le cache du graphique, séparés par des virgules (ex: Beneficiary, FinancialSnapshot). Vide : détectés dans le code de requête.', max_length=255, verbose_name='Dépendances'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0002_chartconfig_depends_on'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chartconfig',
+            name='query_spec',
+            field=models.JSONField(blank=True, help_text='Spécification déclarative (modèle, dimension, mesure, filtre, séries) compilée en une seule requête. Prioritaire sur le code de requête.', null=True, verbose_name='Spécification'),
+        ),
+        migrations.AlterField(
+            model_name='chartconfig',
+            name='query_code',
+            field=models.TextField(blank=True, help_text='Code Python pour générer les données. Doit retourner un dict avec "labels" et "datasets".', verbose_name='Code de requête'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0003_chartconfig_query_spec'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BeneficiaryMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Premier jour du mois', verbose_name='Mois')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Calculé le')),
+                ('new_beneficiaries', models.PositiveIntegerField(default=0, verbose_name='Nouveaux bénéficiaires')),
+                ('active_beneficiaries', models.PositiveIntegerField(default=0, help_text='Au moins une interaction dans le mois', verbose_name='Bénéficiaires actifs')),
+            ],
+            options={
+                'verbose_name': 'Agrégat mensuel des bénéficiaires',
+                'verbose_name_plural': 'Agrégats mensuels des bénéficiaires',
+                'ordering': ['month'],
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('month',), name='beneficiary_rollup_month_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FinancialMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Premier jour du mois', verbose_name='Mois')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Calculé le')),
+                ('household', models.CharField(choices=[('0', '0 enfants'), ('1-2', '1-2 enfants'), ('3+', '3+ enfants')], max_length=3, verbose_name='Foyer')),
+                ('snapshot_count', models.PositiveIntegerField(default=0, verbose_name='Photos financières')),
+                ('total_income', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total des revenus')),
+                ('total_charges', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total des charges')),
+            ],
+            options={
+                'verbose_name': 'Agrégat mensuel financier',
+                'verbose_name_plural': 'Agrégats mensuels financiers',
+                'ordering': ['month'],
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('month', 'household'), name='financial_rollup_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InteractionMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Premier jour du mois', verbose_name='Mois')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Calculé le')),
+                ('interaction_type', models.CharField(choices=[('ASSOCIATION', "Entretien à l'association"), ('EXTERNAL', 'Entretien externe'), ('PHONE', 'Entretien téléphonique'), ('HOME_VISIT', 'Visite à domicile'), ('EMAIL', 'Contact par email'), ('OTHER', 'Autre')], max_length=20, verbose_name="Type d'interaction")),
+                ('primary_need', models.CharField(blank=True, choices=[('', '--------'), ('ALIMENTAIRE', 'Alimentaire'), ('VESTIMENTAIRE', 'Vestimentaire'), ('FINANCIER', 'Financier'), ('ADMINISTRATIF', 'Administratif'), ('LOGEMENT', 'Logement'), ('SANTE', 'Santé'), ('EMPLOI', 'Emploi / Formation'), ('JURIDIQUE', 'Juridique'), ('ECOUTE', 'Écoute / Soutien moral'), ('AUTRE', 'Autre')], max_length=20, verbose_name='1er besoin exprimé')),
+                ('interaction_count', models.PositiveIntegerField(default=0, verbose_name='Interactions')),
+            ],
+            options={
+                'verbose_name': 'Agrégat mensuel des interactions',
+                'verbose_name_plural': 'Agrégats mensuels des interactions',
+                'ordering': ['month'],
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('month', 'interaction_type', 'primary_need'), name='interaction_rollup_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:15
+
+import analysis.models
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0004_monthly_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('export_format', models.CharField(choices=[('pdf', 'PDF'), ('pptx', 'PowerPoint')], max_length=4, verbose_name='Format')),
+                ('status', models.CharField(choices=[('PENDING', 'En attente'), ('RUNNING', 'En cours'), ('DONE', 'Terminé'), ('FAILED', 'Échec')], default='PENDING', max_length=10, verbose_name='Statut')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Progression (%)')),
+                ('message', models.CharField(blank=True, max_length=200, verbose_name='Étape')),
+                ('error', models.TextField(blank=True, verbose_name='Erreur')),
+                ('file', models.FileField(blank=True, upload_to=analysis.models.export_upload_to, verbose_name='Fichier')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Demandé le')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Démarré le')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Terminé le')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Expire le')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analysis_exports', to=settings.AUTH_USER_MODEL, verbose_name='Demandé par')),
+            ],
+            options={
+                'verbose_name': "Export d'analyses",
+                'verbose_name_plural': "Exports d'analyses",
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='export_job_queue_idx')],
+            },
+        ),
+    ]
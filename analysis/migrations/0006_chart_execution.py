@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0005_export_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartExecution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('executed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Exécuté le')),
+                ('duration_ms', models.FloatField(verbose_name='Durée (ms)')),
+                ('query_count', models.PositiveIntegerField(verbose_name='Requêtes SQL')),
+                ('sql_ms', models.FloatField(verbose_name='Durée SQL (ms)')),
+                ('result_bytes', models.PositiveIntegerField(verbose_name='Taille du résultat (octets)')),
+                ('error', models.TextField(blank=True, verbose_name='Erreur')),
+                ('chart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='executions', to='analysis.chartconfig', verbose_name='Graphique')),
+            ],
+            options={
+                'verbose_name': 'Exécution de graphique',
+                'verbose_name_plural': 'Exécutions de graphiques',
+                'ordering': ['-executed_at', '-id'],
+                'indexes': [models.Index(fields=['chart', '-executed_at'], name='chart_execution_recent_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0006_chart_execution'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chartconfig',
+            name='memory_limit_mb',
+            field=models.PositiveIntegerField(blank=True, help_text='Mémoire supplémentaire autorisée pour le code de requête. Vide : CHART_MEMORY_LIMIT_MB.', null=True, verbose_name='Mémoire max (Mo)'),
+        ),
+        migrations.AddField(
+            model_name='chartconfig',
+            name='row_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='Nombre max de lignes lues en base. Vide : CHART_ROW_LIMIT.', null=True, verbose_name='Lignes max'),
+        ),
+        migrations.AddField(
+            model_name='chartconfig',
+            name='timeout_seconds',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Durée max des requêtes et temps CPU du code. Vide : CHART_TIMEOUT_SECONDS.', null=True, verbose_name='Délai max (s)'),
+        ),
+    ]
@@ -1,4 +1,58 @@
-from django.db import models
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldError, ValidationError
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from beneficiaries.models import Beneficiary, Interaction
+
+from .chart_spec import ChartSpecError, compile_chart_spec, evaluate_chart_spec, get_spec_dependencies
+
+
+# Modèles exposés au code des graphiques (nom dans le contexte -> modèle)
+CHART_CONTEXT_MODELS = {
+    'Beneficiary': 'beneficiaries.Beneficiary',
+    'Interaction': 'beneficiaries.Interaction',
+    'FinancialSnapshot': 'beneficiaries.FinancialSnapshot',
+    'Child': 'beneficiaries.Child',
+    'Appointment': 'calendar_app.Appointment',
+    'Volunteer': 'volunteers.Volunteer',
+    'Product': 'stock.Product',
+    'BeneficiaryMonthlyRollup': 'analysis.BeneficiaryMonthlyRollup',
+    'InteractionMonthlyRollup': 'analysis.InteractionMonthlyRollup',
+    'FinancialMonthlyRollup': 'analysis.FinancialMonthlyRollup',
+}
+
+
+# Utilitaires du contexte des graphiques -> modèles qu'ils lisent (dépendances du cache)
+CHART_CONTEXT_HELPERS = {
+    'FinancialFrame': ('FinancialSnapshot', 'Beneficiary'),
+}
+
+# Champs recopiés d'un autre modèle par queryset.update(), donc sans post_save
+# (Beneficiary.refresh_financial_summary) : modèle -> {champ: modèle source}.
+# Un graphique qui les lit dépend aussi du modèle source.
+CHART_DERIVED_FIELDS = {
+    'Beneficiary': dict.fromkeys(Beneficiary.FINANCIAL_SUMMARY_FIELDS, 'FinancialSnapshot'),
+}
+
+
+def _dependency_version_key(model_name):
+    return f'analysis:chart-dependency:{model_name}'
+
+
+def bump_dependency_version(model_name):
+    """
+    Invalide les résultats des graphiques qui dépendent du modèle : la version
+    fait partie de leur clé de cache. Une valeur aléatoire (et non un compteur)
+    ne peut pas retomber sur une ancienne clé si elle est évincée du cache.
+    """
+    cache.set(_dependency_version_key(model_name), uuid.uuid4().hex, None)
 
 
 class ChartConfig(models.Model):
@@ -57,8 +111,47 @@ class ChartConfig(models.Model):
     # Requête Django (sera évaluée de manière sécurisée)
     query_code = models.TextField(
         'Code de requête',
+        blank=True,
         help_text='Code Python pour générer les données. Doit retourner un dict avec "labels" et "datasets".'
     )
+    query_spec = models.JSONField(
+        'Spécification',
+        null=True,
+        blank=True,
+        help_text=(
+            'Spécification déclarative (modèle, dimension, mesure, filtre, séries) compilée en une seule '
+            'requête. Prioritaire sur le code de requête.'
+        )
+    )
+    depends_on = models.CharField(
+        'Dépendances',
+        max_length=255,
+        blank=True,
+        help_text=(
+            'Modèles dont les modifications invalident le cache du graphique, séparés par des virgules '
+            '(ex: Beneficiary, FinancialSnapshot). Vide : détectés dans le code de requête.'
+        )
+    )
+
+    # Limites d'exécution (vide : valeurs par défaut des settings)
+    timeout_seconds = models.PositiveSmallIntegerField(
+        'Délai max (s)',
+        null=True,
+        blank=True,
+        help_text='Durée max des requêtes et temps CPU du code. Vide : CHART_TIMEOUT_SECONDS.'
+    )
+    memory_limit_mb = models.PositiveIntegerField(
+        'Mémoire max (Mo)',
+        null=True,
+        blank=True,
+        help_text='Mémoire supplémentaire autorisée pour le code de requête. Vide : CHART_MEMORY_LIMIT_MB.'
+    )
+    row_limit = models.PositiveIntegerField(
+        'Lignes max',
+        null=True,
+        blank=True,
+        help_text='Nombre max de lignes lues en base. Vide : CHART_ROW_LIMIT.'
+    )
 
     # Configuration visuelle
     y_axis_label = models.CharField('Label axe Y', max_length=100, blank=True)
@@ -79,45 +172,97 @@ class ChartConfig(models.Model):
     def __str__(self):
         return f"{self.title} ({self.get_chart_type_display()})"
 
-    def get_chart_data(self):
+    def clean(self):
+        if self.query_spec:
+            try:
+                compile_chart_spec(self.query_spec)
+            except (ChartSpecError, FieldError, ValueError) as error:
+                raise ValidationError({'query_spec': str(error)})
+        elif not self.query_code.strip():
+            raise ValidationError('Renseigner une spécification ou un code de requête.')
+
+    @property
+    def dependency_models(self):
         """
-        Exécute le code de requête et retourne les données du graphique.
-        IMPORTANT: À sécuriser en production (sandboxing)
+        Noms des modèles (clés de CHART_CONTEXT_MODELS) dont dépend le graphique.
+        Pour une spécification, ils sont déduits des champs et relations
+        utilisés. Pour du code, les relations traversées (ex: Beneficiary ->
+        enfants) ne sont pas détectées : les déclarer, sinon seule
+        l'expiration du cache les rattrape. Dans les deux cas, un champ de
+        CHART_DERIVED_FIELDS ajoute son modèle source.
         """
-        try:
-            # Imports disponibles dans le contexte d'exécution
-            from django.db.models import Count, Sum, Avg, Q
-            from django.utils import timezone
-            from datetime import datetime, timedelta
-            from beneficiaries.models import Beneficiary, Interaction, FinancialSnapshot, Child
-            from calendar_app.models import Appointment
-            from volunteers.models import Volunteer
-            from stock.models import Product
-
-            # Contexte d'exécution sécurisé
-            local_context = {
-                'Count': Count,
-                'Sum': Sum,
-                'Avg': Avg,
-                'Q': Q,
-                'timezone': timezone,
-                'datetime': datetime,
-                'timedelta': timedelta,
-                'Beneficiary': Beneficiary,
-                'Interaction': Interaction,
-                'FinancialSnapshot': FinancialSnapshot,
-                'Child': Child,
-                'Appointment': Appointment,
-                'Volunteer': Volunteer,
-                'Product': Product,
-            }
+        if self.depends_on.strip():
+            names = [name.strip() for name in self.depends_on.split(',')]
+        elif self.query_spec:
+            try:
+                names = get_spec_dependencies(self.query_spec)
+            except ValueError:
+                names = []
+        else:
+            names = re.findall(r'\b(%s)\b' % '|'.join(CHART_CONTEXT_MODELS), self.query_code)
+            for helper in re.findall(r'\b(%s)\b' % '|'.join(CHART_CONTEXT_HELPERS), self.query_code):
+                names.extend(CHART_CONTEXT_HELPERS[helper])
+            for name, fields in CHART_DERIVED_FIELDS.items():
+                if name in names:
+                    names.extend(fields[field] for field in re.findall(r'\b(%s)\b' % '|'.join(fields), self.query_code))
+        return sorted({name for name in names if name in CHART_CONTEXT_MODELS})
+
+    def get_cache_key(self):
+        """Clé du résultat : graphique, dernière modification et versions des dépendances"""
+        version_keys = [_dependency_version_key(name) for name in self.dependency_models]
+        versions = cache.get_many(version_keys)
+        for key in version_keys:
+            if key not in versions:
+                # Première lecture (ou éviction) : nouvelle version, jamais une ancienne
+                cache.add(key, uuid.uuid4().hex, None)
+                versions[key] = cache.get(key)
+        return 'analysis:chart:%s:%s:%s' % (
+            self.pk,
+            self.updated_at.timestamp(),
+            ':'.join(str(versions[key]) for key in version_keys),
+        )
 
-            # Exécution du code
-            exec(self.query_code, local_context)
+    def get_chart_data(self, use_cache=True):
+        """
+        Données du graphique, mises en cache (CHART_CACHE_TIMEOUT secondes au
+        plus) : le tableau de bord et les exports partagent le même résultat.
+        Les erreurs ne sont pas mises en cache. Chaque évaluation hors cache
+        est mesurée (ChartExecution).
+        """
+        from .profiling import profile_chart
+
+        if not use_cache or not self.pk:
+            return profile_chart(self).data
+
+        key = self.get_cache_key()
+        data = cache.get(key)
+        if data is None:
+            data = profile_chart(self).data
+            if 'error' not in data:
+                cache.set(key, data, getattr(settings, 'CHART_CACHE_TIMEOUT', 900))
+        return data
 
-            # Le code doit définir une variable 'result'
-            return local_context.get('result', {'labels': [], 'datasets': []})
+    @cached_property
+    def execution_stats(self):
+        """Résumé des dernières mesures (voir profiling.summarize_executions), ou None"""
+        from .profiling import summarize_executions
 
+        return summarize_executions(self.executions.all())
+
+    def compute_chart_data(self):
+        """
+        Évalue la spécification, ou à défaut exécute le code de requête, et
+        retourne les données du graphique, sous les limites d'exécution du
+        graphique (voir governor).
+        """
+        from .governor import get_chart_limits, governed_queries, run_governed
+
+        limits = get_chart_limits(self)
+        try:
+            if self.query_spec:
+                with governed_queries(limits):
+                    return evaluate_chart_spec(self.query_spec)
+            return run_governed(self, limits)
         except Exception as e:
             # En cas d'erreur, retourner un message d'erreur
             return {
@@ -125,3 +270,335 @@ class ChartConfig(models.Model):
                 'labels': [],
                 'datasets': []
             }
+
+    def execute_query_code(self):
+        """
+        Exécute le code de requête et retourne sa variable `result`.
+        Appelée par le gouverneur (sous-processus aux ressources bornées).
+        """
+        # Imports disponibles dans le contexte d'exécution
+        from django.db.models import Count, Sum, Avg, Q
+        from django.utils import timezone
+        from datetime import datetime, timedelta
+        from beneficiaries.models import Beneficiary, Interaction, FinancialSnapshot, Child
+        from calendar_app.models import Appointment
+        from volunteers.models import Volunteer
+        from stock.models import Product
+        import numpy as np
+        from .frames import FinancialFrame
+
+        # Contexte d'exécution sécurisé
+        local_context = {
+            'Count': Count,
+            'Sum': Sum,
+            'Avg': Avg,
+            'Q': Q,
+            'timezone': timezone,
+            'datetime': datetime,
+            'timedelta': timedelta,
+            'Beneficiary': Beneficiary,
+            'Interaction': Interaction,
+            'FinancialSnapshot': FinancialSnapshot,
+            'Child': Child,
+            'Appointment': Appointment,
+            'Volunteer': Volunteer,
+            'Product': Product,
+            'BeneficiaryMonthlyRollup': BeneficiaryMonthlyRollup,
+            'InteractionMonthlyRollup': InteractionMonthlyRollup,
+            'FinancialMonthlyRollup': FinancialMonthlyRollup,
+            'FinancialFrame': FinancialFrame,
+            'np': np,
+        }
+
+        # Exécution du code
+        exec(self.query_code, local_context)
+
+        # Le code doit définir une variable 'result'
+        return local_context.get('result', {'labels': [], 'datasets': []})
+
+
+class ChartExecution(models.Model):
+    """
+    Mesure d'une évaluation d'un graphique (hors cache), conservée dans un
+    tampon circulaire : les CHART_PROFILE_HISTORY dernières par graphique.
+    """
+
+    chart = models.ForeignKey(
+        ChartConfig,
+        on_delete=models.CASCADE,
+        related_name='executions',
+        verbose_name='Graphique'
+    )
+    executed_at = models.DateTimeField('Exécuté le', default=timezone.now)
+    duration_ms = models.FloatField('Durée (ms)')
+    query_count = models.PositiveIntegerField('Requêtes SQL')
+    sql_ms = models.FloatField('Durée SQL (ms)')
+    result_bytes = models.PositiveIntegerField('Taille du résultat (octets)')
+    error = models.TextField('Erreur', blank=True)
+
+    class Meta:
+        verbose_name = "Exécution de graphique"
+        verbose_name_plural = "Exécutions de graphiques"
+        ordering = ['-executed_at', '-id']
+        indexes = [
+            models.Index(fields=['chart', '-executed_at'], name='chart_execution_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.chart.title} - {self.duration_ms:.0f} ms ({self.query_count} requêtes)"
+
+
+class MonthlyRollup(models.Model):
+    """
+    Agrégat mensuel pré-calculé (voir analysis.rollups) : reconstruit par la
+    commande rebuild_monthly_rollups, tenu à jour par signaux mois par mois.
+    """
+    month = models.DateField('Mois', help_text='Premier jour du mois')
+    updated_at = models.DateTimeField('Calculé le', auto_now=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['month']
+
+
+class BeneficiaryMonthlyRollup(MonthlyRollup):
+    """Nouveaux bénéficiaires et bénéficiaires actifs par mois"""
+
+    new_beneficiaries = models.PositiveIntegerField('Nouveaux bénéficiaires', default=0)
+    active_beneficiaries = models.PositiveIntegerField(
+        'Bénéficiaires actifs', default=0, help_text='Au moins une interaction dans le mois'
+    )
+
+    class Meta(MonthlyRollup.Meta):
+        verbose_name = 'Agrégat mensuel des bénéficiaires'
+        verbose_name_plural = 'Agrégats mensuels des bénéficiaires'
+        constraints = [
+            models.UniqueConstraint(fields=['month'], name='beneficiary_rollup_month_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%m/%Y} : {self.new_beneficiaries} nouveaux, {self.active_beneficiaries} actifs"
+
+
+class InteractionMonthlyRollup(MonthlyRollup):
+    """Interactions par mois, type et premier besoin exprimé"""
+
+    interaction_type = models.CharField(
+        'Type d\'interaction', max_length=20, choices=Interaction.INTERACTION_TYPE_CHOICES
+    )
+    primary_need = models.CharField(
+        '1er besoin exprimé', max_length=20, choices=Interaction.PRIMARY_NEED_CHOICES, blank=True
+    )
+    interaction_count = models.PositiveIntegerField('Interactions', default=0)
+
+    class Meta(MonthlyRollup.Meta):
+        verbose_name = 'Agrégat mensuel des interactions'
+        verbose_name_plural = 'Agrégats mensuels des interactions'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'interaction_type', 'primary_need'], name='interaction_rollup_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%m/%Y} {self.interaction_type}/{self.primary_need} : {self.interaction_count}"
+
+
+class FinancialMonthlyRollup(MonthlyRollup):
+    """
+    Revenus, charges et reste à vivre des photos financières par mois et par
+    foyer (nombre d'enfants à charge actuel du bénéficiaire). Les sommes sont
+    stockées pour que les moyennes se combinent entre foyers.
+    """
+
+    HOUSEHOLD_CHOICES = [
+        ('0', '0 enfants'),
+        ('1-2', '1-2 enfants'),
+        ('3+', '3+ enfants'),
+    ]
+
+    household = models.CharField('Foyer', max_length=3, choices=HOUSEHOLD_CHOICES)
+    snapshot_count = models.PositiveIntegerField('Photos financières', default=0)
+    total_income = models.DecimalField('Total des revenus', max_digits=14, decimal_places=2, default=0)
+    total_charges = models.DecimalField('Total des charges', max_digits=14, decimal_places=2, default=0)
+
+    class Meta(MonthlyRollup.Meta):
+        verbose_name = 'Agrégat mensuel financier'
+        verbose_name_plural = 'Agrégats mensuels financiers'
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'household'], name='financial_rollup_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%m/%Y} {self.household} : {self.snapshot_count} photos"
+
+    @property
+    def average_income(self):
+        return self.total_income / self.snapshot_count if self.snapshot_count else 0
+
+    @property
+    def average_charges(self):
+        return self.total_charges / self.snapshot_count if self.snapshot_count else 0
+
+    @property
+    def average_reste_a_vivre(self):
+        """Solde net mensuel moyen (revenus - charges)"""
+        return self.average_income - self.average_charges
+
+
+def export_upload_to(instance, filename):
+    """Fichiers d'export sous un répertoire au nom imprévisible (identifiant du job)"""
+    return f'exports/{instance.pk.hex}/{filename}'
+
+
+class ExportJob(models.Model):
+    """
+    Export PDF / PowerPoint des analyses, construit en arrière-plan par la
+    commande run_export_worker (file d'attente en base) ; le fichier produit
+    est conservé EXPORT_JOB_RETENTION_DAYS jours.
+    """
+
+    FORMAT_CHOICES = [
+        ('pdf', 'PDF'),
+        ('pptx', 'PowerPoint'),
+    ]
+
+    STATUS_CHOICES = [
+        ('PENDING', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('DONE', 'Terminé'),
+        ('FAILED', 'Échec'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='analysis_exports',
+        verbose_name='Demandé par'
+    )
+    export_format = models.CharField('Format', max_length=4, choices=FORMAT_CHOICES)
+    status = models.CharField('Statut', max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    progress = models.PositiveSmallIntegerField('Progression (%)', default=0)
+    message = models.CharField('Étape', max_length=200, blank=True)
+    error = models.TextField('Erreur', blank=True)
+    file = models.FileField('Fichier', upload_to=export_upload_to, blank=True)
+
+    created_at = models.DateTimeField('Demandé le', auto_now_add=True)
+    started_at = models.DateTimeField('Démarré le', null=True, blank=True)
+    finished_at = models.DateTimeField('Terminé le', null=True, blank=True)
+    expires_at = models.DateTimeField('Expire le', null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Export d'analyses"
+        verbose_name_plural = "Exports d'analyses"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='export_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Export {self.get_export_format_display()} ({self.get_status_display()}) - {self.created_at:%d/%m/%Y %H:%M}"
+
+    @property
+    def is_finished(self):
+        return self.status in ('DONE', 'FAILED')
+
+    @property
+    def is_downloadable(self):
+        return self.status == 'DONE' and bool(self.file) and (
+            self.expires_at is None or self.expires_at > timezone.now()
+        )
+
+    @property
+    def download_name(self):
+        return f"analyses_rosa_{self.created_at:%Y%m%d}.{self.export_format}"
+
+    @classmethod
+    def claim_next(cls):
+        """
+        Réserve le plus ancien job en attente pour ce worker (None si aucun).
+        SKIP LOCKED : plusieurs workers ne prennent jamais le même job.
+        """
+        with transaction.atomic():
+            job = cls.objects.select_for_update(skip_locked=True).filter(
+                status='PENDING'
+            ).order_by('created_at').first()
+            if job is None:
+                return None
+            job.status = 'RUNNING'
+            job.started_at = timezone.now()
+            job.message = 'Démarrage'
+            job.save(update_fields=['status', 'started_at', 'message'])
+        return job
+
+    def set_progress(self, progress, message):
+        """Progression lue par le polling HTMX (écriture ciblée, sans save complet)"""
+        self.progress, self.message = progress, message
+        ExportJob.objects.filter(pk=self.pk).update(progress=progress, message=message)
+
+
+# Signaux : toute écriture sur un modèle utilisé par les graphiques invalide
+# les résultats qui en dépendent, une fois la transaction validée
+def _invalidate_dependent_charts(model_name):
+    def receiver(sender, raw=False, **kwargs):
+        if not raw:
+            transaction.on_commit(lambda: bump_dependency_version(model_name))
+    return receiver
+
+
+for _model_name, _model_label in CHART_CONTEXT_MODELS.items():
+    _receiver = _invalidate_dependent_charts(_model_name)
+    post_save.connect(_receiver, sender=_model_label, weak=False,
+                      dispatch_uid=f'analysis_chart_cache_save_{_model_name}')
+    post_delete.connect(_receiver, sender=_model_label, weak=False,
+                        dispatch_uid=f'analysis_chart_cache_delete_{_model_name}')
+
+
+# Signaux : recalcul des agrégats mensuels des mois touchés, à la validation
+# de la transaction (analysis.rollups)
+def _schedule_rollup(kind, moment):
+    from .rollups import schedule_refresh
+    schedule_refresh(kind, moment)
+
+
+def remember_dependents_count(sender, instance, raw=False, **kwargs):
+    """Nombre d'enfants avant modification : il détermine le foyer des photos financières"""
+    if raw or not instance.pk:
+        return
+    instance._previous_dependents_count = sender.objects.filter(pk=instance.pk).values_list(
+        'dependents_count', flat=True
+    ).first()
+
+
+def update_beneficiary_rollups(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _schedule_rollup('beneficiaries', instance.created_at)
+    previous = getattr(instance, '_previous_dependents_count', None)
+    if previous is not None and previous != instance.dependents_count:
+        for moment in instance.financial_snapshots.values_list('date', flat=True):
+            _schedule_rollup('financial', moment)
+
+
+def update_interaction_rollups(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _schedule_rollup('interactions', instance.created_at)
+    _schedule_rollup('beneficiaries', instance.created_at)
+
+
+def update_financial_rollups(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _schedule_rollup('financial', instance.date)
+
+
+pre_save.connect(remember_dependents_count, sender='beneficiaries.Beneficiary',
+                 dispatch_uid='analysis_rollup_beneficiary_pre_save')
+for _signal in (post_save, post_delete):
+    _signal.connect(update_beneficiary_rollups, sender='beneficiaries.Beneficiary',
+                    dispatch_uid=f'analysis_rollup_beneficiary_{_signal is post_save}')
+    _signal.connect(update_interaction_rollups, sender='beneficiaries.Interaction',
+                    dispatch_uid=f'analysis_rollup_interaction_{_signal is post_save}')
+    _signal.connect(update_financial_rollups, sender='beneficiaries.FinancialSnapshot',
+                    dispatch_uid=f'analysis_rollup_financial_{_signal is post_save}')
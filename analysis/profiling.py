@@ -0,0 +1,155 @@
+"""
+Profilage des graphiques d'analyse.
+
+Chaque évaluation d'un graphique hors cache (ChartConfig.get_chart_data) est
+mesurée : durée totale, nombre et durée des requêtes SQL (compteur branché
+par connection.execute_wrapper sur la connexion du thread qui évalue), taille
+du résultat JSON et erreur éventuelle. Les mesures sont conservées dans
+ChartExecution, tampon circulaire de CHART_PROFILE_HISTORY lignes par
+graphique, résumées dans l'admin (dernière, médiane, 95e centile).
+"""
+import json
+import logging
+import math
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Subquery
+
+from .models import ChartExecution
+
+logger = logging.getLogger(__name__)
+
+
+# Résultat d'un profilage : données du graphique, mesure, requêtes capturées
+ChartProfile = namedtuple('ChartProfile', ['data', 'execution', 'queries'])
+
+
+class QueryRecorder:
+    """
+    Wrapper d'exécution SQL (connection.execute_wrapper) : compte et
+    chronomètre les requêtes, et garde leur texte si capture_sql.
+    """
+
+    def __init__(self, capture_sql=False):
+        self.capture_sql = capture_sql
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    # Points de sauvegarde et statement_timeout du gouverneur : pas des requêtes du graphique
+    IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', "SELECT set_config(")
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.startswith(self.IGNORED_PREFIXES):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if self.capture_sql:
+                self.queries.append({
+                    'sql': self._executed_sql(sql, params, many, context),
+                    'duration_ms': elapsed * 1000,
+                })
+
+    @classmethod
+    def add_to_active(cls, count, duration, queries=()):
+        """
+        Ajoute aux compteurs branchés sur la connexion courante des requêtes
+        exécutées sur une autre connexion (sous-processus du gouverneur).
+        """
+        for wrapper in connection.execute_wrappers:
+            if isinstance(wrapper, cls):
+                wrapper.count += count
+                wrapper.duration += duration
+                if wrapper.capture_sql:
+                    wrapper.queries.extend(queries)
+
+    @staticmethod
+    def _executed_sql(sql, params, many, context):
+        """Requête avec ses paramètres (telle qu'envoyée à la base si possible)"""
+        if many:
+            return sql
+        try:
+            return connection.ops.last_executed_query(context['cursor'], sql, params)
+        except Exception:
+            return sql
+
+
+def _result_size(data):
+    return len(json.dumps(data, default=str).encode())
+
+
+def record_execution(execution):
+    """
+    Enregistre la mesure et supprime les plus anciennes au-delà de
+    CHART_PROFILE_HISTORY pour ce graphique. Un échec d'écriture n'empêche
+    pas l'affichage du graphique.
+    """
+    history = getattr(settings, 'CHART_PROFILE_HISTORY', 50)
+    try:
+        with transaction.atomic():
+            execution.save()
+            executions = ChartExecution.objects.filter(chart_id=execution.chart_id)
+            executions.exclude(pk__in=Subquery(executions.values('pk')[:history])).delete()
+    except DatabaseError as error:
+        logger.warning("Mesure du graphique %s non enregistrée : %s", execution.chart_id, error)
+
+
+def profile_chart(chart, capture_sql=False, record=True):
+    """
+    Évalue le graphique (sans cache) en mesurant son exécution.
+    Retourne un ChartProfile ; la mesure est enregistrée si record.
+    """
+    recorder = QueryRecorder(capture_sql)
+    started = time.perf_counter()
+    with connection.execute_wrapper(recorder):
+        data = chart.compute_chart_data()
+    duration = time.perf_counter() - started
+
+    execution = ChartExecution(
+        chart=chart,
+        duration_ms=duration * 1000,
+        query_count=recorder.count,
+        sql_ms=recorder.duration * 1000,
+        result_bytes=_result_size(data),
+        error=str(data.get('error') or '') if isinstance(data, dict) else '',
+    )
+    if record and chart.pk:
+        record_execution(execution)
+    return ChartProfile(data, execution, recorder.queries)
+
+
+def percentile(values, fraction):
+    """Centile par rang le plus proche d'une liste triée (None si vide)"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize_executions(executions):
+    """
+    Résumé des mesures d'un graphique, de la plus récente à la plus ancienne :
+    dict (runs, errors, last/p50/p95 de durée et de requêtes) ou None.
+    """
+    executions = list(executions)
+    if not executions:
+        return None
+    durations = sorted(execution.duration_ms for execution in executions)
+    query_counts = sorted(execution.query_count for execution in executions)
+    return {
+        'runs': len(executions),
+        'errors': sum(1 for execution in executions if execution.error),
+        'last_ms': executions[0].duration_ms,
+        'p50_ms': percentile(durations, 0.5),
+        'p95_ms': percentile(durations, 0.95),
+        'last_queries': executions[0].query_count,
+        'p50_queries': percentile(query_counts, 0.5),
+        'p95_queries': percentile(query_counts, 0.95),
+    }
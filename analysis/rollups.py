@@ -0,0 +1,196 @@
+"""
+Agrégats mensuels des bénéficiaires, interactions et photos financières.
+
+Les tableaux de bord lisent ces tables (quelques lignes indexées par mois)
+au lieu de recompter l'historique à chaque requête :
+- BeneficiaryMonthlyRollup : nouveaux bénéficiaires, bénéficiaires actifs
+- InteractionMonthlyRollup : interactions par type et premier besoin
+- FinancialMonthlyRollup : revenus, charges et reste à vivre par foyer
+
+Un mois est toujours recalculé en entier depuis les tables sources (quelques
+requêtes groupées) : les signaux programment le recalcul des mois touchés à
+la validation de la transaction, la commande rebuild_monthly_rollups
+reconstruit tout l'historique.
+"""
+import threading
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from beneficiaries.models import Beneficiary, FinancialSnapshot, Interaction
+
+from .models import (
+    BeneficiaryMonthlyRollup, FinancialMonthlyRollup, InteractionMonthlyRollup, bump_dependency_version,
+)
+
+
+BENEFICIARIES = 'beneficiaries'
+INTERACTIONS = 'interactions'
+FINANCIAL = 'financial'
+
+_pending = threading.local()
+
+
+def month_start(value):
+    """Premier jour du mois (heure locale) d'une date ou d'une datetime"""
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value.replace(day=1)
+
+
+def _next_month(month):
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def _filter_months(queryset, field, months):
+    """Restreint aux mois demandés (None : tout l'historique)"""
+    if months is None:
+        return queryset
+    start = timezone.make_aware(datetime.combine(min(months), time.min))
+    end = timezone.make_aware(datetime.combine(_next_month(max(months)), time.min))
+    return queryset.filter(**{f'{field}__gte': start, f'{field}__lt': end})
+
+
+def _by_month(queryset, field, months, *groups, **aggregates):
+    """Lignes groupées par mois (et `groups`), limitées aux mois demandés"""
+    rows = _filter_months(queryset, field, months).annotate(
+        rollup_month=TruncMonth(field)
+    ).values('rollup_month', *groups).annotate(**aggregates).order_by()
+    for row in rows:
+        row['rollup_month'] = month_start(row['rollup_month'])
+        if months is None or row['rollup_month'] in months:
+            yield row
+
+
+def household_expression(path='beneficiary__dependents_count'):
+    """Foyer (FinancialMonthlyRollup.HOUSEHOLD_CHOICES) selon le nombre d'enfants à charge"""
+    return Case(
+        When(**{path: 0}, then=Value('0')),
+        When(**{f'{path}__lte': 2}, then=Value('1-2')),
+        default=Value('3+'),
+    )
+
+
+def compute_beneficiary_rollups(months=None):
+    rollups = defaultdict(lambda: {'new_beneficiaries': 0, 'active_beneficiaries': 0})
+    for row in _by_month(Beneficiary.objects.all(), 'created_at', months, count=Count('id')):
+        rollups[row['rollup_month']]['new_beneficiaries'] = row['count']
+    for row in _by_month(Interaction.objects.all(), 'created_at', months,
+                         count=Count('beneficiary', distinct=True)):
+        rollups[row['rollup_month']]['active_beneficiaries'] = row['count']
+    return [BeneficiaryMonthlyRollup(month=month, **values) for month, values in rollups.items()]
+
+
+def compute_interaction_rollups(months=None):
+    return [
+        InteractionMonthlyRollup(
+            month=row['rollup_month'],
+            interaction_type=row['interaction_type'],
+            primary_need=row['primary_need'],
+            interaction_count=row['count'],
+        )
+        for row in _by_month(Interaction.objects.all(), 'created_at', months,
+                             'interaction_type', 'primary_need', count=Count('id'))
+    ]
+
+
+def compute_financial_rollups(months=None):
+    queryset = FinancialSnapshot.objects.annotate(household=household_expression())
+    return [
+        FinancialMonthlyRollup(
+            month=row['rollup_month'],
+            household=row['household'],
+            snapshot_count=row['count'],
+            total_income=row['income'] or 0,
+            total_charges=row['charges'] or 0,
+        )
+        for row in _by_month(
+            queryset, 'date', months, 'household',
+            count=Count('id'),
+            income=Sum('total_revenus'),
+            charges=Sum('total_charges'),
+        )
+    ]
+
+
+ROLLUPS = {
+    BENEFICIARIES: (BeneficiaryMonthlyRollup, compute_beneficiary_rollups),
+    INTERACTIONS: (InteractionMonthlyRollup, compute_interaction_rollups),
+    FINANCIAL: (FinancialMonthlyRollup, compute_financial_rollups),
+}
+
+
+def refresh_rollups(kind, months=None):
+    """
+    Recalcule les agrégats `kind` des mois donnés (None : tout l'historique)
+    et retourne le nombre de lignes écrites.
+    """
+    model, compute = ROLLUPS[kind]
+    months = set(months) if months is not None else None
+    with transaction.atomic():
+        existing = model.objects.all()
+        if months is not None:
+            existing = existing.filter(month__in=months)
+        existing.delete()
+        rows = model.objects.bulk_create(compute(months))
+        transaction.on_commit(lambda: bump_dependency_version(model.__name__))
+    return len(rows)
+
+
+def rebuild_rollups():
+    """Reconstruit tous les agrégats ; retourne {kind: nombre de lignes}"""
+    return {kind: refresh_rollups(kind) for kind in ROLLUPS}
+
+
+def schedule_refresh(kind, moment):
+    """
+    Programme le recalcul du mois de `moment` à la validation de la
+    transaction. Les mois sont regroupés : la suppression en cascade d'un
+    bénéficiaire ne recalcule chaque mois touché qu'une fois.
+    """
+    if moment is None:
+        return
+    pending = getattr(_pending, 'months', None)
+    if pending is None:
+        pending = _pending.months = set()
+    pending.add((kind, month_start(moment)))
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending():
+    pending, _pending.months = getattr(_pending, 'months', None), None
+    if not pending:
+        return
+    months_by_kind = defaultdict(set)
+    for kind, month in pending:
+        months_by_kind[kind].add(month)
+    for kind, months in months_by_kind.items():
+        refresh_rollups(kind, months)
+
+
+def get_beneficiary_evolution(months, today=None):
+    """
+    Nombre cumulé de bénéficiaires à la fin de chacun des `months` derniers
+    mois : [(premier jour du mois, total)], en deux petites requêtes.
+    """
+    last = month_start(today or timezone.localdate())
+    first = last
+    for _ in range(months - 1):
+        first = (first - timedelta(days=1)).replace(day=1)
+    rollups = BeneficiaryMonthlyRollup.objects.filter(month__range=[first, last])
+    new_by_month = dict(rollups.values_list('month', 'new_beneficiaries'))
+    total = BeneficiaryMonthlyRollup.objects.filter(month__lt=first).aggregate(
+        total=Sum('new_beneficiaries')
+    )['total'] or 0
+
+    evolution = []
+    month = first
+    while month <= last:
+        total += new_by_month.get(month, 0)
+        evolution.append((month, total))
+        month = _next_month(month)
+    return evolution
@@ -1,3 +1,581 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from beneficiaries.models import Beneficiary, FinancialSnapshot, Interaction
+from volunteers.models import Volunteer
+
+from .admin import ChartConfigAdmin
+from .chart_spec import evaluate_chart_spec
+from .executor import evaluate_charts
+from .exports import purge_export_jobs, run_export_job
+from .frames import FinancialFrame
+from .images import chart_image_key, evict_cached_images, get_chart_images
+from .models import BeneficiaryMonthlyRollup, ChartConfig, ChartExecution, ExportJob, FinancialMonthlyRollup, InteractionMonthlyRollup
+from .profiling import profile_chart
+from .rollups import get_beneficiary_evolution, month_start, rebuild_rollups
+from .views import analysis_dashboard, chart_data, export_job_download, export_job_status, export_start
+
+
+COUNT_CODE = """
+result = {'labels': ['total'], 'datasets': [{'label': 'Total', 'data': [%s.objects.count()]}]}
+"""
+
+
+class ChartCacheTests(TestCase):
+    """Cache des résultats de ChartConfig.get_chart_data"""
+
+    def setUp(self):
+        cache.clear()
+        self.beneficiaries = ChartConfig.objects.create(title='Bénéficiaires', query_code=COUNT_CODE % 'Beneficiary')
+        self.volunteers = ChartConfig.objects.create(title='Bénévoles', query_code=COUNT_CODE % 'Volunteer')
+
+    def total(self, chart):
+        return chart.get_chart_data()['datasets'][0]['data'][0]
+
+    def test_result_is_reused_until_a_dependency_changes(self):
+        self.assertEqual(self.beneficiaries.dependency_models, ['Beneficiary'])
+        self.assertEqual(self.total(self.beneficiaries), 0)
+        self.assertEqual(self.total(self.volunteers), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.total(self.beneficiaries), 0)
+        self.assertEqual(len(queries.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Beneficiary.objects.create(first_name='Jeanne', last_name='Test')
+        self.assertEqual(self.total(self.beneficiaries), 1)
+
+        # Un graphique qui ne dépend pas des bénéficiaires garde son résultat
+        with CaptureQueriesContext(connection) as queries:
+            self.total(self.volunteers)
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_editing_the_chart_or_declaring_dependencies(self):
+        self.total(self.beneficiaries)
+        self.beneficiaries.depends_on = 'Interaction, Inconnu'
+        self.beneficiaries.save()
+        self.assertEqual(self.beneficiaries.dependency_models, ['Interaction'])
+
+        self.total(self.beneficiaries)
+        self.assertEqual(self.beneficiaries.executions.count(), 2)
+        self.assertEqual(self.beneficiaries.executions.first().query_count, 1)
+
+    def test_financial_summary_fields_depend_on_snapshots(self):
+        beneficiary = Beneficiary.objects.create(first_name='Jeanne', last_name='Test')
+        spec = ChartConfig.objects.create(
+            title='Solde', query_spec={'model': 'Beneficiary', 'measure': {'op': 'sum', 'fields': ['solde_net']}}
+        )
+        code = ChartConfig.objects.create(
+            title='Solde (code)',
+            query_code="result = {'labels': [''], 'datasets': [{'data': [sum(b.solde_net or 0 for b in Beneficiary.objects.all())]}]}"
+        )
+        self.assertEqual(spec.dependency_models, ['Beneficiary', 'FinancialSnapshot'])
+        self.assertEqual(code.dependency_models, ['Beneficiary', 'FinancialSnapshot'])
+        self.assertEqual(self.total(spec), 0)
+        self.assertEqual(self.total(code), 0)
+
+        # Le résumé du bénéficiaire est mis à jour par update(), sans post_save sur Beneficiary
+        with self.captureOnCommitCallbacks(execute=True):
+            FinancialSnapshot.objects.create(beneficiary=beneficiary, salaire=1200, loyer_residuel=300)
+        self.assertEqual(self.total(spec), 900)
+        self.assertEqual(self.total(code), 900)
+
+    def test_errors_are_not_cached(self):
+        broken = ChartConfig.objects.create(title='Cassé', query_code='result = 1 / 0')
+        self.assertIn('error', broken.get_chart_data())
+        self.assertIsNone(cache.get(broken.get_cache_key()))
+
+
+class ChartProfilingTests(TestCase):
+    """Mesure des évaluations de graphiques (analysis.profiling) et colonnes de l'admin"""
+
+    def setUp(self):
+        cache.clear()
+        self.chart = ChartConfig.objects.create(title='Bénévoles', query_code=COUNT_CODE % 'Volunteer')
+
+    def test_each_evaluation_is_recorded_in_a_bounded_history(self):
+        with override_settings(CHART_PROFILE_HISTORY=2):
+            self.chart.get_chart_data()
+            self.chart.get_chart_data()  # En cache : pas de mesure
+            self.assertEqual(self.chart.executions.count(), 1)
+            for _ in range(3):
+                self.chart.get_chart_data(use_cache=False)
+        executions = list(self.chart.executions.all())
+        self.assertEqual(len(executions), 2)
+        self.assertEqual([execution.query_count for execution in executions], [1, 1])
+        self.assertGreater(executions[0].result_bytes, 0)
+        self.assertEqual(executions[0].error, '')
+
+        broken = ChartConfig.objects.create(title='Cassé', query_code='result = 1 / 0')
+        broken.get_chart_data()
+        self.assertEqual(broken.executions.get().error, 'division by zero')
+
+    def test_admin_shows_timings_and_profiles_on_demand(self):
+        for duration, queries in [(10, 1), (30, 2), (20, 1)]:
+            ChartExecution.objects.create(chart=self.chart, duration_ms=duration, query_count=queries,
+                                          sql_ms=1, result_bytes=10)
+        model_admin = ChartConfigAdmin(ChartConfig, admin.site)
+        request = RequestFactory().post('/')
+        request.user = User.objects.create(username='admin_profile', is_superuser=True, is_staff=True)
+
+        chart = model_admin.get_queryset(request).get(pk=self.chart.pk)
+        self.assertEqual(
+            [model_admin.last_duration(chart), model_admin.p50_duration(chart), model_admin.p95_duration(chart)],
+            ['20 ms', '20 ms', '30 ms']
+        )
+        self.assertEqual(model_admin.query_counts(chart), '1 / 1 / 2')
+
+        response = model_admin.profile_now(request, ChartConfig.objects.filter(pk=self.chart.pk))
+        response.render()
+        self.assertIn('volunteers_volunteer', response.content.decode())
+        self.assertEqual(self.chart.executions.count(), 4)
+
+
+class ChartGovernorTests(TransactionTestCase):
+    """
+    Limites d'exécution du code de requête (analysis.governor) : sous-processus
+    aux ressources bornées (données validées, d'où TransactionTestCase)
+    """
+
+    def test_code_runs_in_a_subprocess_and_is_profiled(self):
+        Volunteer.objects.create(user=User.objects.create(username='benevole'), role='EMPLOYEE')
+        chart = ChartConfig.objects.create(title='Bénévoles', query_code=COUNT_CODE % 'Volunteer')
+        profile = profile_chart(chart)
+        self.assertEqual(profile.data['datasets'][0]['data'], [1])
+        self.assertEqual(profile.execution.query_count, 1)
+
+    def test_runaway_code_is_stopped(self):
+        loop = ChartConfig.objects.create(title='Boucle', query_code='while True:\n    pass', timeout_seconds=1)
+        started = time.monotonic()
+        self.assertIn('error', loop.compute_chart_data())
+        self.assertLess(time.monotonic() - started, 5)
+
+        memory = ChartConfig.objects.create(
+            title='Mémoire', query_code="data = ' ' * (200 * 1024 * 1024)", memory_limit_mb=50
+        )
+        self.assertEqual(memory.compute_chart_data()['error'], 'Limite mémoire dépassée (50 Mo)')
+
+    def test_row_limit_stops_large_reads(self):
+        Beneficiary.objects.bulk_create([Beneficiary(first_name=f'B{i}', last_name='Test') for i in range(5)])
+        chart = ChartConfig.objects.create(
+            title='Lignes', row_limit=3,
+            query_code="result = {'labels': [], 'datasets': [], 'rows': [b.pk for b in Beneficiary.objects.all()]}"
+        )
+        self.assertEqual(chart.compute_chart_data()['error'], 'Limite de 3 lignes lues dépassée')
+        chart.row_limit = 5
+        self.assertNotIn('error', chart.compute_chart_data())
+
+        # iterator() : curseur client, les lignes lues sont comptées aussi
+        iterated = ChartConfig.objects.create(
+            title='Itération', row_limit=3,
+            query_code="result = {'labels': [], 'datasets': [], 'rows': [b.pk for b in Beneficiary.objects.iterator(chunk_size=2)]}"
+        )
+        self.assertEqual(iterated.compute_chart_data()['error'], 'Limite de 3 lignes lues dépassée')
+
+
+class ChartExecutorTests(TestCase):
+    """Évaluation parallèle et bornée dans le temps (analysis.executor)"""
+
+    def test_slow_chart_times_out_without_blocking_the_others(self):
+        cache.clear()
+        slow = ChartConfig.objects.create(
+            title='Lent', query_code="result = {'labels': [], 'datasets': [], 'rows': list(Beneficiary.objects.raw('SELECT 1 AS id FROM pg_sleep(5)'))}"
+        )
+        fast = ChartConfig.objects.create(title='Rapide', query_code=COUNT_CODE % 'Volunteer')
+
+        started = time.monotonic()
+        results = evaluate_charts([slow, fast], max_workers=2, timeout=0.5)
+        self.assertLess(time.monotonic() - started, 2)
+
+        self.assertEqual(list(results), [slow.pk, fast.pk])
+        self.assertTrue(results[slow.pk].timed_out)
+        self.assertIn('Délai dépassé', results[slow.pk].data['error'])
+        self.assertFalse(results[fast.pk].timed_out)
+        self.assertEqual(results[fast.pk].data['datasets'][0]['data'], [0])
+
+    @override_settings(CHART_TIMEOUT_SECONDS=0.5)
+    def test_each_chart_gets_its_own_timeout(self):
+        cache.clear()
+        code = "result = {'labels': [], 'datasets': [], 'rows': [b.pk for b in Beneficiary.objects.raw('SELECT 1 AS id FROM pg_sleep(1)')]}"
+        patient = ChartConfig.objects.create(title='Patient', query_code=code, timeout_seconds=3)
+        default = ChartConfig.objects.create(title='Défaut', query_code=code)
+
+        results = evaluate_charts([patient, default], max_workers=2)
+
+        self.assertFalse(results[patient.pk].timed_out)
+        self.assertNotIn('error', results[patient.pk].data)
+        self.assertTrue(results[default.pk].timed_out)
+        self.assertEqual(results[default.pk].data['error'], 'Délai dépassé (0.5 s)')
+
+
+class ChartDataEndpointTests(TestCase):
+    """Chargement progressif : squelette du tableau de bord et données par graphique"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='admin_test', is_superuser=True)
+        self.chart = ChartConfig.objects.create(title='Bénévoles', query_code=COUNT_CODE % 'Volunteer')
+
+    def get(self, view, **kwargs):
+        headers = {key: kwargs.pop(key) for key in list(kwargs) if key.startswith('HTTP_')}
+        request = RequestFactory().get('/', **headers)
+        request.user = self.admin
+        return view(request, **kwargs)
+
+    def test_dashboard_renders_without_evaluating_charts(self):
+        ChartConfig.objects.create(title='Cassé', query_code='result = 1 / 0')
+        response = self.get(analysis_dashboard)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('analysis:chart_data', args=[self.chart.pk]))
+        self.assertIsNone(cache.get(self.chart.get_cache_key()))
+
+    def test_chart_data_is_revalidated_with_etag(self):
+        response = self.get(chart_data, pk=self.chart.pk)
+        self.assertEqual(response.status_code, 200)
+        payload = json.loads(response.content)
+        self.assertEqual(payload['data']['datasets'][0]['data'], [0])
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        not_modified = self.get(chart_data, pk=self.chart.pk, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Volunteer.objects.create(user=User.objects.create(username='nouveau'), role='EMPLOYEE')
+        self.assertEqual(self.get(chart_data, pk=self.chart.pk, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class ChartSpecTests(TestCase):
+    """Spécification déclarative compilée en une seule requête (analysis.chart_spec)"""
+
+    def setUp(self):
+        cache.clear()
+        self.today = date(2026, 3, 15)
+        for name, children, created, income in [
+            ('Ana', 0, datetime(2025, 12, 5), 1000),
+            ('Bea', 2, datetime(2026, 2, 10), 1500),
+            ('Cid', 4, datetime(2026, 3, 1), 800),
+        ]:
+            beneficiary = Beneficiary.objects.create(first_name=name, last_name='Test', dependents_count=children)
+            Beneficiary.objects.filter(pk=beneficiary.pk).update(created_at=timezone.make_aware(created))
+            snapshot = FinancialSnapshot.objects.create(beneficiary=beneficiary, salaire=income, loyer_residuel=200)
+            FinancialSnapshot.objects.filter(pk=snapshot.pk).update(date=timezone.make_aware(created))
+
+    def evaluate(self, spec):
+        with CaptureQueriesContext(connection) as queries:
+            data = evaluate_chart_spec(spec, today=self.today)
+        self.assertEqual(len(queries.captured_queries), 1)
+        return data
+
+    def test_monthly_average_split_into_series(self):
+        data = self.evaluate({
+            'model': 'FinancialSnapshot',
+            'dimension': {'field': 'date', 'bucket': 'month', 'months': 3},
+            'series': {
+                'cases': [
+                    {'label': 'Sans enfant', 'filter': {'beneficiary__dependents_count': 0}},
+                    {'label': '1-2 enfants', 'filter': {'beneficiary__dependents_count__lte': 2}},
+                ],
+                'default': '3+ enfants',
+            },
+            'measure': {'op': 'avg', 'fields': ['salaire'], 'subtract': ['loyer_residuel']},
+        })
+        self.assertEqual(len(data['labels']), 3)
+        self.assertEqual(
+            [(dataset['label'], dataset['data']) for dataset in data['datasets']],
+            [('Sans enfant', [0, 0, 0]), ('1-2 enfants', [0, 1300.0, 0]), ('3+ enfants', [0, 0, 600.0])]
+        )
+
+    def test_cumulative_count_and_field_labels(self):
+        data = self.evaluate({
+            'model': 'Beneficiary',
+            'dimension': {'field': 'created_at', 'bucket': 'month', 'months': 3, 'cumulative': True},
+        })
+        self.assertEqual(data['datasets'][0]['data'], [1, 2, 3])
+
+        data = self.evaluate({
+            'model': 'Beneficiary',
+            'dimension': {'field': 'family_status'},
+            'measure': {'op': 'count'},
+        })
+        self.assertEqual(data['labels'], ['Célibataire'])
+        self.assertEqual(data['datasets'][0]['data'], [3])
+
+    def test_chart_config_uses_the_spec(self):
+        chart = ChartConfig(title='Revenus', query_spec={
+            'model': 'FinancialSnapshot',
+            'measures': [{'op': 'sum', 'fields': ['salaire'], 'label': 'Salaires'}],
+        })
+        chart.full_clean()
+        chart.save()
+        self.assertEqual(chart.dependency_models, ['FinancialSnapshot'])
+        self.assertEqual(chart.get_chart_data(), {
+            'labels': ['Salaires'], 'datasets': [{'label': '', 'data': [3300.0]}]
+        })
+
+        chart.query_spec = {'model': 'FinancialSnapshot', 'dimension': {'field': 'inconnu'}}
+        with self.assertRaises(ValidationError):
+            chart.full_clean()
+        chart.query_spec = {'model': 'Partner'}
+        with self.assertRaises(ValidationError):
+            chart.full_clean()
+
+
+class MonthlyRollupTests(TestCase):
+    """Agrégats mensuels tenus à jour par signaux (analysis.rollups)"""
+
+    def rollup_values(self):
+        return (
+            list(BeneficiaryMonthlyRollup.objects.values_list('month', 'new_beneficiaries', 'active_beneficiaries')),
+            list(InteractionMonthlyRollup.objects.values_list('month', 'interaction_type', 'interaction_count')),
+            list(FinancialMonthlyRollup.objects.order_by('household').values_list(
+                'month', 'household', 'snapshot_count', 'total_income', 'total_charges'
+            )),
+        )
+
+    def test_signals_keep_rollups_in_sync_with_a_rebuild(self):
+        month = month_start(timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            beneficiary = Beneficiary.objects.create(first_name='Jeanne', last_name='Test')
+            Beneficiary.objects.create(first_name='Paul', last_name='Test', dependents_count=3)
+            Interaction.objects.create(beneficiary=beneficiary, interaction_type='PHONE', title='Appel')
+            Interaction.objects.create(beneficiary=beneficiary, interaction_type='PHONE', title='Rappel')
+            FinancialSnapshot.objects.create(beneficiary=beneficiary, salaire=1200, loyer_residuel=300)
+
+        beneficiaries, interactions, financial = self.rollup_values()
+        self.assertEqual(beneficiaries, [(month, 2, 1)])
+        self.assertEqual(interactions, [(month, 'PHONE', 2)])
+        self.assertEqual(financial, [(month, '0', 1, 1200, 300)])
+        self.assertEqual(FinancialMonthlyRollup.objects.get().average_reste_a_vivre, 900)
+
+        # Le foyer suit le nombre d'enfants à charge
+        with self.captureOnCommitCallbacks(execute=True):
+            beneficiary.dependents_count = 2
+            beneficiary.save()
+        self.assertEqual(FinancialMonthlyRollup.objects.get().household, '1-2')
+
+        snapshot = self.rollup_values()
+        rebuild_rollups()
+        self.assertEqual(self.rollup_values(), snapshot)
+
+        # Suppression en cascade
+        with self.captureOnCommitCallbacks(execute=True):
+            beneficiary.delete()
+        self.assertEqual(self.rollup_values(), ([(month, 1, 0)], [], []))
+
+    def test_home_evolution_reads_rollups(self):
+        today = date(2026, 3, 15)
+        BeneficiaryMonthlyRollup.objects.bulk_create([
+            BeneficiaryMonthlyRollup(month=date(2025, 6, 1), new_beneficiaries=4),
+            BeneficiaryMonthlyRollup(month=date(2026, 2, 1), new_beneficiaries=2),
+            BeneficiaryMonthlyRollup(month=date(2026, 3, 1), new_beneficiaries=1),
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            evolution = get_beneficiary_evolution(3, today)
+        self.assertEqual(len(queries.captured_queries), 2)
+        self.assertEqual(evolution, [(date(2026, 1, 1), 4), (date(2026, 2, 1), 6), (date(2026, 3, 1), 7)])
+
+
+class FinancialFrameTests(TestCase):
+    """Photos financières en tableaux NumPy (analysis.frames)"""
+
+    def setUp(self):
+        self.alice = Beneficiary.objects.create(first_name='Alice', last_name='Test', housing_status='CADA')
+        self.bruno = Beneficiary.objects.create(
+            first_name='Bruno', last_name='Test', housing_status='CADA', dependents_count=2
+        )
+        self.carla = Beneficiary.objects.create(first_name='Carla', last_name='Test', dependents_count=4)
+        old = FinancialSnapshot.objects.create(beneficiary=self.alice, salaire=500)
+        FinancialSnapshot.objects.filter(pk=old.pk).update(date=timezone.now() - timedelta(days=62))
+        self.snapshots = [
+            FinancialSnapshot.objects.create(beneficiary=self.alice, salaire=1200, apl=150, loyer_residuel=300),
+            FinancialSnapshot.objects.create(beneficiary=self.bruno, rsa_prime_activite=600, energie=90),
+            FinancialSnapshot.objects.create(beneficiary=self.carla, af=900, credit_consommation=300),
+        ]
+
+    def test_totals_match_the_model_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            frame = FinancialFrame.load(latest=True)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(len(FinancialFrame.load()), 4)
+
+        expected = {snapshot.beneficiary_id: snapshot for snapshot in self.snapshots}
+        for index, beneficiary_id in enumerate(frame.beneficiary_ids):
+            snapshot = expected[beneficiary_id]
+            self.assertAlmostEqual(frame.revenus[index], float(snapshot.total_revenus))
+            self.assertAlmostEqual(frame.charges[index], float(snapshot.total_charges))
+            # Colonne arrondie au centime par la base
+            self.assertAlmostEqual(frame.rav[index], float(snapshot.reste_a_vivre_journalier), delta=0.005)
+
+    def test_grouped_statistics(self):
+        frame = FinancialFrame.load(latest=True)
+        self.assertEqual(frame.stats('solde', by='housing_status', stats=('mean', 'median', 'max')), {
+            'labels': ['CADA', 'Non renseigné'],
+            'count': [2, 1],
+            'mean': [780.0, 600.0],
+            'median': [780.0, 600.0],
+            'max': [1050.0, 600.0],
+        })
+        self.assertEqual(frame.stats('revenus', by='household', stats=('p25',)), {
+            'labels': ['0 enfants', '1-2 enfants', '3+ enfants'], 'count': [1, 1, 1], 'p25': [1350.0, 600.0, 900.0],
+        })
+        self.assertEqual(
+            FinancialFrame.load().stats('revenus', stats=('median', 'p90')),
+            {'labels': ['Ensemble'], 'count': [4], 'median': [750.0], 'p90': [1215.0]}
+        )
+        self.assertEqual(FinancialFrame.load().stats('revenus', by='month')['count'][-1], 3)
+        with self.assertRaises(ValueError):
+            frame.stats('revenus', by='family_status')
+
+    def test_frame_is_available_to_chart_code(self):
+        chart = ChartConfig.objects.create(title='RAV', query_code="""
+stats = FinancialFrame.load(latest=True).stats('rav', by='dependents', stats=('mean',))
+result = {'labels': stats['labels'], 'datasets': [{'label': 'RAV', 'data': stats['mean']}]}
+""")
+        self.assertEqual(chart.dependency_models, ['Beneficiary', 'FinancialSnapshot'])
+        data = chart.get_chart_data(use_cache=False)
+        self.assertEqual(data['labels'], ['0', '2', '4'])
+        self.assertEqual(data['datasets'][0]['data'], [35.0, 17.0, 20.0])
+
+
+class ChartImageCacheTests(TestCase):
+    """Images PNG des exports : cache disque partagé et rendu en pool de processus"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        override = override_settings(CHART_IMAGE_CACHE_DIR=self.directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.bar = {
+            'chart_data': {'labels': ['A', 'B'], 'datasets': [{'label': 'Série', 'data': [1, 2]}]},
+            'chart_type': 'bar', 'title': 'Barres', 'size': 'full',
+        }
+        self.heatmap = {
+            'chart_data': {
+                'labels': ['Lundi', 'Mardi'],
+                'datasets': [{'label': 'Matin', 'data': [3, 0]}, {'label': 'Après-midi', 'data': [1, 5]}],
+            },
+            'chart_type': 'heatmap', 'title': 'Heatmap', 'size': 'half',
+        }
+
+    def cached_files(self):
+        return sorted(name for name in os.listdir(self.directory.name) if name.endswith('.png'))
+
+    def test_images_are_rendered_once_and_shared(self):
+        images = get_chart_images([self.bar, self.heatmap, self.bar], max_workers=2)
+        self.assertTrue(all(image.startswith(b'\x89PNG') for image in images))
+        self.assertEqual(images[0], images[2])
+        self.assertEqual(
+            self.cached_files(),
+            sorted(f'{chart_image_key(**item)}.png' for item in (self.bar, self.heatmap))
+        )
+
+        # Une image en cache est relue, pas redessinée
+        path = os.path.join(self.directory.name, f'{chart_image_key(**self.bar)}.png')
+        with open(path, 'wb') as image_file:
+            image_file.write(b'cached')
+        self.assertEqual(get_chart_images([self.bar])[0], b'cached')
+
+    def test_least_recently_used_images_are_evicted(self):
+        get_chart_images([self.bar, self.heatmap], max_workers=1)
+        bar_path = os.path.join(self.directory.name, f'{chart_image_key(**self.bar)}.png')
+        os.utime(bar_path, (0, 0))
+        evict_cached_images(max_bytes=os.path.getsize(bar_path) + 1)
+        self.assertEqual(self.cached_files(), [f'{chart_image_key(**self.heatmap)}.png'])
+
+    def test_pdf_export_fills_the_cache(self):
+        cache.clear()
+        ChartConfig.objects.create(title='Bénévoles', query_code=COUNT_CODE % 'Volunteer')
+        user = User.objects.create(username='admin_export', is_superuser=True)
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            job = run_export_job(ExportJob.objects.create(user=user, export_format='pdf'))
+            self.assertEqual(job.status, 'DONE')
+        self.assertEqual(len(self.cached_files()), 1)
+
+
+class ExportJobTests(TestCase):
+    """Exports PDF / PowerPoint construits en arrière-plan par run_export_worker"""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        images = tempfile.TemporaryDirectory()
+        self.addCleanup(images.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name, CHART_IMAGE_CACHE_DIR=images.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        ChartConfig.objects.create(title='Bénévoles', query_code=COUNT_CODE % 'Volunteer')
+        self.user = User.objects.create(username='admin_export', is_superuser=True)
+        self.factory = RequestFactory()
+
+    def request(self, method, path, user=None, **extra):
+        request = getattr(self.factory, method)(path, **extra)
+        request.user = user or self.user
+        return request
+
+    def test_export_request_returns_the_job_immediately(self):
+        response = export_start(self.request('post', '/', HTTP_HX_REQUEST='true'), export_format='pptx')
+        job = ExportJob.objects.get()
+        self.assertEqual((job.status, job.export_format, job.user), ('PENDING', 'pptx', self.user))
+        content = response.content.decode()
+        self.assertIn(reverse('analysis:export_job_status', args=[job.pk]), content)
+        self.assertIn('hx-trigger="every 2s"', content)
+
+    def test_worker_builds_the_file_and_serves_it_to_its_owner(self):
+        job = ExportJob.objects.create(user=self.user, export_format='pptx')
+        call_command('run_export_worker', '--once', stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), ('DONE', 100))
+        self.assertTrue(job.file.name.startswith(f'exports/{job.pk.hex}/'))
+        self.assertGreater(job.expires_at, timezone.now() + timedelta(days=6))
+
+        status = export_job_status(self.request('get', '/'), pk=job.pk)
+        self.assertIn(reverse('analysis:export_job_download', args=[job.pk]), status.content.decode())
+        self.assertNotIn('hx-trigger', status.content.decode())
+
+        response = export_job_download(self.request('get', '/'), pk=job.pk)
+        self.assertIn('analyses_rosa_', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+        response.file_to_stream.close()
+
+        # Export d'un autre utilisateur : introuvable
+        other = User.objects.create(username='other_export')
+        Volunteer.objects.create(user=other, role='EMPLOYEE')
+        with self.assertRaises(Http404):
+            export_job_download(self.request('get', '/', user=other), pk=job.pk)
+
+    def test_expired_exports_are_purged_and_abandoned_ones_failed(self):
+        ExportJob.objects.create(user=self.user, export_format='pdf')
+        job = run_export_job(ExportJob.claim_next())
+        path = job.file.path
+        self.assertTrue(os.path.exists(path))
+        stale = ExportJob.objects.create(user=self.user, export_format='pdf', status='RUNNING',
+                                         started_at=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(purge_export_jobs(), (0, 1))
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'FAILED')
+
+        self.assertEqual(purge_export_jobs(now=job.expires_at + timedelta(minutes=1)), (2, 0))
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ExportJob.objects.exists())
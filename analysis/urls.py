@@ -8,6 +8,9 @@ app_name = 'analysis'
 
 urlpatterns = [
     path('', views.analysis_dashboard, name='dashboard'),
-    path('export/pdf/', views.export_pdf, name='export_pdf'),
-    path('export/ppt/', views.export_ppt, name='export_ppt'),
+    path('chart/<int:pk>/data/', views.chart_data, name='chart_data'),
+    path('export/pdf/', views.export_start, {'export_format': 'pdf'}, name='export_pdf'),
+    path('export/ppt/', views.export_start, {'export_format': 'pptx'}, name='export_ppt'),
+    path('export/<uuid:pk>/', views.export_job_status, name='export_job_status'),
+    path('export/<uuid:pk>/download/', views.export_job_download, name='export_job_download'),
 ]
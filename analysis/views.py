@@ -1,27 +1,19 @@
 """
 Vues pour l'application d'analyse
 """
-import json
-import io
+import hashlib
+import time
 from decimal import Decimal
-from datetime import datetime
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib import messages
+from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden, HttpResponse
-from .models import ChartConfig
-
-# Imports pour les exports
-from reportlab.lib.pagesizes import A4, letter
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from pptx import Presentation
-from pptx.util import Inches, Pt
-import matplotlib
-matplotlib.use('Agg')  # Backend sans interface graphique
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
+from django.http import FileResponse, Http404, HttpResponseForbidden, JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_POST
+from .executor import evaluate_charts
+from .models import ChartConfig, ExportJob
 
 
 def convert_decimals(obj):
@@ -64,13 +56,12 @@ def analysis_dashboard(request):
         )
 
     # Récupérer tous les graphiques actifs groupés par section
+    # Les données sont chargées ensuite, graphique par graphique (chart_data)
     charts = ChartConfig.objects.filter(is_active=True).order_by('section', 'display_order', 'title')
 
     # Grouper par section
     sections_data = {}
     for chart in charts:
-        data = chart.get_chart_data()
-
         chart_info = {
             'id': chart.id,
             'title': chart.title,
@@ -79,13 +70,8 @@ def analysis_dashboard(request):
             'size': chart.size,
             'y_axis_label': chart.y_axis_label,
             'x_axis_label': chart.x_axis_label,
-            'data_json': json.dumps(convert_decimals(data)),
-            'has_error': 'error' in data
         }
 
-        if 'error' in data:
-            chart_info['error_message'] = data['error']
-
         # Grouper par section
         section_key = chart.section
         section_label = chart.get_section_display()
@@ -108,228 +94,99 @@ def analysis_dashboard(request):
     context = {
         'sections': ordered_sections,
         'can_export': True,  # Pour activer les boutons d'export plus tard
+        'export_jobs': _user_export_jobs(request.user),
     }
 
     return render(request, 'analysis/dashboard.html', context)
 
 
-def generate_chart_image(chart_data, chart_type, title):
-    """Génère une image PNG d'un graphique à partir des données Chart.js"""
-    fig, ax = plt.subplots(figsize=(10, 6))
+@login_required
+def chart_data(request, pk):
+    """
+    Données JSON d'un graphique, chargées par le tableau de bord quand la
+    carte devient visible.
 
-    try:
-        datasets = chart_data.get('datasets', [])
-        labels = chart_data.get('labels', [])
-
-        if chart_type in ['pie', 'doughnut']:
-            # Graphique circulaire
-            if datasets and datasets[0].get('data'):
-                data = datasets[0]['data']
-                colors = datasets[0].get('backgroundColor', [])
-                ax.pie(data, labels=labels, autopct='%1.1f%%', colors=colors, startangle=90)
-                ax.axis('equal')
-
-        elif chart_type == 'bar':
-            # Graphique à barres
-            x = range(len(labels))
-            width = 0.8 / len(datasets) if len(datasets) > 1 else 0.6
-
-            for i, dataset in enumerate(datasets):
-                offset = (i - len(datasets) / 2) * width + width / 2
-                bars = ax.bar([p + offset for p in x], dataset['data'], width,
-                             label=dataset.get('label', f'Série {i+1}'),
-                             color=dataset.get('backgroundColor', None))
-
-            ax.set_xticks(x)
-            ax.set_xticklabels(labels, rotation=45, ha='right')
-            ax.legend()
-            ax.grid(axis='y', alpha=0.3)
-
-        elif chart_type == 'line':
-            # Graphique en courbes
-            for dataset in datasets:
-                ax.plot(labels, dataset['data'],
-                       label=dataset.get('label', ''),
-                       marker='o',
-                       color=dataset.get('borderColor', None))
-
-            ax.legend()
-            ax.grid(True, alpha=0.3)
-            plt.xticks(rotation=45, ha='right')
-
-        elif chart_type == 'stacked_bar':
-            # Graphique à barres empilées
-            bottom = [0] * len(labels)
-            for dataset in datasets:
-                ax.bar(labels, dataset['data'], label=dataset.get('label', ''),
-                      bottom=bottom, color=dataset.get('backgroundColor', None))
-                bottom = [b + d for b, d in zip(bottom, dataset['data'])]
-
-            ax.legend()
-            ax.grid(axis='y', alpha=0.3)
-            plt.xticks(rotation=45, ha='right')
-
-        ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
-        plt.tight_layout()
-
-        # Sauvegarder en buffer
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
-        buffer.seek(0)
-        plt.close(fig)
-
-        return buffer
-
-    except Exception as e:
-        plt.close(fig)
-        print(f"Error generating chart image: {e}")
-        return None
+    L'ETag dérive de la clé de cache du résultat (graphique, dépendances) et
+    de la fenêtre CHART_CACHE_TIMEOUT en cours : il est calculé sans évaluer
+    le graphique, une revisite répond 304. Cache-Control autorise le
+    navigateur à réutiliser la réponse pendant CHART_DATA_MAX_AGE secondes.
+    """
+    if not user_can_access_analysis(request.user):
+        return HttpResponseForbidden("Vous n'avez pas les permissions nécessaires.")
+
+    chart = get_object_or_404(ChartConfig, pk=pk, is_active=True)
+
+    cache_window = int(time.time() // getattr(settings, 'CHART_CACHE_TIMEOUT', 900))
+    etag = '"%s"' % hashlib.sha256(f'{chart.get_cache_key()}:{cache_window}'.encode()).hexdigest()[:32]
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        result = evaluate_charts([chart])[chart.pk]
+        response = JsonResponse({
+            'id': chart.pk,
+            'data': convert_decimals(result.data),
+            'duration_ms': round(result.duration * 1000),
+            'timed_out': result.timed_out,
+        })
+        response['Server-Timing'] = f'chart;dur={result.duration * 1000:.1f}'
+        if 'error' in result.data:
+            # Erreur ou délai dépassé : ne pas la garder côté navigateur
+            patch_cache_control(response, no_store=True)
+            return response
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=getattr(settings, 'CHART_DATA_MAX_AGE', 60))
+    return response
+
+
+def _user_export_jobs(user):
+    """Exports récents et non expirés de l'utilisateur"""
+    return ExportJob.objects.filter(user=user).exclude(expires_at__lte=timezone.now())[:5]
 
 
 @login_required
-def export_pdf(request):
-    """Export PDF des analyses"""
+@require_POST
+def export_start(request, export_format):
+    """
+    Demande d'export PDF / PowerPoint : crée le job et rend aussitôt la main.
+    Le document est construit par la commande run_export_worker ; la réponse
+    HTMX est le panneau de suivi du job (polling de export_job_status).
+    """
     if not user_can_access_analysis(request.user):
         return HttpResponseForbidden("Vous n'avez pas les permissions nécessaires.")
 
-    # Créer le PDF en mémoire
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    story = []
-    styles = getSampleStyleSheet()
-
-    # Style personnalisé pour le titre
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor='#1f2937',
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-
-    # Page de titre
-    story.append(Paragraph("Analyses & Indicateurs", title_style))
-    story.append(Paragraph(f"rosa - {datetime.now().strftime('%d/%m/%Y')}", styles['Normal']))
-    story.append(Spacer(1, 0.5*inch))
-
-    # Récupérer les graphiques
-    charts = ChartConfig.objects.filter(is_active=True).order_by('section', 'display_order')
-
-    current_section = None
-    for chart in charts:
-        # Nouvelle section
-        if chart.section != current_section:
-            if current_section is not None:
-                story.append(PageBreak())
-            story.append(Paragraph(chart.get_section_display(), styles['Heading1']))
-            story.append(Spacer(1, 0.2*inch))
-            current_section = chart.section
-
-        # Titre du graphique
-        story.append(Paragraph(chart.title, styles['Heading2']))
-        if chart.description:
-            story.append(Paragraph(chart.description, styles['Normal']))
-        story.append(Spacer(1, 0.1*inch))
-
-        # Générer et ajouter l'image du graphique
-        data = chart.get_chart_data()
-        if 'error' not in data:
-            img_buffer = generate_chart_image(data, chart.chart_type, chart.title)
-            if img_buffer:
-                img = Image(img_buffer, width=6*inch, height=3.6*inch)
-                story.append(img)
-        else:
-            story.append(Paragraph(f"Erreur: {data['error']}", styles['Normal']))
-
-        story.append(Spacer(1, 0.3*inch))
-
-    # Construire le PDF
-    doc.build(story)
-    buffer.seek(0)
-
-    # Retourner la réponse
-    response = HttpResponse(buffer.read(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="analyses_rosa_{datetime.now().strftime("%Y%m%d")}.pdf"'
-    return response
+    job = ExportJob.objects.create(user=request.user, export_format=export_format)
+
+    if request.headers.get('HX-Request'):
+        return render(request, 'analysis/partials/export_job.html', {'job': job})
+    messages.info(request, "Export demandé : le fichier sera disponible dans quelques instants.")
+    return redirect('analysis:dashboard')
+
+
+def _get_user_job(request, pk):
+    """Job de l'utilisateur (tous les jobs pour un superutilisateur)"""
+    jobs = ExportJob.objects.all() if request.user.is_superuser else ExportJob.objects.filter(user=request.user)
+    return get_object_or_404(jobs, pk=pk)
 
 
 @login_required
-def export_ppt(request):
-    """Export PowerPoint des analyses"""
+def export_job_status(request, pk):
+    """Panneau de suivi d'un export, rechargé par HTMX tant qu'il n'est pas terminé"""
     if not user_can_access_analysis(request.user):
         return HttpResponseForbidden("Vous n'avez pas les permissions nécessaires.")
 
-    # Créer la présentation
-    prs = Presentation()
-    prs.slide_width = Inches(10)
-    prs.slide_height = Inches(7.5)
+    job = _get_user_job(request, pk)
+    response = render(request, 'analysis/partials/export_job.html', {'job': job})
+    patch_cache_control(response, no_store=True)
+    return response
 
-    # Slide de titre
-    title_slide_layout = prs.slide_layouts[0]
-    slide = prs.slides.add_slide(title_slide_layout)
-    title = slide.shapes.title
-    subtitle = slide.placeholders[1]
-    title.text = "Analyses & Indicateurs"
-    subtitle.text = f"rosa - {datetime.now().strftime('%d/%m/%Y')}"
 
-    # Récupérer les graphiques
-    charts = ChartConfig.objects.filter(is_active=True).order_by('section', 'display_order')
+@login_required
+def export_job_download(request, pk):
+    """Téléchargement du fichier d'un export terminé et non expiré"""
+    if not user_can_access_analysis(request.user):
+        return HttpResponseForbidden("Vous n'avez pas les permissions nécessaires.")
 
-    current_section = None
-    for chart in charts:
-        # Slide de section
-        if chart.section != current_section:
-            section_slide = prs.slides.add_slide(prs.slide_layouts[5])  # Blank layout
-            txBox = section_slide.shapes.add_textbox(Inches(1), Inches(3), Inches(8), Inches(1))
-            tf = txBox.text_frame
-            tf.text = chart.get_section_display()
-            p = tf.paragraphs[0]
-            p.font.size = Pt(44)
-            p.font.bold = True
-            current_section = chart.section
-
-        # Slide avec graphique
-        blank_slide_layout = prs.slide_layouts[5]  # Blank
-        slide = prs.slides.add_slide(blank_slide_layout)
-
-        # Titre
-        txBox = slide.shapes.add_textbox(Inches(0.5), Inches(0.3), Inches(9), Inches(0.6))
-        tf = txBox.text_frame
-        tf.text = chart.title
-        p = tf.paragraphs[0]
-        p.font.size = Pt(28)
-        p.font.bold = True
-
-        # Description
-        if chart.description:
-            txBox = slide.shapes.add_textbox(Inches(0.5), Inches(0.9), Inches(9), Inches(0.4))
-            tf = txBox.text_frame
-            tf.text = chart.description
-            p = tf.paragraphs[0]
-            p.font.size = Pt(14)
-
-        # Graphique
-        data = chart.get_chart_data()
-        if 'error' not in data:
-            img_buffer = generate_chart_image(data, chart.chart_type, chart.title)
-            if img_buffer:
-                pic = slide.shapes.add_picture(img_buffer, Inches(1), Inches(1.5),
-                                              width=Inches(8), height=Inches(5))
-        else:
-            # Afficher l'erreur
-            txBox = slide.shapes.add_textbox(Inches(2), Inches(3), Inches(6), Inches(1))
-            tf = txBox.text_frame
-            tf.text = f"Erreur: {data['error']}"
-            p = tf.paragraphs[0]
-            p.font.size = Pt(16)
-
-    # Sauvegarder en mémoire
-    buffer = io.BytesIO()
-    prs.save(buffer)
-    buffer.seek(0)
-
-    # Retourner la réponse
-    response = HttpResponse(buffer.read(), content_type='application/vnd.openxmlformats-officedocument.presentationml.presentation')
-    response['Content-Disposition'] = f'attachment; filename="analyses_rosa_{datetime.now().strftime("%Y%m%d")}.pptx"'
-    return response
+    job = _get_user_job(request, pk)
+    if not job.is_downloadable:
+        raise Http404("Export indisponible ou expiré")
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.download_name)
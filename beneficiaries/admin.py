@@ -1,13 +1,29 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from rosa.pagination import EstimatedCountPaginator
 from .models import Beneficiary, FinancialSnapshot, Child, Interaction, Document
+from .search import search_beneficiaries
+
+
+class BeneficiaryChangeList(ChangeList):
+    """Résultats d'une recherche classés par pertinence, sauf tri explicite d'une colonne"""
+
+    def get_ordering(self, request, queryset):
+        if self.query and ORDER_VAR not in self.params:
+            return self._get_deterministic_ordering(list(queryset.query.order_by))
+        return super().get_ordering(request, queryset)
 
 
 @admin.register(Beneficiary)
 class BeneficiaryAdmin(admin.ModelAdmin):
     list_display = ['full_name', 'civility', 'birth_date', 'phone', 'email', 'family_status', 'preferred_contact', 'created_at']
     list_filter = ['civility', 'family_status', 'housing_status', 'created_at']
+    # Champs du document de recherche trigramme (voir get_search_results)
     search_fields = ['first_name', 'last_name', 'email', 'phone']
     ordering = ['last_name', 'first_name']
+    # Grandes tables : pas de COUNT(*) de la table entière à chaque page
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Informations personnelles', {
@@ -21,14 +37,41 @@ class BeneficiaryAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_changelist(self, request, **kwargs):
+        return BeneficiaryChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        # Même moteur que la liste et l'autocomplétion (index trigramme, sans accents)
+        return search_beneficiaries(queryset, search_term), False
+
+
+class SoldeNetFilter(admin.SimpleListFilter):
+    """Photos en solde négatif ou positif (colonne solde_net indexée)"""
+    title = 'solde net'
+    parameter_name = 'solde'
+
+    def lookups(self, request, model_admin):
+        return [('negatif', 'Négatif'), ('positif', 'Positif ou nul')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'negatif':
+            return queryset.filter(solde_net__lt=0)
+        if self.value() == 'positif':
+            return queryset.filter(solde_net__gte=0)
+        return queryset
+
 
 @admin.register(FinancialSnapshot)
 class FinancialSnapshotAdmin(admin.ModelAdmin):
-    list_display = ['beneficiary', 'date', 'total_revenus', 'total_charges', 'solde_net']
-    list_filter = ['date', 'beneficiary__family_status']
+    # Totaux calculés par la base : colonnes triables
+    list_display = ['beneficiary', 'date', 'total_revenus', 'total_charges', 'solde_net', 'reste_a_vivre_journalier']
+    list_filter = ['date', SoldeNetFilter, 'beneficiary__family_status']
     search_fields = ['beneficiary__first_name', 'beneficiary__last_name']
     ordering = ['-date']
     readonly_fields = ['date']
+    # Grandes tables : pas de COUNT(*) de la table entière à chaque page
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Informations générales', {
@@ -80,6 +123,9 @@ class Interactirosadmin(admin.ModelAdmin):
     search_fields = ('title', 'description', 'beneficiary__first_name', 'beneficiary__last_name')
     ordering = ('-created_at',)
     readonly_fields = ('created_at', 'updated_at')
+    # Grandes tables : pas de COUNT(*) de la table entière à chaque page
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Informations principales', {
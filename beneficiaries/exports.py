@@ -0,0 +1,428 @@
+"""
+Exports en masse des bénéficiaires, interactions et photos financières.
+
+Les lignes sont lues par lots (QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+curseur serveur PostgreSQL) et écrites au fil de l'eau en CSV ou en XLSX :
+la mémoire reste la même quel que soit le nombre de lignes, et l'en-tête
+part avant même que la requête ne commence. Le XLSX est écrit directement
+(SpreadsheetML minimal dans un zip non positionnable, chaînes en ligne) : pas
+de fichier temporaire ni de table des chaînes partagées à construire d'abord.
+
+Sert à la vue ExportDownloadView (StreamingHttpResponse) et à la commande
+export_data.
+"""
+import csv
+import datetime
+import io
+import re
+import zipfile
+from contextlib import closing
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, DateTimeField
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Beneficiary, FinancialSnapshot, Interaction
+
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class ExportDataset:
+    """
+    Table exportable : colonnes proposées (chemins ORM, relations comprises)
+    et champ daté sur lequel portent les filtres de période.
+    """
+
+    def __init__(self, name, model, date_field, columns, title):
+        self.name = name
+        self.model = model
+        self.date_field = date_field
+        self.column_paths = tuple(columns)
+        self.title = title
+
+    def _field(self, path):
+        model, labels = self.model, []
+        for part in path.split('__'):
+            field = model._meta.get_field(part)
+            labels.append(str(field.verbose_name))
+            model = field.related_model
+        return field, labels
+
+    @property
+    def columns(self):
+        """{chemin: libellé} des colonnes proposées, dans l'ordre de l'export"""
+        columns = {}
+        for path in self.column_paths:
+            _, labels = self._field(path)
+            columns[path] = ' - '.join(labels)
+        return columns
+
+    def get_queryset(self, date_from=None, date_to=None):
+        """Lignes de la période (bornes incluses, jours du fuseau local), par clé croissante"""
+        queryset = self.model._default_manager.order_by('pk')
+        end_lookup = 'lte'
+        if isinstance(self.model._meta.get_field(self.date_field), DateTimeField):
+            # Bornes en datetime plutôt que __date : l'index du champ reste utilisable
+            date_from = date_from and _start_of_day(date_from)
+            date_to = date_to and _start_of_day(date_to + datetime.timedelta(days=1))
+            end_lookup = 'lt'
+        if date_from:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': date_from})
+        if date_to:
+            queryset = queryset.filter(**{f'{self.date_field}__{end_lookup}': date_to})
+        return queryset
+
+    def iter_rows(self, columns, date_from=None, date_to=None, chunk_size=None):
+        """
+        Lignes (listes de valeurs) des colonnes `columns` : libellés des choix,
+        dates et heures en heure locale. Générateur : rien n'est lu avant la
+        première ligne demandée.
+        """
+        chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+        # Conversions des seules colonnes qui en ont besoin (choix, dates et heures)
+        converters = [
+            (index, converter) for index, converter in enumerate(self._converter(path) for path in columns)
+            if converter is not None
+        ]
+        queryset = self.get_queryset(date_from, date_to).values_list(*columns)
+        # Dans une transaction, le curseur serveur n'est pas déclaré WITH HOLD :
+        # PostgreSQL envoie les lots au fil du parcours au lieu de matérialiser le résultat
+        with transaction.atomic(using=queryset.db):
+            for row in queryset.iterator(chunk_size=chunk_size):
+                row = list(row)
+                for index, convert in converters:
+                    if row[index] is not None:
+                        row[index] = convert(row[index])
+                yield row
+
+    def field_types(self, columns):
+        """Champ de modèle de chaque colonne"""
+        return [self._field(path)[0] for path in columns]
+
+    def _converter(self, path):
+        field, _ = self._field(path)
+        if field.choices:
+            choices = {key: str(label) for key, label in field.flatchoices if key != ''}
+            return lambda value: choices.get(value, value)
+        if isinstance(field, DateTimeField):
+            # Fuseau lu une fois : timezone.make_naive() le chercherait pour chaque valeur
+            local_timezone = timezone.get_current_timezone()
+            return lambda value: value.astimezone(local_timezone).replace(tzinfo=None)
+        return None
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+DATASETS = {
+    dataset.name: dataset for dataset in [
+        ExportDataset(
+            'beneficiaries', Beneficiary, 'created_at', title='Bénéficiaires', columns=[
+                'id', 'file_number', 'first_entry_date', 'civility', 'last_name', 'first_name', 'birth_date',
+                'nationality', 'phone', 'email', 'address', 'residence_address', 'occupation',
+                'housing_status', 'family_status', 'dependents_count', 'referral_source', 'profile_tag',
+                'alert_level', 'solde_net', 'reste_a_vivre_journalier', 'created_at',
+            ],
+        ),
+        ExportDataset(
+            'interactions', Interaction, 'created_at', title='Interactions', columns=[
+                'id', 'beneficiary__id', 'beneficiary__last_name', 'beneficiary__first_name', 'created_at',
+                'interaction_type', 'title', 'description', 'primary_need', 'financial_aid_amount',
+                'financial_aid_details', 'follow_up_required', 'follow_up_date', 'user__username',
+            ],
+        ),
+        ExportDataset(
+            'snapshots', FinancialSnapshot, 'date', title='Photos financières', columns=[
+                'id', 'beneficiary__id', 'beneficiary__last_name', 'beneficiary__first_name', 'date',
+                *FinancialSnapshot.REVENUE_FIELDS, *FinancialSnapshot.CHARGE_FIELDS,
+                'total_revenus', 'total_charges', 'solde_net', 'reste_a_vivre_journalier',
+            ],
+        ),
+    ]
+}
+
+
+class Export:
+    """Export demandé : table, colonnes, format et période, validés"""
+
+    def __init__(self, dataset, columns=None, export_format='csv', date_from=None, date_to=None):
+        if dataset not in DATASETS:
+            raise ValueError(f"Export inconnu : {dataset} ({', '.join(DATASETS)})")
+        if export_format not in FORMATS:
+            raise ValueError(f"Format inconnu : {export_format} ({', '.join(FORMATS)})")
+        self.dataset = DATASETS[dataset]
+        self.format = export_format
+
+        available = self.dataset.columns
+        # Colonnes en liste ou séparées par des virgules ; toutes par défaut
+        columns = [name.strip() for item in (columns or []) for name in item.split(',') if name.strip()]
+        unknown = [name for name in columns if name not in available]
+        if unknown:
+            raise ValueError(f"Colonne(s) inconnue(s) : {', '.join(unknown)}")
+        self.columns = columns or list(available)
+        self.labels = [available[name] for name in self.columns]
+
+        self.date_from = self._parse_date(date_from, 'de début')
+        self.date_to = self._parse_date(date_to, 'de fin')
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise ValueError("La date de début est postérieure à la date de fin")
+
+    @staticmethod
+    def _parse_date(value, label):
+        if not value or isinstance(value, datetime.date):
+            return value or None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValueError(f"Date {label} invalide : {value} (AAAA-MM-JJ)")
+        return day
+
+    @property
+    def content_type(self):
+        return FORMATS[self.format]
+
+    @property
+    def filename(self):
+        period = '_'.join(str(day) for day in (self.date_from, self.date_to) if day) or str(timezone.localdate())
+        return f'{self.dataset.name}_{period}.{self.format}'
+
+    def stream(self, chunk_size=None):
+        """Contenu du fichier, en morceaux d'octets"""
+        rows = self.dataset.iter_rows(self.columns, self.date_from, self.date_to, chunk_size)
+        if self.format == 'xlsx':
+            return xlsx_stream(self.labels, rows, sheet_name=self.dataset.title)
+        return csv_stream(self.labels, rows, formatters={
+            index: CSV_FORMATTERS[type(field)]
+            for index, field in enumerate(self.dataset.field_types(self.columns)) if type(field) in CSV_FORMATTERS
+        })
+
+
+# Lignes écrites entre deux morceaux envoyés
+STREAM_BATCH_ROWS = 500
+
+
+# Valeurs dont la forme CSV n'est pas celle de str() ; None est écrit vide par le module csv
+CSV_FORMATTERS = {
+    BooleanField: lambda value: 'Oui' if value else 'Non',
+    DateTimeField: lambda value: value.isoformat(sep=' ', timespec='seconds'),
+}
+
+
+# Débuts de texte qu'un tableur ouvrant le CSV interpréterait comme une formule
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_text(value):
+    """Neutralise une saisie libre commençant comme une formule (préfixe ')"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_stream(headers, rows, formatters=None):
+    """
+    CSV UTF-8 avec BOM (accents lus correctement par Excel), en morceaux
+    d'octets. formatters : {index de colonne: fonction} appliquées aux valeurs non nulles.
+    Les textes pouvant être pris pour une formule sont préfixés d'une apostrophe.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    formatters = list((formatters or {}).items())
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    yield drain()
+    with closing(rows):
+        for count, row in enumerate(rows, 1):
+            for index, formatter in formatters:
+                if row[index] is not None:
+                    row[index] = formatter(row[index])
+            writer.writerow([_csv_text(value) for value in row])
+            if count % STREAM_BATCH_ROWS == 0:
+                yield drain()
+    yield drain()
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Fichier non positionnable qui accumule ce que zipfile y écrit jusqu'au prochain envoi"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Styles de cellule : 0 standard, 1 date, 2 date et heure, 3 en-tête en gras
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="dd/mm/yyyy hh:mm"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    # Ligne d'en-tête figée
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews>'
+    '<sheetData>'
+)
+
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+# Caractères interdits en XML 1.0 (ils rendraient le classeur illisible)
+XML_ILLEGAL_CHARACTERS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(reference, value, header=False):
+    if value is None or value == '':
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    if isinstance(value, datetime.datetime):
+        serial = (value - EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c r="{reference}" s="2"><v>{serial:.6f}</v></c>'
+    if isinstance(value, datetime.date):
+        return f'<c r="{reference}" s="1"><v>{(value - EXCEL_EPOCH.date()).days}</v></c>'
+    # Chaîne en ligne : jamais évaluée comme formule, quel que soit son premier caractère
+    text = escape(XML_ILLEGAL_CHARACTERS.sub('', str(value)))
+    style = ' s="3"' if header else ''
+    return f'<c r="{reference}"{style} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(number, letters, values, header=False):
+    cells = ''.join(
+        _xlsx_cell(f'{letter}{number}', value, header) for letter, value in zip(letters, values)
+    )
+    return f'<row r="{number}">{cells}</row>'.encode('utf-8')
+
+
+def xlsx_stream(headers, rows, sheet_name='Export'):
+    """
+    Classeur XLSX d'une feuille, en morceaux d'octets : le zip est écrit au
+    fil des lignes (descripteurs de données après chaque fichier, pas de
+    retour en arrière), ce qui garde la mémoire constante.
+    """
+    buffer = _StreamBuffer()
+    letters = [_column_letter(index) for index in range(len(headers))]
+    sheet_name = escape(XML_ILLEGAL_CHARACTERS.sub('', sheet_name), {'"': '&quot;'})[:31]
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(sheet_name=sheet_name))
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', XLSX_STYLES)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(XLSX_SHEET_START.encode('utf-8'))
+            sheet.write(_xlsx_row(1, letters, headers, header=True))
+            yield buffer.drain()
+            batch = []
+            with closing(rows):
+                for number, row in enumerate(rows, 2):
+                    batch.append(_xlsx_row(number, letters, row))
+                    if len(batch) == STREAM_BATCH_ROWS:
+                        sheet.write(b''.join(batch))
+                        batch.clear()
+                        yield buffer.drain()
+            batch.append(XLSX_SHEET_END.encode('utf-8'))
+            sheet.write(b''.join(batch))
+    yield buffer.drain()
@@ -0,0 +1,130 @@
+"""
+Commande Django pour mesurer la recherche de bénéficiaires.
+
+Crée des bénéficiaires synthétiques (noms français accentués), puis compare
+pour quelques recherches typiques l'ancien filtre icontains et la recherche
+trigramme (beneficiaries/search.py) : nombre de résultats, temps d'une page
+de liste (comptage + 20 premiers résultats) et utilisation de l'index
+beneficiary_search_trgm. Toutes les données créées sont annulées à la fin.
+
+Usage: python manage.py benchmark_beneficiary_search [--beneficiaries 100000] [--repeat 5]
+"""
+
+import random
+import statistics
+import time
+import unicodedata
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from faker import Faker
+
+from beneficiaries.models import Beneficiary
+from beneficiaries.search import search_beneficiaries
+
+
+def legacy_search(queryset, query):
+    """Recherche d'origine de la liste et de l'autocomplétion"""
+    return queryset.filter(
+        Q(first_name__icontains=query) |
+        Q(last_name__icontains=query) |
+        Q(email__icontains=query)
+    )
+
+
+def strip_accents(text):
+    return ''.join(
+        char for char in unicodedata.normalize('NFD', text) if unicodedata.category(char) != 'Mn'
+    )
+
+
+def create_synthetic_beneficiaries(count, batch_size=5000):
+    """Crée `count` bénéficiaires aux noms, emails et téléphones réalistes"""
+    fake = Faker('fr_FR')
+    fake.seed_instance(count)
+    for start in range(0, count, batch_size):
+        Beneficiary.objects.bulk_create([
+            Beneficiary(
+                first_name=fake.first_name(),
+                last_name=fake.last_name(),
+                email=fake.email() if index % 3 else '',
+                phone=fake.phone_number()[:20],
+            )
+            for index in range(start, min(start + batch_size, count))
+        ])
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {Beneficiary._meta.db_table}')
+
+
+def sample_queries(rng):
+    """Recherches typiques, construites à partir de bénéficiaires existants"""
+    accented = Beneficiary.objects.filter(Q(first_name__regex='[éèëïç]') | Q(last_name__regex='[éèëïç]'))
+    accented = accented.order_by('?').first() or Beneficiary.objects.order_by('?').first()
+    person = Beneficiary.objects.exclude(email='').order_by('?').first()
+    last_name = person.last_name.split()[-1]
+    typo_position = rng.randrange(1, len(last_name))
+    return [
+        ('Nom sans accent', strip_accents(accented.last_name).lower()),
+        ('Prénom sans accent', strip_accents(accented.first_name).lower()),
+        ('Prénom et nom', f'{person.first_name} {person.last_name}'),
+        ('Faute de frappe', last_name[:typo_position] + last_name[typo_position + 1:]),
+        ('Fragment d\'email', person.email.split('@')[0][:6]),
+        ('Deux lettres', last_name[:2]),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compare la recherche icontains et la recherche trigramme des bénéficiaires'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--beneficiaries',
+            type=int,
+            default=100000,
+            help='Nombre de bénéficiaires synthétiques (défaut: 100000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Nombre de mesures par recherche (défaut: 5)',
+        )
+
+    def measure(self, queryset, repeat):
+        """Médiane (ms) d'une page de liste : comptage puis 20 premiers résultats"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            count = queryset.count()
+            list(queryset[:20])
+            timings.append(time.perf_counter() - started)
+        return count, statistics.median(timings) * 1000
+
+    def handle(self, *args, **options):
+        count = options['beneficiaries']
+        self.stdout.write(f'🏗️  Création de {count} bénéficiaires synthétiques...')
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            create_synthetic_beneficiaries(count)
+            self.stdout.write(f'   Créés en {time.perf_counter() - started:.1f}s')
+
+            self.stdout.write(f'📊 Recherche de bénéficiaires - {Beneficiary.objects.count()} fiches')
+            for label, query in sample_queries(random.Random(count)):
+                legacy = legacy_search(Beneficiary.objects.all(), query)
+                trigram = search_beneficiaries(Beneficiary.objects.all(), query)
+                legacy_count, legacy_ms = self.measure(legacy, options['repeat'])
+                trigram_count, trigram_ms = self.measure(trigram, options['repeat'])
+                index = 'index' if 'beneficiary_search_trgm' in trigram.explain() else 'parcours'
+                self.stdout.write(f'   {label} « {query} »')
+                self.stdout.write(
+                    f'      icontains : {legacy_count:>6} résultat(s), {legacy_ms:7.1f} ms'
+                )
+                self.stdout.write(
+                    f'      trigramme : {trigram_count:>6} résultat(s), {trigram_ms:7.1f} ms ({index})'
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✅ Données synthétiques annulées'))
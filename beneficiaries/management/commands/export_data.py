@@ -0,0 +1,75 @@
+"""
+Commande Django pour exporter en masse bénéficiaires, interactions ou photos financières.
+
+Même export que la page Exports (beneficiaries/exports.py) : lignes lues par
+lots et écrites au fil de l'eau, mémoire constante quel que soit le volume.
+Sans --output, le fichier est écrit sur la sortie standard.
+
+Usage: python manage.py export_data {beneficiaries,interactions,snapshots}
+           [--format csv|xlsx] [--columns id,last_name,...] [--from AAAA-MM-JJ] [--to AAAA-MM-JJ]
+           [--output fichier] [--chunk-size 2000]
+"""
+
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from beneficiaries.exports import DATASETS, FORMATS, Export
+
+
+class Command(BaseCommand):
+    help = 'Exporte bénéficiaires, interactions ou photos financières en CSV ou XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS), help='Table à exporter')
+        parser.add_argument('--format', choices=list(FORMATS), default='csv', help='Format du fichier (défaut: csv)')
+        parser.add_argument(
+            '--columns',
+            default='',
+            help='Colonnes séparées par des virgules (défaut: toutes ; voir --list-columns)',
+        )
+        parser.add_argument('--from', dest='date_from', help='Date de début incluse (AAAA-MM-JJ)')
+        parser.add_argument('--to', dest='date_to', help='Date de fin incluse (AAAA-MM-JJ)')
+        parser.add_argument('--output', help='Fichier de sortie (défaut: sortie standard)')
+        parser.add_argument('--chunk-size', type=int, help='Lignes lues par lot (défaut: EXPORT_CHUNK_SIZE)')
+        parser.add_argument('--list-columns', action='store_true', help='Affiche les colonnes disponibles')
+
+    def handle(self, *args, **options):
+        dataset = DATASETS[options['dataset']]
+        if options['list_columns']:
+            for name, label in dataset.columns.items():
+                self.stdout.write(f'{name:<35} {label}')
+            return
+
+        try:
+            export = Export(
+                options['dataset'],
+                columns=[options['columns']],
+                export_format=options['format'],
+                date_from=options['date_from'],
+                date_to=options['date_to'],
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        started = time.perf_counter()
+        size = 0
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in export.stream(chunk_size=options['chunk_size']):
+                output.write(chunk)
+                size += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+
+        # Messages sur la sortie d'erreur quand le fichier occupe la sortie standard
+        messages = self.stdout if options['output'] else self.stderr
+        messages.write(self.style.SUCCESS(
+            f'✅ Export {dataset.title} ({export.format}, {len(export.columns)} colonne(s)) : '
+            f'{size / 1024:.0f} Ko écrits en {time.perf_counter() - started:.1f}s'
+            + (f' dans {options["output"]}' if options['output'] else '')
+        ))
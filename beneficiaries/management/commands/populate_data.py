@@ -17,7 +17,7 @@ from dateutil.relativedelta import relativedelta
 from decimal import Decimal
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from faker import Faker
 
@@ -27,6 +27,7 @@ from calendar_app.models import VolunteerCalendar, AvailabilitySlot, Appointment
 from partners.models import Partner
 from news.models import News
 from analysis.models import ChartConfig
+from analysis.rollups import rebuild_rollups
 
 fake = Faker('fr_FR')
 
@@ -110,6 +111,17 @@ class Command(BaseCommand):
                 self.style.SUCCESS(f'✅ {charts_count} graphiques d\'analyse créés')
             )
 
+        # Les dates antidatées par update() échappent aux signaux : agrégats recalculés
+        rebuild_rollups()
+        self.stdout.write(
+            self.style.SUCCESS('✅ Agrégats mensuels d\'analyse reconstruits')
+        )
+        # Même raison : dernière photo financière de chaque bénéficiaire recalculée
+        Beneficiary.refresh_financial_summary()
+        self.stdout.write(
+            self.style.SUCCESS('✅ Résumés financiers des bénéficiaires recalculés')
+        )
+
         self.stdout.write(
             self.style.SUCCESS('🎉 Population des données terminée avec succès!')
         )
@@ -439,23 +451,28 @@ class Command(BaseCommand):
 
             beneficiary = random.choice(beneficiaries)
 
-            appointment = Appointment.objects.create(
-                volunteer_calendar=calendar,
-                beneficiary=beneficiary,
-                appointment_date=appointment_date,
-                start_time=time(int(start_hour), int((start_hour % 1) * 60)),
-                end_time=time(int(end_hour), int((end_hour % 1) * 60)),
-                appointment_type=random.choice([
-                    'INTERVIEW', 'FOLLOW_UP', 'ADMINISTRATIVE', 'SOCIAL'
-                ]),
-                title=self.generate_appointment_title(),
-                description=fake.sentence(nb_words=10),
-                location="Association rosa" if random.choice([True, False]) else fake.address(),
-                status=status,
-                preparation_notes=fake.sentence() if random.choice([True, False]) else '',
-                completion_notes=fake.paragraph() if status == 'COMPLETED' else '',
-                created_by=calendar.volunteer.user,
-            )
+            # Les tirages peuvent se chevaucher : la contrainte appointment_no_overlap les refuse
+            try:
+                with transaction.atomic():
+                    appointment = Appointment.objects.create(
+                        volunteer_calendar=calendar,
+                        beneficiary=beneficiary,
+                        appointment_date=appointment_date,
+                        start_time=time(int(start_hour), int((start_hour % 1) * 60)),
+                        end_time=time(int(end_hour), int((end_hour % 1) * 60)),
+                        appointment_type=random.choice([
+                            'INTERVIEW', 'FOLLOW_UP', 'ADMINISTRATIVE', 'SOCIAL'
+                        ]),
+                        title=self.generate_appointment_title(),
+                        description=fake.sentence(nb_words=10),
+                        location="Association rosa" if random.choice([True, False]) else fake.address(),
+                        status=status,
+                        preparation_notes=fake.sentence() if random.choice([True, False]) else '',
+                        completion_notes=fake.paragraph() if status == 'COMPLETED' else '',
+                        created_by=calendar.volunteer.user,
+                    )
+            except IntegrityError:
+                continue
             appointments_created += 1
 
         return appointments_created
@@ -681,20 +698,12 @@ result = {
                 'display_order': 2,
                 'y_axis_label': 'Nombre de bénéficiaires',
                 'description': 'Distribution des bénéficiaires par type d\'hébergement',
-                'query_code': '''
-from django.db.models import Count
-stats = Beneficiary.objects.values('housing_status').annotate(count=Count('id')).order_by('-count')
-labels = [item['housing_status'] or 'Non renseigné' for item in stats]
-data = [item['count'] for item in stats]
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Bénéficiaires',
-        'data': data,
-        'backgroundColor': '#3b82f6'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'Beneficiary',
+                    'dimension': {'field': 'housing_status', 'order': '-measure'},
+                    'label': 'Bénéficiaires',
+                    'colors': ['#3b82f6'],
+                }
             },
             # FINANCIAL - Reste à vivre par nombre d'enfants
             {
@@ -706,71 +715,17 @@ result = {
                 'y_axis_label': 'Reste à vivre moyen (€)',
                 'x_axis_label': 'Mois',
                 'description': 'Reste à vivre selon le nombre d\'enfants (revenus - charges)',
-                'query_code': '''
-today = datetime.now().date()
-labels = []
-data_0_enfants = []
-data_1_2_enfants = []
-data_3plus_enfants = []
-
-for i in range(5, -1, -1):
-    month_date = today - timedelta(days=30*i)
-    labels.append(month_date.strftime('%b'))
-
-    # Snapshots du mois
-    snapshots = FinancialSnapshot.objects.filter(
-        date__year=month_date.year,
-        date__month=month_date.month
-    ).select_related('beneficiary')
-
-    # Grouper par nombre d'enfants
-    rav_0 = []
-    rav_1_2 = []
-    rav_3plus = []
-
-    for snap in snapshots:
-        # Calcul revenus
-        revenus = (snap.rsa_prime_activite or 0) + (snap.salaire or 0) + (snap.france_travail or 0) + (snap.aah_pension_invalidite or 0) + (snap.retraite_aspa or 0) + (snap.ada or 0) + (snap.paje or 0) + (snap.af or 0) + (snap.cf or 0) + (snap.asf or 0) + (snap.pension_alimentaire or 0) + (snap.autres_revenus or 0)
-
-        # Calcul charges
-        charges = (snap.loyer_residuel or 0) + (snap.energie or 0) + (snap.eau or 0) + (snap.transport_commun or 0) + (snap.carburant or 0) + (snap.credit_consommation or 0) + (snap.mutuelle_privee or 0) + (snap.frais_sante_non_rembourses or 0) + (snap.frais_scolaires or 0) + (snap.dettes_diverses or 0)
-
-        reste_a_vivre = revenus - charges
-
-        # Grouper selon nombre d'enfants
-        nb_enfants = snap.beneficiary.dependents_count
-        if nb_enfants == 0:
-            rav_0.append(reste_a_vivre)
-        elif nb_enfants <= 2:
-            rav_1_2.append(reste_a_vivre)
-        else:
-            rav_3plus.append(reste_a_vivre)
-
-    data_0_enfants.append(sum(rav_0) / len(rav_0) if rav_0 else 0)
-    data_1_2_enfants.append(sum(rav_1_2) / len(rav_1_2) if rav_1_2 else 0)
-    data_3plus_enfants.append(sum(rav_3plus) / len(rav_3plus) if rav_3plus else 0)
-
-result = {
-    'labels': labels,
-    'datasets': [
-        {
-            'label': '0 enfants',
-            'data': data_0_enfants,
-            'backgroundColor': '#8b5cf6'
-        },
-        {
-            'label': '1-2 enfants',
-            'data': data_1_2_enfants,
-            'backgroundColor': '#10b981'
-        },
-        {
-            'label': '3+ enfants',
-            'data': data_3plus_enfants,
-            'backgroundColor': '#f59e0b'
-        }
-    ]
-}
-'''
+                'query_spec': {
+                    'model': 'FinancialMonthlyRollup',
+                    'dimension': {'field': 'month', 'bucket': 'month', 'months': 6},
+                    'series': {'field': 'household', 'colors': ['#8b5cf6', '#10b981', '#f59e0b']},
+                    'measure': {
+                        'op': 'sum',
+                        'fields': ['total_income'],
+                        'subtract': ['total_charges'],
+                        'divide_by': 'snapshot_count',
+                    },
+                }
             },
             # OPERATIrosaL
             {
@@ -782,27 +737,13 @@ result = {
                 'y_axis_label': 'Nombre d\'interactions',
                 'x_axis_label': 'Mois',
                 'description': 'Nombre total d\'interactions par mois sur 6 mois',
-                'query_code': '''
-today = datetime.now().date()
-labels = []
-data = []
-for i in range(5, -1, -1):
-    month_date = today - timedelta(days=30*i)
-    labels.append(month_date.strftime('%b %Y'))
-    count = Interaction.objects.filter(
-        created_at__year=month_date.year,
-        created_at__month=month_date.month
-    ).count()
-    data.append(count)
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Interactions',
-        'data': data,
-        'backgroundColor': '#3b82f6'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'InteractionMonthlyRollup',
+                    'dimension': {'field': 'month', 'bucket': 'month', 'months': 6},
+                    'measure': {'op': 'sum', 'fields': ['interaction_count']},
+                    'label': 'Interactions',
+                    'colors': ['#3b82f6'],
+                }
             },
             # TRENDS
             {
@@ -814,28 +755,18 @@ result = {
                 'y_axis_label': 'Nombre de bénéficiaires',
                 'x_axis_label': 'Mois',
                 'description': 'Croissance du nombre total de bénéficiaires sur 12 mois',
-                'query_code': '''
-today = datetime.now().date()
-labels = []
-data = []
-for i in range(11, -1, -1):
-    month_date = today - timedelta(days=30*i)
-    month_end = month_date.replace(day=28)  # Approximation
-    labels.append(month_date.strftime('%b %Y'))
-    count = Beneficiary.objects.filter(created_at__lte=month_end).count()
-    data.append(count)
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Bénéficiaires',
-        'data': data,
-        'borderColor': '#8b5cf6',
-        'backgroundColor': 'rgba(139, 92, 246, 0.1)',
-        'tension': 0.3,
-        'fill': True
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'BeneficiaryMonthlyRollup',
+                    'dimension': {'field': 'month', 'bucket': 'month', 'months': 12, 'cumulative': True},
+                    'measure': {'op': 'sum', 'fields': ['new_beneficiaries']},
+                    'label': 'Bénéficiaires',
+                    'style': {
+                        'borderColor': '#8b5cf6',
+                        'backgroundColor': 'rgba(139, 92, 246, 0.1)',
+                        'tension': 0.3,
+                        'fill': True,
+                    },
+                }
             },
             # OPERATIrosaL
             {
@@ -846,20 +777,13 @@ result = {
                 'display_order': 6,
                 'y_axis_label': 'Nombre d\'interactions',
                 'description': 'Distribution des interactions par type',
-                'query_code': '''
-from django.db.models import Count
-stats = Interaction.objects.values('interaction_type').annotate(count=Count('id')).order_by('-count')
-labels = [item['interaction_type'] for item in stats]
-data = [item['count'] for item in stats]
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Interactions',
-        'data': data,
-        'backgroundColor': '#3b82f6'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'InteractionMonthlyRollup',
+                    'dimension': {'field': 'interaction_type', 'order': '-measure'},
+                    'measure': {'op': 'sum', 'fields': ['interaction_count']},
+                    'label': 'Interactions',
+                    'colors': ['#3b82f6'],
+                }
             },
             # IMPACT - Snapshots financiers créés
             {
@@ -870,28 +794,13 @@ result = {
                 'display_order': 7,
                 'y_axis_label': 'Nombre de snapshots',
                 'description': 'Suivi mensuel des situations financières',
-                'query_code': '''
-today = datetime.now().date()
-labels = []
-data = []
-for i in range(5, -1, -1):
-    month_date = today - timedelta(days=30*i)
-    labels.append(month_date.strftime('%b %Y'))
-    # Compter les snapshots financiers créés ce mois
-    count = FinancialSnapshot.objects.filter(
-        date__year=month_date.year,
-        date__month=month_date.month
-    ).count()
-    data.append(count)
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Snapshots financiers',
-        'data': data,
-        'backgroundColor': '#10b981'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'FinancialMonthlyRollup',
+                    'dimension': {'field': 'month', 'bucket': 'month', 'months': 6},
+                    'measure': {'op': 'sum', 'fields': ['snapshot_count']},
+                    'label': 'Snapshots financiers',
+                    'colors': ['#10b981'],
+                }
             },
             # DEMOGRAPHIC - Distribution par âge
             {
@@ -940,36 +849,12 @@ result = {
                 'display_order': 9,
                 'y_axis_label': 'Nombre de bénéficiaires',
                 'description': 'Répartition par situation familiale',
-                'query_code': '''
-from django.db.models import Count
-stats = Beneficiary.objects.values('family_status').annotate(count=Count('id')).order_by('-count')
-labels = []
-for item in stats:
-    fs = item['family_status']
-    if fs == 'CELIBATAIRE':
-        labels.append('Célibataire')
-    elif fs == 'MARIE':
-        labels.append('Marié(e)')
-    elif fs == 'DIVORCE':
-        labels.append('Divorcé(e)')
-    elif fs == 'VEUF':
-        labels.append('Veuf(ve)')
-    elif fs == 'VIE_MARITALE':
-        labels.append('Vie maritale')
-    elif fs == 'SEPARE':
-        labels.append('Séparé(e)')
-    else:
-        labels.append('Autre')
-data = [item['count'] for item in stats]
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Bénéficiaires',
-        'data': data,
-        'backgroundColor': '#10b981'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'Beneficiary',
+                    'dimension': {'field': 'family_status', 'order': '-measure'},
+                    'label': 'Bénéficiaires',
+                    'colors': ['#10b981'],
+                }
             },
             # DEMOGRAPHIC - Nombre d'enfants à charge
             {
@@ -980,20 +865,12 @@ result = {
                 'display_order': 10,
                 'y_axis_label': 'Nombre de bénéficiaires',
                 'description': 'Distribution selon le nombre d\'enfants',
-                'query_code': '''
-from django.db.models import Count
-stats = Beneficiary.objects.values('dependents_count').annotate(count=Count('id')).order_by('dependents_count')[:6]
-labels = [f"{item['dependents_count']} enfant(s)" for item in stats]
-data = [item['count'] for item in stats]
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Bénéficiaires',
-        'data': data,
-        'backgroundColor': '#8b5cf6'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'Beneficiary',
+                    'dimension': {'field': 'dependents_count', 'limit': 6, 'label_format': '{} enfant(s)'},
+                    'label': 'Bénéficiaires',
+                    'colors': ['#8b5cf6'],
+                }
             },
             # FINANCIAL - Sources de revenus
             {
@@ -1005,33 +882,32 @@ result = {
                 'y_axis_label': 'Montant total (€)',
                 'x_axis_label': 'Type de revenu',
                 'description': 'Répartition des revenus par source',
-                'query_code': '''
-revenue_sources = {
-    'RSA/Prime activité': 0,
-    'Salaire': 0,
-    'France Travail': 0,
-    'AAH/Pension': 0,
-    'Retraite/ASPA': 0,
-    'Prestations familiales': 0,
-    'Autres': 0
-}
-for snap in FinancialSnapshot.objects.all():
-    revenue_sources['RSA/Prime activité'] += snap.rsa_prime_activite or 0
-    revenue_sources['Salaire'] += snap.salaire or 0
-    revenue_sources['France Travail'] += snap.france_travail or 0
-    revenue_sources['AAH/Pension'] += snap.aah_pension_invalidite or 0
-    revenue_sources['Retraite/ASPA'] += snap.retraite_aspa or 0
-    revenue_sources['Prestations familiales'] += (snap.paje or 0) + (snap.af or 0) + (snap.cf or 0) + (snap.asf or 0)
-    revenue_sources['Autres'] += (snap.pension_alimentaire or 0) + (snap.autres_revenus or 0) + (snap.ada or 0)
-result = {
-    'labels': list(revenue_sources.keys()),
-    'datasets': [{
-        'label': 'Revenus totaux (€)',
-        'data': list(revenue_sources.values()),
-        'backgroundColor': '#10b981'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'FinancialSnapshot',
+                    'measures': [
+                        {
+                            'op': 'sum',
+                            'fields': ['rsa_prime_activite'],
+                            'label': 'RSA/Prime activité',
+                        },
+                        {'op': 'sum', 'fields': ['salaire'], 'label': 'Salaire'},
+                        {'op': 'sum', 'fields': ['france_travail'], 'label': 'France Travail'},
+                        {'op': 'sum', 'fields': ['aah_pension_invalidite'], 'label': 'AAH/Pension'},
+                        {'op': 'sum', 'fields': ['retraite_aspa'], 'label': 'Retraite/ASPA'},
+                        {
+                            'op': 'sum',
+                            'fields': ['paje', 'af', 'cf', 'asf'],
+                            'label': 'Prestations familiales',
+                        },
+                        {
+                            'op': 'sum',
+                            'fields': ['pension_alimentaire', 'autres_revenus', 'ada'],
+                            'label': 'Autres',
+                        },
+                    ],
+                    'label': 'Revenus totaux (€)',
+                    'colors': ['#10b981'],
+                }
             },
             # FINANCIAL - Charges moyennes
             {
@@ -1043,34 +919,31 @@ result = {
                 'y_axis_label': 'Montant moyen (€)',
                 'x_axis_label': 'Type de charge',
                 'description': 'Charges moyennes par catégorie',
-                'query_code': '''
-charges = {
-    'Loyer résiduel': 0,
-    'Énergie/Eau': 0,
-    'Transport': 0,
-    'Crédit': 0,
-    'Santé': 0,
-    'Autres': 0
-}
-count = FinancialSnapshot.objects.count() or 1
-for snap in FinancialSnapshot.objects.all():
-    charges['Loyer résiduel'] += snap.loyer_residuel or 0
-    charges['Énergie/Eau'] += (snap.energie or 0) + (snap.eau or 0)
-    charges['Transport'] += (snap.transport_commun or 0) + (snap.carburant or 0)
-    charges['Crédit'] += snap.credit_consommation or 0
-    charges['Santé'] += (snap.mutuelle_privee or 0) + (snap.frais_sante_non_rembourses or 0)
-    charges['Autres'] += (snap.dettes_diverses or 0) + (snap.abonnements_sport_culture or 0) + (snap.frais_scolaires or 0)
-for key in charges:
-    charges[key] = charges[key] / count
-result = {
-    'labels': list(charges.keys()),
-    'datasets': [{
-        'label': 'Charges moyennes (€)',
-        'data': list(charges.values()),
-        'backgroundColor': '#ef4444'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'FinancialSnapshot',
+                    'measures': [
+                        {'op': 'avg', 'fields': ['loyer_residuel'], 'label': 'Loyer résiduel'},
+                        {'op': 'avg', 'fields': ['energie', 'eau'], 'label': 'Énergie/Eau'},
+                        {
+                            'op': 'avg',
+                            'fields': ['transport_commun', 'carburant'],
+                            'label': 'Transport',
+                        },
+                        {'op': 'avg', 'fields': ['credit_consommation'], 'label': 'Crédit'},
+                        {
+                            'op': 'avg',
+                            'fields': ['mutuelle_privee', 'frais_sante_non_rembourses'],
+                            'label': 'Santé',
+                        },
+                        {
+                            'op': 'avg',
+                            'fields': ['dettes_diverses', 'abonnements_sport_culture', 'frais_scolaires'],
+                            'label': 'Autres',
+                        },
+                    ],
+                    'label': 'Charges moyennes (€)',
+                    'colors': ['#ef4444'],
+                }
             },
             # FINANCIAL - Revenus vs Charges
             {
@@ -1082,47 +955,34 @@ result = {
                 'y_axis_label': 'Montant moyen (€)',
                 'x_axis_label': 'Mois',
                 'description': 'Comparaison de l\'évolution des revenus et charges',
-                'query_code': '''
-today = datetime.now().date()
-labels = []
-revenus_data = []
-charges_data = []
-for i in range(5, -1, -1):
-    month_date = today - timedelta(days=30*i)
-    labels.append(month_date.strftime('%b %Y'))
-    snapshots = FinancialSnapshot.objects.filter(
-        date__year=month_date.year,
-        date__month=month_date.month
-    )
-    total_rev = 0
-    total_chg = 0
-    count = 0
-    for snap in snapshots:
-        total_rev += (snap.rsa_prime_activite or 0) + (snap.salaire or 0) + (snap.france_travail or 0) + (snap.aah_pension_invalidite or 0)
-        total_chg += (snap.loyer_residuel or 0) + (snap.energie or 0) + (snap.eau or 0) + (snap.transport_commun or 0) + (snap.carburant or 0)
-        count += 1
-    revenus_data.append(total_rev / count if count > 0 else 0)
-    charges_data.append(total_chg / count if count > 0 else 0)
-result = {
-    'labels': labels,
-    'datasets': [
-        {
-            'label': 'Revenus moyens',
-            'data': revenus_data,
-            'borderColor': '#10b981',
-            'backgroundColor': 'rgba(16, 185, 129, 0.1)',
-            'tension': 0.3
-        },
-        {
-            'label': 'Charges moyennes',
-            'data': charges_data,
-            'borderColor': '#ef4444',
-            'backgroundColor': 'rgba(239, 68, 68, 0.1)',
-            'tension': 0.3
-        }
-    ]
-}
-'''
+                'query_spec': {
+                    'model': 'FinancialMonthlyRollup',
+                    'dimension': {'field': 'month', 'bucket': 'month', 'months': 6},
+                    'measures': [
+                        {
+                            'op': 'sum',
+                            'fields': ['total_income'],
+                            'divide_by': 'snapshot_count',
+                            'label': 'Revenus moyens',
+                            'style': {
+                                'borderColor': '#10b981',
+                                'backgroundColor': 'rgba(16, 185, 129, 0.1)',
+                                'tension': 0.3,
+                            },
+                        },
+                        {
+                            'op': 'sum',
+                            'fields': ['total_charges'],
+                            'divide_by': 'snapshot_count',
+                            'label': 'Charges moyennes',
+                            'style': {
+                                'borderColor': '#ef4444',
+                                'backgroundColor': 'rgba(239, 68, 68, 0.1)',
+                                'tension': 0.3,
+                            },
+                        },
+                    ],
+                }
             },
             # OPERATIrosaL - Taux de présence RDV
             {
@@ -1133,27 +993,12 @@ result = {
                 'display_order': 14,
                 'y_axis_label': 'Nombre de rendez-vous',
                 'description': 'Répartition des rendez-vous par statut',
-                'query_code': '''
-from django.db.models import Count
-stats = Appointment.objects.values('status').annotate(count=Count('id')).order_by('-count')
-status_labels = {
-    'SCHEDULED': 'Programmé',
-    'CONFIRMED': 'Confirmé',
-    'COMPLETED': 'Complété',
-    'CANCELLED': 'Annulé',
-    'NO_SHOW': 'Absent'
-}
-labels = [status_labels.get(item['status'], item['status']) for item in stats]
-data = [item['count'] for item in stats]
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Rendez-vous',
-        'data': data,
-        'backgroundColor': '#8b5cf6'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'Appointment',
+                    'dimension': {'field': 'status', 'order': '-measure'},
+                    'label': 'Rendez-vous',
+                    'colors': ['#8b5cf6'],
+                }
             },
             # OPERATIrosaL - Interactions par bénéficiaire
             {
@@ -1200,27 +1045,13 @@ result = {
                 'y_axis_label': 'Nouveaux bénéficiaires',
                 'x_axis_label': 'Mois',
                 'description': 'Évolution du nombre de nouvelles inscriptions',
-                'query_code': '''
-today = datetime.now().date()
-labels = []
-data = []
-for i in range(11, -1, -1):
-    month_date = today - timedelta(days=30*i)
-    labels.append(month_date.strftime('%b %Y'))
-    count = Beneficiary.objects.filter(
-        created_at__year=month_date.year,
-        created_at__month=month_date.month
-    ).count()
-    data.append(count)
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Nouvelles inscriptions',
-        'data': data,
-        'backgroundColor': '#3b82f6'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'BeneficiaryMonthlyRollup',
+                    'dimension': {'field': 'month', 'bucket': 'month', 'months': 12},
+                    'measure': {'op': 'sum', 'fields': ['new_beneficiaries']},
+                    'label': 'Nouvelles inscriptions',
+                    'colors': ['#3b82f6'],
+                }
             },
             # TRENDS - Actifs vs Inactifs
             {
@@ -1302,21 +1133,16 @@ result = {
                 'size': 'half',
                 'display_order': 19,
                 'description': 'Pourcentage de suivis complétés vs en attente',
-                'query_code': '''
-from django.db.models import Q
-total_interactions = Interaction.objects.filter(follow_up_required=True).count()
-# Considérer comme complété si follow_up_notes n'est pas vide
-completed = Interaction.objects.filter(follow_up_required=True).exclude(Q(follow_up_notes='') | Q(follow_up_notes__isnull=True)).count()
-pending = total_interactions - completed
-result = {
-    'labels': ['Suivis complétés', 'Suivis en attente'],
-    'datasets': [{
-        'label': 'Suivis',
-        'data': [completed, pending],
-        'backgroundColor': ['#10b981', '#f59e0b']
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'Interaction',
+                    'filter': {'follow_up_required': True},
+                    'dimension': {
+                        'cases': [{'label': 'Suivis complétés', 'filter': {'follow_up_notes__gt': ''}}],
+                        'default': 'Suivis en attente',
+                    },
+                    'label': 'Suivis',
+                    'style': {'backgroundColor': ['#10b981', '#f59e0b']},
+                }
             },
             # DEMOGRAPHIC - Métiers / Compétences
             {
@@ -1326,18 +1152,15 @@ result = {
                 'size': 'half',
                 'display_order': 20,
                 'description': 'Proportion de bénéficiaires avec un métier ou savoir-faire',
-                'query_code': '''
-with_occupation = Beneficiary.objects.exclude(occupation='').exclude(occupation__isnull=True).count()
-without_occupation = Beneficiary.objects.filter(occupation='').count() + Beneficiary.objects.filter(occupation__isnull=True).count()
-result = {
-    'labels': ['Avec métier/compétence', 'Sans métier déclaré'],
-    'datasets': [{
-        'label': 'Bénéficiaires',
-        'data': [with_occupation, without_occupation],
-        'backgroundColor': ['#10b981', '#94a3b8']
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'Beneficiary',
+                    'dimension': {
+                        'cases': [{'label': 'Avec métier/compétence', 'filter': {'occupation__gt': ''}}],
+                        'default': 'Sans métier déclaré',
+                    },
+                    'label': 'Bénéficiaires',
+                    'style': {'backgroundColor': ['#10b981', '#94a3b8']},
+                }
             },
             # OPERATIrosaL - Délai de réponse
             {
@@ -1384,35 +1207,23 @@ result = {
                 'y_axis_label': 'Nombre de RDV',
                 'x_axis_label': 'Jour de la semaine',
                 'description': 'Distribution des rendez-vous par jour et plage horaire',
-                'query_code': '''
-days = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-morning = [0] * 7  # 8h-12h
-afternoon = [0] * 7  # 14h-18h
-for apt in Appointment.objects.all():
-    if apt.appointment_date:
-        day_index = apt.appointment_date.weekday()
-        if apt.start_time:
-            hour = apt.start_time.hour
-            if 8 <= hour < 12:
-                morning[day_index] += 1
-            elif 14 <= hour < 18:
-                afternoon[day_index] += 1
-result = {
-    'labels': days,
-    'datasets': [
-        {
-            'label': 'Matin (8h-12h)',
-            'data': morning,
-            'backgroundColor': '#3b82f6'
-        },
-        {
-            'label': 'Après-midi (14h-18h)',
-            'data': afternoon,
-            'backgroundColor': '#10b981'
-        }
-    ]
-}
-'''
+                'query_spec': {
+                    'model': 'Appointment',
+                    'dimension': {'field': 'appointment_date', 'bucket': 'weekday'},
+                    'series': {
+                        'cases': [
+                            {
+                                'label': 'Matin (8h-12h)',
+                                'filter': {'start_time__hour__gte': 8, 'start_time__hour__lt': 12},
+                            },
+                            {
+                                'label': 'Après-midi (14h-18h)',
+                                'filter': {'start_time__hour__gte': 14, 'start_time__hour__lt': 18},
+                            },
+                        ],
+                        'colors': ['#3b82f6', '#10b981'],
+                    },
+                }
             },
             # ADVANCED - Corrélation logement/revenus
             {
@@ -1425,29 +1236,22 @@ result = {
                 'x_axis_label': 'Type de logement',
                 'description': 'Corrélation entre situation de logement et revenus',
                 'query_code': '''
-housing_revenue = {}
-for ben in Beneficiary.objects.all():
-    housing = ben.housing_status or 'Non renseigné'
-    snapshot = ben.financial_snapshots.order_by('-date').first()
-    if snapshot:
-        total_rev = (snapshot.rsa_prime_activite or 0) + (snapshot.salaire or 0) + (snapshot.france_travail or 0)
-        if housing not in housing_revenue:
-            housing_revenue[housing] = {'total': 0, 'count': 0}
-        housing_revenue[housing]['total'] += total_rev
-        housing_revenue[housing]['count'] += 1
-labels = []
-data = []
-for housing, values in housing_revenue.items():
-    labels.append(housing)
-    avg = values['total'] / values['count'] if values['count'] > 0 else 0
-    data.append(avg)
+# Dernière photo de chaque bénéficiaire, revenus calculés par NumPy
+stats = FinancialFrame.load(latest=True).stats('revenus', by='housing_status', stats=('mean', 'median'))
 result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Revenu moyen (€)',
-        'data': data,
-        'backgroundColor': '#8b5cf6'
-    }]
+    'labels': stats['labels'],
+    'datasets': [
+        {
+            'label': 'Revenu moyen (€)',
+            'data': stats['mean'],
+            'backgroundColor': '#8b5cf6'
+        },
+        {
+            'label': 'Revenu médian (€)',
+            'data': stats['median'],
+            'backgroundColor': '#c4b5fd'
+        }
+    ]
 }
 '''
             },
@@ -1503,20 +1307,13 @@ result = {
                 'display_order': 25,
                 'y_axis_label': 'Nombre de suivis',
                 'description': 'Types d\'aides nécessitant un suivi',
-                'query_code': '''
-from django.db.models import Count
-stats = Interaction.objects.filter(follow_up_required=True).values('interaction_type').annotate(count=Count('id'))
-labels = [item['interaction_type'] for item in stats]
-data = [item['count'] for item in stats]
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Suivis requis',
-        'data': data,
-        'backgroundColor': '#f59e0b'
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'Interaction',
+                    'filter': {'follow_up_required': True},
+                    'dimension': {'field': 'interaction_type'},
+                    'label': 'Suivis requis',
+                    'colors': ['#f59e0b'],
+                }
             },
             # IMPACT - Évolution enfants pris en charge
             {
@@ -1528,33 +1325,17 @@ result = {
                 'y_axis_label': 'Nombre d\'enfants',
                 'x_axis_label': 'Mois',
                 'description': 'Impact sur les familles et enfants',
-                'query_code': '''
-today = datetime.now().date()
-labels = []
-data = []
-for i in range(11, -1, -1):
-    month_date = today - timedelta(days=30*i)
-    month_start = month_date.replace(day=1)
-    if month_start.month == 12:
-        month_end = month_start.replace(year=month_start.year + 1, month=1, day=1) - timedelta(days=1)
-    else:
-        month_end = month_start.replace(month=month_start.month + 1, day=1) - timedelta(days=1)
-    month_end_datetime = timezone.make_aware(datetime.combine(month_end, datetime.max.time()))
-    labels.append(month_date.strftime('%b %Y'))
-    count = Child.objects.filter(created_at__lte=month_end_datetime).count()
-    data.append(count)
-result = {
-    'labels': labels,
-    'datasets': [{
-        'label': 'Enfants',
-        'data': data,
-        'borderColor': '#ec4899',
-        'backgroundColor': 'rgba(236, 72, 153, 0.1)',
-        'tension': 0.3,
-        'fill': True
-    }]
-}
-'''
+                'query_spec': {
+                    'model': 'Child',
+                    'dimension': {'field': 'created_at', 'bucket': 'month', 'months': 12, 'cumulative': True},
+                    'label': 'Enfants',
+                    'style': {
+                        'borderColor': '#ec4899',
+                        'backgroundColor': 'rgba(236, 72, 153, 0.1)',
+                        'tension': 0.3,
+                        'fill': True,
+                    },
+                }
             }
         ]
 
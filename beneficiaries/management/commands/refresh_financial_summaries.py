@@ -0,0 +1,30 @@
+"""
+Commande Django pour recalculer le résumé financier des bénéficiaires.
+
+Renseigne Beneficiary.latest_snapshot, solde_net et reste_a_vivre_journalier
+à partir de l'historique des photos financières. Les enregistrements courants
+sont déjà répercutés par FinancialSnapshot et les bénéficiaires existants
+renseignés par la migration 0017 : la commande sert après un import en masse
+ou une modification hors ORM (update(), bulk_create(), SQL).
+
+Usage: python manage.py refresh_financial_summaries
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from beneficiaries.models import Beneficiary
+
+
+class Command(BaseCommand):
+    help = 'Recalcule la dernière photo financière, le solde net et le reste à vivre des bénéficiaires'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = Beneficiary.refresh_financial_summary()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Résumé financier de {count} bénéficiaire(s) recalculé en {elapsed:.2f}s')
+        )
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:34
+
+import beneficiaries.search
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficiaries', '0012_beneficiary_file_number_beneficiary_first_entry_date_and_more'),
+        ('volunteers', '0003_delete_timetracking'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        # unaccent() est STABLE (son dictionnaire est modifiable) : version
+        # IMMUTABLE à dictionnaire explicite, pour la colonne générée
+        migrations.RunSQL(
+            sql="""
+                CREATE OR REPLACE FUNCTION immutable_unaccent(text) RETURNS text
+                LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+                AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+            """,
+            reverse_sql='DROP FUNCTION IF EXISTS immutable_unaccent(text);',
+        ),
+        migrations.AddField(
+            model_name='beneficiary',
+            name='search_document',
+            field=models.GeneratedField(db_persist=True, expression=beneficiaries.search.ImmutableUnaccent(django.db.models.functions.text.Lower(django.db.models.functions.text.Concat('first_name', models.Value(' '), 'last_name', models.Value(' '), 'email', models.Value(' '), 'phone', output_field=models.TextField()))), output_field=models.TextField(), verbose_name='Document de recherche'),
+        ),
+        migrations.AddIndex(
+            model_name='beneficiary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='beneficiary_search_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
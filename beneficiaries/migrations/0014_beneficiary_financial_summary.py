@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficiaries', '0013_beneficiary_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beneficiary',
+            name='latest_snapshot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='beneficiaries.financialsnapshot', verbose_name='Dernière photo instantanée'),
+        ),
+        migrations.AddField(
+            model_name='beneficiary',
+            name='reste_a_vivre_journalier',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Reste à vivre journalier'),
+        ),
+        migrations.AddField(
+            model_name='beneficiary',
+            name='solde_net',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Solde net'),
+        ),
+    ]
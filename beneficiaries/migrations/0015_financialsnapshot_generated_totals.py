@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:40
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficiaries', '0014_beneficiary_financial_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financialsnapshot',
+            name='reste_a_vivre_journalier',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce(models.F('rsa_prime_activite'), models.Value(0), output_field=models.DecimalField()), '+', django.db.models.functions.comparison.Coalesce(models.F('aah_pension_invalidite'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('apl'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('paje'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('af'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('cf'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('asf'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('ape_conge_parental'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('ij_cpam_msa'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('france_travail'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('retraite_aspa'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('salaire'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('ada'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('stage_formation_bourses'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('autres_revenus'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('aide_conseil_departemental'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('pension_alimentaire'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('travail_non_declare'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('soutien_familial_amical'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('contrat_garantie_jeunes'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('contrat_apprentissage'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('tickets_service'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('bons_alimentation'), models.Value(0), output_field=models.DecimalField())), '-', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce(models.F('loyer_residuel'), models.Value(0), output_field=models.DecimalField()), '+', django.db.models.functions.comparison.Coalesce(models.F('energie'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('eau'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('assurance_habitation'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('telephonie_internet'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('mutuelle_privee'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('css'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('frais_scolaires'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('frais_sante_non_rembourses'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('transport_commun'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('carburant'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('credit_consommation'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('dettes_diverses'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('abonnements_sport_culture'), models.Value(0), output_field=models.DecimalField()))), '/', models.Value(30)), output_field=models.DecimalField(decimal_places=2, max_digits=12), verbose_name='Reste à vivre journalier'),
+        ),
+        migrations.AddField(
+            model_name='financialsnapshot',
+            name='solde_net',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce(models.F('rsa_prime_activite'), models.Value(0), output_field=models.DecimalField()), '+', django.db.models.functions.comparison.Coalesce(models.F('aah_pension_invalidite'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('apl'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('paje'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('af'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('cf'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('asf'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('ape_conge_parental'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('ij_cpam_msa'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('france_travail'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('retraite_aspa'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('salaire'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('ada'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('stage_formation_bourses'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('autres_revenus'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('aide_conseil_departemental'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('pension_alimentaire'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('travail_non_declare'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('soutien_familial_amical'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('contrat_garantie_jeunes'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('contrat_apprentissage'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('tickets_service'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('bons_alimentation'), models.Value(0), output_field=models.DecimalField())), '-', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce(models.F('loyer_residuel'), models.Value(0), output_field=models.DecimalField()), '+', django.db.models.functions.comparison.Coalesce(models.F('energie'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('eau'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('assurance_habitation'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('telephonie_internet'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('mutuelle_privee'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('css'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('frais_scolaires'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('frais_sante_non_rembourses'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('transport_commun'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('carburant'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('credit_consommation'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('dettes_diverses'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('abonnements_sport_culture'), models.Value(0), output_field=models.DecimalField()))), output_field=models.DecimalField(decimal_places=2, max_digits=12), verbose_name='Solde net'),
+        ),
+        migrations.AddField(
+            model_name='financialsnapshot',
+            name='total_charges',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce(models.F('loyer_residuel'), models.Value(0), output_field=models.DecimalField()), '+', django.db.models.functions.comparison.Coalesce(models.F('energie'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('eau'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('assurance_habitation'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('telephonie_internet'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('mutuelle_privee'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('css'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('frais_scolaires'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('frais_sante_non_rembourses'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('transport_commun'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('carburant'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('credit_consommation'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('dettes_diverses'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('abonnements_sport_culture'), models.Value(0), output_field=models.DecimalField())), output_field=models.DecimalField(decimal_places=2, max_digits=12), verbose_name='Total des charges'),
+        ),
+        migrations.AddField(
+            model_name='financialsnapshot',
+            name='total_revenus',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Coalesce(models.F('rsa_prime_activite'), models.Value(0), output_field=models.DecimalField()), '+', django.db.models.functions.comparison.Coalesce(models.F('aah_pension_invalidite'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('apl'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('paje'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('af'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('cf'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('asf'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('ape_conge_parental'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('ij_cpam_msa'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('france_travail'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('retraite_aspa'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('salaire'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('ada'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('stage_formation_bourses'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('autres_revenus'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('aide_conseil_departemental'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('pension_alimentaire'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('travail_non_declare'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('soutien_familial_amical'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('contrat_garantie_jeunes'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('contrat_apprentissage'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('tickets_service'), models.Value(0), output_field=models.DecimalField())), '+', django.db.models.functions.comparison.Coalesce(models.F('bons_alimentation'), models.Value(0), output_field=models.DecimalField())), output_field=models.DecimalField(decimal_places=2, max_digits=12), verbose_name='Total des revenus'),
+        ),
+        migrations.AddIndex(
+            model_name='financialsnapshot',
+            index=models.Index(fields=['solde_net'], name='snapshot_solde_net_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financialsnapshot',
+            index=models.Index(fields=['date'], include=('solde_net', 'reste_a_vivre_journalier'), name='snapshot_date_totals_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficiaries', '0015_financialsnapshot_generated_totals'),
+        ('volunteers', '0003_delete_timetracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='beneficiary',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='beneficiary_name_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(fields=['beneficiary', '-created_at', 'id'], name='interaction_history_idx'),
+        ),
+    ]
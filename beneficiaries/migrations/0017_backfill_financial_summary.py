@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def refresh_financial_summaries(apps, schema_editor):
+    """
+    Renseigne latest_snapshot, solde_net et reste_a_vivre_journalier des
+    bénéficiaires existants, ajoutés vides par 0014 (même UPDATE corrélé que
+    Beneficiary.refresh_financial_summary).
+    """
+    Beneficiary = apps.get_model('beneficiaries', 'Beneficiary')
+    FinancialSnapshot = apps.get_model('beneficiaries', 'FinancialSnapshot')
+    latest = FinancialSnapshot.objects.filter(beneficiary=OuterRef('pk')).order_by('-date', '-pk')
+    Beneficiary.objects.update(
+        latest_snapshot=Subquery(latest.values('pk')[:1]),
+        solde_net=Subquery(latest.values('solde_net')[:1]),
+        reste_a_vivre_journalier=Subquery(latest.values('reste_a_vivre_journalier')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficiaries', '0016_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(refresh_financial_summaries, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+
+from .search import search_document_expression
 
 
 class Beneficiary(models.Model):
@@ -52,6 +57,14 @@ class Beneficiary(models.Model):
     )
     phone = models.CharField('Téléphone', max_length=20, blank=True)
     email = models.EmailField('Email', blank=True)
+
+    # Recherche trigramme sans accents (voir beneficiaries/search.py)
+    search_document = models.GeneratedField(
+        expression=search_document_expression(),
+        output_field=models.TextField(),
+        db_persist=True,
+        verbose_name='Document de recherche'
+    )
     
     # Adresses
     address = models.TextField('Adresse de domiciliation', blank=True)
@@ -138,6 +151,24 @@ class Beneficiary(models.Model):
         help_text='Niveau d\'urgence ou de gravité de la situation'
     )
 
+    # Dernière photo financière et ses montants, tenus à jour par
+    # FinancialSnapshot (voir refresh_financial_summary)
+    latest_snapshot = models.ForeignKey(
+        'FinancialSnapshot',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        verbose_name='Dernière photo instantanée'
+    )
+    solde_net = models.DecimalField(
+        'Solde net', max_digits=12, decimal_places=2, null=True, blank=True, editable=False
+    )
+    reste_a_vivre_journalier = models.DecimalField(
+        'Reste à vivre journalier', max_digits=12, decimal_places=2, null=True, blank=True, editable=False
+    )
+
     # Métadonnées
     created_at = models.DateTimeField('Créé le', auto_now_add=True)
     updated_at = models.DateTimeField('Modifié le', auto_now=True)
@@ -146,6 +177,11 @@ class Beneficiary(models.Model):
         verbose_name = 'Bénéficiaire'
         verbose_name_plural = 'Bénéficiaires'
         ordering = ['last_name', 'first_name']
+        indexes = [
+            GinIndex(fields=['search_document'], opclasses=['gin_trgm_ops'], name='beneficiary_search_trgm'),
+            # Ordre de la liste complété par la clé : pagination par curseur (rosa/pagination.py)
+            models.Index(fields=['last_name', 'first_name', 'id'], name='beneficiary_name_order_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_civility_display()} {self.first_name} {self.last_name}"
@@ -160,7 +196,26 @@ class Beneficiary(models.Model):
     @property
     def latest_financial_snapshot(self):
         """Retourne la dernière photo instantanée financière"""
-        return self.financial_snapshots.order_by('-date').first()
+        return self.latest_snapshot
+
+    # Champs recalculés par refresh_financial_summary
+    FINANCIAL_SUMMARY_FIELDS = ('latest_snapshot', 'solde_net', 'reste_a_vivre_journalier')
+
+    @classmethod
+    def refresh_financial_summary(cls, beneficiaries=None):
+        """
+        Recalcule en une requête UPDATE la dernière photo financière, le solde
+        net et le reste à vivre des bénéficiaires du queryset `beneficiaries`
+        (tous par défaut). Retourne le nombre de bénéficiaires mis à jour.
+        """
+        if beneficiaries is None:
+            beneficiaries = cls.objects.all()
+        latest = FinancialSnapshot.objects.filter(beneficiary=OuterRef('pk')).order_by('-date', '-pk')
+        return beneficiaries.update(
+            latest_snapshot=Subquery(latest.values('pk')[:1]),
+            solde_net=Subquery(latest.values('solde_net')[:1]),
+            reste_a_vivre_journalier=Subquery(latest.values('reste_a_vivre_journalier')[:1]),
+        )
 
     @property
     def next_appointment(self):
@@ -175,6 +230,15 @@ class Beneficiary(models.Model):
         ).order_by('appointment_date', 'start_time').first()
 
 
+def snapshot_total(fields):
+    """Somme SQL des montants `fields` d'une photo financière (montants vides comptés 0)"""
+    expression = None
+    for name in fields:
+        term = Coalesce(F(name), Value(0), output_field=DecimalField())
+        expression = term if expression is None else expression + term
+    return expression
+
+
 class FinancialSnapshot(models.Model):
     """Photo instantanée financière d'un bénéficiaire à un moment donné"""
     
@@ -397,50 +461,74 @@ class FinancialSnapshot(models.Model):
         decimal_places=2,
         default=0
     )
+
+    # Champs additionnés par total_revenus et total_charges
+    REVENUE_FIELDS = (
+        'rsa_prime_activite', 'aah_pension_invalidite', 'apl', 'paje', 'af', 'cf', 'asf', 'ape_conge_parental',
+        'ij_cpam_msa', 'france_travail', 'retraite_aspa', 'salaire', 'ada', 'stage_formation_bourses',
+        'autres_revenus', 'aide_conseil_departemental', 'pension_alimentaire', 'travail_non_declare',
+        'soutien_familial_amical', 'contrat_garantie_jeunes', 'contrat_apprentissage', 'tickets_service',
+        'bons_alimentation',
+    )
+    CHARGE_FIELDS = (
+        'loyer_residuel', 'energie', 'eau', 'assurance_habitation', 'telephonie_internet', 'mutuelle_privee',
+        'css', 'frais_scolaires', 'frais_sante_non_rembourses', 'transport_commun', 'carburant',
+        'credit_consommation', 'dettes_diverses', 'abonnements_sport_culture',
+    )
+
+    # Totaux calculés par PostgreSQL : filtrables, triables et agrégeables en SQL
+    total_revenus = models.GeneratedField(
+        expression=snapshot_total(REVENUE_FIELDS),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+        verbose_name='Total des revenus'
+    )
+    total_charges = models.GeneratedField(
+        expression=snapshot_total(CHARGE_FIELDS),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+        verbose_name='Total des charges'
+    )
+    # Une colonne générée ne peut pas dépendre d'une autre : totaux recalculés
+    solde_net = models.GeneratedField(
+        expression=snapshot_total(REVENUE_FIELDS) - snapshot_total(CHARGE_FIELDS),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+        verbose_name='Solde net'
+    )
+    reste_a_vivre_journalier = models.GeneratedField(
+        expression=(snapshot_total(REVENUE_FIELDS) - snapshot_total(CHARGE_FIELDS)) / Value(30),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+        verbose_name='Reste à vivre journalier'
+    )
     
     class Meta:
         verbose_name = 'Photo Instantanée Financière'
         verbose_name_plural = 'Photos Instantanées Financières'
         ordering = ['-date']
+        indexes = [
+            # Photos en négatif, tri de l'admin par solde
+            models.Index(fields=['solde_net'], name='snapshot_solde_net_idx'),
+            # Moyennes mensuelles sur une période : parcours d'index seul
+            models.Index(
+                fields=['date'], include=['solde_net', 'reste_a_vivre_journalier'], name='snapshot_date_totals_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"Photo instantanée {self.beneficiary} - {self.date.strftime('%d/%m/%Y')}"
     
-    @property
-    def total_revenus(self):
-        """Calcule le total des revenus"""
-        revenus = [
-            self.rsa_prime_activite or 0, self.aah_pension_invalidite or 0, self.apl or 0, self.paje or 0,
-            self.af or 0, self.cf or 0, self.asf or 0, self.ape_conge_parental or 0, self.ij_cpam_msa or 0,
-            self.france_travail or 0, self.retraite_aspa or 0, self.salaire or 0, self.ada or 0,
-            self.stage_formation_bourses or 0, self.autres_revenus or 0, self.aide_conseil_departemental or 0,
-            self.pension_alimentaire or 0, self.travail_non_declare or 0, self.soutien_familial_amical or 0,
-            self.contrat_garantie_jeunes or 0, self.contrat_apprentissage or 0, self.tickets_service or 0,
-            self.bons_alimentation or 0
-        ]
-        return sum(revenus)
-    
-    @property
-    def total_charges(self):
-        """Calcule le total des charges"""
-        charges = [
-            self.loyer_residuel or 0, self.energie or 0, self.eau or 0, self.assurance_habitation or 0,
-            self.telephonie_internet or 0,
-            self.mutuelle_privee or 0, self.css or 0, self.frais_scolaires or 0, self.frais_sante_non_rembourses or 0,
-            self.transport_commun or 0, self.carburant or 0, self.credit_consommation or 0, self.dettes_diverses or 0,
-            self.abonnements_sport_culture or 0
-        ]
-        return sum(charges)
-    
-    @property
-    def solde_net(self):
-        """Calcule le solde net mensuel (revenus - charges)"""
-        return self.total_revenus - self.total_charges
-
-    @property
-    def reste_a_vivre_journalier(self):
-        """Calcule le reste à vivre journalier (solde net / 30 jours)"""
-        return self.solde_net / 30 if self.solde_net else 0
+    def save(self, *args, **kwargs):
+        # Photo et résumé financier du bénéficiaire écrits dans la même transaction
+        # (ainsi que celui de l'ancien bénéficiaire si la photo en change)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Beneficiary.refresh_financial_summary(
+                Beneficiary.objects.filter(Q(pk=self.beneficiary_id) | Q(latest_snapshot=self.pk))
+            )
+        if FinancialSnapshot.beneficiary.is_cached(self):
+            self.beneficiary.refresh_from_db(fields=Beneficiary.FINANCIAL_SUMMARY_FIELDS)
 
 
 class Child(models.Model):
@@ -607,6 +695,10 @@ class Interaction(models.Model):
         verbose_name = 'Interaction'
         verbose_name_plural = 'Interactions'
         ordering = ['-created_at']
+        indexes = [
+            # Historique d'un bénéficiaire, paginé par curseur (-created_at, pk)
+            models.Index(fields=['beneficiary', '-created_at', 'id'], name='interaction_history_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.beneficiary.full_name} ({self.created_at.strftime('%d/%m/%Y')})"
@@ -714,4 +806,17 @@ class Document(models.Model):
             return 'fas fa-file-image text-blue-500'
         elif ext in ['.doc', '.docx']:
             return 'fas fa-file-word text-blue-700'
-        return 'fas fa-file text-gray-500'
\ No newline at end of file
+        return 'fas fa-file text-gray-500'
+
+
+# Signaux : la suppression d'une photo (y compris en cascade ou par
+# queryset.delete()) recalcule le résumé financier du bénéficiaire
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+
+@receiver(post_delete, sender=FinancialSnapshot)
+def refresh_financial_summary_on_snapshot_delete(sender, instance, origin=None, **kwargs):
+    """Dernière photo précédente (ou aucune) après suppression"""
+    if not isinstance(origin, Beneficiary):
+        Beneficiary.refresh_financial_summary(Beneficiary.objects.filter(pk=instance.beneficiary_id))
@@ -0,0 +1,69 @@
+"""
+Recherche des bénéficiaires par trigrammes, insensible à la casse et aux accents.
+
+Prénom, nom, email et téléphone forment un document de recherche
+(immutable_unaccent(lower(...))) stocké dans la colonne générée
+Beneficiary.search_document et indexé par un index GIN pg_trgm (migration
+0013). Chaque mot de la recherche doit figurer dans le document, tel quel ou
+approché (faute de frappe : similarité de mot au-delà du seuil de pg_trgm),
+et les résultats sont classés par similarité trigramme décroissante.
+
+Le même moteur sert à la liste des bénéficiaires, à l'autocomplétion et à la
+recherche de l'admin.
+"""
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import FloatField, Func, Q, TextField, Value
+from django.db.models.functions import Cast, Concat, Lower
+
+
+# Champs du document de recherche, dans l'ordre
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'phone')
+
+# En dessous, un mot n'a pas de trigramme propre : recherche exacte seulement
+MIN_SIMILAR_LENGTH = 3
+
+
+class ImmutableUnaccent(Func):
+    """
+    unaccent() déclaré IMMUTABLE (fonction SQL créée par la migration 0013) :
+    unaccent() lui-même ne peut servir ni à une colonne générée ni à un index.
+    """
+    function = 'immutable_unaccent'
+    output_field = TextField()
+
+
+def normalize(expression):
+    """Expression en minuscules et sans accents, comme le document indexé"""
+    return ImmutableUnaccent(Lower(expression))
+
+
+def search_document_expression():
+    """Expression de la colonne générée Beneficiary.search_document"""
+    parts = []
+    for name in SEARCH_FIELDS:
+        if parts:
+            parts.append(Value(' '))
+        parts.append(name)
+    return normalize(Concat(*parts, output_field=TextField()))
+
+
+def search_beneficiaries(queryset, query):
+    """
+    Filtre `queryset` sur la recherche `query` et le classe par pertinence
+    (annotation search_rank, puis nom et prénom). Recherche vide : queryset inchangé.
+    """
+    terms = query.split()
+    if not terms:
+        return queryset
+
+    for term in terms:
+        needle = normalize(Value(term))
+        condition = Q(search_document__contains=needle)
+        if len(term) >= MIN_SIMILAR_LENGTH:
+            condition |= Q(search_document__trigram_word_similar=needle)
+        queryset = queryset.filter(condition)
+    # Similarité (real) en double précision : relue à l'identique dans un curseur de pagination
+    rank = TrigramWordSimilarity(normalize(Value(' '.join(terms))), 'search_document')
+    return queryset.annotate(
+        search_rank=Cast(rank, FloatField())
+    ).order_by('-search_rank', 'last_name', 'first_name')
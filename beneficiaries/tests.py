@@ -1,3 +1,370 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Avg
+from django.db.models.functions import TruncMonth
+from django.http import Http404, StreamingHttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from rosa.pagination import EstimatedCountPaginator, KeysetPaginator
+from volunteers.models import Volunteer
+from .models import Beneficiary, FinancialSnapshot, Interaction
+from .search import search_beneficiaries
+from .views import (
+    BeneficiaryDetailView, BeneficiaryListView, ExportDownloadView, InteractionListView, beneficiary_search_autocomplete
+)
+
+
+class BeneficiarySearchTests(TestCase):
+    """Recherche trigramme sans accents (liste, autocomplétion, admin)"""
+
+    def setUp(self):
+        self.helene = Beneficiary.objects.create(
+            first_name='Hélène', last_name='Dupont', email='helene.dupont@example.org'
+        )
+        self.paul = Beneficiary.objects.create(first_name='Paul', last_name='Martin', phone='06 12 34 56 78')
+        self.martine = Beneficiary.objects.create(first_name='Martine', last_name='Abadie')
+
+    def search(self, query):
+        return list(search_beneficiaries(Beneficiary.objects.all(), query))
+
+    def test_accent_and_case_insensitive(self):
+        self.assertEqual(self.search('HELENE'), [self.helene])
+        self.assertEqual(self.search('dupont hélène'), [self.helene])
+        self.assertEqual(self.search('example.org'), [self.helene])
+
+    def test_typo_matches_by_similarity(self):
+        self.assertEqual(self.search('Dupond'), [self.helene])
+        self.assertEqual(self.search('Dupond Paul'), [])
+
+    def test_ranked_by_similarity(self):
+        # Nom exact avant prénom qui ne fait que contenir le mot
+        self.assertEqual(self.search('martin'), [self.paul, self.martine])
+        self.assertEqual(self.search('  '), [self.martine, self.helene, self.paul])
+
+    def test_trigram_index_is_used(self):
+        queryset = search_beneficiaries(Beneficiary.objects.all(), 'helene')
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('beneficiary_search_trgm', queryset.explain())
+
+    def test_autocomplete_and_admin_use_backend(self):
+        user = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        factory = RequestFactory()
+
+        request = factory.get('/beneficiaries/search/', {'q': 'eloise martin'})
+        request.user = user
+        Beneficiary.objects.create(first_name='Éloïse', last_name='Martin')
+        response = beneficiary_search_autocomplete(request)
+        self.assertEqual(
+            [result['name'] for result in json.loads(response.content)['results']],
+            ['Éloïse Martin']
+        )
+
+        request = factory.get('/admin/beneficiaries/beneficiary/', {'q': 'martin'})
+        request.user = user
+        changelist = site.get_model_admin(Beneficiary).get_changelist_instance(request)
+        # Pertinence avant l'ordre alphabétique de l'admin (Abadie)
+        self.assertEqual(len(changelist.result_list), 3)
+        self.assertEqual(changelist.result_list[2], self.martine)
+
+
+class FinancialSummaryTests(TestCase):
+    """Dernière photo financière et montants recopiés sur le bénéficiaire"""
+
+    def setUp(self):
+        self.beneficiary = Beneficiary.objects.create(first_name='Anne', last_name='Leroy')
+
+    def summary(self, beneficiary=None):
+        beneficiary = Beneficiary.objects.get(pk=(beneficiary or self.beneficiary).pk)
+        return beneficiary.latest_snapshot, beneficiary.solde_net, beneficiary.reste_a_vivre_journalier
+
+    def test_snapshot_save_updates_beneficiary(self):
+        self.assertEqual(self.summary(), (None, None, None))
+
+        first = FinancialSnapshot.objects.create(beneficiary=self.beneficiary, salaire=1200, loyer_residuel=300)
+        self.assertEqual(self.summary(), (first, Decimal('900.00'), Decimal('30.00')))
+        # Instance en mémoire rafraîchie
+        self.assertEqual(first.beneficiary.solde_net, Decimal('900.00'))
+
+        second = FinancialSnapshot.objects.create(beneficiary=self.beneficiary, apl=250, energie=100)
+        self.assertEqual(self.summary(), (second, Decimal('150.00'), Decimal('5.00')))
+
+        # Modifier une photo plus ancienne ne change pas le résumé
+        first.salaire = 2000
+        first.save()
+        self.assertEqual(self.summary()[0], second)
+
+        second.energie = 400
+        second.save()
+        self.assertEqual(self.summary(), (second, Decimal('-150.00'), Decimal('-5.00')))
+
+    def test_deleting_snapshots_falls_back_to_previous(self):
+        first = FinancialSnapshot.objects.create(beneficiary=self.beneficiary, salaire=600)
+        second = FinancialSnapshot.objects.create(beneficiary=self.beneficiary, salaire=900)
+
+        second.delete()
+        self.assertEqual(self.summary(), (first, Decimal('600.00'), Decimal('20.00')))
+        FinancialSnapshot.objects.all().delete()
+        self.assertEqual(self.summary(), (None, None, None))
+
+    def test_moving_a_snapshot_refreshes_both_beneficiaries(self):
+        snapshot = FinancialSnapshot.objects.create(beneficiary=self.beneficiary, salaire=600)
+        other = Beneficiary.objects.create(first_name='Marc', last_name='Roux')
+
+        snapshot.beneficiary = other
+        snapshot.save()
+        self.assertEqual(self.summary(), (None, None, None))
+        self.assertEqual(self.summary(other), (snapshot, Decimal('600.00'), Decimal('20.00')))
+
+    def test_backfill_command_after_writes_outside_the_orm(self):
+        older = FinancialSnapshot.objects.create(beneficiary=self.beneficiary, salaire=300)
+        newer = FinancialSnapshot.objects.create(beneficiary=self.beneficiary, salaire=450)
+        # Antidatée par update() : le résumé n'est plus à jour
+        FinancialSnapshot.objects.filter(pk=newer.pk).update(date=older.date - timedelta(days=31))
+        self.assertEqual(self.summary()[0], newer)
+
+        call_command('refresh_financial_summaries', stdout=io.StringIO())
+        self.assertEqual(self.summary(), (older, Decimal('300.00'), Decimal('10.00')))
+
+    def test_detail_view_reads_latest_snapshot_with_the_beneficiary(self):
+        FinancialSnapshot.objects.create(beneficiary=self.beneficiary, salaire=300)
+        beneficiary = BeneficiaryDetailView(kwargs={'pk': self.beneficiary.pk}).get_object()
+        with self.assertNumQueries(0):
+            self.assertEqual(beneficiary.latest_financial_snapshot.salaire, 300)
+
+
+class FinancialSnapshotTotalsTests(TestCase):
+    """Totaux des photos financières calculés par PostgreSQL"""
+
+    def setUp(self):
+        self.beneficiary = Beneficiary.objects.create(first_name='Anne', last_name='Leroy')
+        self.positive = FinancialSnapshot.objects.create(
+            beneficiary=self.beneficiary, salaire=1200, apl=150, rsa_prime_activite=None, loyer_residuel=300
+        )
+        self.negative = FinancialSnapshot.objects.create(beneficiary=self.beneficiary, af=200, dettes_diverses=350)
+
+    def test_generated_totals(self):
+        self.assertEqual(
+            (self.positive.total_revenus, self.positive.total_charges, self.positive.solde_net),
+            (Decimal('1350.00'), Decimal('300.00'), Decimal('1050.00'))
+        )
+        self.assertEqual(self.positive.reste_a_vivre_journalier, Decimal('35.00'))
+        # Montant modifié : colonnes recalculées par la base
+        self.negative.af = 0
+        self.negative.save()
+        self.negative.refresh_from_db()
+        self.assertEqual((self.negative.solde_net, self.negative.reste_a_vivre_journalier),
+                         (Decimal('-350.00'), Decimal('-11.67')))
+
+    def test_filter_sort_and_aggregate_in_sql(self):
+        self.assertEqual(list(FinancialSnapshot.objects.filter(solde_net__lt=0)), [self.negative])
+        self.assertEqual(list(FinancialSnapshot.objects.order_by('solde_net')), [self.negative, self.positive])
+        with self.assertNumQueries(1):
+            months = list(
+                FinancialSnapshot.objects.annotate(month=TruncMonth('date')).values('month')
+                .annotate(rav=Avg('reste_a_vivre_journalier')).values_list('rav', flat=True)
+            )
+        self.assertEqual(months, [Decimal('15.00')])
+
+    def test_admin_sorts_and_filters_by_balance(self):
+        user = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        model_admin = site.get_model_admin(FinancialSnapshot)
+        # Colonnes de la liste précédées de la case à cocher des actions
+        solde_column = model_admin.list_display.index('solde_net') + 1
+
+        request = RequestFactory().get('/', {'o': str(solde_column)})
+        request.user = user
+        self.assertEqual(list(model_admin.get_changelist_instance(request).result_list),
+                         [self.negative, self.positive])
+
+        request = RequestFactory().get('/', {'solde': 'negatif'})
+        request.user = user
+        self.assertEqual(list(model_admin.get_changelist_instance(request).result_list), [self.negative])
+
+
+class KeysetPaginationTests(TestCase):
+    """Pagination par curseur de la liste et de l'historique des interactions"""
+
+    def setUp(self):
+        names = ['Martin', 'Bernard', 'Martin', 'Petit', 'Durand']
+        for index in range(13):
+            Beneficiary.objects.create(
+                first_name='Léa' if index % 2 else 'Marc', last_name=names[index % len(names)],
+                birth_date=None if index % 3 else date(1980 + index, 1, 1),
+            )
+        self.user = User.objects.create(username='benevole')
+        Volunteer.objects.create(user=self.user, role='VOLUNTEER_INTERVIEW')
+
+    def walk(self, queryset, per_page=4):
+        paginator = KeysetPaginator(queryset, per_page)
+        rows, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = paginator.page(cursor)
+                rows.extend(page)
+            if not page.has_next():
+                return rows
+            cursor = page.next_cursor
+
+    def test_pages_follow_the_full_ordering(self):
+        self.assertEqual(self.walk(Beneficiary.objects.all()),
+                         list(Beneficiary.objects.order_by('last_name', 'first_name', 'pk')))
+        # Valeurs NULL en dernier (croissant) ou en premier (décroissant), comme PostgreSQL
+        for ordering in (['birth_date'], ['-birth_date', '-first_name']):
+            queryset = Beneficiary.objects.order_by(*ordering)
+            self.assertEqual(self.walk(queryset, per_page=3), list(queryset.order_by(*ordering, 'pk')))
+
+    def test_search_results_paginate_by_rank(self):
+        queryset = search_beneficiaries(Beneficiary.objects.all(), 'martin')
+        self.assertEqual(self.walk(queryset, per_page=2), list(queryset.order_by('-search_rank', 'last_name', 'first_name', 'pk')))
+
+    def get_list(self, **params):
+        headers = {'HTTP_HX_REQUEST': 'true'} if 'cursor' in params else {}
+        request = RequestFactory().get('/beneficiaries/', params, **headers)
+        request.user = self.user
+        return BeneficiaryListView.as_view()(request)
+
+    def test_list_view_loads_more_rows_with_htmx(self):
+        response = self.get_list()
+        self.assertEqual(len(response.context_data['beneficiaries']), 13)
+        self.assertFalse(response.context_data['is_paginated'])
+
+        Beneficiary.objects.bulk_create(Beneficiary(first_name='Zoé', last_name='Zola') for _ in range(10))
+        # Une seule requête pour la page, sans COUNT(*)
+        with self.assertNumQueries(1):
+            response = self.get_list()
+            page = response.context_data['page_obj']
+        self.assertEqual((len(page), page.has_next()), (20, True))
+        self.assertIn('Charger plus', response.rendered_content)
+
+        response = self.get_list(cursor=page.next_cursor)
+        self.assertEqual(response.template_name, ['beneficiaries/partials/beneficiary_rows.html'])
+        self.assertEqual(len(response.context_data['beneficiaries']), 3)
+        self.assertNotIn('Charger plus', response.rendered_content)
+
+        # Curseur falsifié, ou émis pour un autre ordre
+        other = KeysetPaginator(Beneficiary.objects.order_by('-last_name'), 1).page().next_cursor
+        for cursor in (page.next_cursor[:-2], other):
+            with self.assertRaises(Http404):
+                self.get_list(cursor=cursor)
+
+    def test_interaction_history_loads_older_interactions(self):
+        beneficiary = Beneficiary.objects.first()
+        Interaction.objects.bulk_create(
+            Interaction(beneficiary=beneficiary, title=f'Entretien {index}', interaction_type='PHONE')
+            for index in range(12)
+        )
+        # Même date pour toutes : départagées par la clé
+        Interaction.objects.update(created_at=timezone.now())
+        context = BeneficiaryDetailView(kwargs={'pk': beneficiary.pk}, object=beneficiary).get_context_data()
+        first_page = context['interactions']
+        self.assertEqual(len(first_page), 10)
+
+        request = RequestFactory().get('/', {'cursor': first_page.next_cursor}, HTTP_HX_REQUEST='true')
+        request.user = self.user
+        response = InteractionListView.as_view()(request, beneficiary_pk=beneficiary.pk)
+        older = list(response.context_data['interactions'])
+        self.assertEqual(list(first_page) + older, list(Interaction.objects.order_by('-created_at', 'pk')))
+        self.assertIn('Entretien', response.rendered_content)
+
+    def test_admin_estimates_count_of_large_unfiltered_tables(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Beneficiary._meta.db_table}')
+        paginator = EstimatedCountPaginator(Beneficiary.objects.order_by('pk'), 5)
+        paginator.threshold = 0
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 13)
+        # Liste filtrée : comptage exact
+        paginator = EstimatedCountPaginator(Beneficiary.objects.filter(last_name='Martin'), 5)
+        paginator.threshold = 0
+        self.assertEqual(paginator.count, 6)
+
+
+class ExportTests(TestCase):
+    """Exports CSV / XLSX en flux (vue et commande export_data)"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='salarie')
+        Volunteer.objects.create(user=self.user, role='EMPLOYEE')
+        self.anne = Beneficiary.objects.create(first_name='Anne', last_name='Leroy', housing_status='DIFFUS')
+        self.marc = Beneficiary.objects.create(first_name='Marc', last_name='Roux')
+        Beneficiary.objects.filter(pk=self.marc.pk).update(created_at=timezone.now() - timedelta(days=400))
+        self.snapshot = FinancialSnapshot.objects.create(beneficiary=self.anne, salaire=1200, loyer_residuel=300)
+
+    def download(self, dataset, **params):
+        request = RequestFactory().get(f'/beneficiaries/export/{dataset}/', params)
+        request.user = self.user
+        return ExportDownloadView.as_view()(request, dataset=dataset)
+
+    def test_csv_with_selected_columns_and_period(self):
+        today = timezone.localdate().isoformat()
+        response = self.download(
+            'beneficiaries', columns='id,last_name,housing_status', date_from=today, date_to=today
+        )
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertIn(f'beneficiaries_{today}_{today}.csv', response['Content-Disposition'])
+        # En-tête envoyé avant toute requête
+        content = iter(response.streaming_content)
+        with self.assertNumQueries(0):
+            header = next(content)
+        rows = list(csv.reader(io.StringIO((header + b''.join(content)).decode('utf-8-sig'))))
+        self.assertEqual(rows, [['ID', 'Nom', 'Hébergement'], [str(self.anne.pk), 'Leroy', 'Logement Diffus']])
+
+    def test_xlsx_workbook(self):
+        response = self.download('snapshots', format='xlsx', columns=['beneficiary__last_name', 'date', 'solde_net'])
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        rows = sheet.findall('.//s:row', namespace)
+        self.assertEqual(len(rows), 2)
+        name, day, solde = rows[1].findall('s:c', namespace)
+        self.assertEqual(name.find('.//s:t', namespace).text, 'Leroy')
+        self.assertEqual(day.get('s'), '2')
+        self.assertEqual(solde.find('s:v', namespace).text, '900.00')
+
+    def test_formula_like_text_is_not_evaluated(self):
+        Beneficiary.objects.filter(pk=self.anne.pk).update(last_name='=HYPERLINK("http://x")', first_name='-2+3')
+        columns = 'last_name,first_name,solde_net'
+
+        response = self.download('beneficiaries', columns=columns)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertIn(["'=HYPERLINK(\"http://x\")", "'-2+3", '900.00'], rows)
+        self.assertIn(['Roux', 'Marc', ''], rows)
+
+        response = self.download('beneficiaries', format='xlsx', columns=columns)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        self.assertEqual(sheet.findall('.//s:f', namespace), [])
+        cells = {cell.find('.//s:t', namespace).text: cell.get('t') for cell in sheet.iterfind('.//s:c', namespace)
+                 if cell.find('.//s:t', namespace) is not None}
+        self.assertEqual(cells['=HYPERLINK("http://x")'], 'inlineStr')
+
+    def test_invalid_parameters_are_rejected(self):
+        for dataset, params in [('beneficiaries', {'columns': 'id,secret'}), ('beneficiaries', {'format': 'pdf'}),
+                                ('beneficiaries', {'date_from': '31/12/2024'}), ('children', {})]:
+            self.assertEqual(self.download(dataset, **params).status_code, 400)
+
+    def test_command_writes_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'interactions.csv')
+        Interaction.objects.create(beneficiary=self.marc, title='Appel', interaction_type='PHONE')
+        stdout = io.StringIO()
+        call_command('export_data', 'interactions', '--columns', 'beneficiary__first_name,title',
+                     '--output', path, '--chunk-size', '1', stdout=stdout)
+        with open(path, encoding='utf-8-sig') as output:
+            self.assertEqual(output.read().splitlines(), ['Bénéficiaire - Prénom,Titre', 'Marc,Appel'])
+        self.assertIn('✅', stdout.getvalue())
@@ -14,6 +14,7 @@ urlpatterns = [
     path('<int:pk>/snapshot/new/', views.financial_snapshot_create_view, name='financial_snapshot_create'),
     
     # Interactions
+    path('<int:beneficiary_pk>/interactions/', views.InteractionListView.as_view(), name='interaction_list'),
     path('<int:beneficiary_pk>/interactions/new/', views.InteractionCreateView.as_view(), name='interaction_create'),
     path('<int:beneficiary_pk>/interactions/<int:pk>/', views.InteractionDetailView.as_view(), name='interaction_detail'),
     path('<int:beneficiary_pk>/interactions/<int:pk>/edit/', views.InteractionUpdateView.as_view(), name='interaction_edit'),
@@ -22,6 +23,10 @@ urlpatterns = [
     path('<int:pk>/documents/upload/', views.DocumentUploadView.as_view(), name='document_upload'),
     path('<int:beneficiary_pk>/documents/<int:pk>/delete/', views.document_delete_view, name='document_delete'),
 
+    # Exports CSV / XLSX
+    path('export/', views.ExportView.as_view(), name='export'),
+    path('export/<slug:dataset>/', views.ExportDownloadView.as_view(), name='export_download'),
+
     # API/HTMX endpoints
     path('search/', views.beneficiary_search_autocomplete, name='search_autocomplete'),
 ] 
\ No newline at end of file
@@ -1,23 +1,27 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.generic import ListView, CreateView, DetailView, UpdateView
+from django.views.generic import ListView, CreateView, DetailView, UpdateView, TemplateView, View
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.db import transaction
 from django.urls import reverse_lazy, reverse
-from django.db.models import Q
 from django.utils import timezone
 from datetime import datetime
 from .models import Beneficiary, FinancialSnapshot, Child, Interaction, Document
+from .exports import DATASETS, FORMATS, Export
+from .search import search_beneficiaries
 from .forms import BeneficiaryForm, FinancialSnapshotForm, ChildForm, ChildFormSet, InteractionForm, DocumentForm
-from volunteers.permissions import CanModifyBeneficiariesMixin
+from rosa.pagination import KeysetPaginationMixin, KeysetPaginator
+from volunteers.permissions import AdminOrEmployeeRequiredMixin, CanModifyBeneficiariesMixin
 
 
-class BeneficiaryListView(CanModifyBeneficiariesMixin, ListView):
-    """Vue liste des bénéficiaires avec recherche"""
+class BeneficiaryListView(CanModifyBeneficiariesMixin, KeysetPaginationMixin, ListView):
+    """Vue liste des bénéficiaires avec recherche, paginée par curseur (nom, prénom ou pertinence)"""
     model = Beneficiary
     template_name = 'beneficiaries/list.html'
+    htmx_template_name = 'beneficiaries/list_htmx.html'
+    rows_template_name = 'beneficiaries/partials/beneficiary_rows.html'
     context_object_name = 'beneficiaries'
     paginate_by = 20
 
@@ -27,13 +31,10 @@ class BeneficiaryListView(CanModifyBeneficiariesMixin, ListView):
         search_query = self.request.GET.get('search', '')
         
         if search_query:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(email__icontains=search_query)
-            )
+            queryset = search_beneficiaries(queryset, search_query)
         
-        return queryset.select_related().prefetch_related('financial_snapshots')
+        # Solde et reste à vivre lus sur le bénéficiaire : pas d'historique des photos
+        return queryset.select_related()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -92,13 +93,16 @@ class BeneficiaryDetailView(CanModifyBeneficiariesMixin, DetailView):
     model = Beneficiary
     template_name = 'beneficiaries/detail.html'
     context_object_name = 'beneficiary'
+    queryset = Beneficiary.objects.select_related('latest_snapshot')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['financial_snapshots'] = self.object.financial_snapshots.all()[:10]  # Derniers 10
         context['latest_snapshot'] = self.object.latest_financial_snapshot
         context['children'] = self.object.children.all()
-        context['interactions'] = self.object.interactions.select_related('user').all()[:10]  # Dernières 10
+        # 10 dernières, les plus anciennes chargées à la demande (InteractionListView)
+        interactions = KeysetPaginator(self.object.interactions.select_related('user'), 10).page()
+        context['interactions'] = context['interactions_page'] = interactions
         context['documents'] = self.object.documents.select_related('uploaded_by').all()
         return context
 
@@ -227,11 +231,7 @@ def beneficiary_search_autocomplete(request):
     beneficiaries = []
     
     if query and len(query) >= 2:
-        beneficiaries = Beneficiary.objects.filter(
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(email__icontains=query)
-        )[:10]
+        beneficiaries = search_beneficiaries(Beneficiary.objects.all(), query)[:10]
     
     if request.headers.get('HX-Request'):
         context = {'beneficiaries': beneficiaries, 'query': query}
@@ -300,23 +300,25 @@ class InteractionCreateView(CanModifyBeneficiariesMixin, CreateView):
                     # Créer le snapshot manuellement avec les données POST
                     financial_snapshot = FinancialSnapshot(beneficiary=self.beneficiary)
                     
-                    # Parcourir tous les champs du modèle FinancialSnapshot
-                    for field in FinancialSnapshot._meta.fields:
-                        if field.name not in ['id', 'beneficiary', 'date']:
-                            value = self.request.POST.get(field.name, '')
-                            if value == '' or value is None:
-                                setattr(financial_snapshot, field.name, 0)
-                            else:
-                                try:
-                                    setattr(financial_snapshot, field.name, float(value))
-                                except (ValueError, TypeError):
-                                    setattr(financial_snapshot, field.name, 0)
-                    
-                    financial_snapshot.save()
+                    # Parcourir tous les montants (les totaux sont calculés par la base)
+                    for field_name in FinancialSnapshot.REVENUE_FIELDS + FinancialSnapshot.CHARGE_FIELDS:
+                        value = self.request.POST.get(field_name, '')
+                        if value == '' or value is None:
+                            setattr(financial_snapshot, field_name, 0)
+                        else:
+                            try:
+                                setattr(financial_snapshot, field_name, float(value))
+                            except (ValueError, TypeError):
+                                setattr(financial_snapshot, field_name, 0)
                     
-                    # Associer le snapshot à l'interaction
-                    self.object.financial_snapshot = financial_snapshot
-                    self.object.save()
+                    # Point de sauvegarde : un échec (photo ou résumé financier du
+                    # bénéficiaire) est annulé sans invalider la transaction de l'interaction
+                    with transaction.atomic():
+                        financial_snapshot.save()
+                        
+                        # Associer le snapshot à l'interaction
+                        self.object.financial_snapshot = financial_snapshot
+                        self.object.save()
                 except Exception as e:
                     # Si la création du snapshot échoue, on continue quand même
                     print(f"Erreur lors de la création du snapshot: {e}")
@@ -330,12 +332,11 @@ class InteractionCreateView(CanModifyBeneficiariesMixin, CreateView):
     
     def _has_financial_data_from_request(self):
         """Vérifie si la requête contient des données financières"""
-        # Parcourir tous les champs du modèle FinancialSnapshot
-        for field in FinancialSnapshot._meta.fields:
-            if field.name not in ['id', 'beneficiary', 'date']:
-                value = self.request.POST.get(field.name, '')
-                if value and value.strip() and value != '0':
-                    return True
+        # Parcourir tous les montants du modèle FinancialSnapshot
+        for field_name in FinancialSnapshot.REVENUE_FIELDS + FinancialSnapshot.CHARGE_FIELDS:
+            value = self.request.POST.get(field_name, '')
+            if value and value.strip() and value != '0':
+                return True
         return False
     
     def _has_financial_data(self, financial_form):
@@ -346,6 +347,24 @@ class InteractionCreateView(CanModifyBeneficiariesMixin, CreateView):
         return reverse('beneficiaries:detail', kwargs={'pk': self.beneficiary.pk})
 
 
+class InteractionListView(CanModifyBeneficiariesMixin, KeysetPaginationMixin, ListView):
+    """Interactions suivantes de l'historique d'un bénéficiaire (fragment HTMX, par curseur)"""
+    model = Interaction
+    template_name = 'beneficiaries/partials/interaction_list.html'
+    context_object_name = 'interactions'
+    paginate_by = 10
+
+    def get_queryset(self):
+        self.beneficiary = get_object_or_404(Beneficiary, pk=self.kwargs['beneficiary_pk'])
+        return self.beneficiary.interactions.select_related('user')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['beneficiary'] = self.beneficiary
+        context['interactions_page'] = context['page_obj']
+        return context
+
+
 class InteractionDetailView(CanModifyBeneficiariesMixin, DetailView):
     """Vue détail d'une interaction"""
     model = Interaction
@@ -450,3 +469,39 @@ def document_serve_view(request, path):
         raise Http404("Fichier non trouvé")
 
     return FileResponse(open(file_path, 'rb'))
+
+
+class ExportView(AdminOrEmployeeRequiredMixin, TemplateView):
+    """Page des exports en masse : table, colonnes, période et format"""
+    template_name = 'beneficiaries/export.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['datasets'] = DATASETS.values()
+        context['formats'] = FORMATS
+        return context
+
+
+class ExportDownloadView(AdminOrEmployeeRequiredMixin, View):
+    """
+    Export CSV / XLSX d'une table (paramètres columns, date_from, date_to,
+    format), envoyé en flux au fil de la lecture des lignes
+    """
+
+    def get(self, request, dataset):
+        try:
+            export = Export(
+                dataset,
+                columns=request.GET.getlist('columns'),
+                export_format=request.GET.get('format', 'csv'),
+                date_from=request.GET.get('date_from'),
+                date_to=request.GET.get('date_to'),
+            )
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+
+        return StreamingHttpResponse(export.stream(), content_type=export.content_type, headers={
+            'Content-Disposition': f'attachment; filename="{export.filename}"',
+            # Pas de mise en tampon par nginx : les premiers octets partent aussitôt
+            'X-Accel-Buffering': 'no',
+        })
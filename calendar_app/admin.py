@@ -1,5 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from rosa.pagination import EstimatedCountPaginator
+from .booking import annotate_booking_capacity, save_booking
 from .models import (
     VolunteerCalendar, AvailabilitySlot, AvailabilityException, Appointment
 )
@@ -70,7 +72,7 @@ class AvailabilityExceptionInline(admin.TabularInline):
 class AvailabilitySlotAdmin(admin.ModelAdmin):
     list_display = [
         'volunteer_name', 'schedule_display', 'slot_type',
-        'duration', 'max_appointments', 'is_bookable', 'is_active'
+        'duration', 'booking_display', 'is_bookable', 'is_active'
     ]
     list_filter = [
         'slot_type', 'recurrence_type', 'weekday', 'is_bookable',
@@ -82,6 +84,7 @@ class AvailabilitySlotAdmin(admin.ModelAdmin):
         'title', 'notes'
     ]
     readonly_fields = ['created_at', 'updated_at', 'created_by']
+    list_select_related = ['volunteer_calendar__volunteer__user']
     inlines = [AvailabilityExceptionInline]
 
     fieldsets = (
@@ -129,6 +132,14 @@ class AvailabilitySlotAdmin(admin.ModelAdmin):
         return f"{obj.duration_hours:.1f}h"
     duration.short_description = 'Durée'
 
+    def get_queryset(self, request):
+        return annotate_booking_capacity(super().get_queryset(request))
+
+    def booking_display(self, obj):
+        return f"{obj.booked_count}/{obj.max_appointments}"
+    booking_display.short_description = 'RDV (prochaine occurrence)'
+    booking_display.admin_order_field = 'booked_count'
+
     def save_model(self, request, obj, form, change):
         if not change:  # Nouveau objet
             obj.created_by = request.user
@@ -199,6 +210,9 @@ class AppointmentAdmin(admin.ModelAdmin):
     ]
     readonly_fields = ['created_at', 'updated_at', 'created_by']
     date_hierarchy = 'appointment_date'
+    # Grandes tables : pas de COUNT(*) de la table entière à chaque page
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         ('Participants', {
@@ -248,7 +262,8 @@ class AppointmentAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if not change:  # Nouveau objet
             obj.created_by = request.user
-        super().save_model(request, obj, form, change)
+        # Capacité du créneau lié revérifiée sous verrou (le formulaire l'a déjà validée)
+        save_booking(obj)
 
     def get_queryset(self, request):
         # Optimiser les requêtes avec select_related
@@ -0,0 +1,207 @@
+"""
+Moteur de calcul des disponibilités réelles.
+
+Les occurrences de créneaux (voir calendar_app.occurrences) et les rendez-vous
+d'une période sont chargés en une seule fois, rangés en listes d'intervalles
+triées par calendrier, puis les plages libres sont obtenues par un seul
+balayage par calendrier (au lieu de découper chaque créneau par chaque
+rendez-vous, jour par jour).
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import time, timedelta
+
+from django.db.models import Exists, OuterRef, Value
+from django.utils import timezone
+
+from .models import Appointment, SlotOccurrence, VolunteerCalendar, appointment_time_range
+from .occurrences import get_slot_occurrences, horizon_covers
+
+
+# Durée minimale d'une plage libre pour être proposée à la réservation
+MIN_FREE_DURATION = timedelta(minutes=30)
+
+
+def _to_seconds(value):
+    """Convertit une heure (datetime.time) en secondes depuis minuit"""
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _from_seconds(seconds):
+    """Convertit des secondes depuis minuit en heure (datetime.time)"""
+    return time(seconds // 3600, (seconds % 3600) // 60, seconds % 60)
+
+
+def _merge_busy(intervals):
+    """Fusionne des intervalles occupés (date, début, fin) déjà triés"""
+    merged = []
+    for day, start, end in intervals:
+        if merged and merged[-1][0] == day and start <= merged[-1][2]:
+            if end > merged[-1][2]:
+                merged[-1][2] = end
+        else:
+            merged.append([day, start, end])
+    return merged
+
+
+def compute_free_windows(occurrences, appointments, now=None, min_duration=MIN_FREE_DURATION):
+    """
+    Calcule les plages libres (disponibilités - rendez-vous).
+
+    Args:
+        occurrences: itérable d'occurrences de créneaux (SlotOccurrence)
+        appointments: itérable de rendez-vous de la même période
+        now: instant de référence pour écarter les plages passées
+            (par défaut l'heure locale ; False pour ne rien filtrer)
+        min_duration: durée minimale d'une plage libre
+
+    Returns:
+        Dictionnaire {(calendar_id, date): [plage, ...]} où chaque plage est
+        un dictionnaire id / start_time / end_time / title / original_slot,
+        dans l'ordre des créneaux puis des heures.
+    """
+    if now is None:
+        now = timezone.localtime()
+    min_seconds = min_duration.total_seconds()
+
+    # Ranger les intervalles par calendrier
+    slots_by_calendar = defaultdict(list)
+    for occurrence in occurrences:
+        slots_by_calendar[occurrence.volunteer_calendar_id].append(
+            (occurrence.date,
+             _to_seconds(occurrence.start_time),
+             _to_seconds(occurrence.end_time),
+             occurrence.availability_slot)
+        )
+
+    busy_by_calendar = defaultdict(list)
+    for appointment in appointments:
+        if appointment.volunteer_calendar_id is None:
+            continue
+        busy_by_calendar[appointment.volunteer_calendar_id].append(
+            (appointment.appointment_date,
+             _to_seconds(appointment.start_time),
+             _to_seconds(appointment.end_time))
+        )
+
+    free_windows = defaultdict(list)
+
+    for calendar_id, slot_intervals in slots_by_calendar.items():
+        slot_intervals.sort(key=lambda item: item[:3])
+        busy = _merge_busy(sorted(busy_by_calendar.get(calendar_id, [])))
+        # Les intervalles fusionnés sont disjoints : leurs fins sont triées
+        busy_ends = [(day, end) for day, _start, end in busy]
+
+        for day, start, end, slot in slot_intervals:
+            cursor = start
+            index = bisect_right(busy_ends, (day, start))
+            pieces = []
+            while index < len(busy) and busy[index][0] == day and busy[index][1] < end:
+                _day, busy_start, busy_end = busy[index]
+                if busy_start > cursor:
+                    pieces.append((cursor, busy_start))
+                cursor = max(cursor, busy_end)
+                index += 1
+            if cursor < end:
+                pieces.append((cursor, end))
+
+            for piece_start, piece_end in pieces:
+                if piece_end - piece_start < min_seconds:
+                    continue
+                start_time = _from_seconds(piece_start)
+                end_time = _from_seconds(piece_end)
+                if now and not _is_upcoming(day, end_time, now):
+                    continue
+                free_windows[(calendar_id, day)].append({
+                    'id': slot.id,
+                    'start_time': start_time,
+                    'end_time': end_time,
+                    'title': slot.title,
+                    'original_slot': slot,
+                })
+
+    return free_windows
+
+
+def _is_upcoming(day, end_time, now):
+    """Une plage est gardée si son jour est futur, ou si elle n'est pas finie aujourd'hui"""
+    today = now.date()
+    if day > today:
+        return True
+    return day == today and end_time > now.time()
+
+
+def get_free_windows(calendars, start_date, end_date, now=None):
+    """
+    Charge en deux requêtes les occurrences de créneaux et les rendez-vous de
+    la période pour les calendriers donnés, puis calcule les plages libres.
+    """
+    occurrences = get_slot_occurrences(calendars, start_date, end_date)
+
+    appointments = Appointment.objects.filter(
+        volunteer_calendar__in=calendars,
+        appointment_date__range=[start_date, end_date],
+        status__in=Appointment.ACTIVE_STATUSES
+    ).only('volunteer_calendar', 'appointment_date', 'start_time', 'end_time')
+
+    return compute_free_windows(occurrences, appointments, now=now)
+
+
+def get_calendars_by_availability(appointment_date, start_time, end_time):
+    """
+    Sépare les calendriers (hors gouvernance) entre disponibles et indisponibles
+    pour un rendez-vous [date, début, fin].
+
+    Un calendrier est disponible si une occurrence de créneau couvre toute la
+    plage et qu'aucun rendez-vous ne la chevauche. Les deux conditions sont
+    évaluées par la base (sous-requêtes EXISTS) : une seule requête, quel que
+    soit le nombre de bénévoles.
+
+    Returns:
+        Tuple (disponibles, indisponibles) de listes de VolunteerCalendar,
+        triées par nom de bénévole.
+    """
+    conflicting_appointments = Appointment.objects.filter(
+        volunteer_calendar=OuterRef('pk'),
+        status__in=Appointment.ACTIVE_STATUSES,
+        time_range__overlap=appointment_time_range(
+            Value(appointment_date), Value(start_time), Value(end_time)
+        )
+    )
+
+    calendars = VolunteerCalendar.objects.filter(
+        volunteer__role__in=['ADMIN', 'EMPLOYEE', 'VOLUNTEER_INTERVIEW']
+    ).select_related('volunteer__user').annotate(
+        has_conflict=Exists(conflicting_appointments)
+    ).order_by('volunteer__user__last_name', 'volunteer__user__first_name')
+
+    # Couverture lue dans la table si son horizon contient la date (même requête)
+    covering_occurrences = SlotOccurrence.objects.filter(
+        volunteer_calendar=OuterRef('pk'),
+        date=appointment_date,
+        start_time__lte=start_time,
+        end_time__gte=end_time
+    )
+    calendars = list(calendars.annotate(
+        within_horizon=horizon_covers(appointment_date, appointment_date),
+        is_covered=Exists(covering_occurrences),
+    ))
+
+    if calendars and not calendars[0].within_horizon:
+        # Hors horizon matérialisé : couverture calculée à la volée
+        covered_ids = {
+            occurrence.volunteer_calendar_id
+            for occurrence in get_slot_occurrences(calendars, appointment_date, appointment_date)
+            if occurrence.start_time <= start_time and end_time <= occurrence.end_time
+        }
+        for calendar in calendars:
+            calendar.is_covered = calendar.id in covered_ids
+
+    available, unavailable = [], []
+    for calendar in calendars:
+        if calendar.is_covered and not calendar.has_conflict:
+            available.append(calendar)
+        else:
+            unavailable.append(calendar)
+
+    return available, unavailable
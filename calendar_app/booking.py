@@ -0,0 +1,130 @@
+"""
+Réservation des créneaux de disponibilité dans la limite de max_appointments.
+
+La capacité d'un créneau vaut pour chacune de ses occurrences : un créneau
+hebdomadaire à une place accepte un rendez-vous par semaine. Les réservations
+sont donc comptées à la date du rendez-vous.
+
+Compter les rendez-vous puis enregistrer n'est pas sûr : deux réservations
+simultanées voient la même place libre. save_booking verrouille la ligne du
+créneau (SELECT ... FOR UPDATE) le temps du comptage et de l'enregistrement :
+les réservations concurrentes d'un même créneau passent l'une après l'autre
+et la seconde voit la première.
+
+find_booking_slot retrouve le créneau réservé par un rendez-vous saisi dans
+une plage libre, et annotate_booking_capacity fournit aux listes le nombre de
+réservations et les places restantes en une seule requête (plus de count()
+par ligne).
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, DateField, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import AvailabilitySlot, Appointment, SlotOccurrence
+from .occurrences import get_slot_occurrences
+
+
+SLOT_FULL_ERROR = 'Ce créneau a atteint son nombre maximum de rendez-vous.'
+SLOT_NOT_BOOKABLE_ERROR = "Ce créneau n'accepte pas de rendez-vous."
+
+
+def annotate_booking_capacity(queryset, on_date=None):
+    """
+    Ajoute booked_count et remaining_capacity à un queryset de créneaux, pour
+    l'occurrence du `on_date`. Sans date, pour la prochaine occurrence de
+    chaque créneau (annotée next_occurrence_date, lue dans SlotOccurrence).
+    """
+    if on_date is None:
+        next_occurrence = SlotOccurrence.objects.filter(
+            availability_slot=OuterRef('pk'),
+            date__gte=timezone.localdate()
+        ).order_by('date').values('date')[:1]
+        queryset = queryset.annotate(next_occurrence_date=Subquery(next_occurrence, output_field=DateField()))
+        booking_date = OuterRef('next_occurrence_date')
+    else:
+        booking_date = on_date
+
+    booked = Appointment.objects.filter(
+        availability_slot=OuterRef('pk'),
+        appointment_date=booking_date,
+        status__in=AvailabilitySlot.BOOKED_STATUSES
+    ).order_by().values('availability_slot').annotate(count=Count('id')).values('count')
+
+    return queryset.annotate(
+        booked_count=Coalesce(Subquery(booked, output_field=IntegerField()), Value(0)),
+    ).annotate(
+        remaining_capacity=Greatest(F('max_appointments') - F('booked_count'), Value(0)),
+    )
+
+
+def find_booking_slot(volunteer_calendar, appointment_date, start_time, end_time, current_slot_id=None):
+    """
+    Créneau réservable dont l'occurrence du jour couvre toute la plage
+    [start_time, end_time] du bénévole, ou None (rendez-vous hors créneau).
+    Parmi plusieurs créneaux, garde celui déjà lié (`current_slot_id`), puis
+    un créneau qui a encore de la place.
+    """
+    slot_ids = {
+        occurrence.availability_slot_id
+        for occurrence in get_slot_occurrences([volunteer_calendar], appointment_date, appointment_date)
+        if occurrence.start_time <= start_time and end_time <= occurrence.end_time
+    }
+    if not slot_ids:
+        return None
+
+    slots = annotate_booking_capacity(
+        AvailabilitySlot.objects.filter(
+            pk__in=slot_ids, is_active=True, is_bookable=True, slot_type='AVAILABILITY'
+        ),
+        on_date=appointment_date
+    ).order_by('start_time', 'pk')
+    return min(
+        slots,
+        key=lambda slot: (slot.pk != current_slot_id, slot.remaining_capacity == 0),
+        default=None
+    )
+
+
+def _is_booking(appointment):
+    """Le rendez-vous occupe-t-il une place de son créneau ?"""
+    return bool(appointment.availability_slot_id) and appointment.status in AvailabilitySlot.BOOKED_STATUSES
+
+
+def _check_capacity(slot, appointment):
+    if not (slot.is_active and slot.is_bookable and slot.slot_type == 'AVAILABILITY'):
+        raise ValidationError(SLOT_NOT_BOOKABLE_ERROR)
+
+    others = slot.appointments.filter(
+        appointment_date=appointment.appointment_date,
+        status__in=AvailabilitySlot.BOOKED_STATUSES
+    )
+    if appointment.pk:
+        others = others.exclude(pk=appointment.pk)
+    if others.count() >= slot.max_appointments:
+        raise ValidationError(SLOT_FULL_ERROR)
+
+
+def check_booking(appointment):
+    """
+    Vérifie sans verrou que le créneau lié peut recevoir le rendez-vous
+    (validation des formulaires ; save_booking revérifie sous verrou).
+    """
+    if _is_booking(appointment):
+        _check_capacity(AvailabilitySlot.objects.get(pk=appointment.availability_slot_id), appointment)
+
+
+def save_booking(appointment):
+    """
+    Enregistre un rendez-vous en respectant la capacité de son créneau à la
+    date du rendez-vous.
+    Lève ValidationError si le créneau n'est pas réservable ou déjà complet.
+    """
+    with transaction.atomic():
+        if _is_booking(appointment):
+            slot = AvailabilitySlot.objects.select_for_update().get(pk=appointment.availability_slot_id)
+            _check_capacity(slot, appointment)
+
+        appointment.save()
+    return appointment
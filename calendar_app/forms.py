@@ -1,9 +1,10 @@
 from django import forms
-from django.db.models import Q
+from django.db.models import Value
 from django.utils import timezone
 from datetime import datetime, timedelta
 
-from .models import Appointment, AvailabilitySlot, VolunteerCalendar
+from .booking import find_booking_slot
+from .models import Appointment, AvailabilitySlot, VolunteerCalendar, appointment_time_range
 from volunteers.models import Volunteer
 from beneficiaries.models import Beneficiary
 
@@ -249,16 +250,16 @@ class AppointmentForm(forms.ModelForm):
                 raise forms.ValidationError("Impossible de planifier un rendez-vous dans le passé.")
 
         # Vérifier les conflits de rendez-vous si on a toutes les données
-        if volunteer_calendar and appointment_date and start_time and end_time:
-            start_datetime = datetime.combine(appointment_date, start_time)
-            end_datetime = datetime.combine(appointment_date, end_time)
-
+        # (même règle que la contrainte appointment_no_overlap, qui tranche en cas de course)
+        if (volunteer_calendar and appointment_date and start_time and end_time and
+                self.instance.status in Appointment.ACTIVE_STATUSES):
             # Exclure le rendez-vous actuel si on est en modification
             conflicting_appointments = Appointment.objects.filter(
                 volunteer_calendar=volunteer_calendar,
-                appointment_date=appointment_date,
-                start_time__lt=end_time,
-                end_time__gt=start_time
+                status__in=Appointment.ACTIVE_STATUSES,
+                time_range__overlap=appointment_time_range(
+                    Value(appointment_date), Value(start_time), Value(end_time)
+                )
             )
 
             if self.instance.pk:
@@ -266,9 +267,17 @@ class AppointmentForm(forms.ModelForm):
 
             if conflicting_appointments.exists():
                 raise forms.ValidationError(
-                    f"Conflit détecté avec un autre rendez-vous de {volunteer_calendar.volunteer.get_full_name()}."
+                    f"Conflit détecté avec un autre rendez-vous de {volunteer_calendar.volunteer.full_name}."
                 )
 
+        # Rattacher le RDV au créneau de la plage libre choisie : sa capacité
+        # (max_appointments) est vérifiée par le modèle puis sous verrou (booking.save_booking)
+        if appointment_date and start_time and end_time:
+            self.instance.availability_slot = find_booking_slot(
+                volunteer_calendar, appointment_date, start_time, end_time,
+                current_slot_id=self.instance.availability_slot_id
+            ) if volunteer_calendar else None
+
         return cleaned_data
 
 
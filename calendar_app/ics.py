@@ -0,0 +1,260 @@
+"""
+Flux iCalendar (RFC 5545) des calendriers bénévoles.
+
+Chaque VolunteerCalendar est publié à l'adresse /calendar/ics/<jeton>.ics :
+rendez-vous et occurrences de créneaux sur une fenêtre glissante
+(ICS_FEED_PAST_DAYS / ICS_FEED_FUTURE_DAYS), pour un abonnement depuis un
+agenda externe. Le jeton tient lieu d'authentification : il est régénérable.
+
+- get_feed_state : empreinte des données (compteurs et dernières
+  modifications) obtenue par agrégats, sans charger les événements ; elle
+  fournit l'ETag et Last-Modified, donc les réponses 304
+- jeton de synchronisation : valeur signée portant la dernière modification
+  servie. Renvoyé en ?sync_token=, il limite la réponse aux événements
+  modifiés ou annulés depuis (clients qui fusionnent par UID). Les
+  suppressions définitives n'apparaissent que dans le flux complet.
+- render_feed : sérialisation VCALENDAR (échappement, pliage à 75 octets, CRLF)
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AvailabilityException, AvailabilitySlot, Appointment
+from .occurrences import get_horizon, get_slot_occurrences
+
+
+PRODID = '-//ROSA//Calendrier des bénévoles//FR'
+SYNC_TOKEN_SALT = 'calendar_app.ics.sync'
+
+# Statut iCalendar des rendez-vous
+APPOINTMENT_ICS_STATUS = {
+    'SCHEDULED': 'TENTATIVE',
+    'CANCELLED': 'CANCELLED',
+}
+
+
+def get_feed_window(today=None):
+    """
+    Période (début, fin) publiée dans le flux, bornée à l'horizon des
+    occurrences pour que les créneaux se lisent d'une seule requête.
+    """
+    today = today or timezone.localdate()
+    past_days = getattr(settings, 'ICS_FEED_PAST_DAYS', 30)
+    future_days = getattr(settings, 'ICS_FEED_FUTURE_DAYS', 180)
+    horizon_start, horizon_end = get_horizon(today)
+    return (
+        max(today - timedelta(days=past_days), horizon_start),
+        min(today + timedelta(days=future_days), horizon_end),
+    )
+
+
+def get_feed_state(calendar, start_date, end_date):
+    """
+    Empreinte du flux : {'fingerprint': str, 'last_modified': datetime | None}.
+    Toute création, modification ou suppression d'un rendez-vous de la fenêtre,
+    d'un créneau ou d'une exception change l'empreinte (deux requêtes).
+    """
+    appointments = Appointment.objects.filter(
+        volunteer_calendar=calendar,
+        appointment_date__range=[start_date, end_date]
+    ).aggregate(count=Count('id'), last=Max('updated_at'))
+    slots = AvailabilitySlot.objects.filter(
+        volunteer_calendar=calendar
+    ).aggregate(
+        count=Count('id', distinct=True),
+        last=Max('updated_at'),
+        exception_count=Count('exceptions', distinct=True),
+        last_exception=Max('exceptions__created_at'),
+    )
+
+    timestamps = [
+        value for value in (appointments['last'], slots['last'], slots['last_exception'])
+        if value is not None
+    ]
+    fingerprint = '|'.join(str(value) for value in (
+        start_date, end_date,
+        appointments['count'], appointments['last'],
+        slots['count'], slots['last'], slots['exception_count'], slots['last_exception'],
+    ))
+    return {
+        'fingerprint': fingerprint,
+        'last_modified': max(timestamps) if timestamps else None,
+    }
+
+
+def make_etag(state, since=None):
+    """ETag fort dérivé de l'empreinte (et du jeton de synchronisation reçu)"""
+    value = f"{state['fingerprint']}|{since.isoformat() if since else ''}"
+    return '"%s"' % hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def make_sync_token(last_modified):
+    """Jeton signé à renvoyer pour ne recevoir que les changements suivants"""
+    return signing.dumps(last_modified.isoformat() if last_modified else '', salt=SYNC_TOKEN_SALT)
+
+
+def parse_sync_token(token):
+    """
+    Date portée par un jeton de synchronisation, ou None (jeton absent,
+    invalide ou émis sur un calendrier vide) : le flux complet est alors servi.
+    """
+    if not token:
+        return None
+    try:
+        value = signing.loads(token, salt=SYNC_TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    return parse_datetime(value) if value else None
+
+
+def _escape(value):
+    """Échappement des valeurs texte (RFC 5545 §3.3.11)"""
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """Pliage des lignes à 75 octets sans couper un caractère UTF-8 (§3.1)"""
+    if len(line.encode('utf-8')) <= 75:
+        return line
+    parts, current, size = [], '', 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > 75:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += char_size
+    parts.append(current)
+    return '\r\n'.join(parts)
+
+
+def _format_utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _local_utc(day, time_value):
+    """Date et heure locales (TIME_ZONE) au format UTC iCalendar"""
+    return _format_utc(timezone.make_aware(datetime.combine(day, time_value)))
+
+
+def _appointment_event(appointment):
+    """VEVENT d'un rendez-vous (bénéficiaire réduit au prénom et à l'initiale)"""
+    beneficiary = appointment.beneficiary
+    summary = appointment.title or appointment.get_appointment_type_display()
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:appointment-{appointment.pk}@rosa',
+        f'DTSTAMP:{_format_utc(appointment.updated_at)}',
+        f'LAST-MODIFIED:{_format_utc(appointment.updated_at)}',
+        f'DTSTART:{_local_utc(appointment.appointment_date, appointment.start_time)}',
+        f'DTEND:{_local_utc(appointment.appointment_date, appointment.end_time)}',
+        f'SUMMARY:{_escape(summary)}',
+        f'DESCRIPTION:{_escape(f"Bénéficiaire : {beneficiary.first_name} {beneficiary.last_name[:1]}.")}',
+    ]
+    if appointment.location:
+        lines.append(f'LOCATION:{_escape(appointment.location)}')
+    lines += [
+        f'STATUS:{APPOINTMENT_ICS_STATUS.get(appointment.status, "CONFIRMED")}',
+        'TRANSP:OPAQUE',
+        'END:VEVENT',
+    ]
+    return lines
+
+
+def _slot_event(slot, original_date, day, start_time, end_time, status='CONFIRMED', stamp=None):
+    """
+    VEVENT d'une occurrence de créneau. L'UID repose sur la date d'origine :
+    une occurrence déplacée garde son identité dans l'agenda abonné.
+    """
+    stamp = _format_utc(stamp or slot.updated_at)
+    return [
+        'BEGIN:VEVENT',
+        f'UID:slot-{slot.pk}-{original_date:%Y%m%d}@rosa',
+        f'DTSTAMP:{stamp}',
+        f'LAST-MODIFIED:{stamp}',
+        f'DTSTART:{_local_utc(day, start_time)}',
+        f'DTEND:{_local_utc(day, end_time)}',
+        f'SUMMARY:{_escape(slot.title or slot.get_slot_type_display())}',
+        f'STATUS:{status}',
+        f'TRANSP:{"TRANSPARENT" if slot.slot_type == "AVAILABILITY" else "OPAQUE"}',
+        'END:VEVENT',
+    ]
+
+
+def get_feed_events(calendar, start_date, end_date, since=None):
+    """Lignes VEVENT du flux, limitées aux changements postérieurs à `since`"""
+    appointments = Appointment.objects.filter(
+        volunteer_calendar=calendar,
+        appointment_date__range=[start_date, end_date]
+    ).select_related('beneficiary')
+    changed_slots = None
+    if since is not None:
+        appointments = appointments.filter(updated_at__gt=since)
+        changed_slots = AvailabilitySlot.objects.filter(volunteer_calendar=calendar).filter(
+            Q(updated_at__gt=since) | Q(exceptions__created_at__gt=since)
+        ).values('pk')
+    occurrences = get_slot_occurrences([calendar], start_date, end_date, slot_ids=changed_slots)
+
+    lines = []
+    for appointment in appointments:
+        lines += _appointment_event(appointment)
+    for occurrence in occurrences:
+        original_date = occurrence.exception.exception_date if occurrence.exception else occurrence.date
+        lines += _slot_event(
+            occurrence.availability_slot, original_date,
+            occurrence.date, occurrence.start_time, occurrence.end_time
+        )
+
+    if since is not None:
+        # Occurrences retirées depuis : exceptions d'annulation et créneaux désactivés
+        cancellations = AvailabilityException.objects.filter(
+            availability_slot__volunteer_calendar=calendar,
+            availability_slot__is_active=True,
+            exception_type='CANCELLED',
+            exception_date__range=[start_date, end_date],
+            created_at__gt=since
+        ).select_related('availability_slot')
+        for exception in cancellations:
+            slot = exception.availability_slot
+            lines += _slot_event(
+                slot, exception.exception_date, exception.exception_date,
+                slot.start_time, slot.end_time, status='CANCELLED', stamp=exception.created_at
+            )
+
+        inactive_slots = AvailabilitySlot.objects.filter(
+            volunteer_calendar=calendar, is_active=False, updated_at__gt=since
+        ).prefetch_related('exceptions')
+        for occurrence in AvailabilitySlot.expand_many(inactive_slots, start_date, end_date):
+            original_date = occurrence.exception.exception_date if occurrence.exception else occurrence.date
+            lines += _slot_event(
+                occurrence.slot, original_date, occurrence.date,
+                occurrence.start_time, occurrence.end_time, status='CANCELLED'
+            )
+
+    return lines
+
+
+def render_feed(calendar, start_date, end_date, since=None, sync_token=''):
+    """Document VCALENDAR complet (ou différentiel si `since` est fourni)"""
+    name = f'ROSA - {calendar.volunteer.full_name}'
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(name)}',
+        f'X-WR-TIMEZONE:{settings.TIME_ZONE}',
+        f'X-ROSA-SYNC-TOKEN:{sync_token}',
+    ]
+    lines += get_feed_events(calendar, start_date, end_date, since=since)
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
@@ -0,0 +1,140 @@
+"""
+Commande Django pour mesurer le rendu de la vue globale (planning équipe).
+
+Crée une équipe synthétique de bénévoles avec leurs créneaux et rendez-vous,
+rend la semaine globale plusieurs fois et affiche le nombre de requêtes SQL
+et le temps de rendu. Toutes les données créées sont annulées à la fin.
+
+Usage: python manage.py benchmark_global_calendar [--volunteers 50] [--repeat 5]
+"""
+
+import random
+import statistics
+import time as perf_time
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from beneficiaries.models import Beneficiary
+from volunteers.models import Volunteer
+from calendar_app.models import AvailabilitySlot, Appointment, VolunteerCalendar
+from calendar_app.occurrences import refresh_slot_occurrences
+from calendar_app.views import GlobalCalendarView
+
+
+def create_synthetic_team(size, week_start, prefix='bench'):
+    """
+    Crée `size` bénévoles d'entretien avec deux créneaux hebdomadaires,
+    un créneau ponctuel et trois rendez-vous chacun dans la semaine donnée.
+    Les occurrences sont matérialisées immédiatement (sans attendre le commit).
+    """
+    rng = random.Random(size)
+    beneficiaries = Beneficiary.objects.bulk_create([
+        Beneficiary(first_name=f'Bénéficiaire{i}', last_name=f'{prefix.title()}{i}')
+        for i in range(size)
+    ])
+
+    calendars = []
+    for i in range(size):
+        user = User.objects.create(
+            username=f'{prefix}_volunteer_{i}',
+            first_name=f'Bénévole{i}',
+            last_name=f'{prefix.title()}{i}',
+        )
+        volunteer = Volunteer.objects.create(user=user, role='VOLUNTEER_INTERVIEW')
+        calendar, _ = VolunteerCalendar.objects.get_or_create(volunteer=volunteer)
+        calendars.append(calendar)
+
+    slots = []
+    for calendar in calendars:
+        for weekday in rng.sample(range(5), 2):
+            slots.append(AvailabilitySlot(
+                volunteer_calendar=calendar,
+                recurrence_type='WEEKLY',
+                weekday=weekday,
+                start_time=time(9, 0),
+                end_time=time(12, 0),
+                valid_from=week_start - timedelta(days=28),
+            ))
+        slots.append(AvailabilitySlot(
+            volunteer_calendar=calendar,
+            recurrence_type='NONE',
+            specific_date=week_start + timedelta(days=rng.randrange(7)),
+            start_time=time(14, 0),
+            end_time=time(17, 0),
+            valid_from=week_start,
+        ))
+    slots = AvailabilitySlot.objects.bulk_create(slots)
+    for slot in slots:
+        refresh_slot_occurrences(slot)
+
+    # Rendez-vous d'une heure sur des (jour, heure) distincts : pas de chevauchement
+    hours_of_week = [(day, hour) for day in range(7) for hour in range(9, 17)]
+    appointments = []
+    for calendar in calendars:
+        for day, start_hour in rng.sample(hours_of_week, 3):
+            appointments.append(Appointment(
+                volunteer_calendar=calendar,
+                beneficiary=rng.choice(beneficiaries),
+                appointment_date=week_start + timedelta(days=day),
+                start_time=time(start_hour, 0),
+                end_time=time(start_hour + 1, 0),
+            ))
+    Appointment.objects.bulk_create(appointments)
+
+    return calendars
+
+
+class Command(BaseCommand):
+    help = 'Mesure le nombre de requêtes et le temps de rendu de la vue globale du calendrier'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--volunteers',
+            type=int,
+            default=50,
+            help='Nombre de bénévoles de l\'équipe synthétique (défaut: 50)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Nombre de rendus mesurés (défaut: 5)',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        week_start = today - timedelta(days=today.weekday())
+        view = GlobalCalendarView.as_view()
+        request = RequestFactory().get(reverse('calendar:global'), {'week': week_start.isoformat()})
+
+        with transaction.atomic():
+            create_synthetic_team(options['volunteers'], week_start)
+            request.user = User.objects.create(username='bench_admin', is_superuser=True, is_staff=True)
+            view(request).render()  # Échauffement (chargement des templates)
+
+            timings = []
+            query_counts = []
+            for _ in range(options['repeat']):
+                with CaptureQueriesContext(connection) as queries:
+                    started = perf_time.perf_counter()
+                    response = view(request).render()
+                    timings.append(perf_time.perf_counter() - started)
+                query_counts.append(len(queries.captured_queries))
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'📊 Vue globale - {options["volunteers"]} bénévoles, semaine du {week_start}')
+        self.stdout.write(f'   Statut HTTP : {response.status_code}')
+        self.stdout.write(f'   Requêtes SQL : {max(query_counts)}')
+        self.stdout.write(
+            f'   Temps de rendu : médiane {statistics.median(timings) * 1000:.1f} ms, '
+            f'max {max(timings) * 1000:.1f} ms'
+        )
+        self.stdout.write(self.style.SUCCESS('✅ Données synthétiques annulées'))
@@ -0,0 +1,178 @@
+"""
+Commande Django pour mesurer le développement des créneaux récurrents.
+
+Crée des créneaux synthétiques (hebdomadaires, bi-hebdomadaires, mensuels,
+ponctuels, dont une partie avec exceptions), puis mesure sur un an :
+- get_occurrences_in_range, comparé à l'ancienne implémentation (parcours
+  jour par jour) : même résultat, une liste de dicts par créneau
+- AvailabilitySlot.expand_many : tous les créneaux, exceptions appliquées,
+  occurrences triées
+Toutes les données créées sont annulées à la fin.
+
+Usage: python manage.py benchmark_slot_expansion [--slots 1000] [--days 365] [--repeat 5]
+"""
+
+import gc
+import random
+import statistics
+import time as perf_time
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from calendar_app.models import AvailabilityException, AvailabilitySlot
+from calendar_app.management.commands.benchmark_global_calendar import create_synthetic_team
+
+
+def day_walk_occurrences(slot, start_date, end_date):
+    """Référence : ancienne implémentation de get_occurrences_in_range (parcours jour par jour)"""
+    occurrences = []
+    if slot.recurrence_type == 'NONE':
+        if start_date <= slot.specific_date <= end_date:
+            occurrences.append({
+                'date': slot.specific_date, 'start_time': slot.start_time,
+                'end_time': slot.end_time, 'slot': slot
+            })
+        return occurrences
+
+    current_date = max(start_date, slot.valid_from)
+    end_check = min(end_date, slot.valid_until) if slot.valid_until else end_date
+    while current_date <= end_check:
+        if current_date.weekday() == slot.weekday:
+            occurrences.append({
+                'date': current_date, 'start_time': slot.start_time,
+                'end_time': slot.end_time, 'slot': slot
+            })
+            if slot.recurrence_type == 'WEEKLY':
+                current_date += timedelta(days=7)
+            elif slot.recurrence_type == 'BIWEEKLY':
+                current_date += timedelta(days=14)
+            else:
+                month, year = current_date.month % 12 + 1, current_date.year + current_date.month // 12
+                try:
+                    current_date = current_date.replace(month=month, year=year)
+                except ValueError:
+                    current_date = current_date.replace(month=month, year=year, day=1)
+        else:
+            current_date += timedelta(days=1)
+    return occurrences
+
+
+def create_synthetic_slots(calendars, count, start_date, rng):
+    """Crée `count` créneaux répartis sur les calendriers, 10 % avec une exception"""
+    recurrences = ['WEEKLY'] * 5 + ['BIWEEKLY'] * 2 + ['MONTHLY'] * 2 + ['NONE']
+    slots = []
+    for i in range(count):
+        recurrence_type = rng.choice(recurrences)
+        start_hour = rng.randrange(8, 17)
+        slots.append(AvailabilitySlot(
+            volunteer_calendar=calendars[i % len(calendars)],
+            recurrence_type=recurrence_type,
+            weekday=rng.randrange(7) if recurrence_type != 'NONE' else None,
+            specific_date=start_date + timedelta(days=rng.randrange(365)) if recurrence_type == 'NONE' else None,
+            start_time=time(start_hour, 0),
+            end_time=time(start_hour + 2, 0),
+            valid_from=start_date - timedelta(days=rng.randrange(60)),
+        ))
+    slots = AvailabilitySlot.objects.bulk_create(slots)
+
+    exceptions = []
+    for slot in rng.sample(slots, count // 10):
+        occurrence_dates = slot.occurrence_dates(start_date, start_date + timedelta(days=90))
+        if occurrence_dates:
+            exceptions.append(AvailabilityException(
+                availability_slot=slot,
+                exception_date=rng.choice(occurrence_dates),
+                exception_type='CANCELLED',
+            ))
+    AvailabilityException.objects.bulk_create(exceptions)
+
+    return slots
+
+
+class Command(BaseCommand):
+    help = 'Mesure le développement des créneaux récurrents (expand_many) sur une période'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--slots',
+            type=int,
+            default=1000,
+            help='Nombre de créneaux synthétiques (défaut: 1000)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='Longueur de la période développée en jours (défaut: 365)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Nombre de mesures (défaut: 5)',
+        )
+
+    def measure(self, function, repeat):
+        """
+        Médiane des temps d'exécution (en ms) et dernier résultat.
+        Le ramasse-miettes est suspendu pendant les mesures (comme timeit) :
+        sinon ses passages sur le tas de Django dominent les écarts.
+        """
+        timings = []
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                started = perf_time.perf_counter()
+                result = function()
+                timings.append(perf_time.perf_counter() - started)
+        finally:
+            gc.enable()
+        return statistics.median(timings) * 1000, result
+
+    def handle(self, *args, **options):
+        start_date = timezone.localdate()
+        end_date = start_date + timedelta(days=options['days'] - 1)
+
+        with transaction.atomic():
+            calendars = create_synthetic_team(20, start_date - timedelta(days=start_date.weekday()))
+            created = create_synthetic_slots(calendars, options['slots'], start_date, random.Random(options['slots']))
+            slots = list(
+                AvailabilitySlot.objects.filter(pk__in=[slot.pk for slot in created])
+                .prefetch_related('exceptions')
+            )
+            transaction.set_rollback(True)
+
+        walk_ms, walked = self.measure(
+            lambda: [
+                occurrence
+                for slot in slots
+                for occurrence in day_walk_occurrences(slot, start_date, end_date)
+            ],
+            options['repeat']
+        )
+        range_ms, ranged = self.measure(
+            lambda: [
+                occurrence
+                for slot in slots
+                for occurrence in slot.get_occurrences_in_range(start_date, end_date)
+            ],
+            options['repeat']
+        )
+        expand_ms, expanded = self.measure(
+            lambda: AvailabilitySlot.expand_many(slots, start_date, end_date),
+            options['repeat']
+        )
+
+        self.stdout.write(f'📊 Développement de {len(slots)} créneaux du {start_date} au {end_date}')
+        self.stdout.write(f'   Ancien parcours jour par jour : {walk_ms:.1f} ms ({len(walked)} occurrences)')
+        self.stdout.write(
+            f'   get_occurrences_in_range : {range_ms:.1f} ms ({len(ranged)} occurrences, '
+            f'x{walk_ms / range_ms:.1f})'
+        )
+        self.stdout.write(
+            f'   expand_many : {expand_ms:.1f} ms ({len(expanded)} occurrences, exceptions appliquées, triées)'
+        )
+        self.stdout.write(self.style.SUCCESS('✅ Données synthétiques annulées'))
@@ -0,0 +1,27 @@
+"""
+Commande Django pour purger les traces de suppression de l'API de synchronisation.
+
+Supprime les CalendarTombstone plus anciennes que SYNC_TOMBSTONE_RETENTION_DAYS :
+un client dont le curseur est plus ancien reçoit de toute façon un
+rechargement complet. Le worker run_export_worker la fait chaque jour ;
+sans lui, à lancer chaque jour par cron.
+
+Usage: python manage.py purge_calendar_tombstones
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from calendar_app.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = "Purge les traces de suppression plus anciennes que la rétention de l'API de synchronisation"
+
+    def handle(self, *args, **options):
+        retention_days = getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30)
+        count = purge_tombstones()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {count} traces de suppression purgées (rétention: {retention_days} jours)')
+        )
@@ -0,0 +1,33 @@
+"""
+Commande Django pour reconstruire la table des occurrences de créneaux.
+
+Développe tous les créneaux actifs (récurrences et exceptions) sur l'horizon
+glissant défini par SLOT_OCCURRENCE_PAST_DAYS / SLOT_OCCURRENCE_FUTURE_DAYS.
+Les modifications courantes sont déjà répercutées par signaux : la commande
+sert à l'initialisation et à faire avancer l'horizon (le worker run_export_worker
+s'en charge chaque jour ; sinon, à lancer chaque jour par cron).
+
+Usage: python manage.py refresh_slot_occurrences
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from calendar_app.occurrences import get_horizon, rebuild_slot_occurrences
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les occurrences matérialisées des créneaux de disponibilité'
+
+    def handle(self, *args, **options):
+        horizon_start, horizon_end = get_horizon()
+        self.stdout.write(f'📅 Horizon: du {horizon_start} au {horizon_end}')
+
+        started = time.perf_counter()
+        count = rebuild_slot_occurrences()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {count} occurrences générées en {elapsed:.2f}s')
+        )
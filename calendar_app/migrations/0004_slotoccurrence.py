@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0003_alter_appointment_volunteer_calendar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('start_time', models.TimeField(verbose_name='Heure de début')),
+                ('end_time', models.TimeField(verbose_name='Heure de fin')),
+                ('availability_slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='calendar_app.availabilityslot')),
+                ('exception', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='calendar_app.availabilityexception')),
+                ('volunteer_calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_occurrences', to='calendar_app.volunteercalendar')),
+            ],
+            options={
+                'verbose_name': 'Occurrence de créneau',
+                'verbose_name_plural': 'Occurrences de créneaux',
+                'ordering': ['date', 'start_time'],
+                'indexes': [models.Index(fields=['volunteer_calendar', 'date'], name='slotocc_calendar_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:37
+
+import calendar_app.models
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+ACTIVE_STATUSES = ['SCHEDULED', 'CONFIRMED', 'IN_PROGRESS', 'COMPLETED']
+
+
+def resolve_existing_overlaps(apps, schema_editor):
+    """
+    Rend les rendez-vous existants compatibles avec la colonne time_range et
+    la contrainte appointment_no_overlap, qui échoueraient sinon :
+    - heure de fin avant l'heure de début (tsrange refuse la plage) : heures inversées ;
+    - rendez-vous actifs qui se chevauchent pour un même bénévole : le premier
+      (par heure de début) est gardé, les suivants sont annulés.
+    Chaque rendez-vous corrigé le signale dans ses notes de compte-rendu.
+    """
+    Appointment = apps.get_model('calendar_app', 'Appointment')
+
+    def flag(appointment, note, fields):
+        appointment.completion_notes = '\n'.join(filter(None, [appointment.completion_notes, note]))
+        appointment.save(update_fields=[*fields, 'completion_notes', 'updated_at'])
+
+    for appointment in Appointment.objects.filter(end_time__lt=models.F('start_time')):
+        appointment.start_time, appointment.end_time = appointment.end_time, appointment.start_time
+        flag(appointment, '[Migration] Heures de début et de fin inversées à la saisie, remises dans l\'ordre.',
+             ['start_time', 'end_time'])
+
+    appointments = Appointment.objects.filter(
+        status__in=ACTIVE_STATUSES, volunteer_calendar__isnull=False
+    ).order_by('volunteer_calendar', 'appointment_date', 'start_time', 'pk')
+    kept_day, kept_end, kept_pk = None, None, None
+    for appointment in appointments.iterator():
+        if appointment.start_time == appointment.end_time:
+            continue  # Plage vide : ne chevauche rien
+        day = (appointment.volunteer_calendar_id, appointment.appointment_date)
+        if day == kept_day and appointment.start_time < kept_end:
+            appointment.status = 'CANCELLED'
+            flag(appointment, f'[Migration] Annulé : chevauche le rendez-vous n°{kept_pk} du même bénévole.', ['status'])
+            continue
+        if day != kept_day or appointment.end_time > kept_end:
+            kept_day, kept_end, kept_pk = day, appointment.end_time, appointment.pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficiaries', '0012_beneficiary_file_number_beneficiary_first_entry_date_and_more'),
+        ('calendar_app', '0004_slotoccurrence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # btree_gist : permet l'égalité sur volunteer_calendar dans un index GiST
+        BtreeGistExtension(),
+        migrations.RunPython(resolve_existing_overlaps, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='appointment',
+            name='time_range',
+            field=models.GeneratedField(db_persist=True, expression=models.Func(models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(models.F('appointment_date'), '+', models.F('start_time')), output_field=models.DateTimeField()), models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(models.F('appointment_date'), '+', models.F('end_time')), output_field=models.DateTimeField()), function='tsrange', output_field=calendar_app.models.TimestampRangeField()), output_field=calendar_app.models.TimestampRangeField(), verbose_name='Plage horaire'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ['SCHEDULED', 'CONFIRMED', 'IN_PROGRESS', 'COMPLETED']), ('volunteer_calendar__isnull', False)), expressions=[('volunteer_calendar', '='), ('time_range', '&&')], name='appointment_no_overlap', violation_error_message='Ce créneau chevauche un autre rendez-vous du bénévole.'),
+        ),
+    ]
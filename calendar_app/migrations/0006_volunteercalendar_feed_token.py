@@ -0,0 +1,31 @@
+import calendar_app.models
+from django.db import migrations, models
+
+
+def generate_tokens(apps, schema_editor):
+    """Un jeton distinct par calendrier existant"""
+    VolunteerCalendar = apps.get_model('calendar_app', 'VolunteerCalendar')
+    for calendar in VolunteerCalendar.objects.all():
+        calendar.feed_token = calendar_app.models.generate_feed_token()
+        calendar.save(update_fields=['feed_token'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0005_appointment_no_overlap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='volunteercalendar',
+            name='feed_token',
+            field=models.CharField(editable=False, max_length=64, null=True, verbose_name='Jeton du flux iCalendar'),
+        ),
+        migrations.RunPython(generate_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='volunteercalendar',
+            name='feed_token',
+            field=models.CharField(default=calendar_app.models.generate_feed_token, editable=False, max_length=64, unique=True, verbose_name='Jeton du flux iCalendar'),
+        ),
+    ]
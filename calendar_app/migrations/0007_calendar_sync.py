@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficiaries', '0012_beneficiary_file_number_beneficiary_first_entry_date_and_more'),
+        ('calendar_app', '0006_volunteercalendar_feed_token'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('appointment', 'Rendez-vous'), ('slot', 'Créneau de disponibilité')], max_length=12)),
+                ('object_id', models.PositiveIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Suppression synchronisée',
+                'verbose_name_plural': 'Suppressions synchronisées',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['volunteer_calendar', 'updated_at'], name='appointment_calendar_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='availabilityslot',
+            index=models.Index(fields=['volunteer_calendar', 'updated_at'], name='slot_calendar_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='calendartombstone',
+            name='volunteer_calendar',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='tombstones', to='calendar_app.volunteercalendar'),
+        ),
+        migrations.AddIndex(
+            model_name='calendartombstone',
+            index=models.Index(fields=['volunteer_calendar', 'deleted_at'], name='tombstone_calendar_del_idx'),
+        ),
+    ]
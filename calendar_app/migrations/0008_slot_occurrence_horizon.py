@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0007_calendar_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotOccurrenceHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField(verbose_name='Début')),
+                ('end_date', models.DateField(verbose_name='Fin')),
+                ('built_at', models.DateTimeField(auto_now=True, verbose_name='Reconstruite le')),
+            ],
+            options={
+                'verbose_name': 'Horizon des occurrences',
+                'verbose_name_plural': 'Horizon des occurrences',
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficiaries', '0017_backfill_financial_summary'),
+        ('calendar_app', '0008_slot_occurrence_horizon'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['volunteer_calendar', 'appointment_date', 'start_time', 'id'], name='appointment_calendar_date_idx'),
+        ),
+    ]
@@ -1,9 +1,58 @@
 from django.db import models
+from django.db.models import ExpressionWrapper, F, Func, Q
 from django.contrib.auth.models import User
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from datetime import datetime, timedelta, time
+from collections import namedtuple
+from datetime import date, datetime, timedelta, time
+from operator import attrgetter
 import calendar
+import secrets
+
+
+class TimestampRangeField(DateTimeRangeField):
+    """
+    Plage date/heure sans fuseau (tsrange).
+    Les rendez-vous sont saisis en heure locale (date + heure de début/fin) :
+    le calcul reste immuable, ce qu'exige une colonne générée.
+    """
+
+    def db_type(self, connection):
+        return 'tsrange'
+
+
+# Statuts qui occupent réellement le bénévole (les RDV annulés ou manqués libèrent le créneau)
+ACTIVE_APPOINTMENT_STATUSES = ['SCHEDULED', 'CONFIRMED', 'IN_PROGRESS', 'COMPLETED']
+
+APPOINTMENT_OVERLAP_ERROR = 'Ce créneau chevauche un autre rendez-vous du bénévole.'
+
+
+def appointment_time_range(appointment_date, start_time, end_time):
+    """
+    Expression tsrange [date + début, date + fin) d'un rendez-vous.
+
+    Sert à la colonne générée Appointment.time_range et aux recherches de
+    chevauchement (`time_range__overlap=appointment_time_range(Value(...), ...)`) :
+    un tuple Python serait envoyé en tstzrange, incomparable avec tsrange.
+    """
+    return Func(
+        ExpressionWrapper(appointment_date + start_time, output_field=models.DateTimeField()),
+        ExpressionWrapper(appointment_date + end_time, output_field=models.DateTimeField()),
+        function='tsrange',
+        output_field=TimestampRangeField(),
+    )
+
+
+def generate_feed_token():
+    """Jeton aléatoire des URL d'abonnement iCalendar"""
+    return secrets.token_urlsafe(32)
+
+
+# Occurrence développée d'un créneau (voir AvailabilitySlot.expand_many)
+ExpandedOccurrence = namedtuple('ExpandedOccurrence', ['slot', 'date', 'start_time', 'end_time', 'exception'])
+
 
 class VolunteerCalendar(models.Model):
     """
@@ -55,6 +104,15 @@ class VolunteerCalendar(models.Model):
         verbose_name='Rappel (heures avant)'
     )
 
+    # Abonnement iCalendar : le jeton dans l'URL tient lieu d'authentification
+    feed_token = models.CharField(
+        max_length=64,
+        unique=True,
+        default=generate_feed_token,
+        editable=False,
+        verbose_name='Jeton du flux iCalendar'
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -71,6 +129,11 @@ class VolunteerCalendar(models.Model):
     def __str__(self):
         return f"{self.volunteer.user.get_full_name()}"
 
+    def regenerate_feed_token(self):
+        """Invalide l'URL d'abonnement actuelle (ex: lien partagé par erreur)"""
+        self.feed_token = generate_feed_token()
+        self.save(update_fields=['feed_token', 'updated_at'])
+
 
 class AvailabilitySlot(models.Model):
     """
@@ -102,6 +165,9 @@ class AvailabilitySlot(models.Model):
         ('UNAVAILABLE', 'Indisponible'),
     ]
 
+    # Statuts de rendez-vous qui occupent une place du créneau (max_appointments)
+    BOOKED_STATUSES = ['SCHEDULED', 'CONFIRMED']
+
     volunteer_calendar = models.ForeignKey(
         VolunteerCalendar,
         on_delete=models.CASCADE,
@@ -190,6 +256,10 @@ class AvailabilitySlot(models.Model):
         verbose_name = 'Créneau de disponibilité'
         verbose_name_plural = 'Créneaux de disponibilité'
         ordering = ['weekday', 'start_time']
+        indexes = [
+            # Curseur de synchronisation (calendar_app.sync)
+            models.Index(fields=['volunteer_calendar', 'updated_at'], name='slot_calendar_updated_idx'),
+        ]
 
     def clean(self):
         """Validation du modèle"""
@@ -216,10 +286,14 @@ class AvailabilitySlot(models.Model):
 
     @property
     def current_appointments_count(self):
-        """Nombre actuel de RDV sur ce créneau"""
-        return self.appointments.filter(
-            status__in=['SCHEDULED', 'CONFIRMED']
-        ).count()
+        """
+        Nombre de RDV de la prochaine occurrence de ce créneau (valeur annotée
+        par booking.annotate_booking_capacity si disponible, sinon une requête)
+        """
+        if 'booked_count' in self.__dict__:
+            return self.booked_count
+        from .booking import annotate_booking_capacity
+        return annotate_booking_capacity(AvailabilitySlot.objects.filter(pk=self.pk)).get().booked_count
 
     @property
     def is_available_for_booking(self):
@@ -235,60 +309,132 @@ class AvailabilitySlot(models.Model):
         end_dt = datetime.combine(timezone.now().date(), self.end_time)
         return (end_dt - start_dt).total_seconds() / 3600
 
+    # Pas (en jours) des récurrences à intervalle fixe ; MONTHLY avance d'un mois
+    RECURRENCE_STEP_DAYS = {
+        'WEEKLY': 7,
+        'BIWEEKLY': 14,
+    }
+
+    def occurrence_dates(self, start_date, end_date, anchor=None):
+        """
+        Dates des occurrences (hors exceptions) dans [start_date, end_date].
+
+        Calcul arithmétique : saut direct au premier jour de la semaine voulu,
+        puis pas de 7 / 14 jours ou d'un mois. `anchor` est la date à partir de
+        laquelle le rythme est compté (par défaut le début de la période, ou
+        `valid_from` s'il est postérieur).
+        """
+        if self.recurrence_type == 'NONE':
+            if self.specific_date and start_date <= self.specific_date <= end_date:
+                return [self.specific_date]
+            return []
+
+        if self.weekday is None:
+            return []
+
+        end_check = min(end_date, self.valid_until) if self.valid_until else end_date
+        first = max(anchor or start_date, self.valid_from)
+        first += timedelta(days=(self.weekday - first.weekday()) % 7)
+
+        step = self.RECURRENCE_STEP_DAYS.get(self.recurrence_type)
+        if step:
+            if first < start_date:
+                # Sauter les pas entiers avant la période
+                first += timedelta(days=-(-(start_date - first).days // step) * step)
+            return [
+                date.fromordinal(ordinal)
+                for ordinal in range(first.toordinal(), end_check.toordinal() + 1, step)
+            ]
+
+        # Mensuel : même jour du mois suivant (borné à la fin du mois),
+        # puis prochain jour de la semaine du créneau
+        dates = []
+        current = first
+        while current <= end_check:
+            if current >= start_date:
+                dates.append(current)
+            year, month = divmod(current.year * 12 + current.month, 12)
+            month += 1
+            day = min(current.day, calendar.monthrange(year, month)[1])
+            current = date(year, month, day)
+            current += timedelta(days=(self.weekday - current.weekday()) % 7)
+        return dates
+
     def get_occurrences_in_range(self, start_date, end_date):
         """
         Retourne toutes les occurrences de ce créneau dans une plage de dates.
         """
+        return [
+            {
+                'date': occurrence_date,
+                'start_time': self.start_time,
+                'end_time': self.end_time,
+                'slot': self
+            }
+            for occurrence_date in self.occurrence_dates(start_date, end_date)
+        ]
+
+    def expand(self, start_date, end_date):
+        """
+        Occurrences du créneau sur la période, exceptions appliquées : une
+        occurrence annulée disparaît, une occurrence modifiée ou déplacée prend
+        ses nouveaux horaires / sa nouvelle date.
+
+        Le rythme est compté depuis `valid_from` : il ne dépend pas de la
+        période demandée. Les exceptions sont lues par `self.exceptions.all()`
+        (à précharger avec prefetch_related('exceptions')).
+        """
+        exceptions = list(self.exceptions.all())
+        if not exceptions:
+            return [
+                ExpandedOccurrence(self, day, self.start_time, self.end_time, None)
+                for day in self.occurrence_dates(start_date, end_date, anchor=self.valid_from)
+            ]
+        exceptions_by_date = {exception.exception_date: exception for exception in exceptions}
+
+        # Élargir la recherche aux occurrences déplacées vers la période
+        search_start, search_end = start_date, end_date
+        for exception in exceptions:
+            if (exception.exception_type == 'MOVED' and exception.new_date and
+                    start_date <= exception.new_date <= end_date):
+                search_start = min(search_start, exception.exception_date)
+                search_end = max(search_end, exception.exception_date)
+
         occurrences = []
+        for original_date in self.occurrence_dates(search_start, search_end, anchor=self.valid_from):
+            day, start_time, end_time = original_date, self.start_time, self.end_time
 
-        if self.recurrence_type == 'NONE':
-            # Créneau ponctuel
-            if start_date <= self.specific_date <= end_date:
-                occurrences.append({
-                    'date': self.specific_date,
-                    'start_time': self.start_time,
-                    'end_time': self.end_time,
-                    'slot': self
-                })
-        else:
-            # Créneaux récurrents
-            current_date = max(start_date, self.valid_from)
-            end_check = min(end_date, self.valid_until) if self.valid_until else end_date
-
-            while current_date <= end_check:
-                if current_date.weekday() == self.weekday:
-                    occurrences.append({
-                        'date': current_date,
-                        'start_time': self.start_time,
-                        'end_time': self.end_time,
-                        'slot': self
-                    })
-
-                    if self.recurrence_type == 'WEEKLY':
-                        current_date += timedelta(days=7)
-                    elif self.recurrence_type == 'BIWEEKLY':
-                        current_date += timedelta(days=14)
-                    elif self.recurrence_type == 'MONTHLY':
-                        # Ajouter un mois (approximatif)
-                        month = current_date.month
-                        year = current_date.year
-                        if month == 12:
-                            month = 1
-                            year += 1
-                        else:
-                            month += 1
-                        try:
-                            current_date = current_date.replace(month=month, year=year)
-                        except ValueError:
-                            # Gérer les fins de mois (31 → 28/29/30)
-                            current_date = current_date.replace(month=month, year=year, day=1)
-                            current_date = current_date.replace(day=min(current_date.day,
-                                calendar.monthrange(year, month)[1]))
-                    else:
-                        current_date += timedelta(days=1)
-                else:
-                    current_date += timedelta(days=1)
+            exception = exceptions_by_date.get(original_date)
+            if exception:
+                if exception.exception_type == 'CANCELLED':
+                    continue
+                if exception.exception_type == 'MOVED' and exception.new_date:
+                    day = exception.new_date
+                start_time = exception.new_start_time or start_time
+                end_time = exception.new_end_time or end_time
+
+            if not (start_date <= day <= end_date) or start_time >= end_time:
+                continue
+
+            occurrences.append(ExpandedOccurrence(self, day, start_time, end_time, exception))
+
+        return occurrences
+
+    @classmethod
+    def expand_many(cls, slots, start_date, end_date):
+        """
+        Développe plusieurs créneaux sur la période (voir `expand`).
 
+        Returns:
+            Liste de ExpandedOccurrence(slot, date, start_time, end_time, exception)
+            triée par date puis heure de début
+        """
+        occurrences = [
+            occurrence
+            for slot in slots
+            for occurrence in slot.expand(start_date, end_date)
+        ]
+        occurrences.sort(key=attrgetter('date', 'start_time'))
         return occurrences
 
 
@@ -356,6 +502,83 @@ class AvailabilityException(models.Model):
         return f"Exception {self.get_exception_type_display()} - {self.exception_date}"
 
 
+class SlotOccurrence(models.Model):
+    """
+    Occurrence matérialisée d'un créneau de disponibilité à une date donnée.
+    Les récurrences sont développées et les exceptions appliquées à l'écriture :
+    les vues du calendrier lisent une simple plage de dates par calendrier.
+
+    La table couvre un horizon glissant (voir calendar_app.occurrences), remplie
+    par la commande refresh_slot_occurrences et tenue à jour par signaux.
+    """
+
+    volunteer_calendar = models.ForeignKey(
+        VolunteerCalendar,
+        on_delete=models.CASCADE,
+        related_name='slot_occurrences'
+    )
+
+    availability_slot = models.ForeignKey(
+        AvailabilitySlot,
+        on_delete=models.CASCADE,
+        related_name='occurrences'
+    )
+
+    date = models.DateField(verbose_name='Date')
+    start_time = models.TimeField(verbose_name='Heure de début')
+    end_time = models.TimeField(verbose_name='Heure de fin')
+
+    # Exception appliquée à cette occurrence (modification ou déplacement)
+    exception = models.ForeignKey(
+        AvailabilityException,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='occurrences'
+    )
+
+    class Meta:
+        verbose_name = 'Occurrence de créneau'
+        verbose_name_plural = 'Occurrences de créneaux'
+        ordering = ['date', 'start_time']
+        indexes = [
+            models.Index(fields=['volunteer_calendar', 'date'], name='slotocc_calendar_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.availability_slot_id} - {self.date} {self.start_time}-{self.end_time}"
+
+    @property
+    def title(self):
+        """Titre du créneau d'origine"""
+        return self.availability_slot.title
+
+    @property
+    def duration_hours(self):
+        """Durée de l'occurrence en heures"""
+        start_dt = datetime.combine(self.date, self.start_time)
+        end_dt = datetime.combine(self.date, self.end_time)
+        return (end_dt - start_dt).total_seconds() / 3600
+
+
+class SlotOccurrenceHorizon(models.Model):
+    """
+    Période effectivement couverte par la table SlotOccurrence (une seule
+    ligne), écrite par la reconstruction complète : les lectures hors de
+    cette période développent les créneaux à la volée.
+    """
+
+    start_date = models.DateField(verbose_name='Début')
+    end_date = models.DateField(verbose_name='Fin')
+    built_at = models.DateTimeField(auto_now=True, verbose_name='Reconstruite le')
+
+    class Meta:
+        verbose_name = 'Horizon des occurrences'
+        verbose_name_plural = 'Horizon des occurrences'
+
+    def __str__(self):
+        return f"Occurrences du {self.start_date} au {self.end_date}"
+
+
 class Appointment(models.Model):
     """
     Rendez-vous entre un bénévole et un bénéficiaire.
@@ -370,6 +593,8 @@ class Appointment(models.Model):
         ('NO_SHOW', 'Absent'),
     ]
 
+    ACTIVE_STATUSES = ACTIVE_APPOINTMENT_STATUSES
+
     APPOINTMENT_TYPES = [
         ('INTERVIEW', 'Entretien'),
         ('FOLLOW_UP', 'Suivi'),
@@ -400,6 +625,14 @@ class Appointment(models.Model):
     start_time = models.TimeField(verbose_name='Heure de début')
     end_time = models.TimeField(verbose_name='Heure de fin')
 
+    # Plage calculée par PostgreSQL, support de la contrainte de non-chevauchement
+    time_range = models.GeneratedField(
+        expression=appointment_time_range(F('appointment_date'), F('start_time'), F('end_time')),
+        output_field=TimestampRangeField(),
+        db_persist=True,
+        verbose_name='Plage horaire'
+    )
+
     # Détails
     appointment_type = models.CharField(
         max_length=15,
@@ -468,6 +701,28 @@ class Appointment(models.Model):
         verbose_name = 'Rendez-vous'
         verbose_name_plural = 'Rendez-vous'
         ordering = ['appointment_date', 'start_time']
+        indexes = [
+            # Curseur de synchronisation (calendar_app.sync)
+            models.Index(fields=['volunteer_calendar', 'updated_at'], name='appointment_calendar_upd_idx'),
+            # Sections de la liste des rendez-vous : pagination par curseur (rosa/pagination.py)
+            models.Index(
+                fields=['volunteer_calendar', 'appointment_date', 'start_time', 'id'],
+                name='appointment_calendar_date_idx'
+            ),
+        ]
+        constraints = [
+            # Un bénévole ne peut pas avoir deux rendez-vous actifs qui se chevauchent.
+            # L'index GiST associé sert aussi aux recherches de conflits.
+            ExclusionConstraint(
+                name='appointment_no_overlap',
+                expressions=[
+                    ('volunteer_calendar', RangeOperators.EQUAL),
+                    ('time_range', RangeOperators.OVERLAPS),
+                ],
+                condition=Q(status__in=ACTIVE_APPOINTMENT_STATUSES, volunteer_calendar__isnull=False),
+                violation_error_message=APPOINTMENT_OVERLAP_ERROR,
+            ),
+        ]
 
     def clean(self):
         """Validation du modèle"""
@@ -484,6 +739,11 @@ class Appointment(models.Model):
             if not self.pk:  # Nouveau RDV
                 raise ValidationError('Impossible de créer un rendez-vous dans le passé.')
 
+        # Place libre dans le créneau lié à la date du RDV (revérifiée sous verrou à l'enregistrement)
+        if self.appointment_date:
+            from .booking import check_booking
+            check_booking(self)
+
     def __str__(self):
         if self.volunteer_calendar:
             volunteer_name = self.volunteer_calendar.volunteer.user.get_full_name()
@@ -539,8 +799,49 @@ class Appointment(models.Model):
         return False
 
 
+
+class CalendarTombstone(models.Model):
+    """
+    Trace de suppression d'un rendez-vous ou d'un créneau, pour l'API de
+    synchronisation différentielle : un client qui envoie un curseur apprend
+    ainsi quels objets retirer. Un rendez-vous réassigné laisse aussi une
+    trace dans le calendrier qu'il quitte.
+
+    Les traces sont purgées après SYNC_TOMBSTONE_RETENTION_DAYS (chaque jour
+    par le worker run_export_worker, ou par la commande purge_calendar_tombstones) ;
+    un curseur plus ancien impose un rechargement complet.
+    """
+
+    OBJECT_TYPES = [
+        ('appointment', 'Rendez-vous'),
+        ('slot', 'Créneau de disponibilité'),
+    ]
+
+    # Sans contrainte : les traces survivent au calendrier le temps de la rétention
+    volunteer_calendar = models.ForeignKey(
+        VolunteerCalendar,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='tombstones'
+    )
+    object_type = models.CharField(max_length=12, choices=OBJECT_TYPES)
+    object_id = models.PositiveIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Suppression synchronisée'
+        verbose_name_plural = 'Suppressions synchronisées'
+        indexes = [
+            models.Index(fields=['volunteer_calendar', 'deleted_at'], name='tombstone_calendar_del_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.object_type} {self.object_id} supprimé le {self.deleted_at}"
+
+
 # Signaux pour créer automatiquement les calendriers
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 
 @receiver(post_save, sender='volunteers.Volunteer')
@@ -550,4 +851,54 @@ def create_volunteer_calendar(sender, instance, created, **kwargs):
         # Créer le calendrier uniquement si le bénévole peut en avoir un
         VolunteerCalendar.objects.get_or_create(
             volunteer=instance
-        )
\ No newline at end of file
+        )
+
+def _schedule_occurrence_refresh(slot_id):
+    """Recalcule les occurrences d'un créneau une fois la transaction validée"""
+    from .occurrences import refresh_slot_occurrences_by_id
+    transaction.on_commit(lambda: refresh_slot_occurrences_by_id(slot_id))
+
+
+@receiver(post_save, sender=AvailabilitySlot)
+def refresh_occurrences_on_slot_save(sender, instance, raw=False, **kwargs):
+    """Rafraîchit les occurrences matérialisées du créneau modifié"""
+    if not raw:
+        _schedule_occurrence_refresh(instance.pk)
+
+
+@receiver(post_save, sender=AvailabilityException)
+@receiver(post_delete, sender=AvailabilityException)
+def refresh_occurrences_on_exception_change(sender, instance, raw=False, **kwargs):
+    """
+    Rafraîchit les occurrences du créneau concerné par une exception, et date
+    la modification sur le créneau (curseur de synchronisation)
+    """
+    if not raw:
+        AvailabilitySlot.objects.filter(pk=instance.availability_slot_id).update(updated_at=timezone.now())
+        _schedule_occurrence_refresh(instance.availability_slot_id)
+
+
+@receiver(pre_save, sender=Appointment)
+def record_appointment_reassignment(sender, instance, raw=False, **kwargs):
+    """Un rendez-vous réassigné disparaît du calendrier qu'il quitte"""
+    if raw or instance.pk is None:
+        return
+    previous_calendar_id = (
+        Appointment.objects.filter(pk=instance.pk).values_list('volunteer_calendar_id', flat=True).first()
+    )
+    if previous_calendar_id and previous_calendar_id != instance.volunteer_calendar_id:
+        CalendarTombstone.objects.create(
+            volunteer_calendar_id=previous_calendar_id, object_type='appointment', object_id=instance.pk
+        )
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=AvailabilitySlot)
+def record_tombstone(sender, instance, **kwargs):
+    """Trace la suppression pour les clients de l'API de synchronisation"""
+    if instance.volunteer_calendar_id:
+        CalendarTombstone.objects.create(
+            volunteer_calendar_id=instance.volunteer_calendar_id,
+            object_type='appointment' if sender is Appointment else 'slot',
+            object_id=instance.pk
+        )
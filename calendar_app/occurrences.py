@@ -0,0 +1,163 @@
+"""
+Occurrences matérialisées des créneaux de disponibilité.
+
+Les récurrences (hebdomadaire, bi-hebdomadaire, mensuelle) et les exceptions
+sont développées une fois à l'écriture dans la table SlotOccurrence, sur un
+horizon glissant autour d'aujourd'hui. Les vues lisent ensuite une simple
+plage de dates par calendrier, via l'index (volunteer_calendar, date).
+
+La période réellement matérialisée est celle de la dernière reconstruction
+(SlotOccurrenceHorizon), pas celle calculée depuis aujourd'hui : tant que la
+table n'est pas reconstruite, les jours qui sortent de cette période sont
+développés à la volée au lieu de paraître sans disponibilité.
+
+- refresh_slot_occurrences : recalcul incrémental d'un créneau (signaux)
+- rebuild_slot_occurrences : reconstruction complète (commande quotidienne)
+- advance_horizon : reconstruction si l'horizon n'est plus celui du jour
+  (boucle du worker)
+- get_slot_occurrences : lecture d'une période, avec repli sur un calcul à la
+  volée si la période sort de l'horizon matérialisé
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists
+from django.utils import timezone
+
+from .models import AvailabilitySlot, SlotOccurrence, SlotOccurrenceHorizon
+
+
+def get_horizon(today=None):
+    """Retourne la période (début, fin) à matérialiser autour d'aujourd'hui"""
+    today = today or timezone.localdate()
+    past_days = getattr(settings, 'SLOT_OCCURRENCE_PAST_DAYS', 370)
+    future_days = getattr(settings, 'SLOT_OCCURRENCE_FUTURE_DAYS', 370)
+    return today - timedelta(days=past_days), today + timedelta(days=future_days)
+
+
+def get_materialized_horizon():
+    """Période (début, fin) couverte par la table des occurrences, ou None si jamais construite"""
+    return SlotOccurrenceHorizon.objects.values_list('start_date', 'end_date').first()
+
+
+def horizon_covers(start_date, end_date):
+    """Condition SQL (EXISTS) : la table des occurrences couvre toute la période"""
+    return Exists(SlotOccurrenceHorizon.objects.filter(start_date__lte=start_date, end_date__gte=end_date))
+
+
+def is_within_horizon(start_date, end_date):
+    """Indique si la période est entièrement couverte par la table des occurrences"""
+    horizon = get_materialized_horizon()
+    return horizon is not None and horizon[0] <= start_date and end_date <= horizon[1]
+
+
+def _to_slot_occurrence(occurrence):
+    """Convertit une ExpandedOccurrence en ligne SlotOccurrence (non enregistrée)"""
+    return SlotOccurrence(
+        volunteer_calendar_id=occurrence.slot.volunteer_calendar_id,
+        availability_slot=occurrence.slot,
+        date=occurrence.date,
+        start_time=occurrence.start_time,
+        end_time=occurrence.end_time,
+        exception=occurrence.exception,
+    )
+
+
+def expand_slot(slot, start_date, end_date):
+    """Occurrences (non enregistrées) d'un créneau sur la période, exceptions appliquées"""
+    return [
+        _to_slot_occurrence(occurrence)
+        for occurrence in slot.expand(start_date, end_date)
+    ]
+
+
+def refresh_slot_occurrences(slot):
+    """Recalcule les occurrences d'un créneau sur l'horizon matérialisé"""
+    with transaction.atomic():
+        SlotOccurrence.objects.filter(availability_slot=slot).delete()
+        horizon = get_materialized_horizon()
+        # Table jamais construite : la reconstruction complète s'en chargera
+        if not slot.is_active or horizon is None:
+            return 0
+        occurrences = expand_slot(slot, *horizon)
+        SlotOccurrence.objects.bulk_create(occurrences)
+
+    return len(occurrences)
+
+
+def refresh_slot_occurrences_by_id(slot_id):
+    """Variante pour les signaux : le créneau a pu être supprimé entre-temps"""
+    slot = AvailabilitySlot.objects.filter(pk=slot_id).prefetch_related('exceptions').first()
+    if slot is None:
+        return 0
+    return refresh_slot_occurrences(slot)
+
+
+def rebuild_slot_occurrences(batch_size=1000):
+    """Reconstruit toute la table des occurrences sur l'horizon du jour"""
+    horizon_start, horizon_end = get_horizon()
+    slots = AvailabilitySlot.objects.filter(is_active=True).prefetch_related('exceptions')
+
+    count = 0
+    with transaction.atomic():
+        # Verrou de la ligne d'horizon : deux reconstructions passent l'une après l'autre
+        SlotOccurrenceHorizon.objects.select_for_update().filter(pk=1).first()
+        SlotOccurrence.objects.all().delete()
+        batch = []
+        for slot in slots.iterator(chunk_size=500):
+            batch.extend(expand_slot(slot, horizon_start, horizon_end))
+            if len(batch) >= batch_size:
+                SlotOccurrence.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        SlotOccurrence.objects.bulk_create(batch)
+        count += len(batch)
+        SlotOccurrenceHorizon.objects.update_or_create(
+            pk=1, defaults={'start_date': horizon_start, 'end_date': horizon_end}
+        )
+
+    return count
+
+
+def advance_horizon():
+    """
+    Reconstruit la table si son horizon n'est plus celui du jour (au plus une
+    fois par jour) ; retourne le nombre d'occurrences générées, ou None.
+    """
+    if get_materialized_horizon() == get_horizon():
+        return None
+    return rebuild_slot_occurrences()
+
+
+def get_slot_occurrences(calendars, start_date, end_date, slot_ids=None):
+    """
+    Occurrences des créneaux actifs des calendriers sur la période,
+    triées par date puis heure de début (limitées à `slot_ids` si fourni).
+    """
+    slot_filter = {} if slot_ids is None else {'availability_slot__in': slot_ids}
+    # Lignes lues seulement si l'horizon matérialisé couvre la période (même requête) ;
+    # un résultat vide peut aussi venir d'une période sans créneau : l'horizon le dira
+    occurrences = list(
+        SlotOccurrence.objects.filter(
+            horizon_covers(start_date, end_date),
+            volunteer_calendar__in=calendars,
+            date__range=[start_date, end_date],
+            **slot_filter
+        ).select_related('availability_slot', 'exception').order_by('date', 'start_time')
+    )
+    if occurrences or is_within_horizon(start_date, end_date):
+        return occurrences
+
+    # Hors horizon : développement à la volée
+    slots = AvailabilitySlot.objects.filter(
+        volunteer_calendar__in=calendars,
+        is_active=True
+    ).prefetch_related('exceptions')
+    if slot_ids is not None:
+        slots = slots.filter(pk__in=slot_ids)
+
+    return [
+        _to_slot_occurrence(occurrence)
+        for occurrence in AvailabilitySlot.expand_many(slots, start_date, end_date)
+    ]
@@ -0,0 +1,142 @@
+"""
+Synchronisation différentielle des données du calendrier (API v1).
+
+Le client charge une période une première fois, puis ne demande que ce qui a
+changé depuis le curseur reçu avec la réponse précédente :
+- rendez-vous créés ou modifiés (index volunteer_calendar, updated_at), quelle
+  que soit leur date : le client retire ceux sortis de sa période
+- créneaux modifiés (une exception date aussi son créneau) : leurs occurrences
+  sur la période remplacent celles que le client connaît
+- suppressions et réassignations, lues dans CalendarTombstone
+
+Le curseur est l'instant de la lecture moins SYNC_CURSOR_OVERLAP_SECONDS :
+une transaction validée juste après la lecture, avec un updated_at antérieur,
+est renvoyée au prochain appel (le client applique les changements par
+identifiant, un doublon est sans effet). Il ne recule jamais.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import AvailabilitySlot, Appointment, CalendarTombstone
+from .occurrences import get_slot_occurrences
+
+
+SYNC_API_VERSION = 1
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(moment):
+    """Curseur opaque : microsecondes depuis l'epoch"""
+    return str((moment - _EPOCH) // _MICROSECOND)
+
+
+def decode_cursor(value):
+    """Instant porté par un curseur ; ValueError s'il est mal formé"""
+    microseconds = int(value)
+    if microseconds < 0:
+        raise ValueError(value)
+    return _EPOCH + microseconds * _MICROSECOND
+
+
+def serialize_appointment(appointment):
+    """Représentation JSON d'un rendez-vous (beneficiary préchargé)"""
+    return {
+        'id': appointment.id,
+        'date': appointment.appointment_date.isoformat(),
+        'start_time': appointment.start_time.strftime('%H:%M'),
+        'end_time': appointment.end_time.strftime('%H:%M'),
+        'title': appointment.title,
+        'beneficiary': f"{appointment.beneficiary.first_name} {appointment.beneficiary.last_name}",
+        'type': appointment.appointment_type,
+        'status': appointment.status,
+        'location': appointment.location,
+    }
+
+
+def serialize_occurrence(occurrence):
+    """Représentation JSON d'une occurrence de créneau"""
+    return {
+        'id': occurrence.availability_slot_id,
+        'date': occurrence.date.isoformat(),
+        'start_time': occurrence.start_time.strftime('%H:%M'),
+        'end_time': occurrence.end_time.strftime('%H:%M'),
+        'title': occurrence.title,
+        'slot_type': occurrence.availability_slot.slot_type,
+    }
+
+
+def get_calendar_changes(calendar, start_date, end_date, since=None, now=None):
+    """
+    Changements du calendrier sur la période depuis `since` (datetime).
+
+    Sans curseur, ou avec un curseur plus ancien que la rétention des traces
+    de suppression, la réponse est complète (`full` vrai) : le client remplace
+    toute la période.
+    """
+    now = now or timezone.now()
+    retention = timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+    overlap = timedelta(seconds=getattr(settings, 'SYNC_CURSOR_OVERLAP_SECONDS', 5))
+    full = since is None or since < now - retention
+
+    cursor = now - overlap
+    if not full:
+        cursor = max(cursor, since)
+
+    appointments = Appointment.objects.filter(volunteer_calendar=calendar).select_related('beneficiary')
+    data = {
+        'version': SYNC_API_VERSION,
+        'cursor': encode_cursor(cursor),
+        'full': full,
+    }
+
+    if full:
+        appointments = appointments.filter(appointment_date__range=[start_date, end_date])
+        occurrences = get_slot_occurrences([calendar], start_date, end_date)
+    else:
+        appointments = appointments.filter(updated_at__gt=since)
+        replaced_slots = list(
+            AvailabilitySlot.objects.filter(
+                volunteer_calendar=calendar, updated_at__gt=since
+            ).values_list('pk', flat=True)
+        )
+        occurrences = (
+            get_slot_occurrences([calendar], start_date, end_date, slot_ids=replaced_slots)
+            if replaced_slots else []
+        )
+
+    appointments = list(appointments)
+
+    if not full:
+        deleted = {'appointment': set(), 'slot': set()}
+        for object_type, object_id in CalendarTombstone.objects.filter(
+            volunteer_calendar=calendar, deleted_at__gt=since
+        ).values_list('object_type', 'object_id'):
+            deleted[object_type].add(object_id)
+        # Rendez-vous parti puis revenu dans ce calendrier : seul l'état actuel compte
+        deleted['appointment'].difference_update(appointment.pk for appointment in appointments)
+
+        data['replaced_slots'] = replaced_slots
+        data['deleted'] = {
+            'appointments': sorted(deleted['appointment']),
+            'availability_slots': sorted(deleted['slot']),
+        }
+
+    data['appointments'] = [serialize_appointment(appointment) for appointment in appointments]
+    data['availability_slots'] = [serialize_occurrence(occurrence) for occurrence in occurrences]
+    return data
+
+
+def purge_tombstones(now=None):
+    """
+    Supprime les traces de suppression plus anciennes que
+    SYNC_TOMBSTONE_RETENTION_DAYS (un curseur aussi ancien impose de toute façon
+    un rechargement complet). Retourne le nombre de traces supprimées.
+    """
+    now = now or timezone.now()
+    retention = timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+    count, _ = CalendarTombstone.objects.filter(deleted_at__lt=now - retention).delete()
+    return count
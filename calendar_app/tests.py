@@ -1,3 +1,679 @@
-from django.test import TestCase
+import io
+from datetime import date, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from beneficiaries.models import Beneficiary
+from volunteers.models import Volunteer
+
+from .availability import compute_free_windows, get_calendars_by_availability, get_free_windows
+from .booking import SLOT_FULL_ERROR, annotate_booking_capacity, save_booking
+from .forms import AppointmentForm
+from .management.commands.benchmark_global_calendar import create_synthetic_team
+from .models import (
+    AvailabilityException, AvailabilitySlot, Appointment, CalendarTombstone, SlotOccurrence, VolunteerCalendar,
+)
+from .occurrences import (
+    advance_horizon, get_horizon, get_slot_occurrences, is_within_horizon, rebuild_slot_occurrences,
+    refresh_slot_occurrences,
+)
+from .sync import decode_cursor, encode_cursor, get_calendar_changes
+from .views import AppointmentOverlapMixin, GlobalCalendarView, calendar_ics_feed
+
+
+class GlobalCalendarQueryBudgetTests(TestCase):
+    """La vue globale doit coûter un nombre de requêtes indépendant de l'équipe"""
+
+    QUERY_BUDGET = 5
+
+    def setUp(self):
+        rebuild_slot_occurrences()  # Horizon matérialisé : les créneaux créés y sont développés
+        today = timezone.localdate()
+        self.week_start = today - timedelta(days=today.weekday())
+        self.admin = User.objects.create(username='admin_test', is_superuser=True, is_staff=True)
+
+    def render_global_week(self):
+        request = RequestFactory().get(reverse('calendar:global'), {'week': self.week_start.isoformat()})
+        request.user = User.objects.get(pk=self.admin.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = GlobalCalendarView.as_view()(request).render()
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries.captured_queries)
+
+    def test_query_budget_is_constant(self):
+        create_synthetic_team(5, self.week_start, prefix='small')
+        _response, small_team_queries = self.render_global_week()
+
+        create_synthetic_team(30, self.week_start, prefix='large')
+        response, large_team_queries = self.render_global_week()
+
+        self.assertLessEqual(large_team_queries, self.QUERY_BUDGET)
+        self.assertEqual(small_team_queries, large_team_queries)
+        self.assertEqual(len(response.context_data['calendar_rows']), 35)
+
+    def test_week_cells_are_bucketed_by_calendar_and_day(self):
+        calendars = create_synthetic_team(3, self.week_start)
+        response, _queries = self.render_global_week()
+
+        for row in response.context_data['calendar_rows']:
+            for cell in row['days']:
+                for appointment in cell['appointments']:
+                    self.assertEqual(appointment.volunteer_calendar_id, row['calendar'].id)
+                    self.assertEqual(appointment.appointment_date, cell['date'])
+                for occurrence in cell['availability_slots']:
+                    self.assertEqual(occurrence.volunteer_calendar_id, row['calendar'].id)
+                    self.assertEqual(occurrence.date, cell['date'])
+
+        total = sum(
+            len(cell['appointments'])
+            for row in response.context_data['calendar_rows']
+            for cell in row['days']
+        )
+        self.assertEqual(total, 3 * len(calendars))
+
+
+class AvailableVolunteersSearchTests(TestCase):
+    """Recherche ensembliste des bénévoles disponibles pour un rendez-vous"""
+
+    def setUp(self):
+        rebuild_slot_occurrences()
+        today = timezone.localdate()
+        self.day = today + timedelta(days=7 - today.weekday())  # lundi prochain
+        self.beneficiary = Beneficiary.objects.create(first_name='Jeanne', last_name='Test')
+
+    def make_calendar(self, name, slot=None, appointment=None):
+        user = User.objects.create(username=name, last_name=name)
+        volunteer = Volunteer.objects.create(user=user, role='VOLUNTEER_INTERVIEW')
+        calendar = VolunteerCalendar.objects.get(volunteer=volunteer)
+        if slot:
+            refresh_slot_occurrences(AvailabilitySlot.objects.create(
+                volunteer_calendar=calendar, recurrence_type='WEEKLY', weekday=self.day.weekday(),
+                start_time=slot[0], end_time=slot[1], valid_from=self.day
+            ))
+        if appointment:
+            Appointment.objects.create(
+                volunteer_calendar=calendar, beneficiary=self.beneficiary, appointment_date=self.day,
+                start_time=appointment[0], end_time=appointment[1]
+            )
+        return calendar
+
+    def test_partition_in_a_single_query(self):
+        free = self.make_calendar('a_free', slot=(time(9), time(12)))
+        busy = self.make_calendar('b_busy', slot=(time(9), time(12)), appointment=(time(10, 30), time(11, 30)))
+        partial = self.make_calendar('c_partial', slot=(time(10), time(11)))
+        absent = self.make_calendar('d_absent')
+
+        with CaptureQueriesContext(connection) as queries:
+            available, unavailable = get_calendars_by_availability(self.day, time(10), time(11))
+            names = [calendar.volunteer.user.last_name for calendar in available + unavailable]
+
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(available, [free, partial])
+        self.assertEqual(unavailable, [busy, absent])
+        self.assertEqual(names, ['a_free', 'c_partial', 'b_busy', 'd_absent'])
+
+
+class AppointmentOverlapConstraintTests(TestCase):
+    """Contrainte d'exclusion appointment_no_overlap"""
+
+    def setUp(self):
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.beneficiary = Beneficiary.objects.create(first_name='Jeanne', last_name='Test')
+        user = User.objects.create(username='interview', last_name='Interview')
+        self.calendar = VolunteerCalendar.objects.get(
+            volunteer=Volunteer.objects.create(user=user, role='VOLUNTEER_INTERVIEW')
+        )
+        self.create(time(10), time(11))
+
+    def create(self, start_time, end_time, **kwargs):
+        kwargs.setdefault('volunteer_calendar', self.calendar)
+        return Appointment.objects.create(
+            beneficiary=self.beneficiary, appointment_date=self.day,
+            start_time=start_time, end_time=end_time, **kwargs
+        )
+
+    def test_database_rejects_overlapping_active_appointments(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.create(time(10, 30), time(11, 30))
+
+        # Bornes adjacentes, RDV annulé, autre bénévole ou RDV non assigné : acceptés
+        self.create(time(11), time(12))
+        self.create(time(10), time(11), status='CANCELLED')
+        self.create(time(10), time(11), volunteer_calendar=None)
+        other_user = User.objects.create(username='other', last_name='Other')
+        self.create(time(10), time(11), volunteer_calendar=VolunteerCalendar.objects.get(
+            volunteer=Volunteer.objects.create(user=other_user, role='VOLUNTEER_INTERVIEW')
+        ))
+
+    def appointment_form(self, start_time, end_time):
+        return AppointmentForm(data={
+            'beneficiary': self.beneficiary.pk,
+            'volunteer_calendar': self.calendar.pk,
+            'appointment_date': self.day.isoformat(),
+            'start_time': start_time,
+            'end_time': end_time,
+            'appointment_type': 'INTERVIEW',
+        }, user=User.objects.create(username='admin_test', is_superuser=True))
+
+    def test_form_reports_overlap(self):
+        form = self.appointment_form('10:30', '11:30')
+        self.assertFalse(form.is_valid())
+        self.assertIn('Conflit détecté', str(form.non_field_errors()))
+
+    def test_concurrent_booking_becomes_form_error(self):
+        form = self.appointment_form('14:00', '15:00')
+        self.assertTrue(form.is_valid())
+
+        # Un autre utilisateur réserve entre la validation et l'enregistrement
+        self.create(time(14, 30), time(15, 30))
+
+        self.assertFalse(AppointmentOverlapMixin().save_appointment(form))
+        self.assertIn('chevauche', str(form.non_field_errors()))
+
+
+class SlotExpansionTests(TestCase):
+    """Développement arithmétique des récurrences (AvailabilitySlot.expand_many)"""
+
+    def test_fixed_steps_match_a_day_by_day_walk(self):
+        valid_from, start, end = date(2030, 1, 3), date(2030, 2, 10), date(2030, 12, 31)
+        for recurrence_type, step in AvailabilitySlot.RECURRENCE_STEP_DAYS.items():
+            for weekday in range(7):
+                slot = AvailabilitySlot(
+                    recurrence_type=recurrence_type, weekday=weekday, valid_from=valid_from,
+                    start_time=time(9), end_time=time(10)
+                )
+                first = valid_from + timedelta(days=(weekday - valid_from.weekday()) % 7)
+                expected = [
+                    first + timedelta(days=offset)
+                    for offset in range(0, (end - first).days + 1, step)
+                    if first + timedelta(days=offset) >= start
+                ]
+                self.assertEqual(slot.occurrence_dates(start, end, anchor=valid_from), expected)
+
+    def test_monthly_recurrence_keeps_weekday_and_clamps_month_end(self):
+        slot = AvailabilitySlot(
+            recurrence_type='MONTHLY', weekday=3, valid_from=date(2030, 1, 31),
+            start_time=time(9), end_time=time(10)
+        )
+        dates = slot.occurrence_dates(date(2030, 1, 1), date(2030, 12, 31))
+        self.assertEqual(dates[:3], [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 28)])
+        self.assertTrue(all(day.weekday() == 3 for day in dates))
+        self.assertEqual(len({day.month for day in dates}), len(dates))
+
+    def test_expand_many_applies_exceptions_and_sorts(self):
+        user = User.objects.create(username='expand', last_name='Expand')
+        calendar = VolunteerCalendar.objects.get(
+            volunteer=Volunteer.objects.create(user=user, role='VOLUNTEER_INTERVIEW')
+        )
+        monday = date(2030, 1, 7)
+        afternoon = AvailabilitySlot.objects.create(
+            volunteer_calendar=calendar, recurrence_type='WEEKLY', weekday=0,
+            start_time=time(14), end_time=time(16), valid_from=monday
+        )
+        morning = AvailabilitySlot.objects.create(
+            volunteer_calendar=calendar, recurrence_type='NONE', specific_date=monday + timedelta(days=14),
+            start_time=time(9), end_time=time(10), valid_from=monday
+        )
+        AvailabilityException.objects.create(
+            availability_slot=afternoon, exception_date=monday, exception_type='CANCELLED'
+        )
+        AvailabilityException.objects.create(
+            availability_slot=afternoon, exception_date=monday + timedelta(days=7), exception_type='MOVED',
+            new_date=monday + timedelta(days=9), new_start_time=time(15)
+        )
+
+        slots = AvailabilitySlot.objects.filter(pk__in=[afternoon.pk, morning.pk]).prefetch_related('exceptions')
+        occurrences = AvailabilitySlot.expand_many(slots, monday, monday + timedelta(days=20))
+
+        self.assertEqual(
+            [(occurrence.slot.pk, occurrence.date, occurrence.start_time) for occurrence in occurrences],
+            [
+                (afternoon.pk, monday + timedelta(days=9), time(15)),
+                (morning.pk, monday + timedelta(days=14), time(9)),
+                (afternoon.pk, monday + timedelta(days=14), time(14)),
+            ]
+        )
+        self.assertEqual(occurrences[0].exception.exception_type, 'MOVED')
+
+
+class FreeWindowTests(TestCase):
+    """Plages libres = occurrences de créneaux moins rendez-vous (compute_free_windows)"""
+
+    day = date(2030, 1, 7)
+
+    def setUp(self):
+        self.slot = AvailabilitySlot(pk=1, title='Permanence', start_time=time(9), end_time=time(13))
+
+    def windows(self, *appointments, **kwargs):
+        occurrence = SlotOccurrence(
+            volunteer_calendar_id=1, availability_slot=self.slot, date=self.day,
+            start_time=time(9), end_time=time(13)
+        )
+        busy = [
+            Appointment(volunteer_calendar_id=1, appointment_date=self.day, start_time=start, end_time=end)
+            for start, end in appointments
+        ]
+        free_windows = compute_free_windows([occurrence], busy, now=False, **kwargs)
+        return [(window['start_time'], window['end_time']) for window in free_windows[(1, self.day)]]
+
+    def test_overlapping_and_adjacent_appointments_are_merged(self):
+        self.assertEqual(
+            self.windows((time(10), time(11)), (time(10, 30), time(11, 30))),
+            [(time(9), time(10)), (time(11, 30), time(13))]
+        )
+        self.assertEqual(
+            self.windows((time(10), time(11)), (time(11), time(12))),
+            [(time(9), time(10)), (time(12), time(13))]
+        )
+        self.assertEqual(self.windows((time(8), time(14))), [])
+
+    def test_windows_shorter_than_the_minimum_are_dropped(self):
+        appointment = (time(9, 20), time(12, 30))
+        self.assertEqual(self.windows(appointment), [(time(12, 30), time(13))])
+        self.assertEqual(
+            self.windows(appointment, min_duration=timedelta(minutes=15)),
+            [(time(9), time(9, 20)), (time(12, 30), time(13))]
+        )
+
+    def test_exceptions_move_and_cancel_windows(self):
+        user = User.objects.create(username='free', last_name='Free')
+        calendar = VolunteerCalendar.objects.get(
+            volunteer=Volunteer.objects.create(user=user, role='VOLUNTEER_INTERVIEW')
+        )
+        slot = AvailabilitySlot.objects.create(
+            volunteer_calendar=calendar, recurrence_type='WEEKLY', weekday=0,
+            start_time=time(9), end_time=time(13), valid_from=self.day
+        )
+        AvailabilityException.objects.create(
+            availability_slot=slot, exception_date=self.day, exception_type='CANCELLED'
+        )
+        AvailabilityException.objects.create(
+            availability_slot=slot, exception_date=self.day + timedelta(days=7), exception_type='MODIFIED',
+            new_start_time=time(14), new_end_time=time(16)
+        )
+        Appointment.objects.create(
+            volunteer_calendar=calendar, beneficiary=Beneficiary.objects.create(first_name='Jeanne', last_name='Test'),
+            appointment_date=self.day + timedelta(days=7), start_time=time(14), end_time=time(15)
+        )
+
+        free_windows = get_free_windows([calendar], self.day, self.day + timedelta(days=7), now=False)
+
+        self.assertNotIn((calendar.pk, self.day), free_windows)
+        self.assertEqual(
+            [(window['start_time'], window['end_time'])
+             for window in free_windows[(calendar.pk, self.day + timedelta(days=7))]],
+            [(time(15), time(16))]
+        )
+
+
+@override_settings(SLOT_OCCURRENCE_PAST_DAYS=30, SLOT_OCCURRENCE_FUTURE_DAYS=60)
+class SlotOccurrenceTests(TestCase):
+    """Table des occurrences matérialisées (calendar_app.occurrences)"""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        user = User.objects.create(username='occurrences', last_name='Occurrences')
+        self.calendar = VolunteerCalendar.objects.get(
+            volunteer=Volunteer.objects.create(user=user, role='VOLUNTEER_INTERVIEW')
+        )
+        self.slot = AvailabilitySlot.objects.create(
+            volunteer_calendar=self.calendar, recurrence_type='WEEKLY', weekday=self.today.weekday(),
+            start_time=time(14), end_time=time(16), valid_from=self.today - timedelta(days=60)
+        )
+
+    def occurrence_dates(self, start_date, end_date):
+        return [occurrence.date for occurrence in get_slot_occurrences([self.calendar], start_date, end_date)]
+
+    def test_stale_horizon_falls_back_until_advanced(self):
+        # Table construite il y a 10 jours, jamais reconstruite depuis
+        with mock.patch('calendar_app.occurrences.timezone.localdate', return_value=self.today - timedelta(days=10)):
+            rebuild_slot_occurrences()
+        end_of_horizon = get_horizon()[1]
+        self.assertFalse(is_within_horizon(end_of_horizon, end_of_horizon))
+
+        # Les derniers jours de l'horizon sont développés à la volée, pas vides
+        last_week = (end_of_horizon - timedelta(days=6), end_of_horizon)
+        self.assertEqual(len(self.occurrence_dates(*last_week)), 1)
+        self.assertEqual(advance_horizon(), SlotOccurrence.objects.count())
+        self.assertTrue(is_within_horizon(*last_week))
+        self.assertEqual(len(self.occurrence_dates(*last_week)), 1)
+        self.assertIsNone(advance_horizon())
+
+    def test_slot_edit_and_delete_refresh_the_table(self):
+        rebuild_slot_occurrences()
+        next_week = (self.today + timedelta(days=7), self.today + timedelta(days=13))
+        self.assertEqual(self.occurrence_dates(*next_week), [self.today + timedelta(days=7)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slot.weekday = (self.today.weekday() + 1) % 7
+            self.slot.save()
+        self.assertEqual(self.occurrence_dates(*next_week), [self.today + timedelta(days=8)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AvailabilityException.objects.create(
+                availability_slot=self.slot, exception_date=self.today + timedelta(days=8),
+                exception_type='CANCELLED'
+            )
+        self.assertEqual(self.occurrence_dates(*next_week), [])
+        # Période couverte par l'horizon : pas de repli sur un calcul à la volée
+        self.assertTrue(is_within_horizon(*next_week))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slot.delete()
+        self.assertFalse(SlotOccurrence.objects.exists())
+
+    def test_period_outside_the_horizon_is_expanded_on_the_fly(self):
+        rebuild_slot_occurrences()
+        far_week = (self.today + timedelta(days=364), self.today + timedelta(days=370))
+        self.assertFalse(is_within_horizon(*far_week))
+        self.assertEqual(self.occurrence_dates(*far_week), [self.today + timedelta(days=364)])
+
+
+class CalendarIcsFeedTests(TestCase):
+    """Flux iCalendar authentifié par jeton"""
+
+    def setUp(self):
+        rebuild_slot_occurrences()
+        self.day = timezone.localdate() + timedelta(days=3)
+        user = User.objects.create(username='feed', first_name='Camille', last_name='Feed')
+        self.calendar = VolunteerCalendar.objects.get(
+            volunteer=Volunteer.objects.create(user=user, role='VOLUNTEER_INTERVIEW')
+        )
+        self.beneficiary = Beneficiary.objects.create(first_name='Jeanne', last_name='Test')
+        self.appointment = Appointment.objects.create(
+            volunteer_calendar=self.calendar, beneficiary=self.beneficiary, appointment_date=self.day,
+            start_time=time(10), end_time=time(11), title='Point budget, dossier CAF'
+        )
+        refresh_slot_occurrences(AvailabilitySlot.objects.create(
+            volunteer_calendar=self.calendar, recurrence_type='WEEKLY', weekday=self.day.weekday(),
+            start_time=time(14), end_time=time(16), valid_from=self.day
+        ))
+
+    def fetch(self, token=None, **params):
+        headers = {key: params.pop(key) for key in list(params) if key.startswith('HTTP_')}
+        request = RequestFactory().get('/', params, **headers)
+        return calendar_ics_feed(request, token or self.calendar.feed_token)
+
+    def test_feed_lists_appointments_and_slot_occurrences(self):
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        content = response.content.decode()
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:appointment-{self.appointment.pk}@rosa', content)
+        self.assertIn('SUMMARY:Point budget\\, dossier CAF', content)
+        self.assertIn('Jeanne T.', content)
+        self.assertIn('TRANSP:TRANSPARENT', content)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in content.split('\r\n')))
+
+    def test_unknown_token_and_conditional_requests(self):
+        from django.http import Http404
+        with self.assertRaises(Http404):
+            self.fetch(token='inconnu')
+
+        etag = self.fetch()['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.fetch(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(len(queries.captured_queries), 3)
+
+        self.appointment.status = 'CANCELLED'
+        self.appointment.save()
+        response = self.fetch(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('STATUS:CANCELLED', response.content.decode())
+
+    def test_sync_token_returns_only_changes(self):
+        sync_token = self.fetch()['X-Sync-Token']
+        self.assertNotIn('BEGIN:VEVENT', self.fetch(sync_token=sync_token).content.decode())
+
+        moved = Appointment.objects.create(
+            volunteer_calendar=self.calendar, beneficiary=self.beneficiary, appointment_date=self.day,
+            start_time=time(11), end_time=time(12)
+        )
+        content = self.fetch(sync_token=sync_token).content.decode()
+        self.assertIn(f'UID:appointment-{moved.pk}@rosa', content)
+        self.assertNotIn(f'UID:appointment-{self.appointment.pk}@rosa', content)
+        self.assertNotIn('UID:slot-', content)
+
+        # Jeton falsifié : flux complet
+        content = self.fetch(sync_token='falsifie').content.decode()
+        self.assertIn(f'UID:appointment-{self.appointment.pk}@rosa', content)
+
+
+class CalendarSyncTests(TestCase):
+    """API de synchronisation différentielle (curseur updated_since et traces de suppression)"""
+
+    def setUp(self):
+        rebuild_slot_occurrences()
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.start, self.end = self.day - timedelta(days=7), self.day + timedelta(days=7)
+        self.beneficiary = Beneficiary.objects.create(first_name='Jeanne', last_name='Test')
+        self.calendar, self.other_calendar = [
+            VolunteerCalendar.objects.get(volunteer=Volunteer.objects.create(
+                user=User.objects.create(username=name, last_name=name), role='VOLUNTEER_INTERVIEW'
+            ))
+            for name in ('sync', 'other')
+        ]
+        self.kept, self.moved, self.removed = [
+            Appointment.objects.create(
+                volunteer_calendar=self.calendar, beneficiary=self.beneficiary, appointment_date=self.day,
+                start_time=time(hour), end_time=time(hour + 1)
+            )
+            for hour in (9, 10, 11)
+        ]
+        self.slot = AvailabilitySlot.objects.create(
+            volunteer_calendar=self.calendar, recurrence_type='WEEKLY', weekday=self.day.weekday(),
+            start_time=time(14), end_time=time(16), valid_from=self.start
+        )
+        refresh_slot_occurrences(self.slot)
+
+    def test_cursor_round_trip(self):
+        moment = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(moment)), moment)
+        with self.assertRaises(ValueError):
+            decode_cursor('abc')
+
+    def test_full_then_delta(self):
+        full = get_calendar_changes(self.calendar, self.start, self.end)
+        self.assertTrue(full['full'])
+        self.assertEqual(len(full['appointments']), 3)
+        self.assertEqual(len(full['availability_slots']), 3)
+
+        since = timezone.now()
+        self.moved.volunteer_calendar = self.other_calendar
+        self.moved.save()
+        removed_pk = self.removed.pk
+        self.removed.delete()
+        AvailabilityException.objects.create(
+            availability_slot=self.slot, exception_date=self.day, exception_type='CANCELLED'
+        )
+        refresh_slot_occurrences(AvailabilitySlot.objects.get(pk=self.slot.pk))
+
+        with CaptureQueriesContext(connection) as queries:
+            delta = get_calendar_changes(self.calendar, self.start, self.end, since=since)
+        self.assertLessEqual(len(queries.captured_queries), 4)
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['appointments'], [])
+        self.assertEqual(delta['deleted']['appointments'], sorted([self.moved.pk, removed_pk]))
+        self.assertEqual(delta['replaced_slots'], [self.slot.pk])
+        self.assertEqual(len(delta['availability_slots']), 2)
+
+        other = get_calendar_changes(self.other_calendar, self.start, self.end, since=since)
+        self.assertEqual([item['id'] for item in other['appointments']], [self.moved.pk])
+        self.assertGreaterEqual(decode_cursor(other['cursor']), since)
+
+    def test_stale_cursor_forces_full_reload(self):
+        CalendarTombstone.objects.create(volunteer_calendar=self.calendar, object_type='slot', object_id=1)
+        stale = timezone.now() - timedelta(days=365)
+        changes = get_calendar_changes(self.calendar, self.start, self.end, since=stale)
+        self.assertTrue(changes['full'])
+        self.assertNotIn('deleted', changes)
+
+    def test_worker_purges_expired_tombstones(self):
+        expired = CalendarTombstone.objects.create(volunteer_calendar=self.calendar, object_type='slot', object_id=1)
+        CalendarTombstone.objects.filter(pk=expired.pk).update(deleted_at=timezone.now() - timedelta(days=31))
+        recent = CalendarTombstone.objects.create(volunteer_calendar=self.calendar, object_type='slot', object_id=2)
+
+        stdout = io.StringIO()
+        call_command('run_export_worker', '--once', stdout=stdout)
+
+        self.assertEqual(list(CalendarTombstone.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertIn('1 trace(s) de suppression purgée(s)', stdout.getvalue())
+
+
+class SlotBookingTests(TestCase):
+    """Réservation d'un créneau dans la limite de max_appointments"""
+
+    def setUp(self):
+        rebuild_slot_occurrences()
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.beneficiary = Beneficiary.objects.create(first_name='Jeanne', last_name='Test')
+        user = User.objects.create(username='booking', last_name='Booking')
+        self.calendar = VolunteerCalendar.objects.get(
+            volunteer=Volunteer.objects.create(user=user, role='VOLUNTEER_INTERVIEW')
+        )
+        self.slot = AvailabilitySlot.objects.create(
+            volunteer_calendar=self.calendar, recurrence_type='NONE', specific_date=self.day,
+            start_time=time(9), end_time=time(12), valid_from=self.day, max_appointments=2
+        )
+        refresh_slot_occurrences(self.slot)
+
+    def book(self, hour, slot=None, day=None, **kwargs):
+        return save_booking(Appointment(
+            volunteer_calendar=self.calendar, beneficiary=self.beneficiary, availability_slot=slot or self.slot,
+            appointment_date=day or self.day, start_time=time(hour), end_time=time(hour + 1), **kwargs
+        ))
+
+    def test_capacity_is_enforced_and_freed_by_cancellation(self):
+        first = self.book(9)
+        self.book(10)
+        with self.assertRaisesMessage(ValidationError, SLOT_FULL_ERROR):
+            self.book(11)
+
+        first.status = 'CANCELLED'
+        save_booking(first)
+        self.book(11)
+
+        first.status = 'SCHEDULED'
+        with self.assertRaisesMessage(ValidationError, SLOT_FULL_ERROR):
+            save_booking(first)
+
+    def test_annotated_capacity_without_per_row_queries(self):
+        self.book(9)
+        self.book(10, status='CANCELLED')
+        refresh_slot_occurrences(AvailabilitySlot.objects.create(
+            volunteer_calendar=self.calendar, recurrence_type='WEEKLY', weekday=0,
+            start_time=time(14), end_time=time(15), valid_from=self.day
+        ))
+
+        with CaptureQueriesContext(connection) as queries:
+            slots = list(annotate_booking_capacity(AvailabilitySlot.objects.order_by('start_time')))
+            capacities = [(slot.current_appointments_count, slot.remaining_capacity) for slot in slots]
+            available = [slot.is_available_for_booking for slot in slots]
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(capacities, [(1, 1), (0, 1)])
+        self.assertEqual(available, [True, True])
+
+    def test_capacity_is_counted_per_occurrence_of_a_recurring_slot(self):
+        weekly = AvailabilitySlot.objects.create(
+            volunteer_calendar=self.calendar, recurrence_type='WEEKLY', weekday=self.day.weekday(),
+            start_time=time(14), end_time=time(16), valid_from=self.day, max_appointments=1
+        )
+        refresh_slot_occurrences(weekly)
+        next_week = self.day + timedelta(days=7)
+
+        self.book(14, slot=weekly)
+        with self.assertRaisesMessage(ValidationError, SLOT_FULL_ERROR):
+            self.book(15, slot=weekly)
+        # La semaine suivante, l'occurrence a de nouveau sa place
+        self.book(14, slot=weekly, day=next_week)
+
+        def capacity(day):
+            slot = annotate_booking_capacity(AvailabilitySlot.objects.filter(pk=weekly.pk), on_date=day).get()
+            return slot.booked_count, slot.remaining_capacity
+
+        self.assertEqual(capacity(next_week), (1, 0))
+        self.assertEqual(capacity(next_week + timedelta(days=7)), (0, 1))
+
+    def test_create_view_binds_the_slot_and_enforces_its_capacity(self):
+        self.client.force_login(User.objects.create(username='admin_test', is_superuser=True, is_staff=True))
+
+        def post(start_time, end_time):
+            return self.client.post(reverse('calendar:appointment_create'), {
+                'beneficiary': self.beneficiary.pk,
+                'volunteer_calendar': self.calendar.pk,
+                'appointment_date': self.day.isoformat(),
+                'start_time': start_time,
+                'end_time': end_time,
+                'appointment_type': 'INTERVIEW',
+            })
+
+        self.assertEqual(post('09:00', '10:00').status_code, 302)
+        self.assertEqual(post('10:00', '11:00').status_code, 302)
+        self.assertEqual(
+            list(Appointment.objects.values_list('availability_slot', flat=True)), [self.slot.pk, self.slot.pk]
+        )
+
+        # Créneau complet (max_appointments=2) : le troisième RDV est refusé
+        response = post('11:00', '12:00')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(SLOT_FULL_ERROR, str(response.context['form'].non_field_errors()))
+
+        # Hors de tout créneau : RDV accepté, sans créneau lié
+        self.assertEqual(post('13:00', '14:00').status_code, 302)
+        self.assertIsNone(Appointment.objects.get(start_time=time(13)).availability_slot)
+        self.assertEqual(Appointment.objects.count(), 3)
+
+
+class AppointmentListTests(TestCase):
+    """Liste des rendez-vous : sections à venir / passés paginées par curseur"""
+
+    def setUp(self):
+        user = User.objects.create(username='liste', last_name='Liste')
+        self.calendar = VolunteerCalendar.objects.get(
+            volunteer=Volunteer.objects.create(user=user, role='VOLUNTEER_INTERVIEW')
+        )
+        beneficiary = Beneficiary.objects.create(first_name='Jeanne', last_name='Test')
+        today = timezone.localdate()
+        Appointment.objects.bulk_create([
+            Appointment(
+                volunteer_calendar=self.calendar, beneficiary=beneficiary, start_time=time(9), end_time=time(10),
+                appointment_date=today + timedelta(days=offset), status='COMPLETED' if offset < 0 else 'SCHEDULED'
+            )
+            for offset in list(range(-25, 0)) + list(range(1, 23))
+        ])
+        self.client.force_login(user)
+
+    def test_sections_are_paged_and_loaded_by_cursor(self):
+        url = reverse('calendar:appointment_list')
+        # Session et calendrier, une page par section, compteurs : quel que soit l'historique
+        with self.assertNumQueries(7):
+            response = self.client.get(url)
+        future, past = response.context['future_appointments'], response.context['past_appointments']
+        self.assertEqual((len(future), len(past)), (20, 20))
+        self.assertEqual(past.object_list[0].appointment_date, timezone.localdate() - timedelta(days=1))
+        self.assertEqual(
+            (response.context['total_count'], response.context['scheduled_count'], response.context['completed_count']),
+            (47, 22, 25)
+        )
+        self.assertContains(response, 'id="appointment-load-more-', count=2)
+
+        response = self.client.get(url, {'section': 'past', 'cursor': past.next_cursor}, HTTP_HX_REQUEST='true')
+        self.assertTemplateUsed(response, 'calendar/partials/appointment_rows.html')
+        self.assertTemplateNotUsed(response, 'calendar/appointment_list.html')
+        rows = response.context['appointments']
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows.object_list[-1].appointment_date, timezone.localdate() - timedelta(days=25))
+        self.assertNotContains(response, 'appointment-load-more')
+
+        # Curseur d'une section refusé pour l'autre
+        response = self.client.get(url, {'section': 'future', 'cursor': past.next_cursor}, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 404)
@@ -38,9 +38,14 @@ urlpatterns = [
     path('api/slots/', views.api_availability_slots, name='api_slots'),
     path('api/appointments/', views.api_appointments, name='api_appointments'),
     path('api/calendar-data/', views.api_calendar_data, name='api_calendar_data'),
+    path('api/v1/sync/', views.api_calendar_sync, name='api_calendar_sync'),
     path('api/volunteer-availability/', views.volunteer_availability_api, name='api_volunteer_availability'),
     path('api/available-volunteers/', views.available_volunteers_api, name='api_available_volunteers'),
 
     # Paramètres du calendrier
     path('settings/', views.CalendarSettingsView.as_view(), name='settings'),
+    path('settings/ics-token/', views.CalendarFeedTokenView.as_view(), name='ics_token_regenerate'),
+
+    # Flux iCalendar (abonnement depuis un agenda externe, authentifié par jeton)
+    path('ics/<str:token>.ics', views.calendar_ics_feed, name='ics_feed'),
 ]
\ No newline at end of file
@@ -6,19 +6,32 @@ from django.views.generic import (
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse
 from django.urls import reverse_lazy, reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.views.decorators.http import require_http_methods
+from django.views.generic.base import View
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.db.models import Q, Count
 from django import forms
+from collections import defaultdict
 from datetime import datetime, timedelta, date
 import json
 
 from .models import (
-    VolunteerCalendar, AvailabilitySlot, AvailabilityException, Appointment
+    VolunteerCalendar, AvailabilitySlot, AvailabilityException, Appointment,
+    APPOINTMENT_OVERLAP_ERROR
 )
 from .forms import AppointmentForm, AvailabilitySlotForm
+from .booking import annotate_booking_capacity, save_booking
+from .availability import get_free_windows, compute_free_windows, get_calendars_by_availability
+from .occurrences import get_slot_occurrences
+from .sync import decode_cursor, get_calendar_changes, serialize_appointment, serialize_occurrence
+from . import ics
+from rosa.pagination import InvalidCursor, KeysetPaginator
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -169,6 +182,39 @@ class CalendarimpersonationMixin:
         return params
 
 
+def is_overlap_violation(error):
+    """Indique si l'IntegrityError vient de la contrainte de non-chevauchement des RDV"""
+    return 'appointment_no_overlap' in str(error)
+
+
+class AppointmentOverlapMixin:
+    """
+    Enregistrement d'un rendez-vous protégé par la contrainte appointment_no_overlap.
+    Le formulaire vérifie déjà les conflits, mais deux réservations simultanées
+    peuvent toutes deux passer cette vérification : la base refuse alors la
+    seconde, et l'erreur est reportée sur le formulaire.
+    """
+
+    def save_appointment(self, form):
+        """
+        Enregistre le formulaire, retourne False si la base a refusé un
+        chevauchement ou si le créneau lié est complet (voir booking.save_booking)
+        """
+        try:
+            with transaction.atomic():
+                self.object = save_booking(form.save(commit=False))
+                form.save_m2m()
+        except ValidationError as error:
+            form.add_error(None, error)
+            return False
+        except IntegrityError as error:
+            if not is_overlap_violation(error):
+                raise
+            form.add_error(None, APPOINTMENT_OVERLAP_ERROR)
+            return False
+        return True
+
+
 class CalendarView(LoginRequiredMixin, CalendarPermissionMixin, TemplateView):
     """Vue principale du calendrier - redirige vers la vue préférée"""
 
@@ -217,21 +263,15 @@ class CalendarWeekView(LoginRequiredMixin, CalendarPermissionMixin, Calendarimpe
             appointment_date__range=[week_start, week_end]
         ).select_related('beneficiary')
 
+        # Occurrences des disponibilités de la semaine (une seule requête)
+        occurrences = get_slot_occurrences([calendar], week_start, week_end)
+
         # Créer la structure des jours de la semaine
         week_days = []
         for i in range(7):
             day_date = week_start + timedelta(days=i)
             day_appointments = [apt for apt in appointments if apt.appointment_date == day_date]
-
-            # Récupérer les disponibilités pour ce jour
-            weekday = day_date.weekday()
-            day_slots = AvailabilitySlot.objects.filter(
-                volunteer_calendar=calendar,
-                is_active=True
-            ).filter(
-                Q(recurrence_type='WEEKLY', weekday=weekday) |
-                Q(recurrence_type='NONE', specific_date=day_date)
-            )
+            day_slots = [occ for occ in occurrences if occ.date == day_date]
 
             week_days.append({
                 'date': day_date,
@@ -300,15 +340,8 @@ class CalendarDayView(LoginRequiredMixin, CalendarPermissionMixin, Calendarimper
             appointment_date=target_date
         ).select_related('beneficiary').order_by('start_time')
 
-        # Récupérer les créneaux de disponibilité du jour
-        weekday = target_date.weekday()
-        availability_slots = AvailabilitySlot.objects.filter(
-            volunteer_calendar=calendar,
-            is_active=True
-        ).filter(
-            Q(recurrence_type='WEEKLY', weekday=weekday) |
-            Q(recurrence_type='NONE', specific_date=target_date)
-        )
+        # Récupérer les occurrences des créneaux de disponibilité du jour
+        availability_slots = get_slot_occurrences([calendar], target_date, target_date)
 
         # Générer toutes les heures de 6h à 23h
         work_hours = []
@@ -471,107 +504,94 @@ class GlobalCalendarView(LoginRequiredMixin, TemplateView):
         next_week = week_start + timedelta(days=7)
 
         # Récupérer tous les calendriers actifs
-        calendars = VolunteerCalendar.objects.filter(
+        calendars = list(VolunteerCalendar.objects.filter(
             volunteer__role__in=['ADMIN', 'EMPLOYEE', 'VOLUNTEER_INTERVIEW']
-        ).select_related('volunteer__user')
+        ).select_related('volunteer__user'))
 
-        # Récupérer tous les RDV et disponibilités de la semaine
-        appointments = Appointment.objects.filter(
+        # Récupérer en une fois tous les RDV et disponibilités de la semaine,
+        # puis les répartir en mémoire par (calendrier, jour) et (calendrier, heure)
+        appointments = list(Appointment.objects.filter(
             appointment_date__range=[week_start, week_end]
-        ).select_related('volunteer_calendar__volunteer__user', 'beneficiary')
+        ).select_related(
+            'volunteer_calendar__volunteer__user', 'beneficiary'
+        ).order_by('appointment_date', 'start_time'))
 
-        availability_slots = AvailabilitySlot.objects.filter(
-            volunteer_calendar__in=calendars,
-            is_active=True
-        )
+        occurrences = get_slot_occurrences(calendars, week_start, week_end)
 
-        # Organiser les données par jour de la semaine et par bénévole
-        week_data = []
-        for i in range(7):  # 7 jours de la semaine
-            day_date = week_start + timedelta(days=i)
+        hours_range = list(range(8, 21))  # 8h à 20h
 
-            # Récupérer les rendez-vous orphelins pour ce jour
-            day_orphan_appointments = appointments.filter(
-                volunteer_calendar__isnull=True,
-                appointment_date=day_date
-            ).order_by('start_time')
+        appointments_by_day = defaultdict(list)
+        appointments_by_hour = defaultdict(list)
+        orphan_appointments_by_day = defaultdict(list)
+        for appointment in appointments:
+            if appointment.volunteer_calendar_id is None:
+                orphan_appointments_by_day[appointment.appointment_date].append(appointment)
+                continue
+            appointments_by_day[(appointment.volunteer_calendar_id, appointment.appointment_date)].append(appointment)
+            appointments_by_hour[(appointment.volunteer_calendar_id, appointment.start_time.hour)].append(appointment)
+
+        slots_by_day = defaultdict(list)
+        slots_by_hour = defaultdict(list)
+        for occurrence in occurrences:
+            slots_by_day[(occurrence.volunteer_calendar_id, occurrence.date)].append(occurrence)
+            for hour in hours_range:
+                if occurrence.start_time.hour <= hour < occurrence.end_time.hour:
+                    slots_by_hour[(occurrence.volunteer_calendar_id, hour)].append(occurrence)
 
-            day_data = {
+        # Organiser les données par jour de la semaine et par bénévole
+        week_days = [week_start + timedelta(days=i) for i in range(7)]
+        week_data = []
+        for day_date in week_days:
+            week_data.append({
                 'date': day_date,
                 'weekday': day_date.weekday(),
-                'volunteers': [],
-                'orphan_appointments': day_orphan_appointments
-            }
-
-            for calendar in calendars:
-                # RDV du jour pour ce bénévole
-                day_appointments = appointments.filter(
-                    volunteer_calendar=calendar,
-                    appointment_date=day_date
-                ).order_by('start_time')
-
-                # Disponibilités du jour pour ce bénévole
-                day_slots = availability_slots.filter(
-                    volunteer_calendar=calendar
-                ).filter(
-                    Q(recurrence_type='WEEKLY', weekday=day_date.weekday()) |
-                    Q(recurrence_type='NONE', specific_date=day_date)
-                ).order_by('start_time')
-
-                volunteer_data = {
-                    'calendar': calendar,
-                    'appointments': day_appointments,
-                    'availability_slots': day_slots
-                }
-
-                day_data['volunteers'].append(volunteer_data)
-
-            week_data.append(day_data)
+                'volunteers': [
+                    {
+                        'calendar': calendar,
+                        'appointments': appointments_by_day[(calendar.id, day_date)],
+                        'availability_slots': slots_by_day[(calendar.id, day_date)],
+                    }
+                    for calendar in calendars
+                ],
+                'orphan_appointments': orphan_appointments_by_day[day_date],
+            })
 
+        # Lignes du planning : un bénévole par ligne, une cellule par jour
+        calendar_rows = []
+        for index, calendar in enumerate(calendars):
+            calendar_rows.append({
+                'calendar': calendar,
+                'days': [
+                    dict(day['volunteers'][index], date=day['date'])
+                    for day in week_data
+                ],
+            })
 
         # Organiser les données par bénévole et par heure (pour vue planning)
-        hours_range = list(range(8, 21))  # 8h à 20h
         volunteers_data = []
-
         for calendar in calendars:
-            volunteer_appointments = appointments.filter(volunteer_calendar=calendar)
-            volunteer_slots = availability_slots.filter(volunteer_calendar=calendar)
-
-            # Créer une liste ordonnée par heure pour les templates
-            hours_list = []
-            for hour in hours_range:
-                hour_appointments = [apt for apt in volunteer_appointments if apt.start_time.hour == hour]
-                hour_slots = [slot for slot in volunteer_slots
-                             if slot.start_time.hour <= hour < slot.end_time.hour]
-
-                hours_list.append({
-                    'hour': hour,
-                    'appointments': hour_appointments,
-                    'slots': hour_slots
-                })
-
             volunteers_data.append({
                 'calendar': calendar,
                 'volunteer': calendar.volunteer,
-                'hours_list': hours_list
+                'hours_list': [
+                    {
+                        'hour': hour,
+                        'appointments': appointments_by_hour[(calendar.id, hour)],
+                        'slots': slots_by_hour[(calendar.id, hour)],
+                    }
+                    for hour in hours_range
+                ],
             })
 
         # Calculer les statistiques de la semaine
-        total_hours = 0
-        unique_beneficiaries = set()
-
-        for appointment in appointments:
-            # Calculer la durée de chaque rendez-vous
-            start_datetime = datetime.combine(appointment.appointment_date, appointment.start_time)
-            end_datetime = datetime.combine(appointment.appointment_date, appointment.end_time)
-            duration = end_datetime - start_datetime
-            total_hours += duration.total_seconds() / 3600  # Convertir en heures
-
-            # Compter les bénéficiaires uniques
-            unique_beneficiaries.add(appointment.beneficiary.id)
+        total_hours = sum(appointment.duration_hours for appointment in appointments)
+        unique_beneficiaries = {appointment.beneficiary_id for appointment in appointments}
 
         # Récupérer tous les rendez-vous orphelins de la semaine
-        orphan_appointments = appointments.filter(volunteer_calendar__isnull=True)
+        orphan_appointments = [
+            appointment for day_date in week_days
+            for appointment in orphan_appointments_by_day[day_date]
+        ]
 
         context.update({
             'calendars': calendars,
@@ -581,6 +601,7 @@ class GlobalCalendarView(LoginRequiredMixin, TemplateView):
             'next_week': next_week,
             'appointments': appointments,
             'orphan_appointments': orphan_appointments,
+            'calendar_rows': calendar_rows,
             'volunteers_data': volunteers_data,
             'hours_range': hours_range,
             'week_data': week_data,
@@ -601,9 +622,9 @@ class AvailabilityListView(LoginRequiredMixin, CalendarPermissionMixin, Calendar
 
     def get_queryset(self):
         calendar = self.get_target_calendar()
-        return AvailabilitySlot.objects.filter(
+        return annotate_booking_capacity(AvailabilitySlot.objects.filter(
             volunteer_calendar=calendar
-        ).order_by('weekday', 'start_time')
+        )).order_by('weekday', 'start_time')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -755,11 +776,23 @@ class AvailabilityDeleteView(LoginRequiredMixin, CalendarPermissionMixin, Calend
 
 
 class AppointmentListView(LoginRequiredMixin, CalendarPermissionMixin, CalendarimpersonationMixin, ListView):
-    """Liste des rendez-vous"""
+    """
+    Liste des rendez-vous : à venir, puis passés (plus récents en premier).
+
+    Chaque section est paginée par clé : la page suivante est demandée par
+    les paramètres `section` et `cursor`, et une requête HTMX ne reçoit que
+    ses lignes et le bouton « Charger plus » suivant.
+    """
     model = Appointment
     template_name = 'calendar/appointment_list.html'
+    rows_template_name = 'calendar/partials/appointment_rows.html'
     context_object_name = 'appointments'
-    paginate_by = 20
+    # Rendez-vous par page de section, et ordre de chaque section (complété par pk)
+    section_paginate_by = 20
+    section_orderings = {
+        'future': ('appointment_date', 'start_time'),
+        'past': ('-appointment_date', '-start_time'),
+    }
 
     def get_queryset(self):
         calendar = self.get_target_calendar()
@@ -767,110 +800,94 @@ class AppointmentListView(LoginRequiredMixin, CalendarPermissionMixin, Calendari
             volunteer_calendar=calendar
         ).select_related('beneficiary')
 
+    def get_section_page(self, section, cursor=None):
+        """Page de la section 'future' ou 'past', après `cursor` s'il est fourni"""
+        today = timezone.localdate()
+        if section == 'future':
+            queryset = self.object_list.filter(appointment_date__gte=today)
+        else:
+            queryset = self.object_list.filter(appointment_date__lt=today)
+        paginator = KeysetPaginator(queryset, self.section_paginate_by, ordering=self.section_orderings[section])
+        try:
+            return paginator.page(cursor)
+        except InvalidCursor:
+            raise Http404('Curseur de pagination invalide')
+
+    def get_requested_section(self):
+        """Section dont la page suivante est demandée (« Charger plus »), ou None"""
+        section = self.request.GET.get('section')
+        if section in self.section_orderings and self.request.GET.get('cursor'):
+            return section
+        return None
+
+    def get_template_names(self):
+        if self.request.headers.get('HX-Request') and self.get_requested_section():
+            return [self.rows_template_name]
+        return super().get_template_names()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        requested = self.get_requested_section()
+
+        if self.request.headers.get('HX-Request') and requested:
+            context['section'] = requested
+            context['appointments'] = self.get_section_page(requested, self.request.GET['cursor'])
+            return context
+
+        for section in self.section_orderings:
+            cursor = self.request.GET['cursor'] if section == requested else None
+            context[f'{section}_appointments'] = self.get_section_page(section, cursor)
+        context['today'] = timezone.localdate()
+
+        # Compteurs par statut, en une requête
+        context.update(self.object_list.aggregate(
+            total_count=Count('pk'),
+            **{
+                f'{status.lower()}_count': Count('pk', filter=Q(status=status))
+                for status, _label in Appointment.STATUS_CHOICES
+            }
+        ))
 
-        from django.utils import timezone
-
-        # Récupérer tous les rendez-vous pour calculer les statistiques
-        calendar = self.get_target_calendar()
-        all_appointments = Appointment.objects.filter(volunteer_calendar=calendar).select_related('beneficiary')
-
-        # Date d'aujourd'hui
-        today = timezone.now().date()
-
-        # Séparer les rendez-vous futurs et passés
-        future_appointments = all_appointments.filter(
-            appointment_date__gte=today
-        ).order_by('appointment_date', 'start_time')
-
-        past_appointments = all_appointments.filter(
-            appointment_date__lt=today
-        ).order_by('-appointment_date', '-start_time')  # Plus récents en premier
-
-        # Combiner dans l'ordre : futurs puis passés
-        appointments_list = list(future_appointments) + list(past_appointments)
+        return context
 
-        # Remplacer la liste des appointments dans le context
-        context['appointments'] = appointments_list
-        context['future_appointments'] = future_appointments
-        context['past_appointments'] = past_appointments
-        context['today'] = today
 
-        # Calculer les compteurs par statut
-        context['scheduled_count'] = all_appointments.filter(status='SCHEDULED').count()
-        context['confirmed_count'] = all_appointments.filter(status='CONFIRMED').count()
-        context['completed_count'] = all_appointments.filter(status='COMPLETED').count()
-        context['cancelled_count'] = all_appointments.filter(status='CANCELLED').count()
-        context['in_progress_count'] = all_appointments.filter(status='IN_PROGRESS').count()
-        context['no_show_count'] = all_appointments.filter(status='NO_SHOW').count()
+def build_booking_week_data(calendars, week_start, week_end):
+    """
+    Construit le planning de réservation de la semaine : pour chaque jour et
+    chaque bénévole, les plages réellement libres (au moins 30 minutes, hors
+    passé). Les créneaux et rendez-vous sont chargés une seule fois pour la
+    semaine puis répartis en mémoire.
+    """
+    calendars = list(calendars)
+    free_windows = get_free_windows(calendars, week_start, week_end)
+
+    week_data = []
+    for i in range(7):  # 7 jours de la semaine
+        day_date = week_start + timedelta(days=i)
+        week_data.append({
+            'date': day_date,
+            'weekday': day_date.weekday(),
+            'volunteers': [
+                {
+                    'calendar': calendar,
+                    'appointments': [],  # Masquer les RDV dans la vue création
+                    'availability_slots': free_windows.get((calendar.id, day_date), [])  # Seulement les créneaux libres
+                }
+                for calendar in calendars
+            ]
+        })
 
-        return context
+    return week_data
 
 
-class AppointmentCreateView(LoginRequiredMixin, CalendarPermissionMixin, CalendarimpersonationMixin, CreateView):
+class AppointmentCreateView(LoginRequiredMixin, CalendarPermissionMixin, CalendarimpersonationMixin,
+                            AppointmentOverlapMixin, CreateView):
     """Créer un nouveau rendez-vous"""
     model = Appointment
     form_class = AppointmentForm
     template_name = 'calendar/appointment_form.html'
     success_url = reverse_lazy('calendar:appointment_list')
 
-    def calculate_real_availability(self, availability_slots, appointments):
-        """
-        Calcule les disponibilités réelles en soustrayant les rendez-vous existants.
-        Retourne des créneaux libres.
-        """
-        real_slots = []
-
-        for slot in availability_slots:
-            current_slots = [{
-                'start_time': slot.start_time,
-                'end_time': slot.end_time,
-                'slot': slot
-            }]
-
-            # Pour chaque rendez-vous, découper les créneaux disponibles
-            for appointment in appointments:
-                new_slots = []
-                for current_slot in current_slots:
-                    # Si le RDV ne chevauche pas avec ce créneau, le garder tel quel
-                    if (appointment.end_time <= current_slot['start_time'] or
-                        appointment.start_time >= current_slot['end_time']):
-                        new_slots.append(current_slot)
-                    else:
-                        # Le RDV chevauche, découper le créneau
-                        # Partie avant le RDV
-                        if appointment.start_time > current_slot['start_time']:
-                            new_slots.append({
-                                'start_time': current_slot['start_time'],
-                                'end_time': appointment.start_time,
-                                'slot': current_slot['slot']
-                            })
-
-                        # Partie après le RDV
-                        if appointment.end_time < current_slot['end_time']:
-                            new_slots.append({
-                                'start_time': appointment.end_time,
-                                'end_time': current_slot['end_time'],
-                                'slot': current_slot['slot']
-                            })
-
-                current_slots = new_slots
-
-            # Ajouter les créneaux libres restants (au moins 30 minutes)
-            for free_slot in current_slots:
-                duration = datetime.combine(date.today(), free_slot['end_time']) - datetime.combine(date.today(), free_slot['start_time'])
-                if duration.total_seconds() >= 1800:  # Au moins 30 minutes
-                    real_slots.append({
-                        'id': free_slot['slot'].id,
-                        'start_time': free_slot['start_time'],
-                        'end_time': free_slot['end_time'],
-                        'title': free_slot['slot'].title,
-                        'original_slot': free_slot['slot']
-                    })
-
-        return real_slots
-
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs['user'] = self.request.user
@@ -931,69 +948,8 @@ class AppointmentCreateView(LoginRequiredMixin, CalendarPermissionMixin, Calenda
             volunteer__role__in=['ADMIN', 'EMPLOYEE', 'VOLUNTEER_INTERVIEW']
         ).select_related('volunteer__user')
 
-        # Récupérer tous les RDV et disponibilités de la semaine
-        appointments = Appointment.objects.filter(
-            appointment_date__range=[week_start, week_end]
-        ).select_related('volunteer_calendar__volunteer__user', 'beneficiary')
-
-        availability_slots = AvailabilitySlot.objects.filter(
-            volunteer_calendar__in=calendars,
-            is_active=True
-        )
-
-        # Organiser les données par jour de la semaine et par bénévole
-        week_data = []
-        for i in range(7):  # 7 jours de la semaine
-            day_date = week_start + timedelta(days=i)
-            day_data = {
-                'date': day_date,
-                'weekday': day_date.weekday(),
-                'volunteers': []
-            }
-
-            for calendar in calendars:
-                # RDV du jour pour ce bénévole
-                day_appointments = appointments.filter(
-                    volunteer_calendar=calendar,
-                    appointment_date=day_date
-                ).order_by('start_time')
-
-                # Disponibilités du jour pour ce bénévole
-                day_slots = availability_slots.filter(
-                    volunteer_calendar=calendar
-                ).filter(
-                    Q(recurrence_type='WEEKLY', weekday=day_date.weekday()) |
-                    Q(recurrence_type='NONE', specific_date=day_date)
-                ).order_by('start_time')
-
-                # Calculer les disponibilités réelles (disponibilités - rendez-vous)
-                real_availability_slots = self.calculate_real_availability(day_slots, day_appointments)
-
-                # Filtrer les créneaux passés : ne pas afficher les créneaux qui sont dans le passé
-                today = timezone.now().date()
-                current_time = timezone.now().time()
-                filtered_slots = []
-
-                for slot in real_availability_slots:
-                    # Garder les créneaux des jours futurs
-                    if day_date > today:
-                        filtered_slots.append(slot)
-                    # Pour aujourd'hui, garder seulement les créneaux dont l'heure de fin n'est pas encore passée
-                    elif day_date == today and slot['end_time'] > current_time:
-                        filtered_slots.append(slot)
-                    # Ignorer complètement les créneaux passés
-
-                real_availability_slots = filtered_slots
-
-                volunteer_data = {
-                    'calendar': calendar,
-                    'appointments': [],  # Masquer les RDV dans la vue création
-                    'availability_slots': real_availability_slots  # Seulement les créneaux libres
-                }
-
-                day_data['volunteers'].append(volunteer_data)
-
-            week_data.append(day_data)
+        # Plages libres de la semaine (disponibilités - rendez-vous, sans le passé)
+        week_data = build_booking_week_data(calendars, week_start, week_end)
 
         # Ajouter au contexte
         context.update({
@@ -1010,12 +966,15 @@ class AppointmentCreateView(LoginRequiredMixin, CalendarPermissionMixin, Calenda
 
     def form_valid(self, form):
         form.instance.created_by = self.request.user
+        if not self.save_appointment(form):
+            return self.form_invalid(form)
+
         target_user = self.get_target_user()
         if self.get_target_user() != self.request.user:
             messages.success(self.request, f'Rendez-vous créé avec succès pour {target_user.get_full_name()}')
         else:
             messages.success(self.request, 'Rendez-vous créé avec succès')
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         """Préserver le paramètre as_user dans l'URL de redirection"""
@@ -1072,7 +1031,8 @@ class AppointmentDetailView(LoginRequiredMixin, CalendarPermissionMixin, Calenda
         return Appointment.objects.none()
 
 
-class AppointmentEditView(LoginRequiredMixin, CalendarPermissionMixin, CalendarimpersonationMixin, UpdateView):
+class AppointmentEditView(LoginRequiredMixin, CalendarPermissionMixin, CalendarimpersonationMixin,
+                          AppointmentOverlapMixin, UpdateView):
     """Modifier un rendez-vous"""
     model = Appointment
     form_class = AppointmentForm
@@ -1113,68 +1073,8 @@ class AppointmentEditView(LoginRequiredMixin, CalendarPermissionMixin, Calendari
             id=self.object.volunteer_calendar.id
         ).select_related('volunteer__user')
 
-        # Récupérer tous les RDV et disponibilités de la semaine
-        appointments = Appointment.objects.filter(
-            appointment_date__range=[week_start, week_end]
-        ).select_related('volunteer_calendar__volunteer__user', 'beneficiary')
-
-        availability_slots = AvailabilitySlot.objects.filter(
-            volunteer_calendar__in=calendars,
-            is_active=True
-        )
-
-        # Organiser les données par jour de la semaine et par bénévole
-        week_data = []
-        for i in range(7):  # 7 jours de la semaine
-            day_date = week_start + timedelta(days=i)
-            day_data = {
-                'date': day_date,
-                'weekday': day_date.weekday(),
-                'volunteers': []
-            }
-
-            for calendar in calendars:
-                # RDV du jour pour ce bénévole
-                day_appointments = appointments.filter(
-                    volunteer_calendar=calendar,
-                    appointment_date=day_date
-                ).order_by('start_time')
-
-                # Disponibilités du jour pour ce bénévole
-                day_slots = availability_slots.filter(
-                    volunteer_calendar=calendar
-                ).filter(
-                    Q(recurrence_type='WEEKLY', weekday=day_date.weekday()) |
-                    Q(recurrence_type='NONE', specific_date=day_date)
-                ).order_by('start_time')
-
-                # Calculer les disponibilités réelles (disponibilités - rendez-vous)
-                from calendar_app.views import AppointmentCreateView
-                create_view = AppointmentCreateView()
-                real_availability_slots = create_view.calculate_real_availability(day_slots, day_appointments)
-
-                # Filtrer les créneaux passés
-                today_date = timezone.now().date()
-                current_time = timezone.now().time()
-                filtered_slots = []
-
-                for slot in real_availability_slots:
-                    if day_date > today_date:
-                        filtered_slots.append(slot)
-                    elif day_date == today_date and slot['end_time'] > current_time:
-                        filtered_slots.append(slot)
-
-                real_availability_slots = filtered_slots
-
-                volunteer_data = {
-                    'calendar': calendar,
-                    'appointments': [],
-                    'availability_slots': real_availability_slots
-                }
-
-                day_data['volunteers'].append(volunteer_data)
-
-            week_data.append(day_data)
+        # Plages libres de la semaine (disponibilités - rendez-vous, sans le passé)
+        week_data = build_booking_week_data(calendars, week_start, week_end)
 
         context['week_data'] = week_data
         context['week_start'] = week_start
@@ -1227,8 +1127,11 @@ class AppointmentEditView(LoginRequiredMixin, CalendarPermissionMixin, Calendari
                 appointment.status = 'SCHEDULED'
                 messages.info(self.request, 'Le rendez-vous a été modifié. Statut repassé à "Programmé" (à confirmer à nouveau)')
 
+        if not self.save_appointment(form):
+            return self.form_invalid(form)
+
         messages.success(self.request, 'Rendez-vous modifié avec succès')
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         """Préserver le paramètre as_user dans l'URL de redirection"""
@@ -1301,8 +1204,19 @@ def appointment_change_status(request, pk):
         if new_status in ['SCHEDULED', 'CONFIRMED', 'IN_PROGRESS', 'COMPLETED', 'CANCELLED', 'NO_SHOW']:
             old_status = appointment.get_status_display()
             appointment.status = new_status
-            appointment.save()
-            messages.success(request, f'Statut changé de "{old_status}" à "{appointment.get_status_display()}"')
+            try:
+                with transaction.atomic():
+                    save_booking(appointment)
+            except ValidationError as error:
+                # Réactiver un RDV annulé alors que son créneau s'est rempli entre-temps
+                messages.error(request, error.messages[0])
+            except IntegrityError as error:
+                # Réactiver un RDV annulé peut chevaucher un RDV pris entre-temps
+                if not is_overlap_violation(error):
+                    raise
+                messages.error(request, APPOINTMENT_OVERLAP_ERROR)
+            else:
+                messages.success(request, f'Statut changé de "{old_status}" à "{appointment.get_status_display()}"')
         else:
             messages.error(request, 'Statut invalide')
 
@@ -1326,11 +1240,60 @@ class CalendarSettingsView(LoginRequiredMixin, CalendarPermissionMixin, UpdateVi
     def get_object(self):
         return self.get_user_calendar()
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['ics_feed_url'] = self.request.build_absolute_uri(
+            reverse('calendar:ics_feed', args=[self.object.feed_token])
+        )
+        return context
+
     def form_valid(self, form):
         messages.success(self.request, 'Paramètres du calendrier mis à jour')
         return super().form_valid(form)
 
 
+class CalendarFeedTokenView(LoginRequiredMixin, CalendarPermissionMixin, View):
+    """Régénère le jeton du flux iCalendar : l'ancienne adresse cesse de fonctionner"""
+
+    def post(self, request):
+        self.get_user_calendar().regenerate_feed_token()
+        messages.success(request, "Nouvelle adresse d'abonnement générée")
+        return redirect('calendar:settings')
+
+
+@require_http_methods(["GET", "HEAD"])
+def calendar_ics_feed(request, token):
+    """
+    Flux iCalendar d'un bénévole, authentifié par le jeton de l'URL.
+    ETag / Last-Modified calculés par agrégats : un agenda qui interroge le
+    flux sans changement reçoit un 304 sans que les événements soient lus.
+    """
+    calendar = get_object_or_404(
+        VolunteerCalendar.objects.select_related('volunteer__user'), feed_token=token
+    )
+    start_date, end_date = ics.get_feed_window()
+    since = ics.parse_sync_token(request.GET.get('sync_token'))
+    state = ics.get_feed_state(calendar, start_date, end_date)
+    etag = ics.make_etag(state, since)
+    last_modified = state['last_modified'].timestamp() if state['last_modified'] else None
+    sync_token = ics.make_sync_token(state['last_modified'])
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(
+            ics.render_feed(calendar, start_date, end_date, since=since, sync_token=sync_token),
+            content_type='text/calendar; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'inline; filename="rosa-{calendar.pk}.ics"'
+
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['X-Sync-Token'] = sync_token
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 # API Views pour HTMX
 @login_required
 def api_availability_slots(request):
@@ -1391,15 +1354,15 @@ def api_calendar_data(request):
     start_date = request.GET.get('start', timezone.now().date().isoformat())
     end_date = request.GET.get('end', (timezone.now().date() + timedelta(days=7)).isoformat())
 
+    start = datetime.fromisoformat(start_date).date()
+    end = datetime.fromisoformat(end_date).date()
+
     # Récupérer les données
-    slots = AvailabilitySlot.objects.filter(
-        volunteer_calendar=calendar,
-        is_active=True
-    )
+    occurrences = get_slot_occurrences([calendar], start, end)
 
     appointments = Appointment.objects.filter(
         volunteer_calendar=calendar,
-        appointment_date__range=[start_date, end_date]
+        appointment_date__range=[start, end]
     ).select_related('beneficiary')
 
     data = {
@@ -1409,35 +1372,37 @@ def api_calendar_data(request):
             'work_end_time': calendar.work_end_time.strftime('%H:%M'),
             'show_weekends': calendar.show_weekends,
         },
-        'availability_slots': [],
-        'appointments': []
+        'availability_slots': [serialize_occurrence(occurrence) for occurrence in occurrences],
+        'appointments': [serialize_appointment(appointment) for appointment in appointments]
     }
 
-    # Formater les créneaux
-    for slot in slots:
-        occurrences = slot.get_occurrences_in_range(
-            datetime.fromisoformat(start_date).date(),
-            datetime.fromisoformat(end_date).date()
-        )
-        data['availability_slots'].extend(occurrences)
-
-    # Formater les RDV
-    for appointment in appointments:
-        data['appointments'].append({
-            'id': appointment.id,
-            'date': appointment.appointment_date.isoformat(),
-            'start_time': appointment.start_time.strftime('%H:%M'),
-            'end_time': appointment.end_time.strftime('%H:%M'),
-            'title': appointment.title,
-            'beneficiary': f"{appointment.beneficiary.first_name} {appointment.beneficiary.last_name}",
-            'type': appointment.appointment_type,
-            'status': appointment.status,
-            'location': appointment.location,
-        })
-
     return JsonResponse(data)
 
 
+@login_required
+def api_calendar_sync(request):
+    """
+    API de synchronisation différentielle (v1) : ?start=&end= pour la période,
+    ?updated_since=<curseur> pour ne recevoir que les changements depuis la
+    réponse précédente (voir calendar_app.sync)
+    """
+    if not hasattr(request.user, 'volunteer_profile'):
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    calendar = VolunteerCalendar.objects.get(volunteer=request.user.volunteer_profile)
+
+    try:
+        today = timezone.localdate()
+        start = date.fromisoformat(request.GET.get('start') or today.isoformat())
+        end = date.fromisoformat(request.GET.get('end') or (today + timedelta(days=7)).isoformat())
+        cursor = request.GET.get('updated_since')
+        since = decode_cursor(cursor) if cursor else None
+    except (ValueError, OverflowError):
+        return JsonResponse({'error': 'Paramètres invalides'}, status=400)
+
+    return JsonResponse(get_calendar_changes(calendar, start, end, since=since))
+
+
 @login_required
 def volunteer_availability_api(request):
     """API HTMX pour afficher les disponibilités d'un bénévole"""
@@ -1468,14 +1433,20 @@ def volunteer_availability_api(request):
         is_active=True
     ).filter(
         Q(recurrence_type='WEEKLY', weekday=weekday) |
-        Q(recurrence_type='ONCE', specific_date=date_obj)
+        Q(recurrence_type='NONE', specific_date=date_obj)
     ).order_by('start_time')
 
     # Récupérer les RDV existants pour cette date
     existing_appointments = Appointment.objects.filter(
         volunteer_calendar=volunteer_calendar,
         appointment_date=date_obj
-    ).order_by('start_time')
+    ).select_related('beneficiary').order_by('start_time')
+
+    # Plages réellement libres ce jour-là (un seul calcul pour le panel)
+    free_windows = compute_free_windows(
+        get_slot_occurrences([volunteer_calendar], date_obj, date_obj),
+        [apt for apt in existing_appointments if apt.status in Appointment.ACTIVE_STATUSES]
+    ).get((volunteer_calendar.id, date_obj), [])
 
     # Vérifier les conflits si une heure de début est spécifiée
     conflict_detected = False
@@ -1486,6 +1457,7 @@ def volunteer_availability_api(request):
             end_time_obj = (datetime.combine(date_obj, start_time_obj) + timedelta(hours=1)).time()
 
             conflict_detected = existing_appointments.filter(
+                status__in=Appointment.ACTIVE_STATUSES,
                 start_time__lt=end_time_obj,
                 end_time__gt=start_time_obj
             ).exists()
@@ -1497,6 +1469,7 @@ def volunteer_availability_api(request):
         'appointment_date': date_obj,
         'availability_slots': availability_slots,
         'existing_appointments': existing_appointments,
+        'free_windows': free_windows,
         'conflict_detected': conflict_detected,
         'selected_time': start_time,
     }
@@ -1539,44 +1512,8 @@ def available_volunteers_api(request):
         html = '<option value="">Format date/heure invalide</option>'
         return HttpResponse(html)
 
-    # Récupérer tous les calendriers actifs (sauf gouvernance)
-    from django.db.models import Q
-
-    all_calendars = VolunteerCalendar.objects.filter(
-        volunteer__role__in=['ADMIN', 'EMPLOYEE', 'VOLUNTEER_INTERVIEW']
-    ).select_related('volunteer__user').order_by('volunteer__user__last_name', 'volunteer__user__first_name')
-
-    weekday = apt_date.weekday()
-    available_calendars = []
-
-    for calendar in all_calendars:
-        # Vérifier disponibilités pour ce créneau
-        availability_slots = AvailabilitySlot.objects.filter(
-            volunteer_calendar=calendar,
-            is_active=True
-        ).filter(
-            Q(recurrence_type='WEEKLY', weekday=weekday) |
-            Q(recurrence_type='NONE', specific_date=apt_date)
-        )
-
-        # Vérifier si le bénévole est disponible pendant ce créneau
-        is_available = False
-        for slot in availability_slots:
-            if (slot.start_time <= start_dt and end_dt <= slot.end_time):
-                is_available = True
-                break
-
-        if is_available:
-            # Vérifier qu'il n'y a pas de conflit avec RDV existants
-            conflicting_appointments = Appointment.objects.filter(
-                volunteer_calendar=calendar,
-                appointment_date=apt_date,
-                start_time__lt=end_dt,
-                end_time__gt=start_dt
-            )
-
-            if not conflicting_appointments.exists():
-                available_calendars.append(calendar)
+    # Bénévoles disponibles / indisponibles, en une seule requête
+    available_calendars, unavailable_calendars = get_calendars_by_availability(apt_date, start_dt, end_dt)
 
     # Générer les options HTML
     html_options = ['<option value="">--- Aucun bénévole assigné (optionnel) ---</option>']
@@ -1589,7 +1526,6 @@ def available_volunteers_api(request):
         html_options.append('</optgroup>')
 
     # Ajouter tous les autres bénévoles comme "occupés" ou "indisponibles"
-    unavailable_calendars = [c for c in all_calendars if c not in available_calendars]
     if unavailable_calendars:
         html_options.append('<optgroup label="Bénévoles indisponibles">')
         for calendar in unavailable_calendars:
@@ -0,0 +1,253 @@
+"""
+Pagination par clé (keyset) des longues listes.
+
+La pagination Django classique lit chaque page par OFFSET et compte toutes
+les lignes (COUNT(*)) : son coût grandit avec la table et la position de la
+page. KeysetPaginator trie le queryset sur l'ordre du modèle complété par la
+clé primaire (par ex. last_name, first_name, pk ou -created_at, pk) et lit la
+page suivante par un filtre « après la dernière ligne affichée » : la requête
+reste la même en page 1 ou 500, l'index de l'ordre est utilisé et rien n'est
+compté. Les valeurs de la dernière ligne forment un curseur opaque et signé,
+transmis par le bouton « Charger plus » (HTMX) de la liste.
+
+L'admin garde ses numéros de page : EstimatedCountPaginator remplace seulement
+le comptage de la table entière par l'estimation de PostgreSQL.
+"""
+import datetime
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, OrderBy, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Dates et heures à la microseconde : DjangoJSONEncoder les tronque à la milliseconde"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class CursorSerializer(signing.JSONSerializer):
+    """Valeurs de tri en JSON, dates et décimaux compris (relues en texte par l'ORM)"""
+
+    def dumps(self, obj):
+        return CursorEncoder(separators=(',', ':')).encode(obj).encode('latin-1')
+
+
+class InvalidCursor(Exception):
+    """Curseur illisible, falsifié ou émis pour un autre ordre de tri"""
+
+
+class KeysetPage:
+    """Page d'un KeysetPaginator : lignes, et curseur de la page suivante s'il y en a une"""
+
+    def __init__(self, object_list, next_cursor, paginator):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.paginator = paginator
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return f'<KeysetPage de {len(self)} ligne(s)>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Pagination par clé de `queryset`, `per_page` lignes par page.
+
+    L'ordre est celui du queryset (order_by, sinon Meta.ordering), complété
+    par pk pour être total. Il ne peut porter que sur des colonnes ou des
+    annotations (pas sur une relation, triée selon l'ordre du modèle lié) ;
+    une valeur NULL se place comme dans PostgreSQL (en dernier en ordre
+    croissant, en premier en ordre décroissant).
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.per_page = int(per_page)
+        self.ordering = self._total_ordering(queryset, ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+        # Curseur lié à l'ordre : celui d'une autre liste ou d'un autre tri est refusé
+        self.salt = f'rosa.pagination:{queryset.model._meta.label}:{",".join(self.ordering)}'
+
+    @staticmethod
+    def _total_ordering(queryset, ordering):
+        if ordering is None:
+            if queryset.query.order_by:
+                ordering = queryset.query.order_by
+            else:
+                ordering = queryset.model._meta.ordering if queryset.query.default_ordering else ()
+        names = []
+        for item in ordering:
+            if isinstance(item, OrderBy) and isinstance(item.expression, F):
+                item = ('-' if item.descending else '') + item.expression.name
+            if not isinstance(item, str) or item == '?':
+                raise ValueError(f'Ordre non paginable par clé : {item!r}')
+            names.append(item)
+        if not {'pk', 'id'} & {name.lstrip('-') for name in names}:
+            names.append('pk')
+        return tuple(names)
+
+    @cached_property
+    def _columns(self):
+        """(chemin, décroissant, peut être NULL) de chaque clé de tri"""
+        model = self.queryset.model
+        columns = []
+        for name in self.ordering:
+            path = name.lstrip('-')
+            field = self._resolve_field(model, path)
+            if field is not None and field.is_relation:
+                raise ValueError(f'Tri sur une relation non paginable par clé : {path} (utiliser {path}_id)')
+            columns.append((path, name.startswith('-'), field is None or field.null))
+        return columns
+
+    @staticmethod
+    def _resolve_field(model, path):
+        """Champ désigné par `path` (None pour une annotation)"""
+        if path == 'pk':
+            return model._meta.pk
+        field = None
+        for part in path.split('__'):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return None
+            model = field.related_model
+        return field
+
+    @staticmethod
+    def _value(obj, path):
+        for part in path.split('__'):
+            if obj is None:
+                return None
+            obj = getattr(obj, part)
+        return obj
+
+    def encode_cursor(self, obj):
+        """Curseur opaque de la ligne `obj` : valeurs de ses clés de tri, signées"""
+        values = [self._value(obj, path) for path, _, _ in self._columns]
+        return signing.dumps(values, salt=self.salt, serializer=CursorSerializer, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            values = signing.loads(cursor, salt=self.salt, serializer=CursorSerializer)
+        except signing.BadSignature:
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self._columns):
+            raise InvalidCursor(cursor)
+        return values
+
+    def _after(self, values):
+        """Filtre des lignes placées strictement après les valeurs `values`"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (path, descending, nullable), value in zip(self._columns, values):
+            if value is None:
+                # NULL en dernier (croissant) : rien après sur cette clé ; en premier (décroissant) : tout le reste
+                if descending:
+                    condition |= equal & Q(**{f'{path}__isnull': False})
+                equal &= Q(**{f'{path}__isnull': True})
+                continue
+            after = Q(**{f'{path}__{"lt" if descending else "gt"}': value})
+            if nullable and not descending:
+                after |= Q(**{f'{path}__isnull': True})
+            condition |= equal & after
+            equal &= Q(**{path: value})
+
+        # Borne redondante sur la première clé : parcours d'index à partir du curseur
+        path, descending, nullable = self._columns[0]
+        if values[0] is not None and not nullable:
+            condition &= Q(**{f'{path}__{"lte" if descending else "gte"}': values[0]})
+        return condition
+
+    def page(self, cursor=None):
+        """Page qui suit le curseur (première page sans curseur), lue en une requête"""
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor)))
+        # Une ligne de plus que la page : y a-t-il une suite, sans COUNT
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return KeysetPage(rows, next_cursor, self)
+
+
+class KeysetPaginationMixin:
+    """
+    Pagination par clé d'une ListView (paginate_by lignes par page).
+
+    La page suivante est demandée par le paramètre `cursor` ; une requête HTMX
+    avec curseur ne reçoit que ses lignes (rows_template_name), à ajouter à
+    la liste, et le bouton « Charger plus » suivant. Une autre requête HTMX
+    reçoit htmx_template_name s'il est défini. Le contexte garde page_obj
+    (avec has_next et next_cursor) et is_paginated, mais pas de nombre de pages.
+    """
+    cursor_kwarg = 'cursor'
+    rows_template_name = None
+    htmx_template_name = None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Curseur de pagination invalide')
+        return paginator, page, page.object_list, bool(self.request.GET.get(self.cursor_kwarg)) or page.has_next()
+
+    def get_template_names(self):
+        if self.request.headers.get('HX-Request'):
+            if self.rows_template_name and self.request.GET.get(self.cursor_kwarg):
+                return [self.rows_template_name]
+            if self.htmx_template_name:
+                return [self.htmx_template_name]
+        return super().get_template_names()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator de l'admin : le nombre de lignes d'une liste non filtrée est
+    l'estimation de PostgreSQL (pg_class.reltuples, tenue à jour par
+    l'autovacuum) dès qu'elle dépasse `threshold`, au lieu d'un COUNT(*) de
+    toute la table. Les listes filtrées ou recherchées restent comptées.
+    """
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where and not query.distinct:
+            estimate = self._estimated_rows(queryset)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def _estimated_rows(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # -1 : table jamais analysée
+        return row[0] if row and row[0] >= 0 else None
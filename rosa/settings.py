@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Local apps
     'users',
@@ -172,6 +174,66 @@ ASSOCIATION_FULL_NAME = os.environ.get('ASSOCIATION_FULL_NAME', 'Réseau Ouvert
 # Admin URL (for security, use a random path instead of /admin/)
 ADMIN_URL = os.environ.get('ADMIN_URL', 'admin')
 
+# Cache partagé entre les workers gunicorn et le worker d'export (résultats des graphiques
+# d'analyse) : les invalidations faites par l'application doivent atteindre le worker, donc
+# CACHE_LOCATION doit être commun aux deux (volume rosa-cache-files dans docker-compose)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'rosa_cache')),
+    }
+}
+
+# Analyses: durée de vie max d'un résultat de graphique en cache (en secondes),
+# filet de sécurité si une dépendance n'est pas déclarée
+CHART_CACHE_TIMEOUT = int(os.environ.get('CHART_CACHE_TIMEOUT', '900'))
+
+# Analyses: évaluation parallèle des graphiques (threads) et délai max par défaut d'un graphique
+# (en secondes, remplacé par le « Délai max » du graphique s'il est renseigné)
+CHART_EXECUTOR_MAX_WORKERS = int(os.environ.get('CHART_EXECUTOR_MAX_WORKERS', '4'))
+CHART_TIMEOUT_SECONDS = float(os.environ.get('CHART_TIMEOUT_SECONDS', '10'))
+# Analyses: limites par défaut d'un graphique (modifiables par graphique) : mémoire
+# supplémentaire du code de requête (en Mo) et nombre de lignes lues en base ; le code
+# est exécuté dans un sous-processus éphémère aux ressources bornées
+CHART_MEMORY_LIMIT_MB = int(os.environ.get('CHART_MEMORY_LIMIT_MB', '256'))
+CHART_ROW_LIMIT = int(os.environ.get('CHART_ROW_LIMIT', '100000'))
+CHART_GOVERNOR_SUBPROCESS = os.environ.get('CHART_GOVERNOR_SUBPROCESS', 'True').lower() in ('true', '1', 't', 'yes')
+# Analyses: durée de réutilisation des données d'un graphique par le navigateur (en secondes)
+CHART_DATA_MAX_AGE = int(os.environ.get('CHART_DATA_MAX_AGE', '60'))
+# Analyses: cache disque des images PNG des exports (partagé entre workers, taille max en octets)
+CHART_IMAGE_CACHE_DIR = os.environ.get('CHART_IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'rosa_chart_images'))
+CHART_IMAGE_CACHE_MAX_BYTES = int(os.environ.get('CHART_IMAGE_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))
+# Analyses: nombre de processus de rendu matplotlib des images manquantes
+CHART_RENDER_MAX_WORKERS = int(os.environ.get('CHART_RENDER_MAX_WORKERS', '2'))
+# Analyses: nombre de mesures d'exécution conservées par graphique (profilage, admin)
+CHART_PROFILE_HISTORY = int(os.environ.get('CHART_PROFILE_HISTORY', '50'))
+# Analyses: exports PDF / PowerPoint en arrière-plan (commande run_export_worker) :
+# durée de conservation des fichiers (en jours), intervalle de scrutation de la file
+# et délai au-delà duquel un export en cours est considéré abandonné (en secondes)
+EXPORT_JOB_RETENTION_DAYS = int(os.environ.get('EXPORT_JOB_RETENTION_DAYS', '7'))
+EXPORT_WORKER_POLL_SECONDS = float(os.environ.get('EXPORT_WORKER_POLL_SECONDS', '5'))
+EXPORT_JOB_STALE_SECONDS = int(os.environ.get('EXPORT_JOB_STALE_SECONDS', '1800'))
+# Bénéficiaires: exports CSV / XLSX en flux (vue et commande export_data) :
+# nombre de lignes lues par lot du curseur serveur
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+
+# Calendar: horizon des occurrences matérialisées des créneaux (en jours)
+# La table est reconstruite au démarrage (python manage.py refresh_slot_occurrences) puis
+# chaque jour par le worker (run_export_worker) ; hors de l'horizon construit, les créneaux
+# sont développés à la volée
+SLOT_OCCURRENCE_PAST_DAYS = int(os.environ.get('SLOT_OCCURRENCE_PAST_DAYS', '370'))
+SLOT_OCCURRENCE_FUTURE_DAYS = int(os.environ.get('SLOT_OCCURRENCE_FUTURE_DAYS', '370'))
+
+# Fenêtre publiée par les flux iCalendar des bénévoles (en jours autour d'aujourd'hui)
+ICS_FEED_PAST_DAYS = int(os.environ.get('ICS_FEED_PAST_DAYS', '30'))
+ICS_FEED_FUTURE_DAYS = int(os.environ.get('ICS_FEED_FUTURE_DAYS', '180'))
+
+# API de synchronisation du calendrier: rétention des traces de suppression (en jours)
+# et recouvrement du curseur (en secondes). Purge quotidienne par le worker (run_export_worker),
+# ou par cron: python manage.py purge_calendar_tombstones
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+SYNC_CURSOR_OVERLAP_SECONDS = int(os.environ.get('SYNC_CURSOR_OVERLAP_SECONDS', '5'))
+
 # HelloAsso Integration Settings
 ENABLE_HELLOASSO_INTEGRATION = os.environ.get('ENABLE_HELLOASSO_INTEGRATION', 'True').lower() in ('true', '1', 't', 'yes')
 HELLOASSO_API_KEY = os.environ.get('HELLOASSO_API_KEY', 'e68c68ac00654206b8a4057c78dcb285')
@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 from django.db.models import Count, Q
 from calendar_app.models import Appointment, VolunteerCalendar
 from beneficiaries.models import Beneficiary, Interaction
+from analysis.rollups import get_beneficiary_evolution
 from news.models import News
 
 
@@ -16,7 +17,6 @@ from news.models import News
 def home(request):
     """Page d'accueil / Tableau de bord"""
     today = timezone.now().date()
-    this_month_start = today.replace(day=1)
 
     # 1. Prochains rendez-vous de l'utilisateur connecté (5 prochains)
     upcoming_appointments = []
@@ -40,10 +40,12 @@ def home(request):
     # 2. Stats des bénéficiaires
     total_beneficiaries = Beneficiary.objects.count()
 
+    # Évolution cumulée sur les 6 derniers mois (agrégats mensuels)
+    evolution = get_beneficiary_evolution(6, today)
+    previous_total = evolution[-2][1] if len(evolution) > 1 else 0
+
     # Nouveaux ce mois
-    new_this_month = Beneficiary.objects.filter(
-        created_at__gte=this_month_start
-    ).count()
+    new_this_month = evolution[-1][1] - previous_total
 
     # Aidés récemment (avec interaction dans les 30 derniers jours)
     thirty_days_ago = today - timedelta(days=30)
@@ -68,30 +70,10 @@ def home(request):
     }
 
     # 3. Évolution des bénéficiaires (6 derniers mois)
-    evolution_data = []
-    for i in range(5, -1, -1):
-        # Calculer le mois ciblé
-        month_date = today - timedelta(days=30 * i)
-        month_start = month_date.replace(day=1)
-
-        # Calculer la fin du mois
-        if month_start.month == 12:
-            month_end = month_start.replace(year=month_start.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            month_end = month_start.replace(month=month_start.month + 1, day=1) - timedelta(days=1)
-
-        # Convertir en datetime aware pour la comparaison
-        month_end_datetime = timezone.make_aware(datetime.combine(month_end, datetime.max.time()))
-
-        # Compter les bénéficiaires créés jusqu'à la fin de ce mois
-        count = Beneficiary.objects.filter(
-            created_at__lte=month_end_datetime
-        ).count()
-
-        evolution_data.append({
-            'month': month_start.strftime('%b'),
-            'count': count
-        })
+    evolution_data = [
+        {'month': month.strftime('%b'), 'count': count}
+        for month, count in evolution
+    ]
 
     # 4. Dernières actualités (3 dernières)
     latest_news = News.objects.all()[:3]
@@ -0,0 +1,150 @@
+"""
+Statistiques d'activité des bénévoles (page détail).
+
+Le coût est constant quel que soit l'historique :
+- rendez-vous par mois : une requête groupée par TruncMonth
+- heures de disponibilité : nombre d'occurrences de chaque créneau par mois
+  calculé par formule (récurrences à pas fixe), puis corrigé des exceptions
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncMonth
+
+from calendar_app.models import Appointment, AvailabilitySlot
+
+
+# Statuts comptés dans les statistiques de rendez-vous
+COUNTED_STATUSES = ['SCHEDULED', 'CONFIRMED', 'COMPLETED']
+
+
+def _hours(start_time, end_time):
+    """Durée en heures entre deux heures d'une même journée"""
+    return (
+        datetime.combine(date.min, end_time) - datetime.combine(date.min, start_time)
+    ).total_seconds() / 3600
+
+
+def count_occurrences(slot, start_date, end_date):
+    """
+    Nombre d'occurrences d'un créneau à pas fixe (hebdomadaire, bi-hebdomadaire)
+    dans [start_date, end_date], sans les énumérer : le rythme part du premier
+    jour voulu à partir de `valid_from`, comme AvailabilitySlot.expand.
+    """
+    step = slot.RECURRENCE_STEP_DAYS[slot.recurrence_type]
+    if slot.weekday is None:
+        return 0
+
+    if slot.valid_until:
+        end_date = min(end_date, slot.valid_until)
+    first = slot.valid_from + timedelta(days=(slot.weekday - slot.valid_from.weekday()) % 7)
+    if end_date < max(start_date, first):
+        return 0
+
+    first_index = max(0, -(-(start_date - first).days // step))
+    last_index = (end_date - first).days // step
+    return max(0, last_index - first_index + 1)
+
+
+def get_availability_hours_by_month(calendar, start_date, end_date):
+    """
+    Heures de disponibilité du calendrier par mois (clé : premier jour du mois)
+    sur [start_date, end_date], exceptions comprises.
+    """
+    slots = AvailabilitySlot.objects.filter(
+        volunteer_calendar=calendar,
+        slot_type='AVAILABILITY',
+        is_active=True
+    ).prefetch_related('exceptions')
+
+    months = []
+    month_start = start_date.replace(day=1)
+    while month_start <= end_date:
+        months.append(month_start)
+        month_start += relativedelta(months=1)
+
+    hours = defaultdict(float)
+    for slot in slots:
+        slot_hours = _hours(slot.start_time, slot.end_time)
+
+        if slot.recurrence_type in slot.RECURRENCE_STEP_DAYS:
+            for month_start in months:
+                month_end = month_start + relativedelta(months=1, days=-1)
+                occurrences = count_occurrences(slot, max(month_start, start_date), min(month_end, end_date))
+                hours[month_start] += occurrences * slot_hours
+        else:
+            # Ponctuel ou mensuel : au plus une occurrence par mois
+            for day in slot.occurrence_dates(start_date, end_date, anchor=slot.valid_from):
+                hours[day.replace(day=1)] += slot_hours
+
+        # Corrections des exceptions : retirer l'occurrence d'origine, ajouter la nouvelle
+        for exception in slot.exceptions.all():
+            original_date = exception.exception_date
+            if not slot.occurrence_dates(original_date, original_date, anchor=slot.valid_from):
+                continue
+            if start_date <= original_date <= end_date:
+                hours[original_date.replace(day=1)] -= slot_hours
+            if exception.exception_type == 'CANCELLED':
+                continue
+
+            day = original_date
+            if exception.exception_type == 'MOVED' and exception.new_date:
+                day = exception.new_date
+            start_time = exception.new_start_time or slot.start_time
+            end_time = exception.new_end_time or slot.end_time
+            if start_date <= day <= end_date and start_time < end_time:
+                hours[day.replace(day=1)] += _hours(start_time, end_time)
+
+    return hours
+
+
+def get_monthly_stats(calendar, today=None, months=12):
+    """
+    Rendez-vous et heures de disponibilité des `months` derniers mois
+    (mois courant inclus), du plus ancien au plus récent.
+    """
+    today = today or date.today()
+    start_date = today.replace(day=1) - relativedelta(months=months - 1)
+    end_date = today.replace(day=1) + relativedelta(months=1, days=-1)
+
+    appointment_counts = dict(
+        Appointment.objects.filter(
+            volunteer_calendar=calendar,
+            appointment_date__range=[start_date, end_date],
+            status__in=COUNTED_STATUSES
+        ).annotate(
+            month=TruncMonth('appointment_date')
+        ).values('month').annotate(
+            count=Count('id')
+        ).values_list('month', 'count')
+    )
+    availability_hours = get_availability_hours_by_month(calendar, start_date, end_date)
+
+    monthly_stats = []
+    for i in range(months):
+        month_date = start_date + relativedelta(months=i)
+        monthly_stats.append({
+            'month': month_date,
+            'month_name': month_date.strftime('%B %Y'),
+            'appointments_count': appointment_counts.get(month_date, 0),
+            'availability_hours': round(availability_hours[month_date], 1),
+        })
+    return monthly_stats
+
+
+def get_year_totals(calendar, today=None):
+    """Nombre et heures de rendez-vous depuis le 1er janvier (une requête)"""
+    today = today or date.today()
+    totals = Appointment.objects.filter(
+        volunteer_calendar=calendar,
+        appointment_date__gte=date(today.year, 1, 1),
+        appointment_date__lte=today,
+        status__in=COUNTED_STATUSES
+    ).aggregate(
+        count=Count('id'),
+        duration=Sum(ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField()))
+    )
+    hours = totals['duration'].total_seconds() / 3600 if totals['duration'] else 0
+    return totals['count'], round(hours, 1)
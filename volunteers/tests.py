@@ -1,3 +1,96 @@
-from django.test import TestCase
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from beneficiaries.models import Beneficiary
+from calendar_app.models import AvailabilityException, AvailabilitySlot, Appointment, VolunteerCalendar
+
+from .models import Volunteer
+from .services import get_availability_hours_by_month, get_monthly_stats
+from .views import VolunteerDetailView
+
+
+class VolunteerStatisticsTests(TestCase):
+    """Statistiques mensuelles de la page détail bénévole"""
+
+    def setUp(self):
+        self.today = date(2030, 6, 15)
+        self.volunteer = Volunteer.objects.create(
+            user=User.objects.create(username='stats', last_name='Stats'), role='VOLUNTEER_INTERVIEW'
+        )
+        self.calendar = VolunteerCalendar.objects.get(volunteer=self.volunteer)
+
+    def add_slot(self, recurrence_type, weekday=None, specific_date=None, valid_from=date(2029, 3, 6)):
+        return AvailabilitySlot.objects.create(
+            volunteer_calendar=self.calendar, recurrence_type=recurrence_type, weekday=weekday,
+            specific_date=specific_date, valid_from=valid_from, start_time=time(9), end_time=time(11, 30)
+        )
+
+    def test_closed_form_hours_match_expansion(self):
+        self.add_slot('WEEKLY', weekday=0)
+        biweekly = self.add_slot('BIWEEKLY', weekday=4, valid_from=date(2029, 9, 1))
+        self.add_slot('MONTHLY', weekday=2)
+        self.add_slot('NONE', specific_date=date(2030, 2, 14))
+        AvailabilityException.objects.create(
+            availability_slot=biweekly, exception_date=date(2029, 9, 7), exception_type='CANCELLED'
+        )
+        AvailabilityException.objects.create(
+            availability_slot=biweekly, exception_date=date(2029, 9, 21), exception_type='MOVED',
+            new_date=date(2029, 10, 2), new_end_time=time(12)
+        )
+
+        start, end = date(2029, 7, 1), date(2030, 6, 30)
+        expected = defaultdict(float)
+        slots = AvailabilitySlot.objects.filter(volunteer_calendar=self.calendar).prefetch_related('exceptions')
+        for occurrence in AvailabilitySlot.expand_many(slots, start, end):
+            duration = (
+                datetime.combine(occurrence.date, occurrence.end_time) -
+                datetime.combine(occurrence.date, occurrence.start_time)
+            )
+            expected[occurrence.date.replace(day=1)] += duration.total_seconds() / 3600
+
+        hours = get_availability_hours_by_month(self.calendar, start, end)
+        for month in set(expected) | set(hours):
+            self.assertAlmostEqual(hours[month], expected[month], msg=month)
+
+    def test_monthly_stats_group_appointments_by_month(self):
+        beneficiary = Beneficiary.objects.create(first_name='Jeanne', last_name='Test')
+        for day, status in [
+            (date(2030, 6, 3), 'SCHEDULED'), (date(2030, 6, 4), 'COMPLETED'),
+            (date(2030, 6, 5), 'CANCELLED'), (date(2029, 7, 1), 'CONFIRMED'), (date(2029, 6, 30), 'COMPLETED'),
+        ]:
+            Appointment.objects.create(
+                volunteer_calendar=self.calendar, beneficiary=beneficiary, appointment_date=day,
+                start_time=time(10), end_time=time(11), status=status
+            )
+
+        stats = get_monthly_stats(self.calendar, today=self.today)
+        self.assertEqual(len(stats), 12)
+        self.assertEqual(stats[0]['month'], date(2029, 7, 1))
+        self.assertEqual(stats[0]['appointments_count'], 1)
+        self.assertEqual(stats[-1]['appointments_count'], 2)
+
+    def test_detail_page_query_count_does_not_grow_with_history(self):
+        admin = User.objects.create(username='admin_test', is_superuser=True, is_staff=True)
+        Volunteer.objects.create(user=admin, role='ADMIN')
+
+        def count_queries():
+            request = RequestFactory().get('/')
+            request.user = User.objects.get(pk=admin.pk)
+            with CaptureQueriesContext(connection) as queries:
+                VolunteerDetailView.as_view()(request, pk=self.volunteer.pk).render()
+            return len(queries.captured_queries)
+
+        self.add_slot('WEEKLY', weekday=1)
+        few = count_queries()
+        for weekday in range(7):
+            for recurrence_type in ['WEEKLY', 'BIWEEKLY', 'MONTHLY']:
+                slot = self.add_slot(recurrence_type, weekday=weekday, valid_from=date(2020, 1, 1) + timedelta(days=weekday))
+                AvailabilityException.objects.create(
+                    availability_slot=slot, exception_date=date(2030, 1, 1), exception_type='CANCELLED'
+                )
+        self.assertEqual(count_queries(), few)
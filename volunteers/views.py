@@ -9,9 +9,10 @@ from django.urls import reverse_lazy, reverse
 from django.db.models import Q
 from django.contrib.auth.models import User
 from django.utils import timezone
-from datetime import datetime, date
+from rosa.pagination import KeysetPaginationMixin
 from .models import Volunteer
 from .forms import VolunteerForm
+from .services import get_monthly_stats, get_year_totals
 from .permissions import (
     VolunteerRequiredMixin,
     AdminOrEmployeeRequiredMixin,
@@ -19,10 +20,11 @@ from .permissions import (
 )
 
 
-class VolunteerListView(VolunteerRequiredMixin, ListView):
-    """Vue liste des bénévoles avec recherche et filtres par rôle"""
+class VolunteerListView(VolunteerRequiredMixin, KeysetPaginationMixin, ListView):
+    """Vue liste des bénévoles avec recherche et filtres par rôle, paginée par curseur"""
     model = Volunteer
     template_name = 'volunteers/list.html'
+    rows_template_name = 'volunteers/partials/volunteer_rows.html'
     context_object_name = 'volunteers'
     paginate_by = 20
 
@@ -105,73 +107,18 @@ class VolunteerDetailView(VolunteerRequiredMixin, DetailView):
     context_object_name = 'volunteer'
 
     def get_context_data(self, **kwargs):
-        from calendar_app.models import Appointment, AvailabilitySlot
-        from collections import defaultdict
-        from dateutil.relativedelta import relativedelta
-
         context = super().get_context_data(**kwargs)
 
-        # Calculer les 12 derniers mois
-        today = date.today()
-        start_date = today - relativedelta(months=11)
-        start_date = start_date.replace(day=1)
-
         # Récupérer le calendrier du bénévole
         if hasattr(self.object, 'calendar'):
             calendar = self.object.calendar
 
-            # Statistiques par mois
-            monthly_stats = []
-
-            for i in range(12):
-                month_date = start_date + relativedelta(months=i)
-                next_month = month_date + relativedelta(months=1)
-
-                # Compter les rendez-vous pour ce mois
-                appointments_count = Appointment.objects.filter(
-                    volunteer_calendar=calendar,
-                    appointment_date__gte=month_date,
-                    appointment_date__lt=next_month,
-                    status__in=['SCHEDULED', 'CONFIRMED', 'COMPLETED']
-                ).count()
-
-                # Calculer les heures de disponibilité pour ce mois
-                availability_slots = AvailabilitySlot.objects.filter(
-                    volunteer_calendar=calendar,
-                    slot_type='AVAILABILITY',
-                    is_active=True
-                )
-
-                total_hours = 0
-                for slot in availability_slots:
-                    # Obtenir les occurrences dans ce mois
-                    occurrences = slot.get_occurrences_in_range(month_date, next_month - relativedelta(days=1))
-                    for occurrence in occurrences:
-                        total_hours += slot.duration_hours
-
-                monthly_stats.append({
-                    'month': month_date,
-                    'month_name': month_date.strftime('%B %Y'),
-                    'appointments_count': appointments_count,
-                    'availability_hours': round(total_hours, 1),
-                })
-
-            context['monthly_stats'] = list(reversed(monthly_stats))
+            # Statistiques des 12 derniers mois (nombre de requêtes constant)
+            context['monthly_stats'] = list(reversed(get_monthly_stats(calendar)))
 
             # Statistiques annuelles
-            current_year = today.year
-            year_start = date(current_year, 1, 1)
-            year_appointments = Appointment.objects.filter(
-                volunteer_calendar=calendar,
-                appointment_date__gte=year_start,
-                appointment_date__lte=today,
-                status__in=['SCHEDULED', 'CONFIRMED', 'COMPLETED']
-            )
-            context['total_appointments_this_year'] = year_appointments.count()
-
-            # Calculer les heures totales de RDV cette année
-            total_hours_appointments = sum(a.duration_hours for a in year_appointments)
-            context['total_hours_appointments_this_year'] = round(total_hours_appointments, 1)
+            (context['total_appointments_this_year'],
+             context['total_hours_appointments_this_year']) = get_year_totals(calendar)
         else:
             context['monthly_stats'] = []
             context['total_appointments_this_year'] = 0